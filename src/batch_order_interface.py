@@ -0,0 +1,467 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script places orders read from a CSV or
+                     JSONL file without any prompts. Orders are validated the
+                     same way create_order does, and every batch removes its
+                     items from inventory in a single checkout. With --shards
+                     the stock is split across worker processes that check
+                     out their share of each batch in parallel.
+
+Usage: python batch_order_interface.py orders.csv --report report.json
+       python batch_order_interface.py orders.jsonl --shards 4
+
+CSV files need the columns order, first_name, last_name, item and quantity,
+with one row per item and the rows of an order next to each other. JSONL
+files hold one order per line, Ex:
+{"order": "A1", "first_name": "John", "last_name": "Doe",
+ "items": {"potato": 3, "corn": 2}}
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import create_order_interface
+import customer_order
+import inventory_manager
+import order_sequence
+import sharded_inventory
+import storage_backends
+
+# Attempts made to check out a batch when other terminals keep selling
+# the same items in between
+MAX_BATCH_ATTEMPTS = 3
+
+
+def read_csv_orders(order_file):
+    """Yields orders from CSV rows, grouping rows with the same order value.
+
+    Args:
+        order_file (file): Open CSV file.
+
+    Return:
+        order (dictionary): Order reference, customer name and item requests.
+    """
+
+    current_order = None
+
+    for row in csv.DictReader(order_file, skipinitialspace=True):
+        order_ref = row.get("order") or ""
+
+        if current_order is None or order_ref != current_order["order"]:
+            if current_order is not None:
+                yield current_order
+
+            current_order = {"order": order_ref,
+                             "first_name": row.get("first_name") or "",
+                             "last_name": row.get("last_name") or "",
+                             "items": list()}
+
+        current_order["items"].append(
+            f"{row.get('item') or ''} {row.get('quantity') or ''}".strip())
+
+    if current_order is not None:
+        yield current_order
+
+
+def read_jsonl_orders(order_file):
+    """Yields orders from a file holding one JSON order per line.
+
+    Args:
+        order_file (file): Open JSONL file.
+
+    Return:
+        order (dictionary): Order reference, customer name and item requests.
+    """
+
+    for line_number, line in enumerate(order_file, start=1):
+        if line.strip() == "":
+            continue
+
+        try:
+            record = json.loads(line)
+            items = record.get("items", dict())
+
+            # Items either as {"potato": 3} or [["potato", 3]]
+            if isinstance(items, dict):
+                items = items.items()
+
+            item_requests = [f"{name} {quantity}" for name, quantity in items]
+        except (ValueError, TypeError, AttributeError) as error:
+            yield {"order": f"line {line_number}",
+                   "first_name": "",
+                   "last_name": "",
+                   "items": list(),
+                   "error": f"Malformed order: {error}"}
+            continue
+
+        yield {"order": str(record.get("order", f"line {line_number}")),
+               "first_name": str(record.get("first_name", "")),
+               "last_name": str(record.get("last_name", "")),
+               "items": item_requests}
+
+
+def validate_order(stock, order, reserved):
+    """Builds the cart of an order, validating every item like create_order.
+
+    Args:
+        stock (Inventory): Inventory the order is checked against.
+
+        order (dictionary): Order read from the input file.
+
+        reserved (dictionary): Quantity already claimed by earlier orders of
+                               the same batch.
+
+    Return:
+        cart (dictionary): Quantity ordered for each (name, price).
+
+        reasons (list): Reasons the order was rejected, empty if valid.
+    """
+
+    if "error" in order:
+        return dict(), [order["error"]]
+
+    cart = dict()
+    reasons = list()
+
+    for item_request in order["items"]:
+        # Items earlier in this order count as claimed as well
+        claimed = dict(reserved)
+        for name_and_price in cart:
+            claimed[name_and_price] = (claimed.get(name_and_price, 0)
+                                       + cart[name_and_price])
+
+        lookup_pair, item_quantity, error = (
+            create_order_interface.validate_item_request(
+                stock, item_request, claimed,
+                reservations=stock.reservations))
+
+        if error is not None:
+            reasons.append(f"{item_request}: {error}")
+            continue
+
+        cart[lookup_pair] = cart.get(lookup_pair, 0) + item_quantity
+
+    if len(reasons) == 0 and len(cart) == 0:
+        reasons.append("Empty Cart. No order created.")
+
+    return cart, reasons
+
+
+def process_batch(stock, batch, report):
+    """Validates a batch of orders, removes every accepted order from
+    inventory in one checkout and writes their order files together.
+
+    Args:
+        stock (Inventory): Inventory the orders are placed against.
+
+        batch (list): Orders read from the input file.
+
+        report (dictionary): Report the results are added to.
+    """
+
+    new_orders = list()
+
+    for attempt in range(MAX_BATCH_ATTEMPTS):
+        stock.refresh_inventory()
+
+        batch_cart = dict()
+        accepted = list()
+        rejected = list()
+
+        for order in batch:
+            cart, reasons = validate_order(stock, order, batch_cart)
+
+            if len(reasons) > 0:
+                rejected.append({"order": order["order"], "reasons": reasons})
+                continue
+
+            accepted.append((order, cart))
+            for name_and_price in cart:
+                batch_cart[name_and_price] = (batch_cart.get(name_and_price, 0)
+                                              + cart[name_and_price])
+
+        if len(batch_cart) == 0:
+            break
+
+        # Numbers are taken before the checkout so its journal record names
+        # the orders, a retry keeps them when it accepts no more orders
+        if len(accepted) > len(new_orders):
+            first_number = allocate_order_numbers(stock, len(accepted))
+        else:
+            first_number = new_orders[0].order_number
+        new_orders = create_orders(stock, accepted, first_number)
+
+        try:
+            stock.checkout(batch_cart, order_id=batch_order_id(new_orders))
+            break
+        except inventory_manager.InsufficientStockError:
+            # Another terminal sold some items, validate the batch again
+            continue
+    else:
+        # Orders already invalid keep their own reasons
+        rejected += [{"order": order["order"],
+                      "reasons": ["Stock kept changing during batch."]}
+                     for order, cart in accepted]
+        accepted = list()
+
+    report["rejected"] += rejected
+
+    write_accepted_orders(stock, accepted, report, new_orders)
+
+
+def process_sharded_batch(stock, shards, batch, report):
+    """Places a batch of orders on sharded stock. Each shard validates and
+    checks out its own lines, and an order is only accepted if every shard
+    accepted its lines.
+
+    Args:
+        stock (Inventory): Inventory the order numbers come from.
+
+        shards (ShardedInventory): Shards owning the stock.
+
+        batch (list): Orders read from the input file.
+
+        report (dictionary): Report the results are added to.
+    """
+
+    valid_orders = list()
+    for order in batch:
+        if "error" in order:
+            report["rejected"].append({"order": order["order"],
+                                       "reasons": [order["error"]]})
+        else:
+            valid_orders.append(order)
+
+    results = shards.place_orders([order["items"] for order in valid_orders])
+
+    accepted = list()
+    for order, (cart, reasons) in zip(valid_orders, results):
+        if len(reasons) > 0:
+            report["rejected"].append({"order": order["order"],
+                                       "reasons": reasons})
+        else:
+            accepted.append((order, cart))
+
+    write_accepted_orders(stock, accepted, report)
+
+
+def allocate_order_numbers(stock, count):
+    """Reserves consecutive order numbers with one counter update.
+
+    Args:
+        stock (Inventory): Inventory the order numbers come from.
+
+        count (int): Amount of numbers reserved.
+
+    Return:
+        first_number (int): First number reserved.
+    """
+
+    if stock.backend is not None:
+        return stock.backend.allocate_order_numbers(count)
+
+    return order_sequence.OrderSequence().allocate(count)
+
+
+def create_orders(stock, accepted, first_number):
+    """Creates the orders of a batch without writing their order files.
+
+    Args:
+        stock (Inventory): Inventory the orders are placed against.
+
+        accepted (list): Order read from the input file and its cart, for
+                         each accepted order.
+
+        first_number (int): Order number of the first order, the others
+                            follow it.
+
+    Return:
+        new_orders (list): CustomerOrder objects.
+    """
+
+    new_orders = list()
+    for order_index, (order, cart) in enumerate(accepted):
+        new_orders.append(customer_order.CustomerOrder(
+            cart, order["first_name"], order["last_name"], confirm=False,
+            order_number=first_number + order_index, write_file=False,
+            backend=stock.backend))
+
+    return new_orders
+
+
+def batch_order_id(new_orders):
+    """Names the orders of a batch checkout in its journal record.
+
+    Args:
+        new_orders (list): CustomerOrder objects of the batch.
+
+    Return:
+        order_id (string): Id of the only order, or the first and last order
+                           id joined by "..".
+    """
+
+    if len(new_orders) == 1:
+        return new_orders[0].order_id
+
+    return f"{new_orders[0].order_id}..{new_orders[-1].order_id}"
+
+
+def write_accepted_orders(stock, accepted, report, new_orders=None):
+    """Creates the orders of a batch and writes their order files together.
+
+    Args:
+        stock (Inventory): Inventory the order numbers come from.
+
+        accepted (list): Order read from the input file and its cart, for
+                         each accepted order.
+
+        report (dictionary): Report the results are added to.
+
+        new_orders (list): Orders already created for accepted, they are
+                           created with new numbers if None.
+    """
+
+    if len(accepted) == 0:
+        return
+
+    # One counter update for the whole batch
+    if new_orders is None:
+        new_orders = create_orders(stock, accepted,
+                                   allocate_order_numbers(stock,
+                                                          len(accepted)))
+
+    for (order, cart), new_order in zip(accepted, new_orders):
+        report["accepted"].append({"order": order["order"],
+                                   "order_id": new_order.order_id})
+
+    customer_order.write_order_files(new_orders, stock.backend)
+
+
+def ingest_orders(stock, orders, batch_size=500, shards=None):
+    """Places a stream of orders in batches without prompting.
+
+    Args:
+        stock (Inventory): Inventory the orders are placed against.
+
+        orders (iterable): Orders from read_csv_orders or read_jsonl_orders.
+
+        batch_size (int): Orders checked out together.
+
+        shards (ShardedInventory): Shards owning the stock, the orders are
+                                   checked out in this process if None.
+
+    Return:
+        report (dictionary): Accepted and rejected orders plus throughput.
+    """
+
+    report = {"accepted": list(), "rejected": list()}
+    batch = list()
+    batch_count = 0
+    line_count = 0
+
+    start_time = time.perf_counter()
+
+    for order in orders:
+        batch.append(order)
+        line_count += len(order["items"])
+
+        if len(batch) >= batch_size:
+            if shards is None:
+                process_batch(stock, batch, report)
+            else:
+                process_sharded_batch(stock, shards, batch, report)
+            batch_count += 1
+            batch = list()
+
+    if len(batch) > 0:
+        if shards is None:
+            process_batch(stock, batch, report)
+        else:
+            process_sharded_batch(stock, shards, batch, report)
+        batch_count += 1
+
+    elapsed = time.perf_counter() - start_time
+    order_count = len(report["accepted"]) + len(report["rejected"])
+
+    report["orders"] = order_count
+    report["lines"] = line_count
+    report["batches"] = batch_count
+    report["seconds"] = elapsed
+    report["orders_per_second"] = order_count / elapsed if elapsed else 0.0
+    report["lines_per_second"] = line_count / elapsed if elapsed else 0.0
+
+    return report
+
+
+def main():
+    """Parses command line options, ingests the order file and prints a
+    summary of the report."""
+
+    parser = argparse.ArgumentParser(
+        description="Place orders from a CSV or JSONL file.")
+    parser.add_argument("order_file")
+    parser.add_argument("--format", choices=["csv", "jsonl"],
+                        help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--report", help="write the full report as JSON")
+    parser.add_argument("--storage", choices=storage_backends.STORAGE_TYPES,
+                        default="text")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="worker processes owning the stock, 0 to "
+                             "check out in this process")
+    args = parser.parse_args()
+
+    # Shards settle crashes from the journal of the text inventory
+    if args.shards > 0 and args.storage != "text":
+        parser.error("--shards needs --storage text")
+
+    file_format = args.format
+    if file_format is None:
+        file_format = "jsonl" if args.order_file.endswith(".jsonl") else "csv"
+
+    stock = storage_backends.open_inventory(args.storage)
+
+    shards = None
+    if args.shards > 0:
+        shards = sharded_inventory.ShardedInventory(stock, args.shards)
+
+    try:
+        with open(args.order_file, newline="") as order_file:
+            if file_format == "csv":
+                orders = read_csv_orders(order_file)
+            else:
+                orders = read_jsonl_orders(order_file)
+
+            report = ingest_orders(stock, orders, args.batch_size, shards)
+    finally:
+        # Stock left in the shards goes back into the inventory
+        if shards is not None:
+            shards.close()
+
+    stock.compact_inventory()
+
+    for rejected in report["rejected"]:
+        print(f"Rejected {rejected['order']}: "
+              f"{'; '.join(rejected['reasons'])}")
+
+    print(f"Accepted: {len(report['accepted'])}  "
+          f"Rejected: {len(report['rejected'])}  "
+          f"Batches: {report['batches']}")
+    print(f"{report['orders_per_second']:.1f} orders/s, "
+          f"{report['lines_per_second']:.1f} lines/s "
+          f"in {report['seconds']:.2f}s")
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Report written to {os.path.abspath(args.report)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script measures checkout throughput when
+                     several writer processes share one inventory file, and
+                     checks that no item was oversold.
+
+Usage: python benchmark_contention.py --writers 1 2 4 8 --orders 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import inventory_manager
+
+
+def write_catalog(item_count, quantity):
+    """Writes a synthetic inventory.txt in the current working directory.
+
+    Args:
+        item_count (int): Amount of items in catalog.
+
+        quantity (int): Starting stock for every item.
+    """
+
+    with open("inventory.txt", "w") as inventory_file:
+        for item_index in range(item_count):
+            inventory_file.write(f"item{item_index}, 1.25, {quantity}\n")
+
+
+def run_writer(work_dir, journaled, compact_threshold, order_count, seed,
+               start_event, results):
+    """Places order_count random orders against the shared inventory.
+
+    Args:
+        work_dir (string): Folder holding inventory.txt.
+
+        journaled (bool): Determines if the journal storage mode is used.
+
+        compact_threshold (int): Journal records allowed before compacting.
+
+        order_count (int): Amount of orders to place.
+
+        seed (int): Seed for the random carts.
+
+        start_event (Event): Released once every writer is ready.
+
+        results (Queue): Receives accepted orders and units sold per item.
+    """
+
+    os.chdir(work_dir)
+    generator = random.Random(seed)
+    stock = inventory_manager.Inventory(journaled=journaled,
+                                        compact_threshold=compact_threshold)
+    item_names = list(stock.item_price_lookup)
+
+    accepted = 0
+    rejected = 0
+    sold = dict()
+
+    start_event.wait()
+
+    for order_index in range(order_count):
+        cart = dict()
+        for item_name in generator.sample(item_names, 3):
+            name_and_price = (item_name, stock.item_price_lookup[item_name])
+            cart[name_and_price] = generator.randint(1, 5)
+
+        try:
+            stock.checkout(cart, order_id=f"bench_{seed}_{order_index}")
+        except inventory_manager.InsufficientStockError:
+            rejected += 1
+            continue
+
+        accepted += 1
+        for name_and_price in cart:
+            sold[name_and_price] = sold.get(name_and_price, 0) + cart[
+                name_and_price]
+
+    results.put((accepted, rejected, sold))
+
+
+def run_round(writer_count, order_count, item_count, quantity, journaled,
+              compact_threshold):
+    """Runs one round of writer_count concurrent writers.
+
+    Args:
+        writer_count (int): Amount of writer processes.
+
+        order_count (int): Orders placed by each writer.
+
+        item_count (int): Amount of items in catalog.
+
+        quantity (int): Starting stock for every item.
+
+        journaled (bool): Determines if the journal storage mode is used.
+
+        compact_threshold (int): Journal records allowed before compacting.
+
+    Return:
+        round_result (dictionary): Throughput and consistency figures.
+    """
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        write_catalog(item_count, quantity)
+        os.chdir(cwd)
+
+        start_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        writers = list()
+
+        for writer_index in range(writer_count):
+            writer = multiprocessing.Process(
+                target=run_writer,
+                args=(work_dir, journaled, compact_threshold, order_count,
+                      writer_index, start_event, results))
+            writer.start()
+            writers.append(writer)
+
+        # Give every writer time to load the catalog before starting
+        time.sleep(0.5)
+        start_time = time.perf_counter()
+        start_event.set()
+
+        accepted = 0
+        rejected = 0
+        sold = dict()
+        for writer_index in range(writer_count):
+            writer_accepted, writer_rejected, writer_sold = results.get()
+            accepted += writer_accepted
+            rejected += writer_rejected
+            for name_and_price in writer_sold:
+                sold[name_and_price] = (sold.get(name_and_price, 0)
+                                        + writer_sold[name_and_price])
+
+        elapsed = time.perf_counter() - start_time
+
+        for writer in writers:
+            writer.join()
+
+        # Every unit sold must be missing from the final inventory exactly once
+        os.chdir(work_dir)
+        final_stock = inventory_manager.Inventory(journaled=journaled)
+        os.chdir(cwd)
+
+        consistent = True
+        for name_and_price in final_stock.inventory:
+            expected = quantity - sold.get(name_and_price, 0)
+            if final_stock.inventory[name_and_price] != expected:
+                consistent = False
+            if final_stock.inventory[name_and_price] < 0:
+                consistent = False
+
+    return {"writers": writer_count,
+            "accepted": accepted,
+            "rejected": rejected,
+            "seconds": elapsed,
+            "orders_per_second": (accepted + rejected) / elapsed,
+            "consistent": consistent}
+
+
+def main():
+    """Parses command line options and prints a throughput table."""
+
+    parser = argparse.ArgumentParser(
+        description="Measure checkouts from concurrent terminals.")
+    parser.add_argument("--writers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--orders", type=int, default=200,
+                        help="orders placed by each writer")
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--quantity", type=int, default=50,
+                        help="starting stock, low values force rejections")
+    parser.add_argument("--compact-threshold", type=int, default=1000)
+    parser.add_argument("--rewrite", action="store_true",
+                        help="rewrite inventory.txt instead of journaling")
+    args = parser.parse_args()
+
+    mode = "rewrite" if args.rewrite else "journaled"
+    print(f"Mode: {mode}, {args.items} items, {args.orders} orders per writer")
+    print(f"{'Writers': >8} {'Accepted': >9} {'Rejected': >9} "
+          f"{'Orders/s': >10} {'Consistent': >11}")
+
+    for writer_count in args.writers:
+        round_result = run_round(writer_count, args.orders, args.items,
+                                 args.quantity, not args.rewrite,
+                                 args.compact_threshold)
+        print(f"{round_result['writers']: >8} "
+              f"{round_result['accepted']: >9} "
+              f"{round_result['rejected']: >9} "
+              f"{round_result['orders_per_second']: >10.1f} "
+              f"{str(round_result['consistent']): >11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script measures how long applying a delta
+                     file takes on a large catalog. A synthetic inventory.txt
+                     and a delta of restocks, price changes, new items and
+                     removed items are written, then the delta is read and
+                     applied with the search and reorder indexes built, and
+                     another terminal picks up the new snapshot.
+
+Usage: python benchmark_delta.py --items 1000000 --lines 100000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import inventory_delta
+import inventory_manager
+
+# Share of delta lines of each operation, the rest are restocks
+PRICE_SHARE = 0.2
+ADD_SHARE = 0.05
+REMOVE_SHARE = 0.05
+
+
+def write_inventory(item_count):
+    """Writes inventory.txt in the current working directory.
+
+    Args:
+        item_count (int): Amount of items.
+    """
+
+    with open("inventory.txt", "w") as inventory_file:
+        for item_index in range(item_count):
+            inventory_file.write(f"item{item_index}, 1.25, "
+                                 f"{item_index % 500}\n")
+
+
+def write_delta(delta_file_path, item_count, line_count, seed):
+    """Writes a delta file touching random items of the catalog, each item
+    at most once so every line can be applied.
+
+    Args:
+        delta_file_path (string): Location of the delta file.
+
+        item_count (int): Amount of items in catalog.
+
+        line_count (int): Amount of delta lines.
+
+        seed (int): Seed for the items chosen and the values.
+    """
+
+    generator = random.Random(seed)
+    item_indexes = generator.sample(range(item_count), line_count)
+
+    with open(delta_file_path, "w") as delta_file:
+        for line_index, item_index in enumerate(item_indexes):
+            share = line_index / line_count
+
+            if share < REMOVE_SHARE:
+                line = inventory_delta.format_delta_line(
+                    inventory_delta.REMOVE_OPERATION, f"item{item_index}")
+            elif share < REMOVE_SHARE + ADD_SHARE:
+                line = inventory_delta.format_delta_line(
+                    inventory_delta.ADD_OPERATION, f"new{item_index}",
+                    generator.randint(10, 2000) / 100,
+                    generator.randint(0, 1000))
+            elif share < REMOVE_SHARE + ADD_SHARE + PRICE_SHARE:
+                line = inventory_delta.format_delta_line(
+                    inventory_delta.PRICE_OPERATION, f"item{item_index}",
+                    generator.randint(10, 2000) / 100)
+            else:
+                line = inventory_delta.format_delta_line(
+                    inventory_delta.RESTOCK_OPERATION, f"item{item_index}",
+                    quantity=generator.randint(1, 1000))
+
+            delta_file.write(line + "\n")
+
+
+def main():
+    """Applies a synthetic delta to a synthetic catalog."""
+
+    parser = argparse.ArgumentParser(
+        description="Measure applying a delta file to a large catalog.")
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--reorder-point", type=int, default=20,
+                        help="default reorder point watched while applying")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+
+        try:
+            write_inventory(args.items)
+            write_delta("delta.txt", args.items, args.lines, seed=5)
+
+            phases = list()
+
+            start_time = time.perf_counter()
+            stock = inventory_manager.Inventory(journaled=True)
+            other_stock = inventory_manager.Inventory(journaled=True)
+            phases.append(("load both terminals",
+                           time.perf_counter() - start_time))
+
+            start_time = time.perf_counter()
+            stock.search_index()
+            stock.reorder_index(args.reorder_point)
+            phases.append(("build indexes", time.perf_counter() - start_time))
+
+            start_time = time.perf_counter()
+            operations = inventory_delta.read_delta("delta.txt")
+            phases.append(("read delta", time.perf_counter() - start_time))
+
+            start_time = time.perf_counter()
+            stock.apply_delta(operations, "delta.txt")
+            phases.append(("apply delta", time.perf_counter() - start_time))
+
+            start_time = time.perf_counter()
+            other_stock.refresh_inventory()
+            phases.append(("other terminal", time.perf_counter() - start_time))
+
+            start_time = time.perf_counter()
+            inventory_manager.Inventory(journaled=True)
+            phases.append(("new terminal", time.perf_counter() - start_time))
+
+            alert_count = len(stock.reorder_index().take_alerts())
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.items} items, {args.lines} delta lines, "
+          f"{alert_count} reorder alerts")
+    for phase_name, seconds in phases:
+        print(f"  {phase_name: <18} {seconds: >8.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script measures how many order files per
+                     second are written when every order is synced alone
+                     compared to orders sharing their fsync in groups. Orders
+                     are placed from several threads at once, like several
+                     terminals served by one process.
+
+Usage: python benchmark_group_commit.py --threads 16 --orders 50
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import customer_order
+import group_commit
+
+
+def place_orders(order_count, first_number, order_group):
+    """Creates order files one after another like a single terminal.
+
+    Args:
+        order_count (int): Orders placed by this thread.
+
+        first_number (int): Order number of the first order, reserved in
+                            advance so only order files are timed.
+
+        order_group (GroupCommit): Group the orders are synced with, None to
+                                   sync each order alone.
+    """
+
+    for order_index in range(order_count):
+        customer_order.CustomerOrder({("potato", 1.35): 1}, "John", "Doe",
+                                     confirm=False,
+                                     order_number=first_number + order_index,
+                                     group_commit=order_group)
+
+
+def run_mode(thread_count, order_count, order_group):
+    """Places orders from several threads in a fresh orders folder.
+
+    Args:
+        thread_count (int): Threads placing orders at once.
+
+        order_count (int): Orders placed by each thread.
+
+        order_group (GroupCommit): Group the orders are synced with, None to
+                                   sync each order alone.
+
+    Return:
+        orders_per_second (float): Order files made durable per second.
+    """
+
+    start_cwd = os.getcwd()
+
+    with tempfile.TemporaryDirectory(dir=start_cwd) as work_dir:
+        os.chdir(work_dir)
+        try:
+            threads = [threading.Thread(target=place_orders,
+                                        args=(order_count,
+                                              thread_index * order_count + 1,
+                                              order_group))
+                       for thread_index in range(thread_count)]
+
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start_time
+        finally:
+            os.chdir(start_cwd)
+
+    return thread_count * order_count / elapsed
+
+
+def main():
+    """Parses command line options and prints orders per second for each
+    durability mode."""
+
+    parser = argparse.ArgumentParser(
+        description="Compare syncing orders alone and in groups.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--orders", type=int, default=50,
+                        help="orders placed by each thread")
+    parser.add_argument("--windows-ms", type=float, nargs="+",
+                        default=[0.0, 1.0, 5.0])
+    parser.add_argument("--group-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'Mode': >18} {'Orders/s': >10} {'Groups': >8} "
+          f"{'Orders/group': >13}")
+
+    orders_per_second = run_mode(args.threads, args.orders, None)
+    print(f"{'strict': >18} {orders_per_second: >10.1f} "
+          f"{args.threads * args.orders: >8} {1.0: >13.1f}")
+
+    for window_ms in args.windows_ms:
+        order_group = group_commit.GroupCommit(window_ms / 1000,
+                                               args.group_size)
+        orders_per_second = run_mode(args.threads, args.orders, order_group)
+        mode_name = f"group {window_ms:g}ms"
+        print(f"{mode_name: >18} {orders_per_second: >10.1f} "
+              f"{order_group.group_count: >8} "
+              f"{order_group.order_count / order_group.group_count: >13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script measures how many rows per second
+                     catalog_importer.py reads. The same synthetic catalog is
+                     written as text, CSV and JSON lines, with a share of
+                     malformed rows, then read in this process and by each
+                     amount of worker processes.
+
+Usage: python benchmark_importer.py --rows 1000000 --workers 2 4
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import catalog_importer
+
+
+def write_catalogs(work_dir, row_count, malformed_every, seed):
+    """Writes the same synthetic catalog in each import format.
+
+    Args:
+        work_dir (string): Folder the catalogs are written in.
+
+        row_count (int): Amount of rows in each catalog.
+
+        malformed_every (int): Every this many rows has a bad price, 0 for
+                               none.
+
+        seed (int): Seed for prices and stock.
+
+    Return:
+        catalog_paths (dictionary): Location of the catalog of each format.
+    """
+
+    generator = random.Random(seed)
+    catalog_paths = {file_format: os.path.join(work_dir,
+                                               f"catalog.{file_format}")
+                     for file_format in catalog_importer.IMPORT_FORMATS}
+    catalog_paths["text"] = os.path.join(work_dir, "catalog.txt")
+
+    with open(catalog_paths["text"], "w") as text_file, \
+            open(catalog_paths["csv"], "w") as csv_file, \
+            open(catalog_paths["jsonl"], "w") as jsonl_file:
+        csv_file.write("name,price,quantity\n")
+
+        for row_index in range(row_count):
+            price = str(generator.randint(10, 2000) / 100)
+            quantity = generator.randint(10_000, 100_000)
+
+            if malformed_every > 0 and row_index % malformed_every == 0:
+                price = "n/a"
+
+            text_file.write(f"Item{row_index}, {price}, {quantity}\n")
+            csv_file.write(f"Item{row_index},{price},{quantity}\n")
+            jsonl_file.write(json.dumps({"name": f"Item{row_index}",
+                                         "price": price,
+                                         "quantity": quantity}) + "\n")
+
+    return catalog_paths
+
+
+def time_import(catalog_path, workers):
+    """Reads every row of a catalog.
+
+    Args:
+        catalog_path (string): Location of the catalog.
+
+        workers (int): Worker processes, 0 to parse in this process.
+
+    Return:
+        elapsed (float): Seconds taken.
+
+        report (dictionary): Report filled in by read_catalog().
+    """
+
+    report = dict()
+    start_time = time.perf_counter()
+    for _ in catalog_importer.read_catalog(catalog_path, workers=workers,
+                                           report=report):
+        pass
+
+    return time.perf_counter() - start_time, report
+
+
+def main():
+    """Reads each format serially and with each amount of workers."""
+
+    parser = argparse.ArgumentParser(
+        description="Measure catalog import throughput.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--malformed-every", type=int, default=1000,
+                        help="every this many rows is malformed, 0 for none")
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows, every {args.malformed_every} malformed, "
+          f"{os.cpu_count()} cores")
+    print(f"{'Format': >7} {'Workers': >8} {'Seconds': >9} {'Rows/s': >10} "
+          f"{'Malformed': >10}")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        catalog_paths = write_catalogs(work_dir, args.rows,
+                                       args.malformed_every, seed=1)
+
+        for file_format in catalog_importer.IMPORT_FORMATS:
+            for workers in [0] + args.workers:
+                elapsed, report = time_import(catalog_paths[file_format],
+                                              workers)
+                print(f"{file_format: >7} {workers: >8} {elapsed: >9.2f} "
+                      f"{report['rows'] / elapsed: >10.0f} "
+                      f"{len(report['malformed']): >10}")
+
+
+if __name__ == '__main__':
+    main()
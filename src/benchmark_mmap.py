@@ -0,0 +1,175 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script compares startup time, checkout time
+                     and resident memory of the text inventory against the
+                     memory-mapped binary inventory. Each measurement runs in
+                     a fresh process so memory is not shared between them.
+
+Usage: python benchmark_mmap.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def write_catalog(inventory_file_path, item_count):
+    """Writes a synthetic inventory.txt.
+
+    Args:
+        inventory_file_path (string): Location of inventory.txt.
+
+        item_count (int): Amount of items in catalog.
+    """
+
+    with open(inventory_file_path, "w") as inventory_file:
+        for item_index in range(item_count):
+            inventory_file.write(f"item{item_index}, 1.25, 100\n")
+
+
+def read_anon_rss():
+    """Reads the private memory of the process. Mapped file pages count
+    towards RSS too, but they are shared page cache the kernel can drop.
+
+    Return:
+        anon_rss (int): Anonymous resident memory in kilobytes, 0 if the
+                        platform does not report it.
+    """
+
+    try:
+        with open("/proc/self/status") as status_file:
+            for line in status_file:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return 0
+
+
+def measure(storage, work_dir, item_count):
+    """Opens the inventory in the current process and times it. Run by the
+    child process started from run_measurement().
+
+    Args:
+        storage (string): "text" or "mmap".
+
+        work_dir (string): Folder holding the inventory files.
+
+        item_count (int): Amount of items in catalog.
+
+    Return:
+        result (dictionary): Startup and checkout time plus peak RSS.
+    """
+
+    os.chdir(work_dir)
+
+    start_time = time.perf_counter()
+
+    import inventory_manager
+    if storage == "mmap":
+        import mmap_backend
+        stock = inventory_manager.Inventory(
+            backend=mmap_backend.MmapBackend())
+    else:
+        stock = inventory_manager.Inventory()
+
+    startup_seconds = time.perf_counter() - start_time
+
+    # Stock checks as done by create_order, spread over the catalog
+    start_time = time.perf_counter()
+    for item_index in range(0, item_count, max(1, item_count // 1000)):
+        item_name = f"item{item_index}"
+        if item_name in stock.item_price_lookup:
+            lookup_pair = (item_name, stock.item_price_lookup[item_name])
+            stock.inventory[lookup_pair]
+    lookup_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    stock.checkout({("item0", 1.25): 1, (f"item{item_count - 1}", 1.25): 2})
+    checkout_seconds = time.perf_counter() - start_time
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {"startup_seconds": startup_seconds,
+            "lookup_seconds": lookup_seconds,
+            "checkout_seconds": checkout_seconds,
+            "peak_rss_mb": peak_rss / 1024,
+            "anon_rss_mb": read_anon_rss() / 1024}
+
+
+def run_measurement(storage, work_dir, item_count):
+    """Runs measure() in a fresh Python process.
+
+    Args:
+        storage (string): "text" or "mmap".
+
+        work_dir (string): Folder holding the inventory files.
+
+        item_count (int): Amount of items in catalog.
+
+    Return:
+        result (dictionary): Result printed by the child process.
+    """
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--measure", storage,
+         work_dir, str(item_count)],
+        capture_output=True, text=True, check=True, cwd=script_dir)
+
+    return json.loads(completed.stdout)
+
+
+def main():
+    """Parses command line options and prints a comparison table."""
+
+    parser = argparse.ArgumentParser(
+        description="Compare the text and mmap inventory storage.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    parser.add_argument("--measure", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        storage, work_dir, item_count = args.measure
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(measure(storage, work_dir, int(item_count))))
+        return
+
+    import mmap_backend
+
+    print(f"{'Items': >9} {'Storage': >8} {'Startup (s)': >12} "
+          f"{'1k lookups (s)': >15} {'Checkout (ms)': >14} "
+          f"{'Peak RSS (MB)': >14} {'Anon RSS (MB)': >14}")
+
+    for item_count in args.sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            inventory_file_path = os.path.join(work_dir, "inventory.txt")
+            write_catalog(inventory_file_path, item_count)
+            mmap_backend.convert_text_to_binary(
+                inventory_file_path,
+                os.path.join(work_dir, mmap_backend.BINARY_FILE_NAME),
+                os.path.join(work_dir, mmap_backend.INDEX_FILE_NAME))
+
+            for storage in ("text", "mmap"):
+                result = run_measurement(storage, work_dir, item_count)
+                print(f"{item_count: >9} {storage: >8} "
+                      f"{result['startup_seconds']: >12.4f} "
+                      f"{result['lookup_seconds']: >15.4f} "
+                      f"{result['checkout_seconds'] * 1000: >14.2f} "
+                      f"{result['peak_rss_mb']: >14.1f} "
+                      f"{result['anon_rss_mb']: >14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script compares keeping orders as one file
+                     each with keeping them as records in segment files. The
+                     same synthetic orders are written to a sharded orders
+                     folder and to a segmented one, one order at a time and
+                     in batches, then random orders are looked up. Order
+                     files already hold the receipt, segments keep the record
+                     and render the receipt from it.
+
+Usage: python benchmark_order_log.py --orders 5000 --lookups 5000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import benchmark_suite
+import customer_order
+import order_log
+import order_paths
+
+
+def build_orders(item_names, order_count, first_number):
+    """Builds orders with their numbers assigned, without writing them.
+
+    Args:
+        item_names (list): Names of the items in catalog.
+
+        order_count (int): Amount of orders.
+
+        first_number (int): Order number of the first order.
+
+    Return:
+        orders (list): CustomerOrder objects.
+    """
+
+    orders = list()
+
+    for order_index, order_lines in enumerate(benchmark_suite.generate_orders(
+            item_names, order_count, seed=3)):
+        items_ordered = dict()
+        for item_name, quantity in order_lines:
+            items_ordered[(item_name, 1.25)] = quantity
+
+        orders.append(customer_order.CustomerOrder(
+            items_ordered, "Bench", f"Customer{order_index % 100}",
+            confirm=False, order_number=first_number + order_index,
+            write_file=False))
+
+    return orders
+
+
+def write_orders(orders, batch_size):
+    """Writes orders in batches with write_order_files().
+
+    Args:
+        orders (list): CustomerOrder objects.
+
+        batch_size (int): Orders written together.
+
+    Return:
+        elapsed (float): Seconds taken.
+    """
+
+    start_time = time.perf_counter()
+    for first_index in range(0, len(orders), batch_size):
+        customer_order.write_order_files(
+            orders[first_index:first_index + batch_size])
+
+    return time.perf_counter() - start_time
+
+
+def read_orders(order_ids, layout, render):
+    """Looks up each order.
+
+    Args:
+        order_ids (list): Orders to look up.
+
+        layout (string): Layout of the orders folder.
+
+        render (bool): Determines if segment records are rendered into
+                       receipts.
+
+    Return:
+        elapsed (float): Seconds taken.
+    """
+
+    start_time = time.perf_counter()
+
+    if layout == order_paths.SEGMENTED_LAYOUT:
+        # A new log, so the first lookups load the segment indexes
+        log = order_log.OrderLog()
+        for order_id in order_ids:
+            if render:
+                found = log.render_order(order_id)
+            else:
+                found = log.read_order(order_id)
+            if found is None:
+                raise RuntimeError(f"Order {order_id} not found")
+        log.close()
+    else:
+        for order_id in order_ids:
+            with open(order_paths.locate_order_file(order_id)) as order_file:
+                order_file.read()
+
+    return time.perf_counter() - start_time
+
+
+def main():
+    """Writes and looks up the orders in each layout."""
+
+    parser = argparse.ArgumentParser(
+        description="Compare order files with the segmented order log.")
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--items", type=int, default=1000)
+    args = parser.parse_args()
+
+    item_names = [f"item{item_index}" for item_index in range(args.items)]
+    lookup_generator = random.Random(4)
+
+    print(f"{args.orders} orders, batches of {args.batch_size}, "
+          f"{args.lookups} random lookups")
+    print(f"{'Layout': >10} {'Single/s': >10} {'Batched/s': >10} "
+          f"{'Lookups/s': >10} {'Receipts/s': >10} {'Files': >7}")
+
+    cwd = os.getcwd()
+
+    for layout in (order_paths.SHARDED_LAYOUT, order_paths.SEGMENTED_LAYOUT):
+        with tempfile.TemporaryDirectory() as work_dir:
+            os.chdir(work_dir)
+
+            try:
+                orders_path = order_paths.default_orders_path()
+                order_paths.write_layout(orders_path, layout)
+
+                single_orders = build_orders(item_names, args.orders, 1)
+                single_elapsed = write_orders(single_orders, 1)
+
+                batched_orders = build_orders(item_names, args.orders,
+                                              args.orders + 1)
+                batched_elapsed = write_orders(batched_orders,
+                                               args.batch_size)
+
+                order_ids = [order.order_id
+                             for order in single_orders + batched_orders]
+                lookup_ids = [lookup_generator.choice(order_ids)
+                              for lookup in range(args.lookups)]
+                lookup_elapsed = read_orders(lookup_ids, layout, False)
+                receipt_elapsed = read_orders(lookup_ids, layout, True)
+
+                file_count = sum(len(file_names) for dir_path, dir_names,
+                                 file_names in os.walk(orders_path))
+            finally:
+                os.chdir(cwd)
+                order_paths.layout_cache.clear()
+                order_log.log_cache.clear()
+
+        print(f"{layout: >10} {args.orders / single_elapsed: >10.0f} "
+              f"{args.orders / batched_elapsed: >10.0f} "
+              f"{args.lookups / lookup_elapsed: >10.0f} "
+              f"{args.lookups / receipt_elapsed: >10.0f} {file_count: >7}")
+
+
+if __name__ == '__main__':
+    main()
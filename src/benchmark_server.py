@@ -0,0 +1,211 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script load tests inventory_server.py on
+                     localhost. It starts a server over a synthetic catalog,
+                     keeps many connections busy with lookups and orders for
+                     a fixed time, then reports throughput and latency
+                     percentiles of each request type.
+
+Usage: python benchmark_server.py --lookup-clients 200 --order-clients 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import benchmark_suite
+import mmap_backend
+
+
+async def run_client(host, port, operation, item_count, deadline, seed,
+                     latencies):
+    """Sends one request at a time over its own connection until the
+    deadline.
+
+    Args:
+        host (string): Server host.
+
+        port (int): Server port.
+
+        operation (string): "lookup" or "order".
+
+        item_count (int): Amount of items in catalog.
+
+        deadline (float): perf_counter() time to stop at.
+
+        seed (int): Seed for the items requested.
+
+        latencies (dictionary): Latency list of each outcome, appended to.
+    """
+
+    generator = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    request_id = 0
+
+    while time.perf_counter() < deadline:
+        request_id += 1
+
+        if operation == "lookup":
+            request = {"id": request_id, "op": "lookup",
+                       "item": f"item{generator.randrange(item_count)}"}
+        else:
+            item_indexes = generator.sample(range(item_count),
+                                            generator.randint(1, 3))
+            request = {"id": request_id, "op": "order",
+                       "first_name": "Load", "last_name": f"Client{seed}",
+                       "items": [[f"item{item_index}", 1]
+                                 for item_index in item_indexes]}
+
+        start_time = time.perf_counter()
+        writer.write(json.dumps(request).encode() + b"\n")
+        response = json.loads(await reader.readline())
+        latency = time.perf_counter() - start_time
+
+        outcome = operation if response["ok"] else f"{operation}_failed"
+        latencies.setdefault(outcome, list()).append(latency)
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_load(host, port, lookup_clients, order_clients, item_count,
+                   duration):
+    """Runs every client at once.
+
+    Args:
+        host (string): Server host.
+
+        port (int): Server port.
+
+        lookup_clients (int): Connections sending lookups.
+
+        order_clients (int): Connections sending orders.
+
+        item_count (int): Amount of items in catalog.
+
+        duration (float): Seconds to keep the load up.
+
+    Return:
+        latencies (dictionary): Latency list of each outcome.
+
+        elapsed (float): Seconds the load ran.
+    """
+
+    latencies = dict()
+    start_time = time.perf_counter()
+    deadline = start_time + duration
+
+    clients = [run_client(host, port, "lookup", item_count, deadline,
+                          client_index, latencies)
+               for client_index in range(lookup_clients)]
+    clients += [run_client(host, port, "order", item_count, deadline,
+                           lookup_clients + client_index, latencies)
+                for client_index in range(order_clients)]
+    await asyncio.gather(*clients)
+
+    return latencies, time.perf_counter() - start_time
+
+
+def percentile(sorted_values, fraction):
+    """Returns a percentile of sorted values.
+
+    Args:
+        sorted_values (list): Values in increasing order.
+
+        fraction (float): Percentile between 0 and 1.
+
+    Return:
+        value (float): Value at that percentile.
+    """
+
+    return sorted_values[min(len(sorted_values) - 1,
+                             int(fraction * len(sorted_values)))]
+
+
+def print_results(latencies, elapsed):
+    """Prints throughput and latency of each outcome.
+
+    Args:
+        latencies (dictionary): Latency list of each outcome.
+
+        elapsed (float): Seconds the load ran.
+    """
+
+    print(f"{'request': <15} {'count': >8} {'per sec': >10} "
+          f"{'p50 ms': >8} {'p99 ms': >8} {'max ms': >8}")
+
+    for outcome in sorted(latencies):
+        values = sorted(latencies[outcome])
+        print(f"{outcome: <15} {len(values): >8} "
+              f"{len(values) / elapsed: >10.1f} "
+              f"{percentile(values, 0.5) * 1000: >8.2f} "
+              f"{percentile(values, 0.99) * 1000: >8.2f} "
+              f"{values[-1] * 1000: >8.2f}")
+
+
+def main():
+    """Starts a server over a synthetic catalog and load tests it."""
+
+    parser = argparse.ArgumentParser(
+        description="Measure orders placed through the inventory server.")
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--lookup-clients", type=int, default=200)
+    parser.add_argument("--order-clients", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds to keep the load up")
+    parser.add_argument("--storage", choices=["text", "mmap"],
+                        default="text")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "inventory_server.py")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        inventory_file_path = os.path.join(work_dir, "inventory.txt")
+        benchmark_suite.write_catalog(inventory_file_path, args.items, seed=1)
+
+        if args.storage == "mmap":
+            mmap_backend.convert_text_to_binary(
+                inventory_file_path,
+                os.path.join(work_dir, mmap_backend.BINARY_FILE_NAME),
+                os.path.join(work_dir, mmap_backend.INDEX_FILE_NAME))
+
+        server = subprocess.Popen([sys.executable, server_script,
+                                   "--port", "0",
+                                   "--storage", args.storage,
+                                   "--batch-size", str(args.batch_size)],
+                                  cwd=work_dir, stdout=subprocess.PIPE,
+                                  text=True)
+
+        try:
+            # Server prints its address once it is listening
+            address = server.stdout.readline().split()
+            if len(address) == 0:
+                sys.exit("Server did not start.")
+            host, _, port = address[-1].rpartition(":")
+
+            latencies, elapsed = asyncio.run(run_load(
+                host, int(port), args.lookup_clients, args.order_clients,
+                args.items, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{args.lookup_clients} lookup and {args.order_clients} order "
+          f"connections for {elapsed:.1f}s over {args.items} items "
+          f"({args.storage} storage)")
+    print_results(latencies, elapsed)
+
+
+if __name__ == '__main__':
+    main()
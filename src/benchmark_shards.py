@@ -0,0 +1,140 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script measures how checkout throughput
+                     grows with the amount of shard processes. The same
+                     synthetic order stream is validated and checked out in
+                     batches, first in a single process the way
+                     batch_order_interface.py does, then by each amount of
+                     shards. Order files are not written.
+
+Usage: python benchmark_shards.py --shards 1 2 4 8 --orders 20000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import batch_order_interface
+import benchmark_suite
+import inventory_manager
+import sharded_inventory
+
+
+def place_in_process(stock, batches):
+    """Validates and checks out each batch in one process.
+
+    Args:
+        stock (Inventory): Inventory the orders are placed against.
+
+        batches (list): Item requests of each order, for each batch.
+
+    Return:
+        accepted_count (int): Amount of orders accepted.
+    """
+
+    accepted_count = 0
+
+    for batch in batches:
+        batch_cart = dict()
+
+        for item_requests in batch:
+            cart, reasons = batch_order_interface.validate_order(
+                stock, {"items": item_requests}, batch_cart)
+
+            if len(reasons) == 0:
+                accepted_count += 1
+                for name_and_price in cart:
+                    batch_cart[name_and_price] = (
+                        batch_cart.get(name_and_price, 0)
+                        + cart[name_and_price])
+
+        if len(batch_cart) > 0:
+            stock.checkout(batch_cart, "benchmark")
+
+    return accepted_count
+
+
+def place_in_shards(shards, batches):
+    """Places each batch on the shards.
+
+    Args:
+        shards (ShardedInventory): Shards owning the stock.
+
+        batches (list): Item requests of each order, for each batch.
+
+    Return:
+        accepted_count (int): Amount of orders accepted.
+    """
+
+    accepted_count = 0
+
+    for batch in batches:
+        for cart, reasons in shards.place_orders(batch):
+            if len(reasons) == 0:
+                accepted_count += 1
+
+    return accepted_count
+
+
+def main():
+    """Runs the order stream in one process and on each amount of
+    shards."""
+
+    parser = argparse.ArgumentParser(
+        description="Compare batch checkouts with and without shards.")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--orders", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    item_names = [f"item{item_index}" for item_index in range(args.items)]
+    orders = [[f"{item_name} {quantity}" for item_name, quantity in order]
+              for order in benchmark_suite.generate_orders(
+                  item_names, args.orders, seed=2)]
+    batches = [orders[first_index:first_index + args.batch_size]
+               for first_index in range(0, len(orders), args.batch_size)]
+
+    print(f"{args.orders} orders over {args.items} items, batches of "
+          f"{args.batch_size}, {os.cpu_count()} cores")
+    print(f"{'Mode': >10} {'Seconds': >9} {'Orders/s': >10} "
+          f"{'Accepted': >9}")
+
+    cwd = os.getcwd()
+
+    for shard_count in [0] + args.shards:
+        with tempfile.TemporaryDirectory() as work_dir:
+            benchmark_suite.write_catalog(
+                os.path.join(work_dir, "inventory.txt"), args.items, seed=1)
+            os.chdir(work_dir)
+
+            try:
+                stock = inventory_manager.Inventory(journaled=True)
+
+                if shard_count == 0:
+                    start_time = time.perf_counter()
+                    accepted_count = place_in_process(stock, batches)
+                    elapsed = time.perf_counter() - start_time
+                    mode = "process"
+                else:
+                    # Moving the stock in and out is not timed
+                    shards = sharded_inventory.ShardedInventory(stock,
+                                                                shard_count)
+                    start_time = time.perf_counter()
+                    accepted_count = place_in_shards(shards, batches)
+                    elapsed = time.perf_counter() - start_time
+                    shards.close()
+                    mode = f"{shard_count} shards"
+            finally:
+                os.chdir(cwd)
+
+        print(f"{mode: >10} {elapsed: >9.2f} "
+              f"{args.orders / elapsed: >10.0f} {accepted_count: >9}")
+
+
+if __name__ == '__main__':
+    main()
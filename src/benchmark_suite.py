@@ -0,0 +1,467 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python script times the inventory and order hot
+                     paths against synthetic catalogs and order streams. Every
+                     case runs in a fresh process and records wall time,
+                     allocations and peak RSS to a JSON results file. Two
+                     results files can be compared to flag regressions.
+
+Usage: python benchmark_suite.py --sizes 1000 100000 --output results.json
+       python benchmark_suite.py --compare baseline.json results.json
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Cases in the order they run, each one times a single hot path
+CASE_NAMES = ("init", "refresh_unchanged", "refresh_after_order",
+              "stock_check", "modify_inventory", "checkout",
+              "customer_order")
+
+
+class PhaseTimer:
+    """Adds up the time spent inside with blocks. When tracemalloc is
+    running, the largest amount of memory allocated inside a block is kept
+    as well, so setup done outside the blocks is not counted.
+
+    Attributes:
+        seconds (float): Time spent inside with blocks.
+
+        peak_bytes (int): Most memory allocated inside one with block.
+
+    Methods:
+        __enter__(): Starts timing a block.
+
+        __exit__(exc_type, exc_value, traceback): Stops timing a block.
+    """
+
+    def __init__(self):
+        """Initializes an empty timer."""
+
+        self.seconds = 0.0
+        self.peak_bytes = 0
+        self.__start_time = 0.0
+        self.__start_bytes = 0
+
+    def __enter__(self):
+        """Starts timing a block."""
+
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.__start_bytes = tracemalloc.get_traced_memory()[0]
+
+        self.__start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Stops timing a block."""
+
+        self.seconds += time.perf_counter() - self.__start_time
+
+        if tracemalloc.is_tracing():
+            block_peak = tracemalloc.get_traced_memory()[1] - self.__start_bytes
+            self.peak_bytes = max(self.peak_bytes, block_peak)
+
+
+def write_catalog(inventory_file_path, sku_count, seed):
+    """Writes a synthetic inventory.txt with random prices and stock.
+
+    Args:
+        inventory_file_path (string): Location of inventory.txt.
+
+        sku_count (int): Amount of items in catalog.
+
+        seed (int): Seed for prices and stock.
+    """
+
+    generator = random.Random(seed)
+
+    with open(inventory_file_path, "w") as inventory_file:
+        for item_index in range(sku_count):
+            price = generator.randint(10, 2000) / 100
+            inventory_file.write(f"item{item_index}, {price}, "
+                                 f"{generator.randint(10_000, 100_000)}\n")
+
+
+def generate_orders(item_names, order_count, seed, max_lines=5):
+    """Builds a synthetic order stream over a catalog.
+
+    Args:
+        item_names (list): Names of the items in catalog.
+
+        order_count (int): Amount of orders.
+
+        seed (int): Seed for item choice and quantity.
+
+        max_lines (int): Most items in one order.
+
+    Return:
+        orders (list): Item name and quantity pairs of each order.
+    """
+
+    generator = random.Random(seed)
+    orders = list()
+
+    for _ in range(order_count):
+        line_count = generator.randint(1, min(max_lines, len(item_names)))
+        orders.append([(item_name, generator.randint(1, 3))
+                       for item_name in generator.sample(item_names,
+                                                         line_count)])
+
+    return orders
+
+
+def build_cart(stock, order):
+    """Turns an order into a cart keyed by (name, price).
+
+    Args:
+        stock (Inventory): Inventory holding the prices.
+
+        order (list): Item name and quantity pairs.
+
+    Return:
+        cart (dictionary): Quantity ordered for each (name, price).
+    """
+
+    cart = dict()
+    for item_name, item_quantity in order:
+        cart[(item_name, stock.item_price_lookup[item_name])] = item_quantity
+
+    return cart
+
+
+def run_case(case_name, sku_count, order_count, seed):
+    """Runs one case in the current working directory, which holds a fresh
+    synthetic catalog.
+
+    Args:
+        case_name (string): One of CASE_NAMES.
+
+        sku_count (int): Amount of items in catalog.
+
+        order_count (int): Amount of orders in the order stream.
+
+        seed (int): Seed for the order stream.
+
+    Return:
+        timer (PhaseTimer): Time and memory of the timed blocks.
+
+        operation_count (int): Operations done in the timed blocks.
+    """
+
+    import create_order_interface
+    import customer_order
+    import inventory_manager
+
+    timer = PhaseTimer()
+    item_names = [f"item{item_index}" for item_index in range(sku_count)]
+    orders = generate_orders(item_names, order_count, seed)
+
+    if case_name == "init":
+        with timer:
+            inventory_manager.Inventory(journaled=True)
+        return timer, 1
+
+    stock = inventory_manager.Inventory(journaled=True)
+
+    if case_name == "refresh_unchanged":
+        with timer:
+            for _ in range(order_count):
+                stock.refresh_inventory()
+        return timer, order_count
+
+    if case_name == "refresh_after_order":
+        # A second terminal places orders, this one picks them up
+        other_stock = inventory_manager.Inventory(journaled=True)
+        for order in orders:
+            other_stock.modify_inventory(build_cart(other_stock, order))
+            with timer:
+                stock.refresh_inventory()
+        return timer, order_count
+
+    if case_name == "stock_check":
+        item_requests = [f"{item_name} {item_quantity}"
+                         for order in orders
+                         for item_name, item_quantity in order]
+        with timer:
+            for item_request in item_requests:
+                create_order_interface.validate_item_request(stock,
+                                                             item_request)
+        return timer, len(item_requests)
+
+    carts = [build_cart(stock, order) for order in orders]
+
+    if case_name == "modify_inventory":
+        with timer:
+            for cart in carts:
+                stock.modify_inventory(cart)
+        return timer, order_count
+
+    if case_name == "checkout":
+        with timer:
+            for cart in carts:
+                stock.checkout(cart)
+        return timer, order_count
+
+    if case_name == "customer_order":
+        # Answer the name confirmation prompt and hide the output
+        original_input = builtins.input
+        builtins.input = lambda prompt="": "Y"
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), timer:
+                for cart in carts:
+                    customer_order.CustomerOrder(cart, "John", "Doe")
+        finally:
+            builtins.input = original_input
+        return timer, order_count
+
+    raise ValueError(f"Unknown case: {case_name}")
+
+
+def measure(case_name, work_dir, sku_count, order_count, seed, trace):
+    """Runs a case in this process and collects its results. Run by the
+    child process started from run_measurement().
+
+    Args:
+        case_name (string): One of CASE_NAMES.
+
+        work_dir (string): Folder holding the synthetic catalog.
+
+        sku_count (int): Amount of items in catalog.
+
+        order_count (int): Amount of orders in the order stream.
+
+        seed (int): Seed for the order stream.
+
+        trace (bool): Determines if allocations are traced, which slows the
+                      case down so its time is not reported.
+
+    Return:
+        result (dictionary): Time, allocations or peak RSS of the case.
+    """
+
+    os.chdir(work_dir)
+
+    if trace:
+        tracemalloc.start()
+
+    timer, operation_count = run_case(case_name, sku_count, order_count, seed)
+
+    if trace:
+        tracemalloc.stop()
+        return {"allocated_peak_mb": timer.peak_bytes / 2 ** 20}
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_rss //= 1024
+
+    return {"seconds": timer.seconds,
+            "operations": operation_count,
+            "microseconds_per_operation":
+                timer.seconds / max(1, operation_count) * 1_000_000,
+            "peak_rss_mb": peak_rss / 1024}
+
+
+def run_measurement(case_name, sku_count, order_count, seed, trace):
+    """Runs measure() in a fresh Python process on a fresh catalog.
+
+    Args:
+        case_name (string): One of CASE_NAMES.
+
+        sku_count (int): Amount of items in catalog.
+
+        order_count (int): Amount of orders in the order stream.
+
+        seed (int): Seed for the catalog and order stream.
+
+        trace (bool): Determines if allocations are traced.
+
+    Return:
+        result (dictionary): Result printed by the child process.
+    """
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        write_catalog(os.path.join(work_dir, "inventory.txt"), sku_count,
+                      seed)
+
+        command = [sys.executable, os.path.abspath(__file__), "--measure",
+                   case_name, work_dir, str(sku_count), str(order_count),
+                   str(seed)]
+        if trace:
+            command.append("--trace")
+
+        completed = subprocess.run(command, capture_output=True, text=True,
+                                   check=True, cwd=script_dir)
+
+    return json.loads(completed.stdout)
+
+
+def run_suite(sizes, order_count, seed, case_names, repeats):
+    """Runs every case for every catalog size.
+
+    Args:
+        sizes (list): Catalog sizes in SKUs.
+
+        order_count (int): Amount of orders in each order stream.
+
+        seed (int): Seed for catalogs and order streams.
+
+        case_names (list): Cases to run.
+
+        repeats (int): Timed runs of each case, the fastest is kept.
+
+    Return:
+        results (dictionary): Environment details and one entry per case.
+    """
+
+    results = {"python": platform.python_version(),
+               "platform": platform.platform(),
+               "orders": order_count,
+               "seed": seed,
+               "cases": list()}
+
+    for sku_count in sizes:
+        for case_name in case_names:
+            runs = [run_measurement(case_name, sku_count, order_count, seed,
+                                    False)
+                    for _ in range(repeats)]
+            fastest = min(runs, key=lambda run: run["seconds"])
+            fastest["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+            fastest.update(run_measurement(case_name, sku_count, order_count,
+                                           seed, True))
+
+            fastest["case"] = case_name
+            fastest["skus"] = sku_count
+            results["cases"].append(fastest)
+
+            print(f"{case_name: >20} {sku_count: >9} "
+                  f"{fastest['seconds']: >10.4f} "
+                  f"{fastest['microseconds_per_operation']: >12.1f} "
+                  f"{fastest['allocated_peak_mb']: >12.2f} "
+                  f"{fastest['peak_rss_mb']: >10.1f}")
+
+    return results
+
+
+def compare_results(baseline, current, threshold):
+    """Finds cases that got slower or use more memory than the baseline.
+
+    Args:
+        baseline (dictionary): Results of the earlier run.
+
+        current (dictionary): Results of the new run.
+
+        threshold (float): Allowed growth, Ex: 0.1 for 10%.
+
+    Return:
+        regressions (list): Description of every regression found.
+    """
+
+    baseline_cases = dict()
+    for case in baseline["cases"]:
+        baseline_cases[(case["case"], case["skus"])] = case
+
+    regressions = list()
+
+    for case in current["cases"]:
+        old_case = baseline_cases.get((case["case"], case["skus"]))
+        if old_case is None:
+            continue
+
+        for metric in ("microseconds_per_operation", "allocated_peak_mb",
+                       "peak_rss_mb"):
+            old_value = old_case.get(metric)
+            new_value = case.get(metric)
+            if not old_value or new_value is None:
+                continue
+
+            change = new_value / old_value - 1
+            status = "REGRESSION" if change > threshold else "ok"
+            print(f"{case['case']: >20} {case['skus']: >9} {metric: >27} "
+                  f"{old_value: >12.2f} {new_value: >12.2f} "
+                  f"{change * 100: >+8.1f}% {status}")
+
+            if change > threshold:
+                regressions.append(f"{case['case']} at {case['skus']} SKUs: "
+                                   f"{metric} {change * 100:+.1f}%")
+
+    return regressions
+
+
+def main():
+    """Parses command line options, then runs the suite or compares two
+    results files."""
+
+    parser = argparse.ArgumentParser(
+        description="Run the inventory benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1000, 10000, 100000, 1000000])
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=521)
+    parser.add_argument("--cases", nargs="+", choices=CASE_NAMES,
+                        default=list(CASE_NAMES))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2,
+                        metavar=("BASELINE", "CURRENT"))
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed growth before a regression is flagged")
+    parser.add_argument("--measure", nargs=5, help=argparse.SUPPRESS)
+    parser.add_argument("--trace", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        case_name, work_dir, sku_count, order_count, seed = args.measure
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(json.dumps(measure(case_name, work_dir, int(sku_count),
+                                 int(order_count), int(seed), args.trace)))
+        return
+
+    if args.compare:
+        with open(args.compare[0]) as baseline_file:
+            baseline = json.load(baseline_file)
+        with open(args.compare[1]) as current_file:
+            current = json.load(current_file)
+
+        regressions = compare_results(baseline, current, args.threshold)
+
+        print("")
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        print(f"{len(regressions)} regressions found")
+
+        sys.exit(1 if len(regressions) > 0 else 0)
+
+    print(f"{'Case': >20} {'SKUs': >9} {'Total (s)': >10} "
+          f"{'us/op': >12} {'Alloc (MB)': >12} {'RSS (MB)': >10}")
+
+    results = run_suite(args.sizes, args.orders, args.seed, args.cases,
+                        args.repeats)
+
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    print(f"Results written to {os.path.abspath(args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,507 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file reads item catalogs in the
+                     inventory.txt text format, CSV or JSONL. Rows are
+                     streamed one at a time, and large files are split into
+                     byte ranges that worker processes parse in parallel.
+                     Rows that cannot be read are reported with their line
+                     number instead of being skipped silently.
+
+Usage: python catalog_importer.py catalog.csv --output inventory.txt
+       python catalog_importer.py catalog.jsonl --workers 4 --report r.json
+
+CSV files need a header with the columns name, price and quantity. JSONL
+files hold one item per line, Ex: {"name": "potato", "price": 1.5,
+"quantity": 30}
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import tempfile
+import time
+
+import inventory_journal
+import item_store
+
+IMPORT_FORMATS = ("text", "csv", "jsonl")
+
+# Files smaller than two chunks are parsed in this process
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Column names accepted for each field of a CSV header
+CSV_COLUMNS = {"name": ("name", "item"),
+               "price": ("price",),
+               "quantity": ("quantity", "stock")}
+
+# Malformed rows printed by the command line, the report keeps all
+PRINTED_MALFORMED_ROWS = 20
+
+
+def parse_text_line(line):
+    """Parses a line of inventory.txt, Ex: "potato, 1.5, 30".
+
+    Args:
+        line (string): Line without its newline.
+
+    Return:
+        item (tuple): Lowercase name, price and quantity.
+
+    Raises:
+        ValueError: The line is formatted incorrectly, with the reason.
+    """
+
+    entries = line.split(", ")
+
+    if len(entries) != 3:
+        raise ValueError(f"expected 3 fields, found {len(entries)}")
+
+    return parse_fields(entries[0], entries[1], entries[2])
+
+
+def parse_fields(name, price, quantity):
+    """Converts the fields of a row, each one once.
+
+    Args:
+        name (string): Item name.
+
+        price (string): Price in dollars.
+
+        quantity (string): Quantity in stock.
+
+    Return:
+        item (tuple): Lowercase name, price and quantity.
+
+    Raises:
+        ValueError: A field is invalid, with the reason.
+    """
+
+    try:
+        item_price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid price {price!r}")
+
+    # Prices the store cannot hold, such as nan, inf or too large ones
+    item_store.price_to_cents(item_price)
+
+    try:
+        item_quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid quantity {quantity!r}")
+
+    return str(name).lower(), item_price, item_quantity
+
+
+def csv_column_indexes(header):
+    """Finds the name, price and quantity columns of a CSV header.
+
+    Args:
+        header (list): Column names of the first row.
+
+    Return:
+        column_indexes (tuple): Index of the name, price and quantity
+                                columns.
+
+    Raises:
+        ValueError: A column is missing.
+    """
+
+    columns = [column.strip().lower() for column in header]
+    column_indexes = list()
+
+    for field in ("name", "price", "quantity"):
+        for column_name in CSV_COLUMNS[field]:
+            if column_name in columns:
+                column_indexes.append(columns.index(column_name))
+                break
+        else:
+            raise ValueError(f"CSV header has no {field} column")
+
+    return tuple(column_indexes)
+
+
+def iter_records(lines, file_format, malformed, first_line_number=1,
+                 column_indexes=None):
+    """Yields the items of some lines of a catalog, one at a time. Blank
+    lines and inventory.txt version headers are skipped.
+
+    Args:
+        lines (iterable): Lines of the catalog, without newlines.
+
+        file_format (string): One of IMPORT_FORMATS.
+
+        malformed (list): Receives the line number, reason and text of each
+                          row that could not be read.
+
+        first_line_number (int): Line number of the first line.
+
+        column_indexes (tuple): CSV columns from csv_column_indexes(), the
+                                first line is read as the header if None.
+
+    Return:
+        item (tuple): Lowercase name, price and quantity of each row.
+    """
+
+    if file_format == "csv":
+        yield from iter_csv_records(lines, malformed, first_line_number,
+                                    column_indexes)
+        return
+
+    for line_number, line in enumerate(lines, start=first_line_number):
+        if line.strip() == "":
+            continue
+
+        try:
+            if file_format == "text":
+                if inventory_journal.parse_version_header(line) is not None:
+                    continue
+                yield parse_text_line(line)
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                if "name" not in record:
+                    raise ValueError("missing name")
+                yield parse_fields(record["name"],
+                                   record.get("price"),
+                                   record.get("quantity"))
+        except ValueError as error:
+            malformed.append({"line": line_number, "error": str(error),
+                              "text": line})
+
+
+def iter_csv_records(lines, malformed, first_line_number=1,
+                     column_indexes=None):
+    """Yields the items of some CSV lines, see iter_records().
+
+    Args:
+        lines (iterable): Lines of the catalog, without newlines.
+
+        malformed (list): Receives each row that could not be read.
+
+        first_line_number (int): Line number of the first line.
+
+        column_indexes (tuple): CSV columns, the first line is read as the
+                                header if None.
+
+    Return:
+        item (tuple): Lowercase name, price and quantity of each row.
+    """
+
+    rows = csv.reader(lines, skipinitialspace=True)
+    line_number = first_line_number - 1
+
+    if column_indexes is None:
+        header = next(rows, None)
+        line_number += 1
+        if header is None:
+            return
+        column_indexes = csv_column_indexes(header)
+
+    row_width = max(column_indexes) + 1
+
+    for row in rows:
+        line_number += 1
+
+        if len(row) == 0:
+            continue
+
+        try:
+            if len(row) < row_width:
+                raise ValueError(f"expected {row_width} columns, found "
+                                 f"{len(row)}")
+            yield parse_fields(row[column_indexes[0]],
+                               row[column_indexes[1]],
+                               row[column_indexes[2]])
+        except ValueError as error:
+            malformed.append({"line": line_number, "error": str(error),
+                              "text": ",".join(row)})
+
+
+def detect_format(file_path):
+    """Picks the catalog format from the file extension.
+
+    Args:
+        file_path (string): Location of the catalog.
+
+    Return:
+        file_format (string): One of IMPORT_FORMATS.
+    """
+
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".csv":
+        return "csv"
+    elif extension in (".jsonl", ".json"):
+        return "jsonl"
+
+    return "text"
+
+
+def find_chunks(file_path, start, chunk_size):
+    """Splits a file into byte ranges that end right after a newline.
+
+    Args:
+        file_path (string): Location of the file.
+
+        start (int): Byte offset of the first range.
+
+        chunk_size (int): Bytes in each range, before moving its end to the
+                          next newline.
+
+    Return:
+        chunks (list): Start and end offset of each range.
+    """
+
+    file_size = os.path.getsize(file_path)
+    chunks = list()
+
+    with open(file_path, "rb") as catalog_file:
+        while start < file_size:
+            catalog_file.seek(min(start + chunk_size, file_size))
+            catalog_file.readline()
+            end = min(catalog_file.tell(), file_size)
+
+            chunks.append((start, end))
+            start = end
+
+    return chunks
+
+
+def parse_chunk(file_path, file_format, start, end, column_indexes):
+    """Parses one byte range of a catalog. Runs in a worker process.
+
+    Args:
+        file_path (string): Location of the catalog.
+
+        file_format (string): One of IMPORT_FORMATS.
+
+        start (int): Byte offset of the first line.
+
+        end (int): Byte offset after the last line.
+
+        column_indexes (tuple): CSV columns from the header.
+
+    Return:
+        items (list): Name, price and quantity of each row.
+
+        malformed (list): Rows that could not be read, numbered from 1 at
+                          the first line of the range.
+
+        line_count (int): Lines in the range.
+    """
+
+    with open(file_path, "rb") as catalog_file:
+        catalog_file.seek(start)
+        text = catalog_file.read(end - start).decode(errors="replace")
+
+    # Ranges end with a newline, the empty string after it is not a line
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    malformed = list()
+    items = list(iter_records(lines, file_format, malformed,
+                              column_indexes=column_indexes))
+
+    return items, malformed, len(lines)
+
+
+def read_catalog(file_path, file_format=None, workers=0, report=None,
+                 chunk_size=CHUNK_SIZE):
+    """Yields the items of a catalog file in file order. With workers, byte
+    ranges of the file are parsed in a process pool and yielded as each
+    range finishes, otherwise lines are read one at a time.
+
+    Args:
+        file_path (string): Location of the catalog.
+
+        file_format (string): One of IMPORT_FORMATS, picked from the file
+                              extension if None.
+
+        workers (int): Worker processes, 0 to parse in this process.
+
+        report (dictionary): Receives "rows", "malformed" and "lines".
+
+        chunk_size (int): Bytes parsed by a worker at once.
+
+    Return:
+        item (tuple): Lowercase name, price and quantity of each row.
+    """
+
+    if file_format is None:
+        file_format = detect_format(file_path)
+    if report is None:
+        report = dict()
+
+    report.setdefault("rows", 0)
+    report.setdefault("malformed", list())
+    report.setdefault("lines", 0)
+
+    # CSV rows quoting a newline would be cut by the byte ranges, the
+    # header is read here and handed to every worker
+    column_indexes = None
+    start = 0
+    first_line_number = 1
+
+    if file_format == "csv":
+        with open(file_path, newline="") as catalog_file:
+            header_line = catalog_file.readline()
+        column_indexes = csv_column_indexes(
+            next(csv.reader([header_line], skipinitialspace=True), []))
+        start = len(header_line.encode())
+        first_line_number = 2
+        report["lines"] += 1
+
+    if workers <= 0 or os.path.getsize(file_path) < 2 * chunk_size:
+        with open(file_path, "rb") as catalog_file:
+            catalog_file.seek(start)
+
+            for item in iter_records(iter_lines(catalog_file, report),
+                                     file_format, report["malformed"],
+                                     first_line_number, column_indexes):
+                report["rows"] += 1
+                yield item
+        return
+
+    chunks = find_chunks(file_path, start, chunk_size)
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        # A few ranges ahead of the one being yielded, so parsed ranges
+        # waiting to be read stay bounded
+        pending = list()
+        next_chunk = 0
+        line_number = first_line_number
+
+        while next_chunk < len(chunks) or len(pending) > 0:
+            while next_chunk < len(chunks) and len(pending) < 2 * workers:
+                chunk_start, chunk_end = chunks[next_chunk]
+                pending.append(executor.submit(parse_chunk, file_path,
+                                               file_format, chunk_start,
+                                               chunk_end, column_indexes))
+                next_chunk += 1
+
+            items, malformed, line_count = pending.pop(0).result()
+
+            for row in malformed:
+                row["line"] += line_number - 1
+            report["malformed"] += malformed
+            report["rows"] += len(items)
+            report["lines"] += line_count
+            line_number += line_count
+
+            yield from items
+
+
+def iter_lines(catalog_file, report=None):
+    """Yields the lines of an open binary file one at a time, counting them
+    in the report.
+
+    Args:
+        catalog_file (file): Catalog opened in binary mode.
+
+        report (dictionary): Report whose "lines" are counted, None to not
+                             count them.
+
+    Return:
+        line (string): Each line without its newline.
+    """
+
+    for raw_line in catalog_file:
+        if report is not None:
+            report["lines"] += 1
+        yield raw_line.decode(errors="replace").rstrip("\r\n")
+
+
+def write_catalog(output_file_path, items):
+    """Writes items as an inventory.txt file. A temporary file is renamed
+    over the output, so it is never left half written.
+
+    Args:
+        output_file_path (string): Location of the file written.
+
+        items (iterable): Name, price and quantity of each item.
+
+    Return:
+        item_count (int): Amount of items written.
+    """
+
+    dir_path = os.path.dirname(os.path.abspath(output_file_path))
+    temp_fd, temp_file_path = tempfile.mkstemp(
+        prefix=os.path.basename(output_file_path) + ".", dir=dir_path)
+
+    item_count = 0
+    with os.fdopen(temp_fd, "w") as output_file:
+        for item_name, item_price, item_quantity in items:
+            output_file.write(f"{item_name}, {item_price}, {item_quantity}\n")
+            item_count += 1
+
+        output_file.flush()
+        os.fsync(output_file.fileno())
+
+    os.chmod(temp_file_path, 0o644)
+    os.replace(temp_file_path, output_file_path)
+
+    return item_count
+
+
+def main():
+    """Imports a catalog file and prints what was read."""
+
+    parser = argparse.ArgumentParser(description="Import an item catalog.")
+    parser.add_argument("catalog_file")
+    parser.add_argument("--format", choices=IMPORT_FORMATS,
+                        help="defaults to the file extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes parsing large files, 0 to parse "
+                             "in this process")
+    parser.add_argument("--output",
+                        help="write the items read as an inventory.txt file")
+    parser.add_argument("--report", help="write the full report as JSON")
+    args = parser.parse_args()
+
+    report = dict()
+    start_time = time.perf_counter()
+
+    try:
+        items = read_catalog(args.catalog_file, args.format, args.workers,
+                             report)
+
+        if args.output:
+            write_catalog(args.output, items)
+        else:
+            for _ in items:
+                pass
+    except (OSError, ValueError) as error:
+        parser.exit(1, f"Could not import {args.catalog_file}: {error}\n")
+
+    report["seconds"] = time.perf_counter() - start_time
+    report["rows_per_second"] = (report["rows"] / report["seconds"]
+                                 if report["seconds"] else 0.0)
+
+    for row in report["malformed"][:PRINTED_MALFORMED_ROWS]:
+        print(f"Line {row['line']}: {row['error']}: {row['text']}")
+    if len(report["malformed"]) > PRINTED_MALFORMED_ROWS:
+        print(f"... {len(report['malformed']) - PRINTED_MALFORMED_ROWS} "
+              f"more malformed rows")
+
+    print(f"Rows: {report['rows']}  Malformed: {len(report['malformed'])}  "
+          f"Lines: {report['lines']}")
+    print(f"{report['rows_per_second']:.0f} rows/s in "
+          f"{report['seconds']:.2f}s")
+
+    if args.output:
+        print(f"Items written to {os.path.abspath(args.output)}")
+
+    if args.report:
+        with open(args.report, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Report written to {os.path.abspath(args.report)}")
+
+
+if __name__ == '__main__':
+    main()
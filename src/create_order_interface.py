@@ -8,6 +8,9 @@ Description of File: This Python scripts contains the functionality that allows
 """
 
 import customer_order
+import inventory_manager
+import metrics
+import reservation_ledger
 
 
 def display_interface_info():
@@ -74,7 +77,117 @@ def display_cart(cart):
     print("")
 
 
-def create_order(stock, customer_first_name, customer_last_name):
+def suggest_item_names(stock, item_name, limit=3):
+    """Finds item names the user may have meant, names starting with what
+    was typed first, then names a couple of typos away.
+
+    Args:
+        stock (Inventory): Contains all items currently in stock based off
+                           inventory file.
+
+        item_name (string): Item name that was not found.
+
+        limit (int): Most names suggested.
+
+    Return:
+        suggestions (list): Suggested item names.
+    """
+
+    with metrics.timer("item_search"):
+        search_index = stock.search_index()
+        suggestions = search_index.complete(item_name, limit)
+
+        for name in search_index.suggest(item_name, limit):
+            if len(suggestions) >= limit:
+                break
+            if name not in suggestions:
+                suggestions.append(name)
+
+    return suggestions
+
+
+def validate_item_request(stock, item_request, reserved=None, suggest=False,
+                          reservations=None, hold_id=None):
+    """Checks an "item quantity" request against the inventory.
+
+    Args:
+        stock (Inventory): Contains all items currently in stock based off
+                           inventory file.
+
+        item_request (string): Item and quantity, Ex: "potato 23".
+
+        reserved (dictionary): Quantity of each (name, price) already claimed,
+                               such as items already in the cart.
+
+        suggest (bool): Determines if similar item names are suggested when
+                        the item is not found.
+
+        reservations (ReservationLedger): Items held by carts, whose stock is
+                                          not available, None to ignore
+                                          holds.
+
+        hold_id (string): Cart whose own holds are not subtracted.
+
+    Return:
+        lookup_pair (tuple): The (name, price) of the item, None if invalid.
+
+        item_quantity (int): Quantity requested, None if invalid.
+
+        error (string): Reason the request is invalid, None if valid.
+    """
+
+    items_in_cart = item_request.split()
+
+    # Make sure selection is valid
+    if len(items_in_cart) != 2:
+        return None, None, "Invalid selection. Please try again."
+
+    if not items_in_cart[1].isnumeric():
+        return None, None, "Invalid quantity. Please enter a digit(s)."
+
+    if int(items_in_cart[1]) <= 0:
+        return (None, None,
+                "Invalid quantity. Please enter a non-zero quantity.")
+
+    item_name = str(items_in_cart[0]).lower()
+    item_quantity = int(items_in_cart[1])
+
+    # Check if item in inventory, price and stock come from one lookup
+    item = stock.lookup_item(item_name)
+    if item is None:
+        suggestions = list()
+        if suggest:
+            suggestions = suggest_item_names(stock, item_name)
+
+        if len(suggestions) > 0:
+            return (None, None,
+                    f'Could not find "{item_name}" in inventory. '
+                    f'Did you mean: {", ".join(suggestions)}?')
+
+        return (None, None,
+                f'Could not find "{item_name}" in inventory. '
+                f'Please try again.')
+
+    # Check if item quantity is in stock, claimed items count under any
+    # price in case the price changed since they were claimed
+    lookup_pair = (item_name, item[0])
+    available = int(item[1])
+    if reserved is not None:
+        for name_and_price in reserved:
+            if name_and_price[0] == item_name:
+                available -= reserved[name_and_price]
+    if reservations is not None:
+        available -= reservations.held_quantity(item_name, hold_id)
+
+    if int(item_quantity) > available:
+        return (None, None,
+                f"Not enough stock for ({available}). Please try again.")
+
+    return lookup_pair, item_quantity, None
+
+
+def create_order(stock, customer_first_name, customer_last_name,
+                 group_commit=None, order_writer=None):
     """Creates a customer order by prompting user for necessary information.
     Ensures successful orders are created by validating user selections.
 
@@ -85,10 +198,20 @@ def create_order(stock, customer_first_name, customer_last_name):
         customer_first_name (string): First name of customer.
 
         customer_last_name (string): Last name of customer.
+
+        group_commit (GroupCommit): Group the order file is synced with, None
+                                    to sync it on its own.
+
+        order_writer (OrderWriter): Writes the order file in the background,
+                                    None to write it before returning.
     """
 
     customer_cart = dict()
     order_finished = False
+    new_order = None
+
+    # Items added to the cart are held until checkout or cancel
+    hold_id = reservation_ledger.new_hold_id()
 
     display_interface_info()
 
@@ -113,12 +236,39 @@ def create_order(stock, customer_first_name, customer_last_name):
                     print("Invalid selection. Please try again.")
                     continue
 
-            if checkout:
-                order_finished = True
-                break
-            else:
+            if not checkout:
+                continue
+
+            # Order number is only taken once the stock is confirmed, so
+            # the journal record carries the real order id and a refused
+            # or cancelled order uses up no number
+            if len(customer_cart.keys()) > 0 and new_order is None:
+                new_order = customer_order.CustomerOrder(
+                    customer_cart, customer_first_name, customer_last_name,
+                    write_file=False, backend=stock.backend,
+                    group_commit=group_commit, order_writer=order_writer,
+                    defer_number=True)
+
+            # Stock is checked again when removed from inventory, since
+            # another terminal may have sold the same items meanwhile
+            try:
+                if len(customer_cart.keys()) > 0:
+                    new_order.items_ordered = customer_cart
+                    with metrics.timer("create_order_checkout"):
+                        stock.checkout(
+                            customer_cart, hold_id=hold_id,
+                            make_order_id=new_order.allocate_order_id)
+            except inventory_manager.InsufficientStockError as error:
+                print(f"{error}. Please update the order.")
+
+                # Remove items that ran short so the order can continue
+                for name_and_price in error.shortages:
+                    del customer_cart[name_and_price]
                 continue
 
+            order_finished = True
+            break
+
         # Cancel order
         if item_request.lower() == "cancel":
             checkout = False
@@ -144,53 +294,48 @@ def create_order(stock, customer_first_name, customer_last_name):
             display_cart(customer_cart)
             continue
 
-        items_in_cart = item_request.split()
-
-        # Make sure selection is valid
-        if len(items_in_cart) != 2:
-            print("Invalid selection. Please try again.")
-            continue
-
-        if not items_in_cart[1].isnumeric():
-            print("Invalid quantity. Please enter a digit(s).")
-            continue
+        with metrics.timer("create_order_stock_check"):
+            lookup_pair, item_quantity, error = validate_item_request(
+                stock, item_request, customer_cart, suggest=True,
+                reservations=stock.reservations, hold_id=hold_id)
 
-        if int(items_in_cart[1]) <= 0:
-            print("Invalid quantity. Please enter a non-zero quantity.")
+        if error is not None:
+            print(error)
             continue
 
-        item_name = str(items_in_cart[0]).lower()
-        item_quantity = int(items_in_cart[1])
-
-        # Check if item in inventory
-        if item_name.lower() not in stock.item_price_lookup.keys():
-            print(f'Could not find "{item_name}" in inventory. '
-                  f'Please try again.')
+        # Add to cart, update quantity if already in cart
+        new_cart = dict(customer_cart)
+        if lookup_pair in new_cart.keys():
+            new_cart[lookup_pair] += item_quantity
+        else:
+            new_cart[lookup_pair] = item_quantity
+
+        # Another terminal may have held the same items since the check
+        try:
+            stock.hold_items(hold_id, new_cart)
+        except inventory_manager.InsufficientStockError as error:
+            print(f"{error}. Please try again.")
+
+            # Remove items the cart can no longer keep, such as items
+            # whose hold expired and were sold meanwhile
+            for name_and_price in error.shortages:
+                if (customer_cart.get(name_and_price, 0)
+                        > error.shortages[name_and_price]):
+                    del customer_cart[name_and_price]
             continue
 
-        # Check if item quantity is in stock
-        lookup_pair = (item_name, stock.item_price_lookup[item_name])
-        if int(item_quantity) > int(stock.inventory[lookup_pair]):
-            print(f"Not enough stock for ({stock.inventory[lookup_pair]})."
-                  f" Please try again.")
-            continue
+        customer_cart = new_cart
 
-        # Add to cart, update quantity if already in cart
-        if lookup_pair in customer_cart.keys():
-            customer_cart[lookup_pair] += item_quantity
-        else:
-            customer_cart[lookup_pair] = item_quantity
+    # Checkout already turned the held items into the order
+    if not order_finished or len(customer_cart.keys()) == 0:
+        stock.release_hold(hold_id)
 
     # Create customer order
     if order_finished:
         if len(customer_cart.keys()) > 0:
-            # Modify existing amount in inventory file
-            stock.modify_inventory(customer_cart)
-
-            # Create customer order based off previous entered info
-            new_order = customer_order.CustomerOrder(customer_cart,
-                                                     customer_first_name,
-                                                     customer_last_name)
+            # Write customer order created at checkout
+            new_order.items_ordered = customer_cart
+            new_order.save()
 
             # Display order location
             print("")
@@ -8,8 +8,20 @@ Description of File: This Python file defines the CustomerOrder class that is
                      order created.
 """
 
+import errno
 import os
 
+import inventory_journal
+import metrics
+import order_index
+import order_log
+import order_paths
+import order_sequence
+import sales_analytics
+
+# Order files kept open at once by write_order_files()
+MAX_OPEN_ORDER_FILES = 256
+
 
 class CustomerOrder:
     """This class is used to hold all the necessary customer order info.
@@ -27,16 +39,36 @@ class CustomerOrder:
 
         order_id (string): An order ID that's created unique for each order.
 
+        __backend (object): Storage backend holding the order, None when an
+                            output file is written.
+
+        __group_commit (GroupCommit): Group the order is written with, None
+                                      to sync the order on its own.
+
+        __order_writer (OrderWriter): Background writer the output file is
+                                      handed to, None to write it right away.
+
     Methods:
-        __init__(items_ordered, first_name, last_name): Initializes customer
-                                                        info and creates an
-                                                        order_id.
+        __init__(items_ordered, first_name, last_name, confirm,
+                 order_number, write_file, backend, group_commit,
+                 order_writer, defer_number): Initializes customer info and
+                                              creates an order_id.
+
+        from_record(record): Rebuilds an order saved with to_record().
+
+        to_record(): Saves the order as a JSON friendly dictionary.
 
         __generate_order_id(first_name, last_name): Generate an order_id string.
 
+        allocate_order_id(): Reserves the order number and builds the
+                             order_id.
+
         __generate_order_file(): Generates the output file for each customer
                                  order.
 
+        save(): Writes the output file of an order created with
+                write_file=False.
+
         __confirm_customer_info(first_name, last_name): Ensures information
                                                         entered meets user
                                                         criteria.
@@ -47,6 +79,8 @@ class CustomerOrder:
 
         display_customer_items(): Displays all items ordered by customer.
 
+        render_order_file(): Builds the contents of the output file.
+
         display_order_file_info(include_path): Displays output file name and
                                                location.
 
@@ -55,7 +89,10 @@ class CustomerOrder:
         __dir__(): Displays all CustomerOrder class attributes.
     """
 
-    def __init__(self, items_ordered, first_name="", last_name=""):
+    def __init__(self, items_ordered, first_name="", last_name="",
+                 confirm=True, order_number=None, write_file=True,
+                 backend=None, group_commit=None, order_writer=None,
+                 defer_number=False):
         """Creates customer order from customer names and items ordered.
         Generates an order id for each object created.
 
@@ -65,6 +102,31 @@ class CustomerOrder:
             first_name (string): First name of customer.
 
             last_name (string): Last name of customer.
+
+            confirm (bool): Determines if the user is asked to confirm the
+                            customer name.
+
+            order_number (int): Order number reserved in advance, a new one
+                                is allocated if None.
+
+            write_file (bool): Determines if the output file is written now,
+                               otherwise write_order_files() writes it.
+
+            backend (object): Storage backend such as SQLiteBackend that
+                              stores the order instead of an output file.
+
+            group_commit (GroupCommit): Shares the fsync of the output file
+                                        with orders placed at the same time,
+                                        the file is synced alone if None.
+
+            order_writer (OrderWriter): Writes the output file in the
+                                        background, the file is written
+                                        before returning if None.
+
+            defer_number (bool): Determines if the order number is only
+                                 taken by allocate_order_id(), such as once
+                                 checkout succeeded. order_id is None until
+                                 then. Only used with write_file=False.
         """
 
         # Public customer attributes
@@ -72,11 +134,22 @@ class CustomerOrder:
         self.customer_last_name = last_name
         self.items_ordered = items_ordered
 
-        # Private customer attribute
-        self.__order_number = 1
+        # Private customer attributes
+        self.__order_number = order_number
+        self.__confirm = confirm
+        self.__backend = backend
+        self.__group_commit = group_commit
+        self.__order_writer = order_writer
 
         # Order ID gets created once and is never changed
-        self.order_id = self.__generate_order_file()
+        if write_file:
+            self.order_id = self.__generate_order_file()
+        elif defer_number:
+            self.order_id = None
+            if self.__confirm:
+                print(self.__confirm_customer_info(first_name, last_name))
+        else:
+            self.order_id = self.__generate_order_id(first_name, last_name)
 
     def __generate_order_id(self, first_name, last_name):
         """Generates an order id by confirming customer info entered is correct.
@@ -92,48 +165,31 @@ class CustomerOrder:
         """
 
         # Confirm customer info
-        print(self.__confirm_customer_info(first_name, last_name))
-
-        # Find all file order numbers
-        existing_numbers = set()
-
-        cwd = os.getcwd()
-        order_path = os.path.join(cwd, "orders")
-
-        if os.path.exists(order_path):
-            customer_orders_file_path = os.listdir(order_path)
-
-            # Put all order numbers in existing numbers set
-            for order_id in customer_orders_file_path:
-                if not order_id.startswith('.'):
-                    file_name = order_id.split(".txt")
-
-                    # Remove .txt for file name
-                    while "" in file_name:
-                        file_name.remove("")
+        if self.__confirm:
+            print(self.__confirm_customer_info(first_name, last_name))
 
-                    # Extract number from order name
-                    file_name_parts = file_name[0].split("_")
-                    order_num = int(file_name_parts[2])
+        return self.allocate_order_id()
 
-                    # Place into set to avoid duplicates
-                    existing_numbers.add(order_num)
+    def allocate_order_id(self):
+        """Reserves the next number from the shared order counter, unless
+        one was reserved in advance, and builds the order id from it.
 
-            current_order_number = self.__order_number
-
-            # New order number always be 1 more than most recent order number.
-            if current_order_number in sorted(existing_numbers):
-                current_order_number += sorted(existing_numbers)[-1]
+        Return:
+            order_id (string): A combination of first name, last name, and
+                               an order number.
+        """
 
-            self.__order_number = current_order_number
-        else:
-            os.mkdir(order_path)
+        with metrics.timer("order_id"):
+            if self.__order_number is None and self.__backend is not None:
+                self.__order_number = self.__backend.allocate_order_numbers()
+            elif self.__order_number is None:
+                self.__order_number = order_sequence.OrderSequence().allocate()
 
-        confirmation_num = (f"{str(self.customer_first_name)}"
-                            f"_{str(self.customer_last_name)}"
-                            f"_{self.__order_number}")
+        self.order_id = (f"{str(self.customer_first_name)}"
+                         f"_{str(self.customer_last_name)}"
+                         f"_{self.__order_number}")
 
-        return confirmation_num
+        return self.order_id
 
     def __generate_order_file(self):
         """Creates an output file that details the customers info and
@@ -143,23 +199,67 @@ class CustomerOrder:
             file_name (string): The customers order output file name.
         """
 
-        cwd = os.getcwd()
-        orders_path = os.path.join(cwd, "orders")
         file_name = self.__generate_order_id(self.customer_first_name,
                                              self.customer_last_name)
-        customer_order_path = os.path.join(orders_path, f"{file_name}.txt")
-
-        # Create output file
-        with open(customer_order_path, "w+") as customer_order_file:
-            customer_order_file.write(self.display_customer_info())
-            customer_order_file.write("\n")
-            customer_order_file.write(self.display_customer_items())
-            customer_order_file.flush()
-            os.fsync(customer_order_file.fileno())
+        self.order_id = file_name
+        self.save()
 
         # Return file name as the order_id
         return file_name
 
+    def save(self):
+        """Writes the output file of the order, through its order writer,
+        group commit or backend when it has one. Used for orders created with
+        write_file=False whose id had to be known first, such as to record
+        it with the inventory change.
+        """
+
+        file_name = self.order_id
+
+        with metrics.timer("order_file"):
+            # Returns once the order is queued, a worker writes the file
+            if self.__order_writer is not None:
+                self.__order_writer.submit(self)
+                return
+
+            # Returns once the whole group is durable
+            if self.__group_commit is not None:
+                self.__group_commit.commit(self)
+                return
+
+            # Backend stores the order itself, no output file
+            if self.__backend is not None:
+                self.__backend.save_orders([self])
+                metrics.increment("orders_written_total")
+                return
+
+            # Segmented folders keep a record instead of an output file
+            if order_paths.read_layout() == order_paths.SEGMENTED_LAYOUT:
+                order_log.append_orders([self])
+            else:
+                customer_order_path = order_paths.order_file_path(
+                    file_name, create_dirs=True)
+                order_text = self.render_order_file().encode()
+
+                # Create output file, never over another order's file
+                order_fd = open_order_file(customer_order_path, order_text)
+                if order_fd is not None:
+                    try:
+                        os.write(order_fd, order_text)
+                        with metrics.timer("order_file_fsync"):
+                            os.fsync(order_fd)
+                    finally:
+                        os.close(order_fd)
+
+                inventory_journal.fsync_directory(
+                    os.path.dirname(customer_order_path))
+
+            metrics.increment("orders_written_total")
+
+            # Order index is kept up to date instead of rescanning files
+            order_index.record_orders([self])
+            sales_analytics.record_orders([self])
+
     def __confirm_customer_info(self, first_name, last_name):
         """Confirms the users information entered when prompted for
         after checkout sequence occurs.
@@ -292,6 +392,63 @@ class CustomerOrder:
 
         return total_output
 
+    @classmethod
+    def from_record(cls, record):
+        """Rebuilds an order saved with to_record() without writing its
+        output file or asking for confirmation.
+
+        Args:
+            record (dictionary): Order saved with to_record().
+
+        Return:
+            order (CustomerOrder): Order with the saved number and items.
+        """
+
+        items_ordered = dict()
+        for item_name, item_price, item_quantity in record["items"]:
+            items_ordered[(item_name, item_price)] = item_quantity
+
+        return cls(items_ordered, record["first_name"], record["last_name"],
+                   confirm=False, order_number=record["order_number"],
+                   write_file=False)
+
+    def to_record(self):
+        """Saves the order as a dictionary that can be written as JSON.
+
+        Return:
+            record (dictionary): Customer name, order number and items.
+        """
+
+        return {"first_name": self.customer_first_name,
+                "last_name": self.customer_last_name,
+                "order_number": self.__order_number,
+                "items": [[name_and_price[0], name_and_price[1],
+                           self.items_ordered[name_and_price]]
+                          for name_and_price in self.items_ordered]}
+
+    @property
+    def order_number(self):
+        """Number of the order, the last part of order_id.
+
+        Return:
+            order_number (int): Order number.
+        """
+
+        return self.__order_number
+
+    def render_order_file(self):
+        """Builds the contents of the customer order output file.
+
+        Return:
+            order_file_text (string): Customer info followed by items ordered.
+        """
+
+        order_file_text = self.display_customer_info()
+        order_file_text += "\n"
+        order_file_text += self.display_customer_items()
+
+        return order_file_text
+
     def display_order_file_info(self, include_path=False):
         """Displays the output file name and output file path if desired.
 
@@ -302,11 +459,16 @@ class CustomerOrder:
             orders_info (string): The output file name and location if desired.
         """
 
+        if self.__backend is not None:
+            if include_path:
+                return self.__backend.order_location(self.order_id)
+            return self.order_id
+
         if include_path:
-            cwd = os.getcwd()
-            dir_path = os.path.join(cwd, "orders")
-            orders_info = os.path.join(dir_path, self.order_id + ".txt")
+            orders_info = order_paths.order_location(self.order_id)
             return orders_info
+        elif order_paths.read_layout() == order_paths.SEGMENTED_LAYOUT:
+            return self.order_id
         else:
             orders_info = self.order_id + ".txt"
             return orders_info
@@ -342,6 +504,106 @@ class CustomerOrder:
         return customer_attributes
 
 
+def open_order_file(customer_order_path, order_text):
+    """Creates an order file without replacing the receipt of another
+    order, which an order number handed out twice would otherwise do. A file
+    already holding the same order, such as one written again from a spool,
+    is left as it is, and one cut short by a crash is written again.
+
+    Args:
+        customer_order_path (string): Location of the order file.
+
+        order_text (bytes): Contents of the order file.
+
+    Return:
+        order_fd (int): File descriptor to write order_text to, None if the
+                        file already holds it.
+
+    Raises:
+        FileExistsError: The file holds another order.
+    """
+
+    try:
+        return os.open(customer_order_path,
+                       os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        pass
+
+    with open(customer_order_path, "rb") as order_file:
+        existing_text = order_file.read()
+
+    if existing_text == order_text:
+        return None
+
+    # Never synced before a crash, it holds the start of this order
+    if order_text.startswith(existing_text):
+        return os.open(customer_order_path, os.O_WRONLY | os.O_TRUNC)
+
+    raise FileExistsError(errno.EEXIST, "Order file holds another order",
+                          customer_order_path)
+
+
+@metrics.timed("order_file_batch")
+def write_order_files(orders, backend=None):
+    """Writes the output files of many orders created with write_file=False.
+    All files are written before any is synced, so the disk can flush them
+    together, and the orders folder is synced once at the end. A segmented
+    orders folder gets one append of all their records instead. The orders
+    are then added to the order index and sales analytics in one append
+    each.
+
+    Args:
+        orders (list): CustomerOrder objects to write.
+
+        backend (object): Storage backend that stores the orders instead.
+    """
+
+    metrics.increment("orders_written_total", len(orders))
+
+    if backend is not None:
+        backend.save_orders(orders)
+        return
+
+    # Segmented folders take every record in one append
+    if order_paths.read_layout() == order_paths.SEGMENTED_LAYOUT:
+        order_log.append_orders(orders)
+        order_index.record_orders(orders)
+        sales_analytics.record_orders(orders)
+        return
+
+    order_dirs = set()
+
+    # Keep the amount of open files bounded for very large batches
+    for first_index in range(0, len(orders), MAX_OPEN_ORDER_FILES):
+        order_fds = list()
+
+        try:
+            for order in orders[first_index:
+                                first_index + MAX_OPEN_ORDER_FILES]:
+                customer_order_path = order_paths.order_file_path(
+                    order.order_id, create_dirs=True)
+                order_dirs.add(os.path.dirname(customer_order_path))
+                order_text = order.render_order_file().encode()
+                order_fd = open_order_file(customer_order_path, order_text)
+                if order_fd is None:
+                    continue
+                order_fds.append(order_fd)
+                os.write(order_fd, order_text)
+
+            with metrics.timer("order_file_fsync"):
+                for order_fd in order_fds:
+                    os.fsync(order_fd)
+        finally:
+            for order_fd in order_fds:
+                os.close(order_fd)
+
+    for order_dir in order_dirs:
+        inventory_journal.fsync_directory(order_dir)
+
+    order_index.record_orders(orders)
+    sales_analytics.record_orders(orders)
+
+
 if __name__ == '__main__':
 
     # Unit Test Framework for CustomerOrder
@@ -365,10 +627,7 @@ if __name__ == '__main__':
     assert customer_test.items_ordered == order_dict
 
     # Test case: Display customer file path info.
-    cwd_test = os.getcwd()
-    dir_path_test = os.path.join(cwd_test, "orders")
-    orders_path_test = os.path.join(dir_path_test,
-                                    customer_test.order_id + ".txt")
+    orders_path_test = order_paths.locate_order_file(customer_test.order_id)
     assert customer_test.display_order_file_info(True) == orders_path_test
 
     # Test case: Testing output file generation
@@ -0,0 +1,112 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines a FileLock class used to keep
+                     several terminals from changing the same file at once.
+"""
+
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """Advisory lock held on a separate lock file for the duration of a with
+    block. The lock is released by the operating system if the process dies.
+
+    Attributes:
+        lock_file_path (string): Location of the lock file.
+
+        shared (bool): Determines if the lock may be shared with readers.
+
+    Methods:
+        __init__(lock_file_path, shared): Initializes lock for a file path.
+
+        acquire(blocking): Blocks until the lock is held, or gives up at once
+                           when blocking is False.
+
+        release(): Releases the lock.
+    """
+
+    def __init__(self, lock_file_path, shared=False):
+        """Initializes a lock on the given lock file.
+
+        Args:
+            lock_file_path (string): Location of the lock file.
+
+            shared (bool): Determines if other shared holders are allowed.
+        """
+
+        self.lock_file_path = lock_file_path
+        self.shared = shared
+        self.__lock_fd = None
+
+    def acquire(self, blocking=True):
+        """Opens the lock file and blocks until the lock is held.
+
+        Args:
+            blocking (bool): Determines if the call waits for other holders.
+
+        Return:
+            acquired (bool): True if the lock is held, False if another
+                             holder has it and blocking is False.
+        """
+
+        self.__lock_fd = os.open(self.lock_file_path,
+                                 os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            if fcntl is not None:
+                if self.shared:
+                    operation = fcntl.LOCK_SH
+                else:
+                    operation = fcntl.LOCK_EX
+                if not blocking:
+                    operation |= fcntl.LOCK_NB
+                fcntl.flock(self.__lock_fd, operation)
+            elif blocking:
+                # Windows has no shared locks, always lock exclusively
+                msvcrt.locking(self.__lock_fd, msvcrt.LK_LOCK, 1)
+            else:
+                msvcrt.locking(self.__lock_fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(self.__lock_fd)
+            self.__lock_fd = None
+            if blocking:
+                raise
+            return False
+
+        return True
+
+    def release(self):
+        """Releases the lock and closes the lock file."""
+
+        if self.__lock_fd is None:
+            return
+
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.__lock_fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.__lock_fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.__lock_fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self.__lock_fd)
+            self.__lock_fd = None
+
+    def __enter__(self):
+        """Acquires lock when entering a with block."""
+
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Releases lock when leaving a with block."""
+
+        self.release()
@@ -0,0 +1,143 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the GroupCommit class that lets
+                     orders placed at about the same time share one round of
+                     fsync calls. Each caller still waits until its own order
+                     file is on disk before it returns.
+"""
+
+import threading
+import time
+
+import customer_order
+
+
+class GroupCommit:
+    """Collects orders from several threads and writes them as one group.
+    The first caller of a group waits up to window_seconds for more orders,
+    or until max_group_size orders arrived, then writes and syncs the whole
+    group with write_order_files(). Every caller returns once its group is
+    durable, or raises the error that stopped the group from being written.
+
+    Attributes:
+        window_seconds (float): Longest time a group waits for more orders.
+
+        max_group_size (int): Orders that close a group straight away.
+
+        group_count (int): Groups written so far.
+
+        order_count (int): Orders written so far.
+
+    Methods:
+        __init__(window_seconds, max_group_size, backend): Initializes an
+                                                           empty group.
+
+        commit(order): Blocks until the order file of an order is durable.
+    """
+
+    def __init__(self, window_seconds=0.001, max_group_size=64,
+                 backend=None):
+        """Initializes the group commit settings.
+
+        Args:
+            window_seconds (float): Longest time a group waits for more
+                                    orders.
+
+            max_group_size (int): Orders that close a group straight away.
+
+            backend (object): Storage backend that stores the orders instead
+                              of output files.
+        """
+
+        self.window_seconds = window_seconds
+        self.max_group_size = max(1, max_group_size)
+        self.group_count = 0
+        self.order_count = 0
+
+        self.__backend = backend
+        self.__condition = threading.Condition()
+        self.__pending = list()
+        self.__leader_active = False
+
+        # Group being collected and the last group known to be on disk
+        self.__open_group = 1
+        self.__durable_group = 0
+        self.__failed_groups = dict()
+
+    def commit(self, order):
+        """Adds an order to the open group and blocks until that group is
+        written and synced.
+
+        Args:
+            order (CustomerOrder): Order created with write_file=False.
+        """
+
+        with self.__condition:
+            self.__pending.append(order)
+            group_number = self.__open_group
+
+            if len(self.__pending) >= self.max_group_size:
+                self.__condition.notify_all()
+
+            # Wait for the group unless this caller has to write it
+            while self.__durable_group < group_number:
+                if (not self.__leader_active
+                        and self.__open_group == group_number):
+                    self.__leader_active = True
+                    break
+                self.__condition.wait()
+            else:
+                if group_number in self.__failed_groups:
+                    raise self.__failed_groups[group_number]
+                return
+
+            self.__write_group(group_number)
+
+            if group_number in self.__failed_groups:
+                raise self.__failed_groups[group_number]
+
+    def __write_group(self, group_number):
+        """Collects orders for the open group, writes them and wakes every
+        waiting caller. Called with the condition held by the caller that
+        leads the group.
+
+        Args:
+            group_number (int): Number of the group being written.
+        """
+
+        deadline = time.monotonic() + self.window_seconds
+
+        while len(self.__pending) < self.max_group_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.__condition.wait(remaining)
+
+        # Later orders start the next group while this one is written
+        group = self.__pending
+        self.__pending = list()
+        self.__open_group += 1
+
+        self.__condition.release()
+        try:
+            customer_order.write_order_files(group, self.__backend)
+            error = None
+        except Exception as write_error:
+            error = write_error
+        finally:
+            self.__condition.acquire()
+
+        if error is not None:
+            self.__failed_groups[group_number] = error
+        else:
+            self.group_count += 1
+            self.order_count += len(group)
+
+        self.__durable_group = group_number
+        self.__leader_active = False
+
+        # Wakes the callers of this group and a leader for the next one
+        self.__condition.notify_all()
@@ -0,0 +1,433 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file talks to inventory_server.py, so a
+                     terminal can look up items, browse the inventory and
+                     place orders without loading the inventory itself. It
+                     can run single commands or the usual menu.
+
+Usage: python inventory_client.py [--server HOST:PORT] lookup <item>
+       python inventory_client.py [--server HOST:PORT] list [offset] [limit]
+       python inventory_client.py [--server HOST:PORT] order <first> <last>
+                                  <item> <quantity> ...
+       python inventory_client.py [--server HOST:PORT] stats | menu
+"""
+
+import argparse
+import json
+import socket
+import sys
+
+import create_order_interface
+import inventory_listing
+import inventory_manager
+import main_menu
+
+DEFAULT_SERVER = "127.0.0.1:8521"
+
+
+class ServerError(Exception):
+    """Raised when the server cannot be reached or answers badly."""
+
+
+def parse_server_address(server_address):
+    """Splits a "host:port" server address.
+
+    Args:
+        server_address (string): Address such as "127.0.0.1:8521".
+
+    Return:
+        host (string): Server host.
+
+        port (int): Server port.
+    """
+
+    host, _, port = server_address.rpartition(":")
+    if host == "" or not port.isnumeric():
+        raise ValueError(f"Invalid server address: {server_address}")
+
+    return host, int(port)
+
+
+class InventoryClient:
+    """Connection to an inventory server. Requests are sent one JSON object
+    per line and answered in order.
+
+    Attributes:
+        host (string): Server host.
+
+        port (int): Server port.
+
+    Methods:
+        __init__(host, port, timeout): Connects to the server.
+
+        request(operation, **fields): Sends one request.
+
+        lookup_item(item_name): Returns the price and stock of an item.
+
+        list_items(offset, limit, sort_by, descending,
+                   **filters): Returns a page of items.
+
+        place_order(first_name, last_name, cart): Orders a cart.
+
+        stats(): Returns server counters.
+
+        print_inventory_header(): Prints the inventory column headers.
+
+        close(): Closes the connection.
+    """
+
+    # Same banner as a local inventory
+    print_inventory_header = inventory_manager.Inventory.print_inventory_header
+
+    def __init__(self, host, port, timeout=30.0):
+        """Connects to the server.
+
+        Args:
+            host (string): Server host.
+
+            port (int): Server port.
+
+            timeout (float): Seconds to wait for a response.
+        """
+
+        self.host = host
+        self.port = port
+
+        try:
+            self.__socket = socket.create_connection((host, port), timeout)
+        except OSError as error:
+            raise ServerError(f"Could not connect to {host}:{port}: "
+                              f"{error}")
+
+        self.__file = self.__socket.makefile("rwb")
+        self.__next_id = 0
+
+    def request(self, operation, **fields):
+        """Sends one request and waits for its response.
+
+        Args:
+            operation (string): Request op, such as "lookup".
+
+            fields (dictionary): Other request fields.
+
+        Return:
+            response (dictionary): Decoded response.
+        """
+
+        self.__next_id += 1
+        fields["id"] = self.__next_id
+        fields["op"] = operation
+
+        try:
+            self.__file.write(json.dumps(fields).encode() + b"\n")
+            self.__file.flush()
+            line = self.__file.readline()
+        except OSError as error:
+            raise ServerError(f"Lost connection to server: {error}")
+
+        if not line:
+            raise ServerError("Server closed the connection.")
+
+        response = json.loads(line)
+        if response.get("id") != self.__next_id:
+            raise ServerError("Response does not match the request.")
+
+        return response
+
+    def lookup_item(self, item_name):
+        """Returns the price and stock of an item, same as
+        Inventory.lookup_item().
+
+        Args:
+            item_name (string): Item name.
+
+        Return:
+            item (tuple): Price and quantity, None if not in inventory.
+        """
+
+        response = self.request("lookup", item=item_name)
+        if not response["ok"]:
+            return None
+
+        return response["price"], response["quantity"]
+
+    def list_items(self, offset=0, limit=None, sort_by=None, descending=False,
+                   **filters):
+        """Returns a page of items, same as inventory_listing.list_items().
+
+        Args:
+            offset (int): Rows skipped.
+
+            limit (int): Most rows returned.
+
+            sort_by (string): One of SORT_KEYS, inventory order if None.
+
+            descending (bool): Determines if the sort is reversed.
+
+            filters (dictionary): Filters passed to filter_rows().
+
+        Return:
+            rows (list): Name, price and quantity of each item.
+        """
+
+        fields = {"offset": offset, "sort_by": sort_by,
+                  "descending": descending, "filters": filters}
+        if limit is not None:
+            fields["limit"] = limit
+
+        response = self.request("list", **fields)
+        if not response["ok"]:
+            raise ServerError(response["error"])
+
+        return [tuple(row) for row in response["rows"]]
+
+    def place_order(self, first_name, last_name, cart):
+        """Orders a cart, the server checks the stock again.
+
+        Args:
+            first_name (string): First name of customer.
+
+            last_name (string): Last name of customer.
+
+            cart (dictionary): Quantity ordered for each (name, price).
+
+        Return:
+            response (dictionary): Order id, location and total, or the
+                                   error and items that ran short.
+        """
+
+        return self.request("order", first_name=first_name,
+                            last_name=last_name,
+                            items=[[name_and_price[0], cart[name_and_price]]
+                                   for name_and_price in cart])
+
+    def stats(self):
+        """Returns server counters.
+
+        Return:
+            stats (dictionary): Item, order and batch counts.
+        """
+
+        return self.request("stats")
+
+    def close(self):
+        """Closes the connection."""
+
+        self.__file.close()
+        self.__socket.close()
+
+
+def confirm(prompt):
+    """Asks a Y or N question until answered.
+
+    Args:
+        prompt (string): Question shown.
+
+    Return:
+        answer (bool): True for Y.
+    """
+
+    while True:
+        selection = input(prompt)
+        if selection.upper() == "Y":
+            return True
+        elif selection.upper() == "N":
+            return False
+
+        print("Invalid selection. Please try again.")
+
+
+def create_remote_order(client, customer_first_name, customer_last_name):
+    """Builds a cart like create_order_interface.create_order(), then sends
+    it to the server as one order.
+
+    Args:
+        client (InventoryClient): Connected client.
+
+        customer_first_name (string): First name of customer.
+
+        customer_last_name (string): Last name of customer.
+    """
+
+    customer_cart = dict()
+
+    create_order_interface.display_interface_info()
+
+    while True:
+        item_request = input("Enter Item and Quantity (Ex: potato 23): ")
+
+        if item_request.lower() == "":
+            continue
+
+        if item_request.lower() == "checkout":
+            if not confirm("Complete checkout (Y or N): "):
+                continue
+
+            if len(customer_cart) == 0:
+                print("Empty Cart. No order created. Returning to main menu.")
+                return
+
+            response = client.place_order(customer_first_name,
+                                          customer_last_name, customer_cart)
+
+            if not response["ok"]:
+                print(response["error"])
+
+                # Remove items that ran short so the order can continue
+                short_names = {short[0] for short
+                               in response.get("shortages", list())}
+                for name_and_price in list(customer_cart):
+                    if name_and_price[0] in short_names:
+                        del customer_cart[name_and_price]
+                continue
+
+            print("")
+            print(f"Order Location: {response['location']}")
+            print(f"Order ID: {response['order_id']}")
+            print(f"Total ($): {response['total']:.2f}")
+            print("Checkout complete! Returning to main menu.")
+            print("")
+            return
+
+        if item_request.lower() == "cancel":
+            if confirm("Cancel this order (Y or N): "):
+                print("Order cancelled. Returning to main menu.")
+                return
+            continue
+
+        if item_request.lower() == "cart":
+            create_order_interface.display_cart(customer_cart)
+            continue
+
+        # Stock is checked against the server, and again at checkout
+        lookup_pair, item_quantity, error = (
+            create_order_interface.validate_item_request(
+                client, item_request, customer_cart))
+
+        if error is not None:
+            print(error)
+            continue
+
+        customer_cart[lookup_pair] = (customer_cart.get(lookup_pair, 0)
+                                      + item_quantity)
+
+
+def run_menu(client, page_size=inventory_listing.DEFAULT_PAGE_SIZE):
+    """Runs the main menu against a server.
+
+    Args:
+        client (InventoryClient): Connected client.
+
+        page_size (int): Items per inventory page.
+    """
+
+    main_menu.print_title_info()
+    main_menu.print_main_menu()
+    print(f"Connected to inventory server {client.host}:{client.port}")
+
+    while True:
+        menu_selection = input("Select Option #: ")
+
+        if menu_selection == "":
+            continue
+
+        if (not menu_selection.isnumeric() or int(menu_selection) not in
+                main_menu.MenuOptions.OPTION_DICT):
+            print("Invalid option (1 for Main Menu). Please try again.")
+            continue
+
+        selection = int(menu_selection)
+
+        try:
+            if selection == 1:
+                main_menu.print_main_menu()
+            elif selection == 2:
+                inventory_listing.browse_inventory(client,
+                                                   max(page_size, 1),
+                                                   client.list_items)
+            elif selection == 3:
+                print("")
+                print("Enter customer information below.")
+                print("")
+
+                customer_first_name = input("Customer First Name: ")
+                customer_last_name = input("Customer Last Name: ")
+
+                print("")
+
+                create_remote_order(client, customer_first_name,
+                                    customer_last_name)
+            else:
+                print("")
+                print("Successfully exited application.")
+                break
+        except ServerError as error:
+            print(error)
+            break
+
+    client.close()
+
+
+def main():
+    """Runs one command against the server, or the menu."""
+
+    parser = argparse.ArgumentParser(
+        description="Use an inventory server.")
+    parser.add_argument("--server", default=DEFAULT_SERVER,
+                        help="server address as HOST:PORT")
+    parser.add_argument("command",
+                        choices=["lookup", "list", "order", "stats", "menu"])
+    parser.add_argument("arguments", nargs="*")
+    args = parser.parse_args()
+
+    try:
+        client = InventoryClient(*parse_server_address(args.server))
+    except (ValueError, ServerError) as error:
+        print(error)
+        sys.exit(1)
+
+    if args.command == "menu":
+        run_menu(client)
+        return
+
+    if args.command == "lookup" and len(args.arguments) == 1:
+        response = client.request("lookup", item=args.arguments[0])
+        if response["ok"]:
+            print(f"{response['item']}: ${response['price']:.2f}, "
+                  f"{response['quantity']} in stock")
+        else:
+            print(response["error"])
+            if response["suggestions"]:
+                print(f"Did you mean: {', '.join(response['suggestions'])}?")
+    elif (args.command == "list" and len(args.arguments) <= 2
+            and all(argument.isnumeric() for argument in args.arguments)):
+        page = [int(argument) for argument in args.arguments]
+        client.print_inventory_header()
+        inventory_listing.render_rows(client.list_items(*page))
+    elif (args.command == "order" and len(args.arguments) >= 4
+            and len(args.arguments) % 2 == 0):
+        item_arguments = args.arguments[2:]
+        response = client.request(
+            "order", first_name=args.arguments[0],
+            last_name=args.arguments[1],
+            items=[[item_arguments[index], item_arguments[index + 1]]
+                   for index in range(0, len(item_arguments), 2)])
+        if response["ok"]:
+            print(f"Order {response['order_id']} placed, total "
+                  f"${response['total']:.2f}: {response['location']}")
+        else:
+            print(response["error"])
+    elif args.command == "stats" and len(args.arguments) == 0:
+        print(json.dumps(client.stats(), indent=2))
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
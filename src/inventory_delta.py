@@ -0,0 +1,326 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file reads delta files of restocks, price
+                     changes, new items and removed items, and applies them
+                     to the inventory. The whole file is checked first, then
+                     every change is applied together and written as a single
+                     new snapshot of inventory.txt instead of rewriting the
+                     file once per line.
+
+Usage: python inventory_delta.py restock.txt
+       python inventory_delta.py restock.txt --check
+
+A delta file holds one operation per line, applied in order. Blank lines and
+lines starting with # are skipped.
+    restock, potato, 40        adds 40 to the stock, negative to write off
+    price, potato, 1.75        changes the price
+    add, kiwi, 0.5, 100        adds a new item with its price and stock
+    remove, kiwi               removes an item
+"""
+
+import argparse
+import math
+import os
+import time
+
+import item_store
+
+RESTOCK_OPERATION = "restock"
+PRICE_OPERATION = "price"
+ADD_OPERATION = "add"
+REMOVE_OPERATION = "remove"
+
+# Fields after the operation name each operation takes
+OPERATION_FIELDS = {RESTOCK_OPERATION: ("name", "quantity"),
+                    PRICE_OPERATION: ("name", "price"),
+                    ADD_OPERATION: ("name", "price", "quantity"),
+                    REMOVE_OPERATION: ("name",)}
+
+# Errors printed by the command line
+PRINTED_ERRORS = 20
+
+
+class DeltaError(Exception):
+    """Raised when lines of a delta file cannot be applied.
+
+    Attributes:
+        errors (list): Line number, reason and text of every line that
+                       cannot be applied.
+    """
+
+    def __init__(self, errors):
+        """Initializes error from the lines that cannot be applied.
+
+        Args:
+            errors (list): Line number, reason and text of each line.
+        """
+
+        self.errors = errors
+
+        first_error = errors[0]
+        super().__init__(f"{len(errors)} delta lines cannot be applied, "
+                         f"first on line {first_error['line']}: "
+                         f"{first_error['error']}")
+
+
+def parse_delta_line(line):
+    """Parses a line of a delta file, Ex: "restock, potato, 40".
+
+    Args:
+        line (string): Line without its newline.
+
+    Return:
+        operation (tuple): Operation name, lowercase item name, price and
+                           quantity, None for fields the operation does not
+                           take.
+
+    Raises:
+        ValueError: The line is formatted incorrectly, with the reason.
+    """
+
+    entries = line.split(", ")
+    operation = entries[0].strip().lower()
+
+    if operation not in OPERATION_FIELDS:
+        raise ValueError(f"unknown operation {entries[0]!r}")
+
+    fields = OPERATION_FIELDS[operation]
+    if len(entries) != len(fields) + 1:
+        raise ValueError(f"{operation} expects {len(fields)} fields, found "
+                         f"{len(entries) - 1}")
+
+    values = dict(zip(fields, entries[1:]))
+    item_name = values["name"].lower()
+    item_price = None
+    quantity = None
+
+    if item_name == "":
+        raise ValueError("missing name")
+
+    if "price" in values:
+        try:
+            item_price = float(values["price"])
+        except ValueError:
+            raise ValueError(f"invalid price {values['price']!r}")
+
+        if not math.isfinite(item_price) or item_price < 0:
+            raise ValueError(f"invalid price {values['price']!r}")
+
+    if "quantity" in values:
+        try:
+            quantity = int(values["quantity"])
+        except ValueError:
+            raise ValueError(f"invalid quantity {values['quantity']!r}")
+
+        # Only a restock may take stock away
+        if operation == ADD_OPERATION and quantity < 0:
+            raise ValueError(f"invalid quantity {values['quantity']!r}")
+
+    return operation, item_name, item_price, quantity
+
+
+def format_delta_line(operation, item_name, item_price=None, quantity=None):
+    """Builds the line of a delta file for an operation.
+
+    Args:
+        operation (string): Operation name.
+
+        item_name (string): Item name.
+
+        item_price (float): Price, None if the operation takes none.
+
+        quantity (int): Quantity, None if the operation takes none.
+
+    Return:
+        line (string): Line without its newline.
+    """
+
+    fields = [operation, item_name]
+    if item_price is not None:
+        fields.append(str(item_price))
+    if quantity is not None:
+        fields.append(str(quantity))
+
+    return ", ".join(fields)
+
+
+def read_delta(delta_file_path):
+    """Reads and checks every line of a delta file.
+
+    Args:
+        delta_file_path (string): Location of the delta file.
+
+    Return:
+        operations (list): Line number, operation name, item name, price and
+                           quantity of each operation, in file order.
+
+    Raises:
+        DeltaError: Some lines are formatted incorrectly, all of them are
+                    listed.
+    """
+
+    operations = list()
+    errors = list()
+
+    with open(delta_file_path) as delta_file:
+        for line_number, line in enumerate(delta_file, start=1):
+            entry = line.rstrip("\n")
+
+            if entry.strip() == "" or entry.startswith("#"):
+                continue
+
+            try:
+                operations.append((line_number,) + parse_delta_line(entry))
+            except ValueError as error:
+                errors.append({"line": line_number, "error": str(error),
+                               "text": entry})
+
+    if len(errors) > 0:
+        raise DeltaError(errors)
+
+    return operations
+
+
+def resolve_delta(operations, lookup_item):
+    """Works out the new price and quantity of every item a delta changes,
+    applying the operations in order on top of the current items.
+
+    Args:
+        operations (list): Operations from read_delta().
+
+        lookup_item (function): Returns the current price and quantity of an
+                                item name, None if unknown, such as
+                                Inventory.lookup_item.
+
+    Return:
+        updates (dictionary): New price and quantity of each changed item
+                              name, None for removed items.
+
+    Raises:
+        DeltaError: Some operations do not fit the items, all of them are
+                    listed and nothing should be applied.
+    """
+
+    updates = dict()
+    errors = list()
+
+    for line_number, operation, item_name, item_price, quantity in operations:
+        # Earlier lines of the delta count, not only the stored items
+        if item_name in updates:
+            item = updates[item_name]
+        else:
+            item = lookup_item(item_name)
+
+        # Prices the store cannot hold would fail part way through applying
+        if item_price is not None:
+            try:
+                item_store.price_to_cents(item_price)
+            except ValueError as error:
+                line = format_delta_line(operation, item_name, item_price,
+                                         quantity)
+                errors.append({"line": line_number, "error": str(error),
+                               "text": line})
+                continue
+
+        error = None
+
+        if operation == ADD_OPERATION:
+            if item is not None:
+                error = "item already in inventory"
+            else:
+                item = (item_price, quantity)
+        elif item is None:
+            error = "item not in inventory"
+        elif operation == RESTOCK_OPERATION:
+            if item[1] + quantity < 0:
+                error = f"stock would drop to {item[1] + quantity}"
+            else:
+                item = (item[0], item[1] + quantity)
+        elif operation == PRICE_OPERATION:
+            item = (item_price, item[1])
+        else:
+            item = None
+
+        if error is not None:
+            errors.append({"line": line_number, "error": error,
+                           "text": format_delta_line(operation, item_name,
+                                                     item_price, quantity)})
+            continue
+
+        updates[item_name] = item
+
+    if len(errors) > 0:
+        raise DeltaError(errors)
+
+    return updates
+
+
+def count_operations(operations):
+    """Counts the operations of each kind in a delta.
+
+    Args:
+        operations (list): Operations from read_delta().
+
+    Return:
+        counts (dictionary): Amount of operations of each operation name.
+    """
+
+    counts = dict.fromkeys(OPERATION_FIELDS, 0)
+    for operation in operations:
+        counts[operation[1]] += 1
+
+    return counts
+
+
+def main():
+    """Checks a delta file against inventory.txt and applies it."""
+
+    # Imported here, inventory_manager imports this module
+    import inventory_manager
+
+    parser = argparse.ArgumentParser(
+        description="Apply a delta file to the inventory.")
+    parser.add_argument("delta_file")
+    parser.add_argument("--check", action="store_true",
+                        help="only check the delta, change nothing")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+
+    try:
+        operations = read_delta(args.delta_file)
+
+        stock = inventory_manager.Inventory(journaled=True)
+        if args.check:
+            resolve_delta(operations, stock.lookup_item)
+        else:
+            stock.apply_delta(operations, os.path.basename(args.delta_file))
+    except DeltaError as error:
+        for row in error.errors[:PRINTED_ERRORS]:
+            print(f"Line {row['line']}: {row['error']}: {row['text']}")
+        if len(error.errors) > PRINTED_ERRORS:
+            print(f"... {len(error.errors) - PRINTED_ERRORS} more errors")
+        parser.exit(1, f"Nothing applied, {len(error.errors)} lines of "
+                       f"{args.delta_file} cannot be applied\n")
+    except OSError as error:
+        parser.exit(1, f"Could not apply {args.delta_file}: {error}\n")
+
+    counts = count_operations(operations)
+    print(f"Restock: {counts[RESTOCK_OPERATION]}  "
+          f"Price: {counts[PRICE_OPERATION]}  "
+          f"Add: {counts[ADD_OPERATION]}  "
+          f"Remove: {counts[REMOVE_OPERATION]}")
+
+    if args.check:
+        print(f"Delta can be applied, checked in "
+              f"{time.perf_counter() - start_time:.2f}s")
+    else:
+        print(f"Applied in {time.perf_counter() - start_time:.2f}s, "
+              f"inventory is now version {stock.version}")
+
+
+if __name__ == '__main__':
+    main()
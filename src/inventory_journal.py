@@ -0,0 +1,463 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines an InventoryJournal class which
+                     records inventory changes as compact delta records
+                     appended to a journal file, so an order no longer has to
+                     rewrite the whole master inventory text file.
+"""
+
+import os
+import zlib
+
+import metrics
+
+JOURNAL_FILE_NAME = "inventory.journal"
+
+# First line of a compacted inventory.txt. Older readers skip it because it
+# does not split into the 3 fields of an item line.
+VERSION_HEADER = "# version: "
+
+
+def parse_version_header(line):
+    """Reads the version number out of an inventory.txt header line.
+
+    Args:
+        line (string): A single line from inventory.txt.
+
+    Return:
+        version (int): Version number, or None if line is not a header.
+    """
+
+    if not line.startswith(VERSION_HEADER):
+        return None
+
+    try:
+        return int(line[len(VERSION_HEADER):].strip())
+    except ValueError:
+        return None
+
+
+def read_snapshot_version(inventory_file_path):
+    """Reads only the version header of inventory.txt.
+
+    Args:
+        inventory_file_path (string): Location of inventory.txt.
+
+    Return:
+        version (int): Version of the snapshot, 0 if it has no header.
+    """
+
+    with open(inventory_file_path) as inventory_file:
+        version = parse_version_header(inventory_file.readline())
+
+    if version is None:
+        return 0
+
+    return version
+
+
+def fsync_directory(dir_path):
+    """Flushes a directory entry to disk so a rename inside it is durable.
+
+    Args:
+        dir_path (string): Directory that had a file created or renamed.
+    """
+
+    # Directories cannot be opened on every platform (Windows)
+    try:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class InventoryJournal:
+    """Appends and replays the delta records of inventory changes.
+
+    Each record is one line holding a sequence number, the order id, every
+    (name, price, quantity change) of the order and a checksum. A record is
+    only applied if its line is complete and the checksum matches, so a crash
+    half way through an append is simply ignored on the next replay.
+
+    Attributes:
+        journal_file_path (string): Location of the journal file.
+
+        last_sequence (int): Sequence number of the newest record seen.
+
+        offset (int): Byte offset up to which the journal has been replayed.
+
+        record_count (int): Number of records seen since the last compaction.
+
+        inode (int): Inode of the journal file the offset belongs to.
+
+    Methods:
+        __init__(journal_file_path): Initializes journal at the given path.
+
+        reset(version): Forgets replay progress, starting again at version.
+
+        append(changes, order_id): Appends a delta record for an order.
+
+        replay(inventory, item_price_lookup): Applies new records to the
+                                              given inventory dictionaries.
+
+        truncate_through(version): Drops records already in the snapshot.
+
+        find_record(order_id, after_sequence): Returns the sequence number
+                                               of an order's record.
+    """
+
+    def __init__(self, journal_file_path=None):
+        """Initializes a journal, defaulting to inventory.journal in the
+        current working directory.
+
+        Args:
+            journal_file_path (string): Location of the journal file.
+        """
+
+        if journal_file_path is None:
+            journal_file_path = os.path.join(os.getcwd(), JOURNAL_FILE_NAME)
+
+        self.journal_file_path = journal_file_path
+        self.last_sequence = 0
+        self.offset = 0
+        self.record_count = 0
+        self.inode = None
+
+    def reset(self, version):
+        """Restarts replay from the beginning of the journal.
+
+        Args:
+            version (int): Version of the snapshot the journal applies to.
+        """
+
+        self.last_sequence = version
+        self.offset = 0
+        self.record_count = 0
+        self.inode = None
+
+    def append(self, changes, order_id=None):
+        """Appends a single delta record for an order and syncs it to disk.
+
+        Args:
+            changes (dictionary): Quantity change for each (name, price).
+
+            order_id (string): Order that caused the change.
+
+        Return:
+            sequence (int): Sequence number given to the record.
+        """
+
+        sequence = self.last_sequence + 1
+
+        # Fields are split on ", ", an order id holding one would shift them
+        fields = [str(sequence), str(order_id or "-").replace(", ", " ")]
+        for name_and_price in changes:
+            fields.append(str(name_and_price[0]))
+            fields.append(str(name_and_price[1]))
+            fields.append(str(changes[name_and_price]))
+
+        body = ", ".join(fields)
+        checksum = zlib.crc32(body.encode())
+        line = f"{body}, {checksum}\n"
+
+        # O_APPEND keeps each record in one contiguous write
+        journal_fd = os.open(self.journal_file_path,
+                             os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Start a fresh line if a previous append was torn by a crash
+            journal_size = os.fstat(journal_fd).st_size
+            if (journal_size > 0
+                    and os.pread(journal_fd, 1, journal_size - 1) != b"\n"):
+                line = "\n" + line
+
+            os.write(journal_fd, line.encode())
+            with metrics.timer("journal_fsync"):
+                os.fsync(journal_fd)
+        finally:
+            os.close(journal_fd)
+
+        self.last_sequence = sequence
+        self.record_count += 1
+
+        return sequence
+
+    def replay(self, inventory, item_price_lookup):
+        """Applies every complete record newer than last_sequence.
+
+        Args:
+            inventory (dictionary): Item names, prices, and quantity.
+
+            item_price_lookup (dictionary): Item names and prices.
+
+        Return:
+            applied (int): Number of records applied.
+        """
+
+        applied = 0
+
+        if not os.path.exists(self.journal_file_path):
+            return applied
+
+        with open(self.journal_file_path, "rb") as journal_file:
+            # Journal was compacted by another process, records already
+            # applied are skipped by their sequence number
+            journal_stat = os.fstat(journal_file.fileno())
+            if (journal_stat.st_ino != self.inode
+                    or journal_stat.st_size < self.offset):
+                self.inode = journal_stat.st_ino
+                self.offset = 0
+                self.record_count = 0
+
+            journal_file.seek(self.offset)
+            data = journal_file.read()
+
+        # Anything after the last newline is a torn append, leave it
+        end = data.rfind(b"\n") + 1
+
+        for raw_line in data[:end].splitlines():
+            record = self.__parse_record(raw_line.decode(errors="replace"))
+
+            if record is None:
+                continue
+
+            sequence, changes = record
+            self.record_count += 1
+
+            if sequence <= self.last_sequence:
+                continue
+
+            for name_and_price in changes:
+                if name_and_price in inventory:
+                    inventory[name_and_price] += changes[name_and_price]
+                else:
+                    inventory[name_and_price] = changes[name_and_price]
+                    item_price_lookup[name_and_price[0]] = name_and_price[1]
+
+            self.last_sequence = sequence
+            applied += 1
+
+        self.offset += end
+
+        return applied
+
+    def truncate_through(self, version):
+        """Removes records up to version once they are in the snapshot.
+
+        Args:
+            version (int): Highest sequence number contained in snapshot.
+        """
+
+        if not os.path.exists(self.journal_file_path):
+            self.reset(version)
+            return
+
+        kept_lines = list()
+
+        with open(self.journal_file_path, "rb") as journal_file:
+            data = journal_file.read()
+
+        end = data.rfind(b"\n") + 1
+
+        for raw_line in data[:end].splitlines(keepends=True):
+            record = self.__parse_record(raw_line.decode(errors="replace"))
+
+            if record is not None and record[0] > version:
+                kept_lines.append(raw_line)
+
+        temp_file_path = self.journal_file_path + ".tmp"
+
+        with open(temp_file_path, "wb") as temp_file:
+            temp_file.writelines(kept_lines)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_file_path, self.journal_file_path)
+        fsync_directory(os.path.dirname(self.journal_file_path))
+
+        self.last_sequence = max(self.last_sequence, version)
+        self.offset = sum(len(line) for line in kept_lines)
+        self.record_count = len(kept_lines)
+        self.inode = os.stat(self.journal_file_path).st_ino
+
+    def find_record(self, order_id, after_sequence=0):
+        """Looks for the first complete record of an order newer than a
+        sequence number. Records already folded into the snapshot are no
+        longer in the journal and are not found.
+
+        Args:
+            order_id (string): Order id the record was appended with.
+
+            after_sequence (int): Only records with a higher sequence number
+                                  are looked at.
+
+        Return:
+            sequence (int): Sequence number of the record, None if the
+                            journal holds no such record.
+        """
+
+        if not os.path.exists(self.journal_file_path):
+            return None
+
+        with open(self.journal_file_path, "rb") as journal_file:
+            data = journal_file.read()
+
+        end = data.rfind(b"\n") + 1
+        order_id = str(order_id or "-").replace(", ", " ")
+
+        for raw_line in data[:end].splitlines():
+            line = raw_line.decode(errors="replace")
+            record = self.__parse_record(line)
+
+            if (record is not None and record[0] > after_sequence
+                    and line.split(", ", 2)[1] == order_id):
+                return record[0]
+
+        return None
+
+    @staticmethod
+    def __parse_record(line):
+        """Splits a journal line back into its sequence number and changes.
+
+        Args:
+            line (string): A single journal line.
+
+        Return:
+            record (tuple): Sequence number and changes dictionary, or None
+                            if the line is damaged.
+        """
+
+        body, separator, checksum = line.rstrip("\n").rpartition(", ")
+
+        if not separator:
+            return None
+
+        try:
+            if zlib.crc32(body.encode()) != int(checksum):
+                return None
+        except ValueError:
+            return None
+
+        fields = body.split(", ")
+
+        if len(fields) < 2 or (len(fields) - 2) % 3 != 0:
+            return None
+
+        changes = dict()
+
+        try:
+            sequence = int(fields[0])
+
+            for index in range(2, len(fields), 3):
+                name_and_price = (fields[index], float(fields[index + 1]))
+                quantity = int(fields[index + 2])
+                changes[name_and_price] = (changes.get(name_and_price, 0)
+                                           + quantity)
+        except ValueError:
+            return None
+
+        return sequence, changes
+
+
+if __name__ == '__main__':
+
+    # Unit Test Framework for InventoryJournal, run in a scratch folder
+    import shutil
+    import tempfile
+
+    import inventory_manager
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        journal_test = InventoryJournal()
+        inventory_test = {("potato", 1.5): 30, ("corn", 0.25): 10}
+        prices_test = {"potato": 1.5, "corn": 0.25}
+
+        # Test case: Records are replayed in order with their order id.
+        assert journal_test.append({("potato", 1.5): -3}, "John_Doe_1") == 1
+        assert journal_test.append({("corn", 0.25): -2,
+                                    ("potato", 1.5): -1}, "Jane, Roe_2") == 2
+        with open(JOURNAL_FILE_NAME) as journal_file:
+            assert "Jane Roe_2" in journal_file.read()
+
+        replayed_test = InventoryJournal()
+        assert replayed_test.replay(inventory_test, prices_test) == 2
+        assert inventory_test == {("potato", 1.5): 26, ("corn", 0.25): 8}
+        assert replayed_test.last_sequence == 2
+
+        # Test case: Replaying again applies nothing twice.
+        assert replayed_test.replay(inventory_test, prices_test) == 0
+
+        # Test case: A torn append is skipped, the next append starts on a
+        # fresh line and both readers pick it up.
+        with open(JOURNAL_FILE_NAME, "a") as journal_file:
+            journal_file.write("3, Torn_Order_3, potato, 1.5, -5")
+        assert replayed_test.replay(inventory_test, prices_test) == 0
+        journal_test.append({("potato", 1.5): -4}, "John_Doe_3")
+        assert replayed_test.replay(inventory_test, prices_test) == 1
+        assert inventory_test[("potato", 1.5)] == 22
+
+        # Test case: A record whose checksum does not match is skipped.
+        with open(JOURNAL_FILE_NAME, "a") as journal_file:
+            journal_file.write("4, Bad_Order_4, potato, 1.5, -5, 12345\n")
+        assert replayed_test.replay(inventory_test, prices_test) == 0
+
+        # Test case: Compacting keeps only records newer than the snapshot.
+        journal_test.truncate_through(2)
+        assert journal_test.record_count == 1
+        assert journal_test.append({("corn", 0.25): -1}, "John_Doe_4") == 4
+        compacted_test = InventoryJournal()
+        compacted_test.reset(2)
+        compacted_inventory_test = {("potato", 1.5): 26, ("corn", 0.25): 8}
+        assert compacted_test.replay(compacted_inventory_test,
+                                     prices_test) == 2
+        assert compacted_inventory_test == {("potato", 1.5): 22,
+                                            ("corn", 0.25): 7}
+
+        os.remove(JOURNAL_FILE_NAME)
+
+        # Test case: Another terminal recovers every checkout from the
+        # snapshot and journal after compaction.
+        with open("inventory.txt", "w") as inventory_file:
+            inventory_file.write("potato, 1.5, 30\ncorn, 0.25, 10\n")
+
+        stock_test = inventory_manager.Inventory(journaled=True)
+        stock_test.checkout({("potato", 1.5): 5}, "John_Doe_5")
+        stock_test.compact_inventory()
+        stock_test.checkout({("corn", 0.25): 4}, "John_Doe_6")
+        assert read_snapshot_version("inventory.txt") == 1
+
+        other_stock_test = inventory_manager.Inventory(journaled=True)
+        assert other_stock_test.lookup_item("potato") == (1.5, 25)
+        assert other_stock_test.lookup_item("corn") == (0.25, 6)
+        assert other_stock_test.version == 2
+
+        # Test case: A crash after the snapshot is written but before the
+        # journal is truncated applies nothing twice.
+        shutil.copy(JOURNAL_FILE_NAME, "journal.copy")
+        stock_test.compact_inventory()
+        os.replace("journal.copy", JOURNAL_FILE_NAME)
+
+        # Parsed again instead of loaded from the startup cache
+        os.remove("inventory.cache")
+        recovered_test = inventory_manager.Inventory(journaled=True)
+        assert recovered_test.lookup_item("corn") == (0.25, 6)
+        assert recovered_test.version == 2
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
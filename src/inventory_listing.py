@@ -0,0 +1,258 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file lists inventory items a page at a
+                     time. Rows are streamed from the inventory, filtered by
+                     name, price or stock, optionally sorted, and written to
+                     the terminal in large chunks instead of one print per
+                     row.
+"""
+
+import functools
+import heapq
+import itertools
+import operator
+import sys
+
+SORT_KEYS = ("name", "price", "stock")
+DEFAULT_PAGE_SIZE = 25
+
+# Rows joined into a single write to the terminal
+RENDER_CHUNK_ROWS = 256
+
+
+def filter_rows(rows, name_filter=None, min_price=None, max_price=None,
+                below_stock=None):
+    """Yields the rows matching every filter given.
+
+    Args:
+        rows (iterable): Name, price and quantity of each item.
+
+        name_filter (string): Text the item name must contain.
+
+        min_price (float): Lowest price listed.
+
+        max_price (float): Highest price listed.
+
+        below_stock (int): Only items with less stock than this are listed.
+
+    Return:
+        row (tuple): Name, price and quantity of a matching item.
+    """
+
+    for row in rows:
+        if name_filter is not None and name_filter not in row[0]:
+            continue
+        if min_price is not None and row[1] < min_price:
+            continue
+        if max_price is not None and row[1] > max_price:
+            continue
+        if below_stock is not None and row[2] >= below_stock:
+            continue
+        yield row
+
+
+def list_items(stock, offset=0, limit=None, sort_by=None, descending=False,
+               **filters):
+    """Streams a page of inventory rows. Without sorting only the rows up to
+    the end of the page are read. Sorting by name walks the sorted names of
+    the search index, sorting by price or stock keeps only the rows up to
+    the end of the page in a heap while every item is read.
+
+    Args:
+        stock (Inventory): Inventory listed.
+
+        offset (int): Matching rows skipped before the page.
+
+        limit (int): Rows in the page, every remaining row if None.
+
+        sort_by (string): "name", "price", "stock" or None for stored order.
+
+        descending (bool): Determines if the sort order is reversed.
+
+        **filters: Filters passed on to filter_rows().
+
+    Return:
+        row (tuple): Name, price and quantity of each item in the page.
+    """
+
+    stop = None if limit is None else offset + limit
+    filtered = any(value is not None for value in filters.values())
+
+    if sort_by == "name" and stock.items is not None:
+        sorted_names = stock.search_index().sorted_names
+        if descending:
+            sorted_names = sorted_names[::-1]
+
+        # Without filters the page is sliced out of the names directly
+        if not filtered:
+            return ((item_name,) + stock.items.lookup(item_name)
+                    for item_name in sorted_names[offset:stop])
+
+        rows = ((item_name,) + stock.items.lookup(item_name)
+                for item_name in sorted_names)
+        rows = filter_rows(rows, **filters)
+    elif sort_by is not None and stock.items is not None and not filtered:
+        if sort_by == "price":
+            column = stock.items.prices
+        else:
+            column = stock.items.quantities
+
+        # Pairs of column value and name are made and compared in C, the
+        # full rows are only looked up for the page
+        pairs = zip(map(column.__getitem__, stock.items.slots.values()),
+                    stock.items.slots.keys())
+
+        if limit is None:
+            pairs = sorted(pairs, reverse=descending)
+        elif descending:
+            pairs = heapq.nlargest(stop, pairs)
+        else:
+            pairs = heapq.nsmallest(stop, pairs)
+
+        return ((item_name,) + stock.items.lookup(item_name)
+                for value, item_name in pairs[offset:stop])
+    else:
+        rows = filter_rows(stock.iter_items(), **filters)
+
+        if sort_by is not None:
+            # Ties keep a stable order by name
+            sort_key = operator.itemgetter(SORT_KEYS.index(sort_by), 0)
+
+            if limit is None:
+                rows = sorted(rows, key=sort_key, reverse=descending)
+            elif descending:
+                rows = heapq.nlargest(stop, rows, key=sort_key)
+            else:
+                rows = heapq.nsmallest(stop, rows, key=sort_key)
+
+    return itertools.islice(rows, offset, stop)
+
+
+def render_rows(rows, output=None, chunk_rows=RENDER_CHUNK_ROWS):
+    """Writes rows in the column layout of the inventory table, joining
+    chunk_rows rows into each write.
+
+    Args:
+        rows (iterable): Name, price and quantity of each item.
+
+        output (file): Where rows are written, standard output if None.
+
+        chunk_rows (int): Rows joined into a single write.
+
+    Return:
+        row_count (int): Amount of rows written.
+    """
+
+    if output is None:
+        output = sys.stdout
+
+    row_count = 0
+    chunk = list()
+
+    for item_name, item_price, item_quantity in rows:
+        chunk.append(f"{item_name: ^15} {item_price: ^15} "
+                     f"{item_quantity: ^10}\n")
+
+        if len(chunk) >= chunk_rows:
+            output.write("".join(chunk))
+            row_count += len(chunk)
+            chunk = list()
+
+    if len(chunk) > 0:
+        output.write("".join(chunk))
+        row_count += len(chunk)
+
+    output.flush()
+
+    return row_count
+
+
+def parse_browse_command(command, settings):
+    """Applies a browse command to the listing settings.
+
+    Args:
+        command (string): Command typed by the user.
+
+        settings (dictionary): Sort order and filters, changed in place.
+
+    Return:
+        error (string): Reason the command was not understood, None if it
+                        was applied.
+    """
+
+    words = command.split()
+
+    if words[0] == "sort" and len(words) in (2, 3) and words[1] in SORT_KEYS:
+        settings["sort_by"] = words[1]
+        settings["descending"] = len(words) == 3 and words[2] == "desc"
+    elif words[0] == "name" and len(words) == 2:
+        settings["filters"]["name_filter"] = words[1].lower()
+    elif words[0] == "price" and len(words) == 3:
+        try:
+            settings["filters"]["min_price"] = float(words[1])
+            settings["filters"]["max_price"] = float(words[2])
+        except ValueError:
+            return "Invalid price range. Please enter two numbers."
+    elif words[0] == "below" and len(words) == 2 and words[1].isnumeric():
+        settings["filters"]["below_stock"] = int(words[1])
+    elif words[0] == "clear" and len(words) == 1:
+        settings["sort_by"] = None
+        settings["descending"] = False
+        settings["filters"] = dict()
+    else:
+        return "Invalid option. Please try again."
+
+    return None
+
+
+def browse_inventory(stock, page_size=DEFAULT_PAGE_SIZE, fetch_rows=None):
+    """Shows the inventory a page at a time until the user quits.
+
+    Args:
+        stock (Inventory): Inventory listed.
+
+        page_size (int): Rows on each page.
+
+        fetch_rows (function): Called like list_items() without the stock to
+                               get each page, such as from a server. Pages
+                               come from list_items() if None.
+    """
+
+    if fetch_rows is None:
+        fetch_rows = functools.partial(list_items, stock)
+
+    settings = {"sort_by": None, "descending": False, "filters": dict()}
+    page = 0
+
+    while True:
+        stock.print_inventory_header()
+
+        rows = fetch_rows(page * page_size, page_size, settings["sort_by"],
+                          settings["descending"], **settings["filters"])
+        row_count = render_rows(rows)
+
+        if row_count == 0:
+            print("No items on this page.")
+
+        print("")
+        print(f"Page {page + 1}. [Enter] next, [p] previous, [q] back, "
+              f"sort name|price|stock [desc],")
+        print("name <text>, price <min> <max>, below <stock>, clear")
+
+        command = input("Select Option: ").strip().lower()
+
+        if command == "q":
+            break
+        elif command == "":
+            if row_count == page_size:
+                page += 1
+        elif command == "p":
+            page = max(0, page - 1)
+        else:
+            error = parse_browse_command(command, settings)
+            if error is not None:
+                print(error)
+            page = 0
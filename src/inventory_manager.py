@@ -8,41 +8,212 @@ Description of File: This Python file defines an Inventory class which serves to
                      required to do so.
 """
 
+import hashlib
+import io
 import os
 
+import catalog_importer
+import file_lock
+import inventory_delta
+import inventory_journal
+import inventory_listing
+import item_search
+import item_store
+import metrics
+import reorder_index
+import reservation_ledger
+import startup_cache
+
+
+class InsufficientStockError(Exception):
+    """Raised when a checkout asks for more of an item than is in stock.
+
+    Attributes:
+        shortages (dictionary): Quantity still available for each
+                                (name, price) that ran short.
+    """
+
+    def __init__(self, shortages):
+        """Initializes error from the items that ran short.
+
+        Args:
+            shortages (dictionary): Quantity available for each short item.
+        """
+
+        self.shortages = shortages
+
+        short_items = ", ".join(f"{name_and_price[0]} ({available})"
+                                for name_and_price, available
+                                in shortages.items())
+        super().__init__(f"Not enough stock for: {short_items}")
+
 
 class Inventory:
     """Holds all the information extracted from each item in inventory input
     file and refreshes based on changes.
 
     Attributes:
-        inventory (dictionary): Stores item names, prices, and quantity.
+        items (ItemStore): Stores item names, prices, and quantity once,
+                           None when a backend holds the items.
+
+        inventory (dictionary): View of items keyed by (name, price).
+
+        item_price_lookup (dictionary): View of item prices keyed by name.
+
+        version (int): Version of the inventory, the sequence number of the
+                       newest journal record applied.
+
+        snapshot_version (int): Version in the header of the inventory.txt
+                                last read or written, changes when another
+                                process compacts.
+
+        journal (InventoryJournal): Journal of changes, None when every
+                                    change rewrites inventory.txt.
+
+        compact_threshold (int): Journal records allowed before changes are
+                                 folded back into inventory.txt.
+
+        verify_hash (bool): Determines if a content hash is part of the file
+                            fingerprint checked by refresh_inventory().
 
-        item_price_lookup (dictionary): Stores item names and prices.
+        backend (object): Storage backend holding the inventory instead of
+                          inventory.txt, None for the text file.
+
+        reservations (ReservationLedger): Items held by carts of every
+                                          terminal, None when a backend
+                                          holds the items.
+
+        cache_hits (int): Refreshes skipped because no file changed.
+
+        cache_misses (int): Refreshes that had to read a changed file.
+
+        lines_reparsed (int): Lines of inventory.txt parsed after a change.
+
+        malformed_rows (list): Line number, reason and text of each line
+                               skipped by the last parse of inventory.txt.
 
     Methods:
-        __init__(): Initializes inventory using master inventory file.
+        __init__(journaled, compact_threshold, verify_hash, backend,
+                 hold_ttl): Initializes inventory using master inventory file
+                            or a backend.
 
         print_current_inventory(): Displays the items in current inventory.
 
-        modify_inventory(new_inventory): Modify existing inventory according
-                                         to new_inventory.
+        print_inventory_header(): Displays the inventory banner and column
+                                  headers.
+
+        iter_items(): Iterates name, price and quantity of every item.
+
+        lookup_item(item_name): Returns the price and quantity of an item.
+
+        search_index(): Returns the prefix and typo search index of item
+                        names.
+
+        reorder_index(default_reorder_point,
+                      reorder_dir_path): Returns the index of items at or
+                                         below their reorder point.
+
+        set_reorder_point(item_name, reorder_point): Changes and saves the
+                                                     reorder point of an item.
+
+        modify_inventory(new_inventory, order_id,
+                         reorder_alerts): Modify existing inventory according
+                                          to new_inventory.
+
+        apply_delta(operations, delta_id): Applies restocks, price changes,
+                                           new items and removed items in
+                                           one snapshot.
+
+        checkout(cart, order_id, hold_id): Removes an order from inventory
+                                           if all of it is still in stock.
+
+        hold_items(hold_id, cart): Holds the items of a cart for a while.
+
+        release_hold(hold_id): Releases the items held by a cart.
 
         refresh_inventory(): Updates current inventory with any changes in
                              master inventory file.
+
+        compact_inventory(): Writes journaled changes into a new snapshot of
+                             the master inventory file.
     """
 
-    def __init__(self):
+    def __init__(self, journaled=False, compact_threshold=1000,
+                 verify_hash=False, backend=None,
+                 hold_ttl=reservation_ledger.DEFAULT_HOLD_TTL):
         """Initializes an inventory and item price look up storage using the
-        master inventory text file as input."""
+        master inventory text file as input.
+
+        Args:
+            journaled (bool): Determines if changes are appended to a journal
+                              instead of rewriting inventory.txt.
+
+            compact_threshold (int): Journal records allowed before
+                                     compacting automatically.
+
+            verify_hash (bool): Determines if file contents are hashed to
+                                detect changes, on top of size and mtime.
+
+            backend (object): Storage backend such as SQLiteBackend, the
+                              inventory.txt file is used if None.
+
+            hold_ttl (float): Seconds the items of a cart stay held after
+                              the cart last changed.
+        """
+
+        self.items = item_store.ItemStore()
+        self.inventory = item_store.ItemInventoryView(self.items)
+        self.item_price_lookup = item_store.ItemPriceView(self.items)
+        self.version = 0
+        self.snapshot_version = 0
+        self.journal = None
+        self.compact_threshold = compact_threshold
+        self.verify_hash = verify_hash
+
+        # Change detection for refresh_inventory
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.lines_reparsed = 0
+        self.malformed_rows = list()
+        self.__snapshot_fingerprint = None
+        self.__journal_fingerprint = None
+
+        # Built on first use, then kept up to date by the item store
+        self.__search_index = None
+        self.__reorder_index = None
+        self.__search_index_version = None
+
+        self.backend = backend
+        self.reservations = None
+
+        # Backend views read stored items on demand, nothing to load
+        if backend is not None:
+            self.items = None
+            self.inventory = backend.inventory_view()
+            self.item_price_lookup = backend.price_view()
+            self.version = backend.version()
+            return
+
+        if journaled:
+            self.journal = inventory_journal.InventoryJournal()
+
+        self.reservations = reservation_ledger.ReservationLedger(
+            hold_ttl=hold_ttl)
 
-        self.inventory = dict()
-        self.item_price_lookup = dict()
         self.refresh_inventory()
 
     def print_current_inventory(self):
         """ Prints current items formatted within inventory."""
 
+        self.print_inventory_header()
+
+        # Rows are streamed and written in chunks, not printed one by one
+        inventory_listing.render_rows(self.iter_items())
+        print("")
+
+    def print_inventory_header(self):
+        """Prints the inventory banner and column headers."""
+
         print("")
         print("********************************************")
         print("              Current Inventory             ")
@@ -60,91 +231,797 @@ class Inventory:
               f"{column2_underline: ^15} "
               f"{column3_underline: ^10}")
 
-        for item in self.inventory:
-            print(f"{item[0]: ^15} {item[1]: ^15} {self.inventory[item]: ^10}")
-        print("")
+    def iter_items(self):
+        """Iterates every item without copying the inventory.
+
+        Return:
+            item (tuple): Name, price and quantity of each item.
+        """
+
+        if self.items is not None:
+            return self.items.iter_items()
+
+        return ((item[0], item[1], quantity)
+                for item, quantity in self.inventory.items())
+
+    def lookup_item(self, item_name):
+        """Returns the price and quantity of an item in a single lookup.
+
+        Args:
+            item_name (string): Lowercase item name.
+
+        Return:
+            item (tuple): Price and quantity, None if the item is unknown.
+        """
+
+        if self.items is not None:
+            return self.items.lookup(item_name)
+
+        if item_name not in self.item_price_lookup:
+            return None
+
+        item_price = self.item_price_lookup[item_name]
+        return item_price, self.inventory[(item_name, item_price)]
+
+    def search_index(self):
+        """Returns the search index of item names, building it on first use.
+        The index follows the item store from then on, with a backend it is
+        built again whenever the version changed.
+
+        Return:
+            index (ItemSearchIndex): Prefix and typo search over item names.
+        """
+
+        if self.items is not None:
+            if self.__search_index is None:
+                self.__search_index = item_search.ItemSearchIndex(
+                    self.items.slots, known_names=self.items.slots)
+                self.items.listeners.append(self.__search_index)
+            return self.__search_index
+
+        if (self.__search_index is None
+                or self.__search_index_version != self.version):
+            self.__search_index = item_search.ItemSearchIndex(
+                self.item_price_lookup)
+            self.__search_index_version = self.version
+
+        return self.__search_index
+
+    def reorder_index(self, default_reorder_point=None,
+                      reorder_dir_path=None):
+        """Returns the index of items at or below their reorder point,
+        building it from reorder_points.txt on first use. Only the items
+        with a reorder point are looked up, unless a default reorder point
+        is given. The index then follows the item store, with a backend it
+        is updated for the items of each order. Every change to the items
+        builds it first, so alerts are written whichever program made the
+        change.
 
-    def modify_inventory(self, new_inventory):
+        Args:
+            default_reorder_point (int): Reorder point of items without their
+                                         own, only used on first call.
+
+            reorder_dir_path (string): Folder holding reorder_points.txt and
+                                       reorder_alerts.jsonl, the current
+                                       folder if None. Only used on first
+                                       call.
+
+        Return:
+            index (ReorderIndex): Low stock index.
+        """
+
+        if self.__reorder_index is not None:
+            return self.__reorder_index
+
+        if reorder_dir_path is None:
+            reorder_dir_path = os.getcwd()
+
+        reorder_points = reorder_index.read_reorder_points(
+            os.path.join(reorder_dir_path,
+                         reorder_index.REORDER_POINTS_FILE_NAME))
+
+        index = reorder_index.ReorderIndex(
+            reorder_points, default_reorder_point,
+            os.path.join(reorder_dir_path, reorder_index.ALERTS_FILE_NAME))
+
+        if default_reorder_point is None:
+            for item_name in reorder_points:
+                item = self.lookup_item(item_name)
+                if item is not None:
+                    index.update(item_name, item[1])
+        else:
+            for item_name, item_price, item_quantity in self.iter_items():
+                index.update(item_name, item_quantity)
+
+        if self.items is not None:
+            self.items.listeners.append(index)
+
+        self.__reorder_index = index
+
+        return index
+
+    def set_reorder_point(self, item_name, reorder_point):
+        """Changes the reorder point of an item and saves it in
+        reorder_points.txt.
+
+        Args:
+            item_name (string): Lowercase item name.
+
+            reorder_point (int): New reorder point, None to remove it.
+        """
+
+        index = self.reorder_index()
+
+        item = self.lookup_item(item_name)
+        index.set_reorder_point(item_name, reorder_point,
+                                None if item is None else item[1])
+
+        reorder_index.write_reorder_points(
+            os.path.join(os.getcwd(), reorder_index.REORDER_POINTS_FILE_NAME),
+            index.reorder_points)
+
+    def __watch_reorder_points(self, cart):
+        """Notes which items of an order are low before it is applied.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+        Return:
+            low_states (dictionary): Low state of each item, None if the
+                                     change raises no alerts.
+        """
+
+        return self.reorder_index().low_states(
+            name_and_price[0] for name_and_price in cart)
+
+    def __alert_reorder_points(self, low_states, order_id):
+        """Updates the reorder index for the items of an applied order and
+        records an alert for each item that crossed its reorder point.
+
+        Args:
+            low_states (dictionary): Result of __watch_reorder_points().
+
+            order_id (string): Order that changed the items.
+        """
+
+        if low_states is None:
+            return
+
+        quantities = dict()
+        for item_name in low_states:
+            item = self.lookup_item(item_name)
+            quantities[item_name] = None if item is None else item[1]
+
+            # Store listeners already did this, a backend has none
+            self.__reorder_index.update(item_name, quantities[item_name])
+
+        self.__reorder_index.emit_alerts(low_states, quantities, order_id)
+
+    @metrics.timed("inventory_modify")
+    def modify_inventory(self, new_inventory, order_id=None,
+                         reorder_alerts=True):
         """Changes quantity of items within file.
 
+        In journaled mode only a delta record is appended to the journal, the
+        master inventory file is rewritten later by compact_inventory().
+
+        Items are changed at their current price, so a cart made before a
+        price change still takes its stock. Items no longer in inventory are
+        left out.
+
         Args:
             new_inventory (dictionary): current inventory after making an order
+
+            order_id (string): Order that the change belongs to.
+
+            reorder_alerts (bool): Determines if items crossing their
+                                   reorder point are alerted, off for stock
+                                   only moved elsewhere such as into shards.
+        """
+
+        if self.backend is not None:
+            low_states = None
+            if reorder_alerts:
+                low_states = self.__watch_reorder_points(new_inventory)
+            self.version = self.backend.modify(new_inventory, order_id)
+            self.__alert_reorder_points(low_states, order_id)
+            return
+
+        with self.__lock():
+            self.__catch_up()
+            self.__commit(self.__at_current_prices(new_inventory), order_id,
+                          reorder_alerts)
+
+        self.__compact_if_needed()
+
+    @metrics.timed("inventory_delta")
+    def apply_delta(self, operations, delta_id=None):
+        """Applies a delta of restocks, price changes, new items and removed
+        items, see inventory_delta.py. Every operation is checked against the
+        newest version under the inventory lock before anything changes,
+        then all of them are applied to the item store in one pass and
+        written as a single new snapshot of inventory.txt. The snapshot also
+        holds every journaled change, so the journal is emptied.
+
+        Args:
+            operations (list): Operations from inventory_delta.read_delta().
+
+            delta_id (string): Name of the delta, recorded with reorder
+                               alerts.
+
+        Return:
+            version (int): Inventory version created by the delta.
+
+        Raises:
+            DeltaError: Some operations do not fit the inventory, nothing was
+                        changed.
+
+            ValueError: A backend holds the items.
         """
 
+        if self.backend is not None:
+            raise ValueError("Deltas can only be applied to inventory.txt")
+
         cwd = os.getcwd()
         inventory_file_path = os.path.join(cwd, "inventory.txt")
 
-        self.inventory.clear()
-        entry_lines = list()
-
-        with open(inventory_file_path) as inventory_file:
-            for line in inventory_file:
-                # Each entry line's name and quantity in list
-                entry_lines += line.splitlines()
-
-            for entry in entry_lines:
-                entries = entry.split(", ")
-
-                # Should just be 3 fields in list, don't add if field
-                # formatted incorrectly in inventory.txt.
-                if len(entries) == 3:
-                    try:
-                        name_and_price = (entries[0].lower(), float(entries[1]))
-                        quantity = int(entries[2])
-                    except ValueError:
-                        continue
-
-                    item_name = entries[0].lower()
-                    item_price = float(entries[1])
-                    item_quantity = int(entries[2])
-                    name_and_price = (item_name, item_price)
-                    quantity = item_quantity
-                    self.inventory[name_and_price] = quantity
-                    self.item_price_lookup[item_name] = item_price
+        with self.__lock():
+            self.__catch_up()
 
-            # Update current inventory quantity
-            for name_and_price in new_inventory:
-                self.inventory[name_and_price] -= new_inventory[name_and_price]
+            updates = inventory_delta.resolve_delta(operations,
+                                                    self.items.lookup)
+
+            # Removed items are simply forgotten, they get no alert
+            kept_items = {item_name: item[1]
+                          for item_name, item in updates.items()
+                          if item is not None}
+
+            low_states = self.reorder_index().low_states(kept_items)
+
+            # Search and reorder indexes follow the store as listeners
+            self.items.update_items(updates)
+
+            self.version += 1
+            self.__write_snapshot(inventory_file_path)
+
+            self.__reorder_index.emit_alerts(low_states, kept_items,
+                                             delta_id)
+
+        metrics.increment("inventory_delta_items_total", len(updates))
+
+        return self.version
+
+    @metrics.timed("inventory_checkout")
+    def checkout(self, cart, order_id=None, hold_id=None,
+                 make_order_id=None):
+        """Removes the items of an order from inventory only if every item is
+        still in stock. Stock is checked again under the inventory lock
+        against the newest version, so orders from other terminals made since
+        the last refresh are taken into account. Items held by other carts
+        are not in stock for this order. Items are taken at their current
+        price, like modify_inventory().
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            order_id (string): Order that the change belongs to.
+
+            hold_id (string): Cart whose held items are turned into the
+                              order, None if the order has no holds.
+
+            make_order_id (function): Creates the order id once every item
+                                      is known to be in stock, used instead
+                                      of order_id so a refused checkout
+                                      takes no order number.
+
+        Return:
+            version (int): Inventory version created by this checkout.
+
+        Raises:
+            InsufficientStockError: Some items no longer have enough stock,
+                                    nothing was changed.
+        """
+
+        if self.backend is not None:
+            low_states = self.__watch_reorder_points(cart)
+            self.version = self.backend.checkout(cart, order_id)
+            if make_order_id is not None:
+                order_id = make_order_id()
+            self.__alert_reorder_points(low_states, order_id)
+            return self.version
+
+        with self.__lock():
+            self.__catch_up()
+            self.reservations.refresh()
 
-        # Update inventory text file
-        with (open(inventory_file_path, "w") as inventory_file):
-            for name_and_price in self.inventory:
-                line = str(name_and_price[0]) + ", "
-                line += str(name_and_price[1]) + ", "
-                line += str((self.inventory[name_and_price])) + "\n"
-                inventory_file.write(line)
+            shortages = self.__find_shortages(cart, hold_id)
+            if len(shortages) > 0:
+                metrics.increment("checkout_shortages_total")
+                raise InsufficientStockError(shortages)
 
+            if make_order_id is not None:
+                order_id = make_order_id()
+
+            self.__commit(self.__at_current_prices(cart), order_id)
+
+            # Held items are now removed from stock, drop them from the
+            # ledger so they are not counted twice
+            if hold_id is not None:
+                self.reservations.release(hold_id)
+            self.reservations.compact_if_needed()
+
+        self.__compact_if_needed()
+
+        return self.version
+
+    @metrics.timed("inventory_hold")
+    def hold_items(self, hold_id, cart):
+        """Holds every item of a cart so other terminals cannot sell them,
+        until the cart checks out, is cancelled or is left unchanged for the
+        hold time to live. Holding a cart again renews it and only records
+        the quantities that changed.
+
+        Args:
+            hold_id (string): Cart holding the items.
+
+            cart (dictionary): Quantity in cart for each (name, price).
+
+        Raises:
+            InsufficientStockError: Some items do not have enough stock left
+                                    that is not held by other carts, nothing
+                                    was held.
+        """
+
+        # Backends check stock only at checkout
+        if self.reservations is None:
+            return
+
+        with self.__lock():
+            self.__catch_up()
+            self.reservations.refresh()
+
+            shortages = self.__find_shortages(cart, hold_id)
+            if len(shortages) > 0:
+                metrics.increment("hold_shortages_total")
+                raise InsufficientStockError(shortages)
+
+            # Held by name, so a price change keeps the hold
+            held_items = self.reservations.held_items(hold_id)
+            requested = self.__requested_by_name(cart)
+
+            changes = dict()
+            for item_name in requested:
+                change = requested[item_name] - held_items.get(item_name, 0)
+                if change != 0:
+                    changes[item_name] = change
+            for item_name in held_items:
+                if item_name not in requested:
+                    changes[item_name] = -held_items[item_name]
+
+            self.reservations.hold(hold_id, changes)
+            self.reservations.compact_if_needed()
+
+    def release_hold(self, hold_id):
+        """Releases every item held by a cart.
+
+        Args:
+            hold_id (string): Cart holding the items.
+        """
+
+        if self.reservations is None:
+            return
+
+        with self.__lock():
+            self.reservations.refresh()
+            self.reservations.release(hold_id)
+
+    @metrics.timed("inventory_refresh")
     def refresh_inventory(self):
         """Refreshes inventory by opening and extracting current content within
-        inventory.txt."""
+        inventory.txt. Nothing is read when the files still match the
+        fingerprints from the last refresh, and only lines that changed are
+        parsed again."""
+
+        if self.backend is not None:
+            self.version = self.backend.version()
+            return
+
+        # Holds of other terminals are replayed without the lock too
+        self.reservations.refresh()
 
         cwd = os.getcwd()
         inventory_file_path = os.path.join(cwd, "inventory.txt")
 
-        self.inventory.clear()
-        entry_lines = list()
-
-        with open(inventory_file_path) as inventory_file:
-            for line in inventory_file:
-                # Each entry line's name and quantity in list
-                entry_lines += line.splitlines()
-
-            for entry in entry_lines:
-                entries = entry.split(", ")
-
-                # Should just be 3 fields in list, don't add if field
-                # formatted incorrectly in inventory.txt
-                if len(entries) == 3:
-                    try:
-                        name_and_price = (entries[0].lower(), float(entries[1]))
-                        quantity = int(entries[2])
-                    except ValueError:
-                        continue
-
-                    item_name = entries[0].lower()
-                    item_price = float(entries[1])
-                    item_quantity = int(entries[2])
-                    name_and_price = (item_name, item_price)
-                    quantity = item_quantity
-                    self.inventory[name_and_price] = quantity
-                    self.item_price_lookup[item_name] = item_price
+        while True:
+            snapshot_fingerprint = self.__fingerprint(inventory_file_path)
+            journal_fingerprint = None
+            if self.journal is not None:
+                journal_fingerprint = self.__fingerprint(
+                    self.journal.journal_file_path)
+
+            if (snapshot_fingerprint == self.__snapshot_fingerprint
+                    and journal_fingerprint == self.__journal_fingerprint):
+                self.cache_hits += 1
+                metrics.increment("inventory_refresh_cache_hits_total")
+                return
+
+            self.cache_misses += 1
+            metrics.increment("inventory_refresh_cache_misses_total")
+
+            if snapshot_fingerprint != self.__snapshot_fingerprint:
+                self.__read_inventory_file(inventory_file_path)
+                self.snapshot_version = self.version
+
+                # Replay every journal record newer than the snapshot
+                if self.journal is not None:
+                    self.journal.reset(self.version)
+
+            if self.journal is None:
+                self.__snapshot_fingerprint = snapshot_fingerprint
+                break
+
+            # Only records not replayed yet are read
+            self.journal.replay(self.inventory, self.item_price_lookup)
+            self.version = self.journal.last_sequence
+
+            # Read without the lock, start over if a compaction swapped the
+            # snapshot while the journal was being replayed
+            if (inventory_journal.read_snapshot_version(inventory_file_path)
+                    == self.snapshot_version):
+                self.__snapshot_fingerprint = snapshot_fingerprint
+                self.__journal_fingerprint = journal_fingerprint
+                break
+
+            self.__snapshot_fingerprint = None
+
+    @metrics.timed("inventory_compact")
+    def compact_inventory(self):
+        """Folds the journal back into inventory.txt as a new snapshot."""
+
+        if self.backend is not None or self.journal is None:
+            return
+
+        cwd = os.getcwd()
+        inventory_file_path = os.path.join(cwd, "inventory.txt")
+
+        with self.__lock():
+            self.__catch_up()
+
+            # Nothing journaled since the snapshot, keep inventory.txt and
+            # its startup cache as they are
+            if (self.version == self.snapshot_version
+                    and self.journal.record_count == 0):
+                return
+
+            self.__write_snapshot(inventory_file_path)
+
+    def __write_snapshot(self, inventory_file_path):
+        """Writes every item as a new snapshot of inventory.txt, drops the
+        journal records it contains and rebuilds the startup cache. Must be
+        called while holding the inventory lock.
+
+        Args:
+            inventory_file_path (string): Location of inventory.txt.
+        """
+
+        # Snapshot first, records it contains are only dropped afterwards
+        self.__write_inventory_file(inventory_file_path)
+
+        if self.journal is not None:
+            self.journal.truncate_through(self.version)
+            self.__journal_fingerprint = self.__fingerprint(
+                self.journal.journal_file_path)
+
+        # Next terminal loads the new snapshot without parsing it
+        source_key = startup_cache.read_source(inventory_file_path)[1]
+        startup_cache.write_cache(
+            os.path.join(os.path.dirname(inventory_file_path),
+                         startup_cache.CACHE_FILE_NAME),
+            source_key, self.version, self.items)
+
+    def __lock(self):
+        """Creates the advisory lock every writer of inventory.txt holds.
+
+        Return:
+            lock (FileLock): Lock on inventory.txt.lock.
+        """
+
+        cwd = os.getcwd()
+        return file_lock.FileLock(os.path.join(cwd, "inventory.txt.lock"))
+
+    def __catch_up(self):
+        """Brings inventory up to the newest version on disk. Must be called
+        while holding the inventory lock."""
+
+        cwd = os.getcwd()
+        inventory_file_path = os.path.join(cwd, "inventory.txt")
+
+        # Another process compacted, records it dropped from the journal are
+        # only in the new snapshot
+        if (self.journal is None
+                or inventory_journal.read_snapshot_version(inventory_file_path)
+                != self.snapshot_version):
+            self.refresh_inventory()
+            return
+
+        # Only records appended since the last replay are read
+        self.journal.replay(self.inventory, self.item_price_lookup)
+        self.version = self.journal.last_sequence
+
+    def __commit(self, new_inventory, order_id, reorder_alerts=True):
+        """Writes an order's quantity changes and bumps the version. Must be
+        called while holding the inventory lock.
+
+        Args:
+            new_inventory (dictionary): Quantity ordered for each item.
+
+            order_id (string): Order that the change belongs to.
+
+            reorder_alerts (bool): Determines if items crossing their
+                                   reorder point are alerted.
+        """
+
+        low_states = None
+        if reorder_alerts:
+            low_states = self.__watch_reorder_points(new_inventory)
+
+        if self.journal is not None:
+            changes = dict()
+            for name_and_price in new_inventory:
+                changes[name_and_price] = -new_inventory[name_and_price]
+
+            self.version = self.journal.append(changes, order_id)
+
+            for name_and_price in new_inventory:
+                self.inventory[name_and_price] -= new_inventory[name_and_price]
+
+            # Own record is already applied, no need to refresh for it
+            self.__journal_fingerprint = self.__fingerprint(
+                self.journal.journal_file_path)
+        else:
+            # Update current inventory quantity
+            for name_and_price in new_inventory:
+                self.inventory[name_and_price] -= new_inventory[name_and_price]
+
+            # Update inventory text file
+            self.version += 1
+            cwd = os.getcwd()
+            self.__write_inventory_file(os.path.join(cwd, "inventory.txt"))
+
+        self.__alert_reorder_points(low_states, order_id)
+
+    def __at_current_prices(self, cart):
+        """Keys the items of a cart by their current price, a price change
+        since the cart was made would otherwise leave a key that is no
+        longer in inventory. Must be called while holding the inventory lock.
+
+        Args:
+            cart (dictionary): Quantity for each (name, price).
+
+        Return:
+            current_cart (dictionary): Quantity for each (name, current
+                                       price), without items no longer in
+                                       inventory.
+        """
+
+        current_cart = dict()
+        for name_and_price in cart:
+            item = self.items.lookup(name_and_price[0])
+            if item is None:
+                continue
+
+            current_key = (name_and_price[0], item[0])
+            current_cart[current_key] = (current_cart.get(current_key, 0)
+                                         + cart[name_and_price])
+
+        return current_cart
+
+    @staticmethod
+    def __requested_by_name(cart):
+        """Adds up the quantities of a cart by item name, a cart made across
+        a price change may hold an item under two prices.
+
+        Args:
+            cart (dictionary): Quantity for each (name, price).
+
+        Return:
+            requested (dictionary): Quantity of each item name.
+        """
+
+        requested = dict()
+        for name_and_price in cart:
+            requested[name_and_price[0]] = (requested.get(name_and_price[0], 0)
+                                            + cart[name_and_price])
+
+        return requested
+
+    def __find_shortages(self, cart, hold_id):
+        """Finds the items of a cart that have less stock than requested,
+        not counting stock held by other carts. Items are looked up by name,
+        so a price change since the cart was made does not matter, and items
+        no longer in inventory have no stock. Must be called while holding
+        the inventory lock.
+
+        Args:
+            cart (dictionary): Quantity requested for each (name, price).
+
+            hold_id (string): Cart whose own held items are counted as in
+                              stock, None if the cart has no holds.
+
+        Return:
+            shortages (dictionary): Quantity available for each short item.
+        """
+
+        requested = self.__requested_by_name(cart)
+
+        shortages = dict()
+        for name_and_price in cart:
+            item_name = name_and_price[0]
+            item = self.items.lookup(item_name)
+
+            available = -self.reservations.held_quantity(item_name, hold_id)
+            if item is not None:
+                available += item[1]
+
+            if requested[item_name] > available:
+                shortages[name_and_price] = available
+
+        return shortages
+
+    def __compact_if_needed(self):
+        """Compacts the journal once it holds compact_threshold records."""
+
+        if (self.journal is not None
+                and self.journal.record_count >= self.compact_threshold):
+            self.compact_inventory()
+
+    def __fingerprint(self, file_path):
+        """Builds a fingerprint that changes whenever a file is replaced or
+        written to.
+
+        Args:
+            file_path (string): Location of the file.
+
+        Return:
+            fingerprint (tuple): Inode, size, modification time, the version
+                                 header for inventory.txt and optionally a
+                                 content hash. None if file does not exist.
+        """
+
+        try:
+            file_stat = os.stat(file_path)
+        except FileNotFoundError:
+            return None
+
+        fingerprint = (file_stat.st_ino, file_stat.st_size,
+                       file_stat.st_mtime_ns)
+
+        # Header version changes on every rewrite, even within one mtime tick
+        if self.journal is None or file_path != self.journal.journal_file_path:
+            fingerprint += (inventory_journal.read_snapshot_version(file_path),)
+
+        if self.verify_hash:
+            with open(file_path, "rb") as hashed_file:
+                fingerprint += (hashlib.blake2b(hashed_file.read()).digest(),)
+
+        return fingerprint
+
+    @metrics.timed("inventory_parse")
+    def __read_inventory_file(self, inventory_file_path):
+        """Extracts every item and the version header from inventory.txt.
+        Items already in the store are updated in place and items no longer
+        in the file are removed, so listeners only hear about real changes.
+        A line is only parsed again when it differs from the one its item
+        was last read from, or the item changed since.
+
+        An empty store is loaded from inventory.cache instead when the cache
+        was built from the same inventory.txt, and the cache is rebuilt after
+        parsing otherwise.
+
+        Args:
+            inventory_file_path (string): Location of inventory.txt.
+        """
+
+        content, source_key = startup_cache.read_source(inventory_file_path)
+        cache_file_path = os.path.join(os.path.dirname(inventory_file_path),
+                                       startup_cache.CACHE_FILE_NAME)
+        loading_empty_store = len(self.items) == 0
+
+        if loading_empty_store:
+            with metrics.timer("startup_cache_load"):
+                cached = startup_cache.load_cache(cache_file_path, source_key)
+
+            if cached is not None:
+                self.version, names, prices, quantities = cached
+                self.items.load_columns(names, prices, quantities)
+                metrics.increment("startup_cache_hits_total")
+                return
+
+            metrics.increment("startup_cache_misses_total")
+
+        self.version = 0
+        kept_slots = bytearray(len(self.items.prices))
+        lines_parsed = 0
+        self.malformed_rows = list()
+
+        # Lines are decoded one at a time, the same way catalogs are read
+        lines = catalog_importer.iter_lines(io.BytesIO(content))
+
+        for line_number, entry in enumerate(lines, start=1):
+            version = inventory_journal.parse_version_header(entry)
+            if version is not None:
+                self.version = version
+                continue
+
+            if entry.strip() == "":
+                continue
+
+            # Unchanged lines of unchanged items are kept as they are
+            line_key = hash(entry)
+            slot = self.items.line_slot(entry.partition(", ")[0].lower(),
+                                        line_key)
+
+            if slot is None:
+                lines_parsed += 1
+
+                # Same parser as catalog imports, lines formatted
+                # incorrectly are skipped but kept for the caller to report
+                try:
+                    item_name, item_price, quantity = (
+                        catalog_importer.parse_text_line(entry))
+                    slot = self.items.set_item(item_name, item_price,
+                                               quantity, line_key)
+                except ValueError as error:
+                    self.malformed_rows.append({"line": line_number,
+                                                "error": str(error),
+                                                "text": entry})
+                    continue
+
+            if slot >= len(kept_slots):
+                kept_slots.extend(bytes(slot + 1 - len(kept_slots)))
+            kept_slots[slot] = 1
+
+        self.items.retain(kept_slots)
+
+        self.lines_reparsed += lines_parsed
+        metrics.increment("inventory_lines_parsed_total", lines_parsed)
+        metrics.increment("inventory_malformed_rows_total",
+                          len(self.malformed_rows))
+
+        # Later terminals start from the columns just parsed
+        if loading_empty_store:
+            startup_cache.write_cache(cache_file_path, source_key,
+                                      self.version, self.items)
+
+    @metrics.timed("inventory_write")
+    def __write_inventory_file(self, inventory_file_path):
+        """Writes current inventory to inventory.txt. A temporary file is
+        renamed over the old one so a crash never leaves it half written.
+
+        Args:
+            inventory_file_path (string): Location of inventory.txt.
+        """
+
+        temp_file_path = inventory_file_path + ".tmp"
+
+        with open(temp_file_path, "w") as inventory_file:
+            if self.version > 0:
+                inventory_file.write(inventory_journal.VERSION_HEADER
+                                     + str(self.version) + "\n")
+
+            for item in self.items.iter_items():
+                line = str(item[0]) + ", "
+                line += str(item[1]) + ", "
+                line += str(item[2])
+                inventory_file.write(line + "\n")
+
+            inventory_file.flush()
+            with metrics.timer("inventory_fsync"):
+                os.fsync(inventory_file.fileno())
+
+        os.replace(temp_file_path, inventory_file_path)
+        with metrics.timer("inventory_fsync"):
+            inventory_journal.fsync_directory(
+                os.path.dirname(inventory_file_path))
+        self.snapshot_version = self.version
+        self.__snapshot_fingerprint = self.__fingerprint(inventory_file_path)
@@ -0,0 +1,524 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file runs the inventory as a local network
+                     service, so many terminals share one copy of it instead
+                     of each opening the inventory files. Clients send one
+                     JSON request per line over TCP. Orders are queued for a
+                     single writer thread that checks them out and writes
+                     their order files in batches. Lookups and listings are
+                     answered from memory by the same thread between
+                     batches, so the items never change while being read.
+
+Usage: python inventory_server.py [--host HOST] [--port PORT] [--storage S]
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import signal
+
+import create_order_interface
+import customer_order
+import inventory_listing
+import inventory_manager
+import metrics
+import order_index
+import order_sequence
+import storage_backends
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8521
+
+# Orders checked out and written together by the writer thread
+MAX_BATCH_SIZE = 64
+
+# Longest request line accepted from a client
+MAX_REQUEST_SIZE = 1 << 20
+
+# Requests a client can send
+SERVER_OPERATIONS = ("lookup", "list", "order", "stats")
+
+# Storage usable from the writer thread, SQLite connections only work on
+# the thread that opened them
+SERVER_STORAGE_TYPES = ("text", "mmap")
+
+
+class RequestError(Exception):
+    """Raised when a request is malformed, sent back to the client as its
+    error message."""
+
+
+class InventoryServer:
+    """Serves an inventory to many clients. Only the writer thread touches
+    the inventory, a refresh while checking out may add or remove items
+    that a read on the event loop would be walking.
+
+    Attributes:
+        stock (Inventory): Inventory served.
+
+        max_batch_size (int): Most orders committed together.
+
+        order_count (int): Orders committed since the server started.
+
+        batch_count (int): Batches committed since the server started.
+
+    Methods:
+        __init__(stock, max_batch_size): Initializes the server.
+
+        start(host, port): Starts listening and the commit loop.
+
+        close(): Stops listening and finishes queued orders.
+
+        handle_request(request): Answers one decoded request.
+
+        commit_orders(requests): Checks out and writes a batch of orders,
+                                 run on the writer thread.
+    """
+
+    def __init__(self, stock, max_batch_size=MAX_BATCH_SIZE):
+        """Initializes the server.
+
+        Args:
+            stock (Inventory): Inventory served.
+
+            max_batch_size (int): Most orders committed together.
+        """
+
+        self.stock = stock
+        self.max_batch_size = max_batch_size
+        self.order_count = 0
+        self.batch_count = 0
+
+        self.__server = None
+        self.__order_queue = None
+        self.__commit_task = None
+
+        # Order numbers reserved but not used yet, an order that cannot be
+        # checked out leaves its number to the next one
+        self.__next_number = 1
+        self.__last_number = 0
+
+        # Only this thread changes the inventory
+        self.__writer = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="inventory-writer")
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Starts listening and the commit loop.
+
+        Args:
+            host (string): Address listened on.
+
+            port (int): Port listened on, 0 for any free port.
+
+        Return:
+            address (tuple): Host and port actually listened on.
+        """
+
+        self.__order_queue = asyncio.Queue()
+        self.__commit_task = asyncio.create_task(self.__commit_loop())
+        self.__server = await asyncio.start_server(self.__serve_client, host,
+                                                   port,
+                                                   limit=MAX_REQUEST_SIZE)
+
+        return self.__server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        """Stops listening, then waits for queued orders to be committed."""
+
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+
+        if self.__commit_task is not None:
+            await self.__order_queue.put(None)
+            await self.__commit_task
+
+        await asyncio.get_running_loop().run_in_executor(
+            self.__writer, self.__release_order_numbers)
+        self.__writer.shutdown()
+
+    async def __serve_client(self, reader, writer):
+        """Answers the requests of one connection in order.
+
+        Args:
+            reader (StreamReader): Requests from the client.
+
+            writer (StreamWriter): Responses to the client.
+        """
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, ConnectionError):
+                    break
+
+                if not line:
+                    break
+
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise RequestError("Request must be a JSON object.")
+                    response = await self.handle_request(request)
+                except (ValueError, RequestError) as error:
+                    response = {"ok": False, "error": str(error)}
+                    request = dict()
+                except Exception as error:
+                    # The connection and the server outlive a failed request
+                    response = {"ok": False,
+                                "error": f"Request failed: {error}"}
+
+                if "id" in request:
+                    response["id"] = request["id"]
+
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, request):
+        """Answers one decoded request.
+
+        Args:
+            request (dictionary): Request with an "op" of "lookup", "list",
+                                  "order" or "stats".
+
+        Return:
+            response (dictionary): Response with "ok" and the result or an
+                                   "error".
+        """
+
+        operation = request.get("op")
+        if operation not in SERVER_OPERATIONS:
+            raise RequestError(f"Unknown op: {operation}")
+
+        metrics.increment(f"server_{operation}_requests_total")
+
+        loop = asyncio.get_running_loop()
+
+        if operation == "lookup":
+            return await loop.run_in_executor(self.__writer, self.__lookup,
+                                              request)
+        elif operation == "list":
+            return await loop.run_in_executor(self.__writer, self.__list,
+                                              request)
+        elif operation == "order":
+            return await self.__order(request)
+
+        return {"ok": True,
+                "items": len(self.stock.item_price_lookup),
+                "version": self.stock.version,
+                "orders": self.order_count,
+                "batches": self.batch_count,
+                "queued": self.__order_queue.qsize()}
+
+    def __lookup(self, request):
+        """Looks up the price and stock of an item. Runs on the writer
+        thread.
+
+        Args:
+            request (dictionary): Request with the "item" name.
+
+        Return:
+            response (dictionary): Item price and quantity, or an error with
+                                   suggested names.
+        """
+
+        item_name = str(request.get("item", "")).lower()
+        item = self.stock.lookup_item(item_name)
+
+        if item is None:
+            return {"ok": False,
+                    "error": f'Could not find "{item_name}" in inventory.',
+                    "suggestions": create_order_interface.suggest_item_names(
+                        self.stock, item_name)}
+
+        return {"ok": True, "item": item_name, "price": item[0],
+                "quantity": item[1]}
+
+    def __list(self, request):
+        """Lists a page of items. Runs on the writer thread.
+
+        Args:
+            request (dictionary): Request with optional "offset", "limit",
+                                  "sort_by", "descending" and "filters".
+
+        Return:
+            response (dictionary): Name, price and quantity of each row.
+        """
+
+        sort_by = request.get("sort_by")
+        if sort_by is not None and sort_by not in inventory_listing.SORT_KEYS:
+            raise RequestError(f"Unknown sort: {sort_by}")
+
+        filters = request.get("filters", dict())
+        if not isinstance(filters, dict) or not set(filters) <= {
+                "name_filter", "min_price", "max_price", "below_stock"}:
+            raise RequestError("Unknown filters.")
+
+        try:
+            rows = list(inventory_listing.list_items(
+                self.stock, int(request.get("offset", 0)),
+                int(request.get("limit", inventory_listing.DEFAULT_PAGE_SIZE)),
+                sort_by, bool(request.get("descending", False)), **filters))
+        except (TypeError, ValueError) as error:
+            raise RequestError(f"Invalid listing: {error}")
+
+        return {"ok": True, "rows": rows}
+
+    async def __order(self, request):
+        """Validates an order like the order prompt does, then waits for the
+        writer thread to check it out.
+
+        Args:
+            request (dictionary): Request with "first_name", "last_name" and
+                                  "items" as [name, quantity] pairs.
+
+        Return:
+            response (dictionary): Order id, location and total, or an error
+                                   with the items that ran short.
+        """
+
+        items = request.get("items")
+        if not isinstance(items, list) or len(items) == 0:
+            raise RequestError("Order needs a list of [item, quantity].")
+
+        for item_request in items:
+            if not isinstance(item_request, list) or len(item_request) != 2:
+                raise RequestError("Order needs a list of [item, quantity].")
+
+        cart, error = await asyncio.get_running_loop().run_in_executor(
+            self.__writer, self.__validate_order, items)
+
+        if error is not None:
+            return {"ok": False, "error": error}
+
+        future = asyncio.get_running_loop().create_future()
+        await self.__order_queue.put((cart, str(request.get("first_name", "")),
+                                      str(request.get("last_name", "")),
+                                      future))
+
+        return await future
+
+    def __validate_order(self, items):
+        """Checks the items of an order like the order prompt does. Runs on
+        the writer thread.
+
+        Args:
+            items (list): Item name and quantity of each line.
+
+        Return:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            error (string): Reason the first bad line was refused, None if
+                            every line is valid.
+        """
+
+        cart = dict()
+        for item_name, item_quantity in items:
+            lookup_pair, quantity, error = (
+                create_order_interface.validate_item_request(
+                    self.stock, f"{item_name} {item_quantity}", cart,
+                    suggest=True, reservations=self.stock.reservations))
+
+            if error is not None:
+                return cart, error
+
+            cart[lookup_pair] = cart.get(lookup_pair, 0) + quantity
+
+        return cart, None
+
+    async def __commit_loop(self):
+        """Hands queued orders to the writer thread in batches, so orders
+        arriving together share one round of order file syncs."""
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = [await self.__order_queue.get()]
+
+            while (batch[-1] is not None and len(batch) < self.max_batch_size
+                   and not self.__order_queue.empty()):
+                batch.append(self.__order_queue.get_nowait())
+
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+
+            if len(batch) > 0:
+                requests = [pending[:3] for pending in batch]
+                try:
+                    responses = await loop.run_in_executor(
+                        self.__writer, self.commit_orders, requests)
+                except Exception as error:
+                    responses = [{"ok": False,
+                                  "error": f"Order failed: {error}"}
+                                 for _ in batch]
+
+                for pending, response in zip(batch, responses):
+                    if not pending[3].done():
+                        pending[3].set_result(response)
+
+            if stopping:
+                break
+
+    def commit_orders(self, requests):
+        """Checks out a batch of orders one by one, then writes the order
+        files of those that succeeded together. Runs on the writer thread.
+
+        Args:
+            requests (list): Cart, first name and last name of each order.
+
+        Return:
+            responses (list): Response for each order.
+        """
+
+        with metrics.timer("server_commit_batch"):
+            responses = list()
+            orders = list()
+
+            for offset, (cart, first_name, last_name) in enumerate(requests):
+                # Enough numbers for the rest of the batch in one update
+                if self.__next_number > self.__last_number:
+                    count = len(requests) - offset
+                    if self.stock.backend is not None:
+                        self.__next_number = (
+                            self.stock.backend.allocate_order_numbers(count))
+                    else:
+                        self.__next_number = (
+                            order_sequence.OrderSequence().allocate(count))
+                    self.__last_number = self.__next_number + count - 1
+
+                order = customer_order.CustomerOrder(
+                    cart, first_name, last_name, confirm=False,
+                    order_number=self.__next_number, write_file=False,
+                    backend=self.stock.backend)
+
+                try:
+                    self.stock.checkout(cart, order.order_id)
+                except inventory_manager.InsufficientStockError as error:
+                    responses.append({"ok": False,
+                                      "error": f"{error}. Please update the "
+                                               f"order.",
+                                      "shortages": [
+                                          [name_and_price[0], available]
+                                          for name_and_price, available
+                                          in error.shortages.items()]})
+                    continue
+
+                self.__next_number += 1
+                orders.append(order)
+                total_price = sum(name_and_price[1] * cart[name_and_price]
+                                  for name_and_price in cart)
+                responses.append({"ok": True,
+                                  "order_id": order.order_id,
+                                  "total": round(total_price, 2)})
+
+            if len(orders) > 0:
+                customer_order.write_order_files(orders, self.stock.backend)
+
+            locations = iter(order.display_order_file_info(include_path=True)
+                             for order in orders)
+            for response in responses:
+                if response["ok"]:
+                    response["location"] = next(locations)
+
+        self.order_count += len(orders)
+        self.batch_count += 1
+
+        return responses
+
+    def __release_order_numbers(self):
+        """Gives back the order numbers reserved but never used, runs on
+        the writer thread once the last batch is committed."""
+
+        count = self.__last_number - self.__next_number + 1
+        if count <= 0:
+            return
+
+        if self.stock.backend is not None:
+            self.stock.backend.release_order_numbers(self.__next_number,
+                                                     count)
+        else:
+            order_sequence.OrderSequence().release(self.__next_number,
+                                                   count)
+
+        self.__next_number = self.__last_number + 1
+
+
+async def serve(stock, host, port, max_batch_size):
+    """Runs the server until interrupted or terminated.
+
+    Args:
+        stock (Inventory): Inventory served.
+
+        host (string): Address listened on.
+
+        port (int): Port listened on.
+
+        max_batch_size (int): Most orders committed together.
+    """
+
+    server = InventoryServer(stock, max_batch_size)
+    address = await server.start(host, port)
+    print(f"Serving inventory on {address[0]}:{address[1]}", flush=True)
+
+    # Stop on Ctrl+C or kill, so queued orders still get written
+    stop_event = asyncio.Event()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            asyncio.get_running_loop().add_signal_handler(stop_signal,
+                                                          stop_event.set)
+        except NotImplementedError:
+            pass
+
+    try:
+        await stop_event.wait()
+    finally:
+        await server.close()
+
+
+def main():
+    """Opens the inventory and serves it until interrupted."""
+
+    parser = argparse.ArgumentParser(description="Serve the inventory.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--storage", choices=SERVER_STORAGE_TYPES,
+                        default="text")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help="most orders checked out and synced together")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record timings and counters to FILE on exit")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.registry.enable()
+
+    stock = storage_backends.open_inventory(args.storage)
+
+    # Order index is built from existing order files on the first run
+    if stock.backend is None:
+        order_index.open_index().ensure_built()
+
+    try:
+        asyncio.run(serve(stock, args.host, args.port, args.batch_size))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Fold journaled changes back into inventory.txt
+        stock.compact_inventory()
+
+        if args.metrics:
+            metrics.registry.write(args.metrics)
+
+
+if __name__ == '__main__':
+    main()
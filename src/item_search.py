@@ -0,0 +1,241 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the ItemSearchIndex class that
+                     completes item name prefixes and suggests names close to
+                     a mistyped one. Names are kept sorted for prefix search,
+                     and typos are found by trying every single letter change
+                     of the typed name against the known names. The index
+                     follows items added to or removed from an ItemStore
+                     without being built again.
+"""
+
+import bisect
+
+
+def single_edits(name, alphabet):
+    """Lists every name one typo away: a letter missing, an extra letter, a
+    wrong letter or two neighbouring letters swapped.
+
+    Args:
+        name (string): Typed name.
+
+        alphabet (string): Letters that appear in item names.
+
+    Return:
+        edits (set): Names one typo away from name.
+    """
+
+    splits = [(name[:index], name[index:]) for index in range(len(name) + 1)]
+
+    deletes = [start + end[1:] for start, end in splits if end]
+    swaps = [start + end[1] + end[0] + end[2:]
+             for start, end in splits if len(end) > 1]
+    replaces = [start + letter + end[1:]
+                for start, end in splits if end for letter in alphabet]
+    inserts = [start + letter + end
+               for start, end in splits for letter in alphabet]
+
+    return set(deletes + swaps + replaces + inserts)
+
+
+def short_edits(name):
+    """Lists the names made by deleting one letter or swapping two
+    neighbouring letters, the cheap part of single_edits().
+
+    Args:
+        name (string): Typed name.
+
+    Return:
+        edits (set): Shorter or swapped versions of name.
+    """
+
+    splits = [(name[:index], name[index:]) for index in range(len(name) + 1)]
+
+    deletes = [start + end[1:] for start, end in splits if end]
+    swaps = [start + end[1] + end[0] + end[2:]
+             for start, end in splits if len(end) > 1]
+
+    return set(deletes + swaps)
+
+
+class ItemSearchIndex:
+    """Prefix and typo tolerant search over item names.
+
+    Attributes:
+        sorted_names (list): Every item name in sorted order.
+
+        known_names (container): Answers if a name exists, such as the
+                                  name index of an ItemStore.
+
+        alphabet (string): Letters that appear in item names.
+
+    Methods:
+        __init__(names, known_names): Builds the index from item names.
+
+        item_added(name, slot): Adds a name, called by ItemStore.
+
+        item_removed(name, slot): Removes a name, called by ItemStore.
+
+        items_cleared(): Removes every name, called by ItemStore.
+
+        items_updated(added_names, removed_names): Adds and removes many
+                                                   names, called by
+                                                   ItemStore.
+
+        quantity_changed(name, slot, quantity): Does nothing, called by
+                                                ItemStore.
+
+        complete(prefix, limit): Returns names starting with prefix.
+
+        suggest(name, limit): Returns names close to a mistyped name.
+    """
+
+    def __init__(self, names=(), known_names=None):
+        """Builds the index from item names.
+
+        Args:
+            names (iterable): Item names to index.
+
+            known_names (container): Kept up to date by its owner and used to
+                                     check typo candidates, a set of names
+                                     is made if None.
+        """
+
+        self.sorted_names = sorted(names)
+
+        if known_names is None:
+            known_names = set(self.sorted_names)
+        self.known_names = known_names
+
+        self.__letters = set().union(*self.sorted_names)
+        self.alphabet = "".join(sorted(self.__letters))
+
+    def item_added(self, name, slot):
+        """Adds a name to the index.
+
+        Args:
+            name (string): Item name.
+
+            slot (int): Slot of the item in its ItemStore, not used.
+        """
+
+        bisect.insort(self.sorted_names, name)
+
+        if isinstance(self.known_names, set):
+            self.known_names.add(name)
+
+        if not self.__letters.issuperset(name):
+            self.__letters.update(name)
+            self.alphabet = "".join(sorted(self.__letters))
+
+    def item_removed(self, name, slot):
+        """Removes a name from the index.
+
+        Args:
+            name (string): Item name.
+
+            slot (int): Slot of the item in its ItemStore, not used.
+        """
+
+        name_index = bisect.bisect_left(self.sorted_names, name)
+        if (name_index < len(self.sorted_names)
+                and self.sorted_names[name_index] == name):
+            del self.sorted_names[name_index]
+
+        if isinstance(self.known_names, set):
+            self.known_names.discard(name)
+
+    def items_cleared(self):
+        """Removes every name from the index."""
+
+        self.sorted_names = list()
+
+        if isinstance(self.known_names, set):
+            self.known_names.clear()
+
+    def items_updated(self, added_names, removed_names):
+        """Adds and removes many names at once. The sorted names are built
+        again in one pass, moving the list once per name would take minutes
+        for a large delta.
+
+        Args:
+            added_names (list): Item names added.
+
+            removed_names (list): Item names removed.
+        """
+
+        if len(removed_names) > 0:
+            removed = set(removed_names)
+            self.sorted_names = [name for name in self.sorted_names
+                                 if name not in removed]
+
+            if isinstance(self.known_names, set):
+                self.known_names.difference_update(removed)
+
+        if len(added_names) > 0:
+            # Sorting finds the run already in order and merges the rest in
+            self.sorted_names.extend(added_names)
+            self.sorted_names.sort()
+
+            if isinstance(self.known_names, set):
+                self.known_names.update(added_names)
+
+            new_letters = set().union(*added_names) - self.__letters
+            if len(new_letters) > 0:
+                self.__letters.update(new_letters)
+                self.alphabet = "".join(sorted(self.__letters))
+
+    def quantity_changed(self, name, slot, quantity):
+        """Does nothing, names do not depend on stock."""
+
+    def complete(self, prefix, limit=10):
+        """Returns names starting with prefix in sorted order.
+
+        Args:
+            prefix (string): Start of an item name.
+
+            limit (int): Most names returned.
+
+        Return:
+            names (list): Names starting with prefix.
+        """
+
+        first_index = bisect.bisect_left(self.sorted_names, prefix)
+        names = list()
+
+        for name in self.sorted_names[first_index:first_index + limit]:
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+
+        return names
+
+    def suggest(self, name, limit=3):
+        """Returns known names one typo away from name, or else names two
+        deletions or swaps away. Candidates are checked against known_names,
+        so the time taken depends on the length of the name, not on the
+        amount of items.
+
+        Args:
+            name (string): Possibly mistyped item name.
+
+            limit (int): Most names returned.
+
+        Return:
+            names (list): Suggested names in sorted order.
+        """
+
+        edits = single_edits(name, self.alphabet)
+        matches = sorted(edit for edit in edits if edit in self.known_names)
+
+        if len(matches) == 0:
+            second_edits = set()
+            for edit in short_edits(name):
+                second_edits.update(short_edits(edit))
+            matches = sorted(edit for edit in second_edits
+                             if edit in self.known_names)
+
+        return matches[:limit]
@@ -0,0 +1,535 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the ItemStore class that keeps
+                     every item once, as a slot in a name index with its
+                     price in cents and its quantity in compact parallel
+                     columns. Mapping views keyed like the old dictionaries
+                     let existing code keep reading and changing items.
+"""
+
+import array
+import collections.abc
+import math
+
+# NumPy is optional, only used to hand out a vector view of a column
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Column types of the array module, 64-bit cents and quantities
+PRICE_COLUMN_TYPE = "q"
+QUANTITY_COLUMN_TYPE = "q"
+LINE_KEY_COLUMN_TYPE = "q"
+
+# Largest price in cents the price column holds
+MAX_PRICE_CENTS = 2 ** 63 - 1
+
+
+def price_to_cents(price):
+    """Converts a price in dollars to whole cents.
+
+    Args:
+        price (float): Price in dollars.
+
+    Return:
+        cents (int): Price in cents.
+
+    Raises:
+        ValueError: The price is not finite, is not a whole amount of cents
+                    or does not fit the price column.
+    """
+
+    if not math.isfinite(price):
+        raise ValueError(f"invalid price {price!r}")
+
+    cents = int(round(price * 100))
+
+    # Stored as cents, a price with more decimals would come back changed
+    if cents / 100 != price:
+        raise ValueError(f"price {price!r} is not a whole amount of cents")
+
+    if abs(cents) > MAX_PRICE_CENTS:
+        raise ValueError(f"price {price!r} is too large")
+
+    return cents
+
+
+class ItemStore:
+    """Keeps each item in one slot. A dictionary maps the item name to its
+    slot, and array columns hold the price in cents and the quantity of
+    every slot. Slots of removed items are reused by the next new item.
+
+    Attributes:
+        slots (dictionary): Slot of each item name, in the order items were
+                            added.
+
+        prices (array): Price in cents of each slot.
+
+        quantities (array): Quantity of each slot.
+
+        line_keys (array): Key of the inventory.txt line each slot was last
+                           set from, 0 once it changed any other way.
+
+        listeners (list): Objects told about added and removed items through
+                          their item_added(name, slot), item_removed(name,
+                          slot) and items_cleared() methods, and about
+                          quantity changes through quantity_changed(name,
+                          slot, quantity). Items changed in bulk are told
+                          through items_updated(added_names,
+                          removed_names) instead of one call per name.
+
+    Methods:
+        __len__(): Counts the items.
+
+        __contains__(name): Checks if an item is stored.
+
+        lookup(name): Returns the price and quantity of an item.
+
+        set_item(name, price, quantity,
+                 line_key): Adds an item or replaces its price and quantity.
+
+        line_slot(name, line_key): Returns the slot of an item last set from
+                                   a given line.
+
+        retain(kept_slots): Removes every item whose slot is not marked.
+
+        load_columns(names, prices, quantities): Replaces every item with
+                                                 columns loaded in bulk.
+
+        update_items(updates): Adds, changes and removes many items in one
+                               pass.
+
+        add_quantity(name, amount): Adds to the quantity of an item.
+
+        remove(name): Removes an item.
+
+        clear(): Removes every item.
+
+        iter_items(): Iterates name, price and quantity of every item in the
+                      order items were added.
+
+        quantity_column(): Returns the quantity column, as a NumPy array
+                           when NumPy is installed.
+    """
+
+    def __init__(self):
+        """Initializes an empty store."""
+
+        self.slots = dict()
+        self.prices = array.array(PRICE_COLUMN_TYPE)
+        self.quantities = array.array(QUANTITY_COLUMN_TYPE)
+        self.line_keys = array.array(LINE_KEY_COLUMN_TYPE)
+        self.listeners = list()
+        self.__free_slots = list()
+
+    def __len__(self):
+        """Counts the items.
+
+        Return:
+            item_count (int): Amount of items stored.
+        """
+
+        return len(self.slots)
+
+    def __contains__(self, name):
+        """Checks if an item is stored.
+
+        Args:
+            name (string): Item name.
+
+        Return:
+            found (bool): True if the item is stored.
+        """
+
+        return name in self.slots
+
+    def lookup(self, name):
+        """Returns the price and quantity of an item in one index lookup.
+
+        Args:
+            name (string): Item name.
+
+        Return:
+            item (tuple): Price in dollars and quantity, None if not stored.
+        """
+
+        slot = self.slots.get(name)
+
+        if slot is None:
+            return None
+
+        # Same float as parsed from a price written with two decimals
+        return self.prices[slot] / 100, self.quantities[slot]
+
+    def set_item(self, name, price, quantity, line_key=0):
+        """Adds an item, or replaces the price and quantity of an item
+        already stored so a price change never adds a second entry.
+
+        Args:
+            name (string): Item name.
+
+            price (float): Price in dollars.
+
+            quantity (int): Quantity in stock.
+
+            line_key (int): Key of the inventory.txt line the item was
+                            parsed from, 0 if it was not.
+
+        Return:
+            slot (int): Slot holding the item.
+
+        Raises:
+            ValueError: The price does not fit the price column, nothing is
+                        changed.
+        """
+
+        price_cents = price_to_cents(price)
+        slot = self.slots.get(name)
+        old_quantity = None
+
+        if slot is None:
+            slot = self.__new_slot()
+
+            self.slots[name] = slot
+
+            for listener in self.listeners:
+                listener.item_added(name, slot)
+        else:
+            old_quantity = self.quantities[slot]
+
+        self.prices[slot] = price_cents
+        self.quantities[slot] = quantity
+        self.line_keys[slot] = line_key
+
+        # Reloading an unchanged line tells nobody
+        if quantity != old_quantity:
+            for listener in self.listeners:
+                listener.quantity_changed(name, slot, quantity)
+
+        return slot
+
+    def line_slot(self, name, line_key):
+        """Returns the slot of an item whose price and quantity were last set
+        from a line with the given key, so reading the same line again would
+        change nothing.
+
+        Args:
+            name (string): Item name.
+
+            line_key (int): Key of the line.
+
+        Return:
+            slot (int): Slot holding the item, None if the item is not
+                        stored or changed since.
+        """
+
+        slot = self.slots.get(name)
+
+        if slot is None or line_key == 0 or self.line_keys[slot] != line_key:
+            return None
+
+        return slot
+
+    def update_items(self, updates):
+        """Adds, changes and removes many items in one pass, such as for an
+        applied delta. Listeners hear about every added and removed name in
+        a single items_updated() call, then about each changed quantity.
+
+        Args:
+            updates (dictionary): New price and quantity of each item name,
+                                  None to remove the item.
+        """
+
+        added_names = list()
+        removed_names = list()
+        changed_quantities = list()
+
+        for name, item in updates.items():
+            slot = self.slots.get(name)
+
+            if item is None:
+                if slot is not None:
+                    del self.slots[name]
+                    self.prices[slot] = 0
+                    self.quantities[slot] = 0
+                    self.line_keys[slot] = 0
+                    self.__free_slots.append(slot)
+                    removed_names.append(name)
+                continue
+
+            old_quantity = None
+
+            if slot is None:
+                slot = self.__new_slot()
+                self.slots[name] = slot
+                added_names.append(name)
+            else:
+                old_quantity = self.quantities[slot]
+
+            self.prices[slot] = price_to_cents(item[0])
+            self.quantities[slot] = item[1]
+            self.line_keys[slot] = 0
+
+            if item[1] != old_quantity:
+                changed_quantities.append((name, slot, item[1]))
+
+        for listener in self.listeners:
+            listener.items_updated(added_names, removed_names)
+
+            for name, slot, quantity in changed_quantities:
+                listener.quantity_changed(name, slot, quantity)
+
+    def add_quantity(self, name, amount):
+        """Adds to the quantity of a stored item.
+
+        Args:
+            name (string): Item name.
+
+            amount (int): Quantity added, negative to remove stock.
+
+        Return:
+            quantity (int): New quantity of the item.
+        """
+
+        slot = self.slots[name]
+        self.quantities[slot] += amount
+        self.line_keys[slot] = 0
+
+        for listener in self.listeners:
+            listener.quantity_changed(name, slot, self.quantities[slot])
+
+        return self.quantities[slot]
+
+    def remove(self, name):
+        """Removes an item and frees its slot.
+
+        Args:
+            name (string): Item name.
+        """
+
+        slot = self.slots.pop(name)
+        self.prices[slot] = 0
+        self.quantities[slot] = 0
+        self.line_keys[slot] = 0
+        self.__free_slots.append(slot)
+
+        for listener in self.listeners:
+            listener.item_removed(name, slot)
+
+    def retain(self, kept_slots):
+        """Removes every item whose slot is not marked, used after loading a
+        new copy of the inventory over the current one.
+
+        Args:
+            kept_slots (bytearray): Non-zero at the slot of each item kept,
+                                    slots past its end are removed.
+        """
+
+        removed_names = [name for name, slot in self.slots.items()
+                         if slot >= len(kept_slots) or not kept_slots[slot]]
+
+        for name in removed_names:
+            self.remove(name)
+
+    def load_columns(self, names, prices, quantities):
+        """Replaces every item with columns loaded in bulk, such as from the
+        startup cache. Slots follow the order of the names.
+
+        Args:
+            names (list): Item names.
+
+            prices (array): Price in cents of each name.
+
+            quantities (array): Quantity of each name.
+        """
+
+        self.clear()
+
+        self.slots.update(zip(names, range(len(names))))
+        self.prices = prices
+        self.quantities = quantities
+        self.line_keys = array.array(LINE_KEY_COLUMN_TYPE,
+                                     bytes(8 * len(names)))
+
+        for listener in self.listeners:
+            for name, slot in self.slots.items():
+                listener.item_added(name, slot)
+                listener.quantity_changed(name, slot, quantities[slot])
+
+    def clear(self):
+        """Removes every item and releases the columns."""
+
+        # Cleared in place, listeners may hold on to the name index
+        self.slots.clear()
+        self.prices = array.array(PRICE_COLUMN_TYPE)
+        self.quantities = array.array(QUANTITY_COLUMN_TYPE)
+        self.line_keys = array.array(LINE_KEY_COLUMN_TYPE)
+        self.__free_slots = list()
+
+        for listener in self.listeners:
+            listener.items_cleared()
+
+    def __new_slot(self):
+        """Takes a free slot, or adds one at the end of the columns.
+
+        Return:
+            slot (int): Empty slot.
+        """
+
+        if len(self.__free_slots) > 0:
+            return self.__free_slots.pop()
+
+        self.prices.append(0)
+        self.quantities.append(0)
+        self.line_keys.append(0)
+
+        return len(self.prices) - 1
+
+    def iter_items(self):
+        """Iterates the stored items in the order they were added.
+
+        Return:
+            item (tuple): Name, price in dollars and quantity of each item.
+        """
+
+        prices = self.prices
+        quantities = self.quantities
+
+        for name, slot in self.slots.items():
+            yield name, prices[slot] / 100, quantities[slot]
+
+    def quantity_column(self):
+        """Returns the quantity of every slot without copying, as a NumPy
+        array when NumPy is installed. Free slots hold 0.
+
+        Return:
+            quantities (array): Quantity column indexed by slot.
+        """
+
+        if numpy is not None and len(self.quantities) > 0:
+            return numpy.frombuffer(self.quantities, dtype=numpy.int64)
+
+        return self.quantities
+
+
+class ItemInventoryView(collections.abc.MutableMapping):
+    """Dictionary-like view of an ItemStore keyed by (name, price), standing
+    in for the old Inventory.inventory dictionary.
+
+    Attributes:
+        store (ItemStore): Store holding the items.
+    """
+
+    def __init__(self, store):
+        """Initializes view on a store.
+
+        Args:
+            store (ItemStore): Store holding the items.
+        """
+
+        self.store = store
+
+    def __getitem__(self, name_and_price):
+        """Looks up the quantity of an item with the given price."""
+
+        item = self.store.lookup(name_and_price[0])
+
+        if item is None or item[0] != name_and_price[1]:
+            raise KeyError(name_and_price)
+
+        return item[1]
+
+    def __setitem__(self, name_and_price, quantity):
+        """Sets the price and quantity of an item, adding it if new."""
+
+        self.store.set_item(name_and_price[0], name_and_price[1], quantity)
+
+    def __delitem__(self, name_and_price):
+        """Removes an item."""
+
+        if name_and_price not in self:
+            raise KeyError(name_and_price)
+
+        self.store.remove(name_and_price[0])
+
+    def __iter__(self):
+        """Iterates (name, price) pairs in the order items were added."""
+
+        for name, price, quantity in self.store.iter_items():
+            yield name, price
+
+    def __len__(self):
+        """Counts the items."""
+
+        return len(self.store)
+
+    def items(self):
+        """Iterates ((name, price), quantity) pairs in one pass."""
+
+        for name, price, quantity in self.store.iter_items():
+            yield (name, price), quantity
+
+    def clear(self):
+        """Removes every item at once."""
+
+        self.store.clear()
+
+
+class ItemPriceView(collections.abc.MutableMapping):
+    """Dictionary-like view of item prices keyed by name, standing in for
+    the old Inventory.item_price_lookup dictionary.
+
+    Attributes:
+        store (ItemStore): Store holding the items.
+    """
+
+    def __init__(self, store):
+        """Initializes view on a store.
+
+        Args:
+            store (ItemStore): Store holding the items.
+        """
+
+        self.store = store
+
+    def __getitem__(self, name):
+        """Looks up the price of an item."""
+
+        item = self.store.lookup(name)
+
+        if item is None:
+            raise KeyError(name)
+
+        return item[0]
+
+    def __setitem__(self, name, price):
+        """Changes the price of an item, adding it out of stock if new."""
+
+        item = self.store.lookup(name)
+        quantity = 0 if item is None else item[1]
+        self.store.set_item(name, price, quantity)
+
+    def __delitem__(self, name):
+        """Removes an item."""
+
+        self.store.remove(name)
+
+    def __contains__(self, name):
+        """Checks if an item is stored without reading its price."""
+
+        return name in self.store
+
+    def __iter__(self):
+        """Iterates item names in the order items were added."""
+
+        for name, price, quantity in self.store.iter_items():
+            yield name
+
+    def __len__(self):
+        """Counts the items."""
+
+        return len(self.store)
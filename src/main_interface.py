@@ -8,18 +8,171 @@ Description of File: This python file is meant to serve as the user's
                      run through this file.
 """
 
+import time
+
+# Taken before the other imports, so --profile-startup can time them
+STARTUP_TIME = time.perf_counter()
+
+import argparse
+
 import main_menu
-import inventory_manager
 import create_order_interface
+import group_commit
+import inventory_client
+import inventory_listing
+import metrics
+import order_index
+import order_writer
+import reorder_index
+import reservation_ledger
+import storage_backends
+
+IMPORTS_DONE_TIME = time.perf_counter()
+
+
+def print_startup_profile(phases, stock):
+    """Prints how long each part of startup took.
+
+    Args:
+        phases (list): Name and seconds of each startup phase.
+
+        stock (Inventory): Inventory loaded during startup.
+    """
+
+    print("")
+    print("Startup profile:")
+    for phase_name, seconds in phases:
+        print(f"  {phase_name: <18} {seconds * 1000: >9.1f} ms")
+    print(f"  {'total': <18} "
+          f"{(time.perf_counter() - STARTUP_TIME) * 1000: >9.1f} ms")
+
+    if stock.backend is None:
+        if stock.lines_reparsed == 0:
+            print("  inventory loaded from the startup cache")
+        else:
+            print(f"  inventory parsed from {stock.lines_reparsed} lines, "
+                  f"startup cache rebuilt")
+    print("")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--storage", choices=storage_backends.STORAGE_TYPES,
+                        default="text")
+    parser.add_argument("--durability", choices=["strict", "group"],
+                        default="strict",
+                        help="sync each order file alone or in groups")
+    parser.add_argument("--group-window-ms", type=float, default=1.0)
+    parser.add_argument("--group-size", type=int, default=64)
+    parser.add_argument("--order-writers", type=int,
+                        help="threads writing order files, 0 to write "
+                             "them before returning to the menu, defaults "
+                             "to 2 with strict durability")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record timings and counters to FILE")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"],
+                        default="json")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="seconds between metrics writes, 0 to write "
+                             "only on exit")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="attribute allocations to each timed phase")
+    parser.add_argument("--reorder-point", type=int,
+                        help="reorder point of items not listed in "
+                             "reorder_points.txt")
+    parser.add_argument("--page-size", type=int,
+                        default=inventory_listing.DEFAULT_PAGE_SIZE,
+                        help="items per inventory page, 0 to list every "
+                             "item at once")
+    parser.add_argument("--hold-ttl", type=float,
+                        default=reservation_ledger.DEFAULT_HOLD_TTL,
+                        help="seconds items in a cart stay held for it "
+                             "after the cart last changed")
+    parser.add_argument("--server", metavar="HOST:PORT",
+                        help="use the inventory of inventory_server.py "
+                             "instead of the local files")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long imports, loading and the "
+                             "first render took")
+    args = parser.parse_args()
+
+    # Order writers sync each order themselves, a group would never be used
+    if args.order_writers is None:
+        args.order_writers = 0 if args.durability == "group" else 2
+    elif args.order_writers > 0 and args.durability == "group":
+        parser.error("--durability group needs --order-writers 0")
+
+    # Thin client, the server owns the inventory and order files
+    if args.server:
+        try:
+            client = inventory_client.InventoryClient(
+                *inventory_client.parse_server_address(args.server))
+        except (ValueError, inventory_client.ServerError) as error:
+            parser.exit(1, f"{error}\n")
+
+        inventory_client.run_menu(client, args.page_size)
+        parser.exit()
+
+    if args.metrics:
+        metrics.registry.enable(trace_memory=args.trace_memory)
+        if args.metrics_interval > 0:
+            metrics.registry.start_periodic_export(args.metrics,
+                                                   args.metrics_interval,
+                                                   args.metrics_format)
+
+    startup_phases = [("imports", IMPORTS_DONE_TIME - STARTUP_TIME)]
+
     # Initial Setup
+    phase_start = time.perf_counter()
     main_menu.print_title_info()
     main_menu.print_main_menu()
+    startup_phases.append(("first render", time.perf_counter() - phase_start))
 
     # Load in current inventory
-    stock = inventory_manager.Inventory()
+    phase_start = time.perf_counter()
+    stock = storage_backends.open_inventory(args.storage, args.hold_ttl)
+    startup_phases.append(("inventory load",
+                           time.perf_counter() - phase_start))
+
+    if len(stock.malformed_rows) > 0:
+        first_row = stock.malformed_rows[0]
+        print(f"Skipped {len(stock.malformed_rows)} malformed lines in "
+              f"inventory.txt, first on line {first_row['line']}: "
+              f"{first_row['error']}")
+
+    # Items already at their reorder point are found once, orders then
+    # only check the items they touch
+    phase_start = time.perf_counter()
+    low_stock = stock.reorder_index(args.reorder_point)
+    low_stock_count = len(low_stock.low_stock_items())
+    if low_stock_count > 0:
+        print(f"{low_stock_count} items are at or below their reorder point")
+    startup_phases.append(("reorder index",
+                           time.perf_counter() - phase_start))
+
+    # Order index is built from existing order files on the first run
+    phase_start = time.perf_counter()
+    if stock.backend is None:
+        indexed_count = order_index.open_index().ensure_built()
+        if indexed_count:
+            print(f"Indexed {indexed_count} existing orders")
+    startup_phases.append(("order index", time.perf_counter() - phase_start))
+
+    if args.profile_startup:
+        print_startup_profile(startup_phases, stock)
+
+    # Order files share their fsync with orders placed at the same time
+    order_group = None
+    if args.durability == "group":
+        order_group = group_commit.GroupCommit(args.group_window_ms / 1000,
+                                               args.group_size,
+                                               stock.backend)
+
+    # SQLite connections only work on the thread that opened them, so
+    # storage backends keep saving orders right away
+    background_writer = None
+    if args.order_writers > 0 and stock.backend is None:
+        background_writer = order_writer.OrderWriter(args.order_writers)
 
     # Enable menu
     while True:
@@ -48,7 +201,10 @@ if __name__ == '__main__':
         if select_option == main_menu.MenuOptions.OPTION_DICT[1]:
             main_menu.print_main_menu()
         elif select_option == main_menu.MenuOptions.OPTION_DICT[2]:
-            stock.print_current_inventory()
+            if args.page_size > 0:
+                inventory_listing.browse_inventory(stock, args.page_size)
+            else:
+                stock.print_current_inventory()
         elif select_option == main_menu.MenuOptions.OPTION_DICT[3]:
             # Prompt for customer info
             print("")
@@ -63,10 +219,32 @@ if __name__ == '__main__':
             # Ask user what they want to order
             create_order_interface.create_order(stock,
                                                 customer_first_name,
-                                                customer_last_name)
+                                                customer_last_name,
+                                                order_group,
+                                                background_writer)
             # Refresh inventory after changes
             stock.refresh_inventory()
+
+            for alert in low_stock.take_alerts():
+                print(reorder_index.format_alert(alert))
         elif select_option == main_menu.MenuOptions.OPTION_DICT[4]:
+            # Finish writing queued order files
+            if background_writer is not None:
+                background_writer.close()
+
+                if len(background_writer.failed_orders) > 0:
+                    print(f"{len(background_writer.failed_orders)} order "
+                          f"files could not be written "
+                          f"({background_writer.errors[0]}), they are "
+                          f"written again on the next start")
+
+            # Fold journaled changes back into inventory.txt
+            stock.compact_inventory()
+
+            if args.metrics:
+                metrics.registry.stop_periodic_export()
+                metrics.registry.write(args.metrics, args.metrics_format)
+
             print("")
             print("Successfully exited application.")
             break
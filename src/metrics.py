@@ -0,0 +1,459 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file keeps counters and timing histograms
+                     for the inventory and order code paths, so a slow
+                     checkout can be traced to parsing, rewriting files,
+                     scanning orders or fsync. Nothing is recorded until
+                     enable() is called, and the metrics can be written as
+                     JSON or as a Prometheus text file.
+"""
+
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Upper bounds in seconds of the timing histogram buckets
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0,
+                   5.0)
+
+# Prefix of every metric in the Prometheus text file
+PROMETHEUS_PREFIX = "fims_"
+
+
+class Histogram:
+    """Counts observed values per bucket, Prometheus style.
+
+    Attributes:
+        bounds (tuple): Upper bound of each bucket.
+
+        bucket_counts (list): Values observed per bucket, the last bucket
+                              holds values above every bound.
+
+        count (int): Values observed.
+
+        total (float): Sum of observed values.
+
+        minimum (float): Smallest observed value.
+
+        maximum (float): Largest observed value.
+
+    Methods:
+        __init__(bounds): Initializes empty buckets.
+
+        observe(value): Adds a value.
+
+        to_dict(): Returns the histogram as a dictionary.
+    """
+
+    def __init__(self, bounds=DEFAULT_BUCKETS):
+        """Initializes empty buckets.
+
+        Args:
+            bounds (tuple): Upper bound of each bucket, in increasing order.
+        """
+
+        self.bounds = tuple(bounds)
+        self.bucket_counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def observe(self, value):
+        """Adds a value to its bucket.
+
+        Args:
+            value (float): Observed value.
+        """
+
+        bucket_index = len(self.bounds)
+        for bound_index, bound in enumerate(self.bounds):
+            if value <= bound:
+                bucket_index = bound_index
+                break
+
+        self.bucket_counts[bucket_index] += 1
+        self.count += 1
+        self.total += value
+
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def to_dict(self):
+        """Returns the histogram as a dictionary.
+
+        Return:
+            histogram (dictionary): Count, sum, min, max, mean and buckets.
+        """
+
+        mean = self.total / self.count if self.count else 0.0
+        buckets = dict()
+        for bound, bucket_count in zip(self.bounds + ("+Inf",),
+                                       self.bucket_counts):
+            buckets[str(bound)] = bucket_count
+
+        return {"count": self.count,
+                "sum": self.total,
+                "min": self.minimum,
+                "max": self.maximum,
+                "mean": mean,
+                "buckets": buckets}
+
+
+class Timer:
+    """Context manager that records the time of a with block in the
+    histogram <name>_seconds. When memory tracing is on, memory allocated
+    inside the block is added to the counter <name>_allocated_bytes.
+
+    Methods:
+        __init__(registry, name): Initializes a timer for a phase.
+
+        __enter__(): Starts timing.
+
+        __exit__(exc_type, exc_value, traceback): Records the time.
+    """
+
+    def __init__(self, registry, name):
+        """Initializes a timer for a phase.
+
+        Args:
+            registry (MetricsRegistry): Registry the time is recorded in.
+
+            name (string): Name of the phase.
+        """
+
+        self.__registry = registry
+        self.__name = name
+        self.__start_time = 0.0
+        self.__start_bytes = None
+
+    def __enter__(self):
+        """Starts timing."""
+
+        if self.__registry.trace_memory and tracemalloc.is_tracing():
+            self.__start_bytes = tracemalloc.get_traced_memory()[0]
+
+        self.__start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Records the time of the block."""
+
+        elapsed = time.perf_counter() - self.__start_time
+        self.__registry.observe(self.__name + "_seconds", elapsed)
+
+        if self.__start_bytes is not None:
+            allocated = (tracemalloc.get_traced_memory()[0]
+                         - self.__start_bytes)
+            self.__registry.increment(self.__name + "_allocated_bytes",
+                                      max(0, allocated))
+
+
+class NoOpTimer:
+    """Timer handed out while metrics are disabled, does nothing."""
+
+    def __enter__(self):
+        """Does nothing."""
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Does nothing."""
+
+        return None
+
+
+NO_OP_TIMER = NoOpTimer()
+
+
+class MetricsRegistry:
+    """Holds every counter and histogram of the process.
+
+    Attributes:
+        enabled (bool): Determines if anything is recorded.
+
+        trace_memory (bool): Determines if timers attribute memory
+                             allocations to their phase with tracemalloc.
+
+        counters (dictionary): Value of each counter.
+
+        histograms (dictionary): Histogram of each timed phase.
+
+    Methods:
+        enable(trace_memory): Starts recording.
+
+        disable(): Stops recording.
+
+        reset(): Forgets every recorded value.
+
+        increment(name, amount): Adds to a counter.
+
+        observe(name, value): Adds a value to a histogram.
+
+        timer(name): Returns a context manager timing a phase.
+
+        snapshot(): Returns every metric as a dictionary.
+
+        to_prometheus(): Returns every metric in Prometheus text format.
+
+        write(file_path, file_format): Writes the metrics to a file.
+
+        start_periodic_export(file_path, interval_seconds,
+                              file_format): Writes the metrics every
+                                            interval_seconds.
+
+        stop_periodic_export(): Stops the periodic export.
+    """
+
+    def __init__(self):
+        """Initializes a disabled, empty registry."""
+
+        self.enabled = False
+        self.trace_memory = False
+        self.counters = dict()
+        self.histograms = dict()
+
+        self.__lock = threading.Lock()
+        self.__export_thread = None
+        self.__export_stop = threading.Event()
+
+    def enable(self, trace_memory=False):
+        """Starts recording metrics.
+
+        Args:
+            trace_memory (bool): Determines if tracemalloc is started to
+                                 attribute allocations to each phase.
+        """
+
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self.enabled = True
+
+    def disable(self):
+        """Stops recording metrics, recorded values are kept."""
+
+        self.enabled = False
+
+    def reset(self):
+        """Forgets every recorded value."""
+
+        with self.__lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def increment(self, name, amount=1):
+        """Adds to a counter.
+
+        Args:
+            name (string): Name of the counter.
+
+            amount (int): Amount added.
+        """
+
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, value):
+        """Adds a value to a histogram.
+
+        Args:
+            name (string): Name of the histogram.
+
+            value (float): Observed value.
+        """
+
+        if not self.enabled:
+            return
+
+        with self.__lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+
+    def timer(self, name):
+        """Returns a context manager timing a phase.
+
+        Args:
+            name (string): Name of the phase, Ex: inventory_refresh.
+
+        Return:
+            timer (Timer): Timer, or a shared no-op timer while disabled.
+        """
+
+        if not self.enabled:
+            return NO_OP_TIMER
+
+        return Timer(self, name)
+
+    def snapshot(self):
+        """Returns every metric as a dictionary.
+
+        Return:
+            snapshot (dictionary): Time taken plus counters and histograms.
+        """
+
+        with self.__lock:
+            return {"timestamp": time.time(),
+                    "counters": dict(self.counters),
+                    "histograms": {name: self.histograms[name].to_dict()
+                                   for name in self.histograms}}
+
+    def to_prometheus(self):
+        """Returns every metric in the Prometheus text exposition format.
+
+        Return:
+            metrics_text (string): One line per counter and bucket.
+        """
+
+        lines = list()
+
+        with self.__lock:
+            for name in sorted(self.counters):
+                metric_name = PROMETHEUS_PREFIX + name
+                lines.append(f"# TYPE {metric_name} counter")
+                lines.append(f"{metric_name} {self.counters[name]}")
+
+            for name in sorted(self.histograms):
+                histogram = self.histograms[name]
+                metric_name = PROMETHEUS_PREFIX + name
+                lines.append(f"# TYPE {metric_name} histogram")
+
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds + ("+Inf",),
+                                               histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric_name}_bucket{{le="{bound}"}} '
+                                 f'{cumulative}')
+
+                lines.append(f"{metric_name}_sum {histogram.total}")
+                lines.append(f"{metric_name}_count {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_path, file_format="json"):
+        """Writes the metrics to a file. A temporary file is renamed over the
+        old one, so readers never see a half written file.
+
+        Args:
+            file_path (string): Location of the metrics file.
+
+            file_format (string): "json" or "prometheus".
+        """
+
+        if file_format == "prometheus":
+            metrics_text = self.to_prometheus()
+        else:
+            metrics_text = json.dumps(self.snapshot(), indent=2) + "\n"
+
+        dir_path = os.path.dirname(os.path.abspath(file_path))
+        temp_fd, temp_file_path = tempfile.mkstemp(dir=dir_path,
+                                                   suffix=".tmp")
+
+        with os.fdopen(temp_fd, "w") as metrics_file:
+            metrics_file.write(metrics_text)
+
+        os.replace(temp_file_path, file_path)
+
+    def start_periodic_export(self, file_path, interval_seconds=10.0,
+                              file_format="json"):
+        """Writes the metrics every interval_seconds on a background thread.
+
+        Args:
+            file_path (string): Location of the metrics file.
+
+            interval_seconds (float): Time between writes.
+
+            file_format (string): "json" or "prometheus".
+        """
+
+        self.stop_periodic_export()
+        self.__export_stop.clear()
+
+        def export_loop():
+            while not self.__export_stop.wait(interval_seconds):
+                self.write(file_path, file_format)
+
+        self.__export_thread = threading.Thread(target=export_loop,
+                                                daemon=True)
+        self.__export_thread.start()
+
+    def stop_periodic_export(self):
+        """Stops the periodic export started by start_periodic_export()."""
+
+        if self.__export_thread is None:
+            return
+
+        self.__export_stop.set()
+        self.__export_thread.join()
+        self.__export_thread = None
+
+
+# Registry shared by every module of the process
+registry = MetricsRegistry()
+
+
+def increment(name, amount=1):
+    """Adds to a counter of the shared registry.
+
+    Args:
+        name (string): Name of the counter.
+
+        amount (int): Amount added.
+    """
+
+    if registry.enabled:
+        registry.increment(name, amount)
+
+
+def timer(name):
+    """Returns a context manager timing a phase in the shared registry.
+
+    Args:
+        name (string): Name of the phase, Ex: inventory_refresh.
+
+    Return:
+        timer (Timer): Timer, or a shared no-op timer while disabled.
+    """
+
+    if not registry.enabled:
+        return NO_OP_TIMER
+
+    return Timer(registry, name)
+
+
+def timed(name):
+    """Decorator timing every call of a function in the shared registry.
+
+    Args:
+        name (string): Name of the phase, Ex: inventory_refresh.
+
+    Return:
+        decorator (function): Wraps a function with timer(name).
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return function(*args, **kwargs)
+
+            with Timer(registry, name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,980 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the MmapBackend class, a storage
+                     backend that keeps the inventory in a fixed-width binary
+                     file opened with mmap, so startup does not depend on the
+                     catalog size and a checkout only writes the quantities
+                     of the items ordered.
+
+Usage: python mmap_backend.py import|export inventory.txt
+"""
+
+import collections.abc
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import catalog_importer
+import customer_order
+import file_lock
+import inventory_manager
+import item_store
+import order_paths
+import order_sequence
+
+BINARY_FILE_NAME = "inventory.bin"
+INDEX_FILE_NAME = "inventory.idx"
+
+# Header: magic, record count, record capacity, version
+HEADER_FORMAT = "<8sqqq"
+HEADER_SIZE = 64
+BINARY_MAGIC = b"FIMSINV1"
+
+# Record: name (NUL padded), price in cents, quantity
+NAME_SIZE = 48
+RECORD_FORMAT = f"<{NAME_SIZE}sqq"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+QUANTITY_OFFSET = NAME_SIZE + 8
+
+# Index: magic and slot count, followed by one record number + 1 per slot
+INDEX_HEADER_FORMAT = "<8sq"
+INDEX_HEADER_SIZE = 16
+INDEX_MAGIC = b"FIMSIDX1"
+SLOT_FORMAT = "<Q"
+SLOT_SIZE = 8
+EMPTY_SLOT = 0
+DELETED_SLOT = 2 ** 64 - 1
+
+# Slots kept per record, the index is rebuilt when it gets fuller
+MAX_LOAD_FACTOR = 0.7
+
+# Redo record written before a checkout touches the mapped file:
+# count, then (file offset, new quantity) pairs, then a checksum
+REDO_FILE_SUFFIX = ".redo"
+
+
+def encode_name(name):
+    """Encodes an item name into its fixed-width field.
+
+    Args:
+        name (string): Item name.
+
+    Return:
+        encoded_name (bytes): UTF-8 name, at most NAME_SIZE bytes.
+    """
+
+    encoded_name = name.encode()
+
+    if len(encoded_name) > NAME_SIZE or len(encoded_name) == 0:
+        raise ValueError(f'Item name "{name}" must be 1 to {NAME_SIZE} bytes.')
+
+    return encoded_name
+
+
+def name_slot(encoded_name, slot_count):
+    """Finds the first index slot to probe for an item name.
+
+    Args:
+        encoded_name (bytes): Encoded item name.
+
+        slot_count (int): Amount of slots, a power of two.
+
+    Return:
+        slot (int): First slot to probe.
+    """
+
+    return zlib.crc32(encoded_name) & (slot_count - 1)
+
+
+def index_slot_count(record_count):
+    """Picks an index size that keeps the load factor at one half or less,
+    well below MAX_LOAD_FACTOR, so new records fit before a rebuild.
+
+    Args:
+        record_count (int): Amount of records to index.
+
+    Return:
+        slot_count (int): Amount of slots, a power of two.
+    """
+
+    slot_count = 16
+    while slot_count < record_count * 2:
+        slot_count *= 2
+
+    return slot_count
+
+
+def write_index(index_file_path, names, slot_count=None):
+    """Builds a new index file for the given record names.
+
+    Args:
+        index_file_path (string): Location of the index file.
+
+        names (iterable): Encoded name of every record in order, None for
+                          deleted records.
+
+        slot_count (int): Amount of slots, picked from the names if None.
+    """
+
+    names = list(names)
+    if slot_count is None:
+        slot_count = index_slot_count(len(names))
+
+    slots = bytearray(slot_count * SLOT_SIZE)
+    mask = slot_count - 1
+
+    for record_number, encoded_name in enumerate(names):
+        if encoded_name is None:
+            continue
+
+        slot = name_slot(encoded_name, slot_count)
+        while struct.unpack_from(SLOT_FORMAT, slots,
+                                 slot * SLOT_SIZE)[0] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+
+        struct.pack_into(SLOT_FORMAT, slots, slot * SLOT_SIZE,
+                         record_number + 1)
+
+    temp_file_path = index_file_path + ".tmp"
+
+    with open(temp_file_path, "wb") as index_file:
+        index_file.write(struct.pack(INDEX_HEADER_FORMAT, INDEX_MAGIC,
+                                     slot_count))
+        index_file.write(slots)
+        index_file.flush()
+        os.fsync(index_file.fileno())
+
+    os.replace(temp_file_path, index_file_path)
+
+
+def convert_text_to_binary(inventory_file_path, binary_file_path=None,
+                           index_file_path=None, report=None):
+    """Converts inventory.txt into the binary record and index files.
+
+    Args:
+        inventory_file_path (string): Location of inventory.txt.
+
+        binary_file_path (string): Location of the record file.
+
+        index_file_path (string): Location of the index file.
+
+        report (dictionary): Receives the malformed lines skipped, see
+                             catalog_importer.read_catalog().
+
+    Return:
+        record_count (int): Amount of items converted.
+    """
+
+    cwd = os.getcwd()
+    if binary_file_path is None:
+        binary_file_path = os.path.join(cwd, BINARY_FILE_NAME)
+    if index_file_path is None:
+        index_file_path = os.path.join(cwd, INDEX_FILE_NAME)
+
+    record_numbers = dict()
+    names = list()
+    temp_file_path = binary_file_path + ".tmp"
+
+    if report is None:
+        report = dict()
+
+    with open(temp_file_path, "wb") as binary_file:
+        binary_file.write(bytes(HEADER_SIZE))
+
+        for item_name, item_price, quantity in catalog_importer.read_catalog(
+                inventory_file_path, "text", report=report):
+            try:
+                encoded_name = encode_name(item_name)
+            except ValueError as error:
+                report["malformed"].append({"line": None,
+                                            "error": str(error),
+                                            "text": item_name})
+                continue
+
+            price_cents = item_store.price_to_cents(item_price)
+
+            record = struct.pack(RECORD_FORMAT, encoded_name, price_cents,
+                                 quantity)
+
+            # A repeated name replaces the earlier line, like Inventory does
+            if encoded_name in record_numbers:
+                binary_file.seek(HEADER_SIZE + record_numbers[encoded_name]
+                                 * RECORD_SIZE)
+                binary_file.write(record)
+                binary_file.seek(0, os.SEEK_END)
+                continue
+
+            record_numbers[encoded_name] = len(names)
+            names.append(encoded_name)
+            binary_file.write(record)
+
+        binary_file.seek(0)
+        binary_file.write(struct.pack(HEADER_FORMAT, BINARY_MAGIC, len(names),
+                                      len(names), 1))
+        binary_file.flush()
+        os.fsync(binary_file.fileno())
+
+    write_index(index_file_path, names)
+    os.replace(temp_file_path, binary_file_path)
+
+    return len(names)
+
+
+def convert_binary_to_text(inventory_file_path, binary_file_path=None):
+    """Writes the binary records back out in the inventory.txt format.
+
+    Args:
+        inventory_file_path (string): Location to write inventory.txt to.
+
+        binary_file_path (string): Location of the record file.
+
+    Return:
+        record_count (int): Amount of items written.
+    """
+
+    backend = MmapBackend(binary_file_path)
+    record_count = 0
+
+    try:
+        with open(inventory_file_path, "w") as inventory_file:
+            for name_and_price, quantity in backend.inventory_view().items():
+                inventory_file.write(f"{name_and_price[0]}, "
+                                     f"{name_and_price[1]}, {quantity}\n")
+                record_count += 1
+    finally:
+        backend.close()
+
+    return record_count
+
+
+class MmapInventoryView(collections.abc.MutableMapping):
+    """Dictionary-like view of the mapped records keyed by (name, price),
+    standing in for Inventory.inventory.
+
+    Attributes:
+        backend (MmapBackend): Backend holding the mapped files.
+    """
+
+    def __init__(self, backend):
+        """Initializes view on a backend.
+
+        Args:
+            backend (MmapBackend): Backend holding the mapped files.
+        """
+
+        self.backend = backend
+
+    def __getitem__(self, name_and_price):
+        """Looks up the quantity of an item through the index."""
+
+        record = self.backend.read_record(name_and_price[0])
+
+        if record is None or record[1] != name_and_price[1]:
+            raise KeyError(name_and_price)
+
+        return record[2]
+
+    def __setitem__(self, name_and_price, quantity):
+        """Sets the quantity of an item in place, adding it if new."""
+
+        self.backend.write_record(name_and_price[0], name_and_price[1],
+                                  quantity)
+
+    def __delitem__(self, name_and_price):
+        """Removes an item."""
+
+        if name_and_price not in self:
+            raise KeyError(name_and_price)
+
+        self.backend.delete_record(name_and_price[0])
+
+    def __iter__(self):
+        """Iterates (name, price) pairs in record order."""
+
+        for name, price, quantity in self.backend.iter_records():
+            yield name, price
+
+    def __len__(self):
+        """Counts the items."""
+
+        return self.backend.live_count()
+
+    def items(self):
+        """Iterates ((name, price), quantity) pairs in one pass."""
+
+        for name, price, quantity in self.backend.iter_records():
+            yield (name, price), quantity
+
+
+class MmapPriceView(collections.abc.Mapping):
+    """Dictionary-like view of item prices keyed by name, standing in for
+    Inventory.item_price_lookup.
+
+    Attributes:
+        backend (MmapBackend): Backend holding the mapped files.
+    """
+
+    def __init__(self, backend):
+        """Initializes view on a backend.
+
+        Args:
+            backend (MmapBackend): Backend holding the mapped files.
+        """
+
+        self.backend = backend
+
+    def __getitem__(self, name):
+        """Looks up the price of an item through the index."""
+
+        record = self.backend.read_record(name)
+
+        if record is None:
+            raise KeyError(name)
+
+        return record[1]
+
+    def __iter__(self):
+        """Iterates item names in record order."""
+
+        for name, price, quantity in self.backend.iter_records():
+            yield name
+
+    def __len__(self):
+        """Counts the items."""
+
+        return self.backend.live_count()
+
+
+class MmapBackend:
+    """Keeps the inventory in fixed-width records of a memory-mapped file with
+    an on-disk hash index from name to record. Opening maps both files
+    without reading them, and a checkout overwrites only the quantity field
+    of each record it touches. Orders are still written as text files.
+
+    Attributes:
+        binary_file_path (string): Location of the record file.
+
+        index_file_path (string): Location of the index file.
+
+    Methods:
+        __init__(binary_file_path, index_file_path): Maps the files.
+
+        inventory_view(): Returns a view standing in for Inventory.inventory.
+
+        price_view(): Returns a view standing in for
+                      Inventory.item_price_lookup.
+
+        version(): Returns the number of changes made to inventory.
+
+        read_record(name): Returns (name, price, quantity) of an item.
+
+        iter_records(): Yields (name, price, quantity) of every item.
+
+        live_count(): Returns the amount of items not deleted.
+
+        write_record(name, price, quantity): Sets or adds an item.
+
+        delete_record(name): Removes an item.
+
+        checkout(cart, order_id): Removes an order if all of it is in stock.
+
+        modify(cart, order_id): Removes an order without checking stock.
+
+        allocate_order_numbers(count): Reserves consecutive order numbers.
+
+        release_order_numbers(first_number, count): Gives back unused order
+                                                    numbers.
+
+        save_orders(orders): Writes the order files.
+
+        order_location(order_id): Returns the path of an order file.
+
+        close(): Unmaps the files.
+    """
+
+    def __init__(self, binary_file_path=None, index_file_path=None):
+        """Maps the record and index files, replaying an interrupted
+        checkout first.
+
+        Args:
+            binary_file_path (string): Location of the record file, defaults
+                                       to inventory.bin in the current
+                                       working directory.
+
+            index_file_path (string): Location of the index file, defaults to
+                                      inventory.idx next to the records.
+        """
+
+        cwd = os.getcwd()
+        if binary_file_path is None:
+            binary_file_path = os.path.join(cwd, BINARY_FILE_NAME)
+        if index_file_path is None:
+            index_file_path = os.path.join(os.path.dirname(binary_file_path),
+                                           INDEX_FILE_NAME)
+
+        self.binary_file_path = binary_file_path
+        self.index_file_path = index_file_path
+        self.__binary_map = None
+        self.__index_map = None
+        self.__deleted_count = None
+
+        with self.__lock():
+            self.__open_maps()
+            self.__replay_redo()
+
+    def inventory_view(self):
+        """Creates a view of the records keyed by (name, price).
+
+        Return:
+            view (MmapInventoryView): Stand in for Inventory.inventory.
+        """
+
+        return MmapInventoryView(self)
+
+    def price_view(self):
+        """Creates a view of item prices keyed by name.
+
+        Return:
+            view (MmapPriceView): Stand in for Inventory.item_price_lookup.
+        """
+
+        return MmapPriceView(self)
+
+    def version(self):
+        """Reads the inventory version from the header.
+
+        Return:
+            version (int): Number of changes made to inventory.
+        """
+
+        self.__remap_if_grown()
+        return struct.unpack_from(HEADER_FORMAT, self.__binary_map, 0)[3]
+
+    def read_record(self, name):
+        """Looks up an item through the index.
+
+        Args:
+            name (string): Item name.
+
+        Return:
+            record (tuple): (name, price, quantity), None if not found.
+        """
+
+        self.__remap_if_grown()
+        record_number = self.__find(name.encode())[1]
+
+        if record_number is None:
+            return None
+
+        return self.__unpack_record(record_number)
+
+    def iter_records(self):
+        """Yields every item in record order.
+
+        Return:
+            record (tuple): (name, price, quantity) of each item.
+        """
+
+        self.__remap_if_grown()
+
+        for record_number in range(self.__record_count()):
+            record = self.__unpack_record(record_number)
+            if record is not None:
+                yield record
+
+    def live_count(self):
+        """Counts items that are not deleted.
+
+        Return:
+            item_count (int): Amount of items.
+        """
+
+        self.__remap_if_grown()
+
+        # Deleted records are rare, count them once per mapping
+        if self.__deleted_count is None:
+            self.__deleted_count = sum(
+                1 for record_number in range(self.__record_count())
+                if self.__binary_map[self.__record_offset(record_number)] == 0)
+
+        return self.__record_count() - self.__deleted_count
+
+    def write_record(self, name, price, quantity):
+        """Sets the price and quantity of an item, appending a new record if
+        the item does not exist yet.
+
+        Args:
+            name (string): Item name.
+
+            price (float): Item price in dollars.
+
+            quantity (int): Item quantity.
+
+        Raises:
+            ValueError: The name is too long or the price does not fit the
+                        price field, nothing was written.
+        """
+
+        encoded_name = encode_name(name)
+        price_cents = item_store.price_to_cents(price)
+
+        with self.__lock():
+            self.__remap_if_grown()
+            self.__replay_redo()
+            record_number = self.__find(encoded_name)[1]
+
+            if record_number is None:
+                record_number = self.__append_record(encoded_name)
+
+            struct.pack_into(RECORD_FORMAT, self.__binary_map,
+                             self.__record_offset(record_number),
+                             encoded_name, price_cents, quantity)
+            self.__bump_version()
+            self.__binary_map.flush()
+
+    def delete_record(self, name):
+        """Removes an item by clearing its name and its index slot.
+
+        Args:
+            name (string): Item name.
+        """
+
+        with self.__lock():
+            self.__remap_if_grown()
+            self.__replay_redo()
+            slot, record_number = self.__find(name.encode())
+
+            if record_number is None:
+                return
+
+            offset = self.__record_offset(record_number)
+            self.__binary_map[offset:offset + NAME_SIZE] = bytes(NAME_SIZE)
+            struct.pack_into(SLOT_FORMAT, self.__index_map,
+                             INDEX_HEADER_SIZE + slot * SLOT_SIZE,
+                             DELETED_SLOT)
+            self.__bump_version()
+            self.__index_map.flush()
+            self.__binary_map.flush()
+            self.__deleted_count = None
+
+    def checkout(self, cart, order_id=None):
+        """Removes every item of an order, but only if all of them are still
+        in stock. Only the quantity field of each ordered record is written.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            order_id (string): Order that the change belongs to.
+
+        Return:
+            version (int): Inventory version created by this checkout.
+
+        Raises:
+            InsufficientStockError: Some items no longer have enough stock,
+                                    nothing was changed.
+        """
+
+        return self.__apply(cart, check_stock=True)
+
+    def modify(self, cart, order_id=None):
+        """Removes every item of an order without checking stock.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            order_id (string): Order that the change belongs to.
+
+        Return:
+            version (int): Inventory version created by this change.
+        """
+
+        return self.__apply(cart, check_stock=False)
+
+    def allocate_order_numbers(self, count=1):
+        """Reserves count consecutive order numbers from the orders folder
+        counter.
+
+        Args:
+            count (int): Amount of order numbers to reserve.
+
+        Return:
+            first_number (int): First of the reserved order numbers.
+        """
+
+        return order_sequence.OrderSequence().allocate(count)
+
+    def release_order_numbers(self, first_number, count):
+        """Gives back the newest reserved order numbers if they were never
+        used and nothing was allocated after them.
+
+        Args:
+            first_number (int): First of the unused order numbers.
+
+            count (int): Amount of unused order numbers.
+
+        Return:
+            released (bool): True if the numbers will be handed out again.
+        """
+
+        return order_sequence.OrderSequence().release(first_number, count)
+
+    def save_orders(self, orders):
+        """Writes the order files, orders are not kept in the binary file.
+
+        Args:
+            orders (list): CustomerOrder objects.
+        """
+
+        customer_order.write_order_files(orders)
+
+    def order_location(self, order_id):
+        """Returns the path of an order file, or its segment location.
+
+        Args:
+            order_id (string): Order to locate.
+
+        Return:
+            location (string): Location of the order.
+        """
+
+        return order_paths.order_location(order_id)
+
+    def close(self):
+        """Unmaps the record and index files."""
+
+        if self.__binary_map is not None:
+            self.__binary_map.close()
+            self.__binary_map = None
+
+        if self.__index_map is not None:
+            self.__index_map.close()
+            self.__index_map = None
+
+    def __lock(self):
+        """Creates the advisory lock held by every writer.
+
+        Return:
+            lock (FileLock): Lock on the record file.
+        """
+
+        return file_lock.FileLock(self.binary_file_path + ".lock")
+
+    def __open_maps(self):
+        """Maps the record and index files, closing earlier mappings."""
+
+        self.close()
+
+        with open(self.binary_file_path, "r+b") as binary_file:
+            self.__binary_map = mmap.mmap(binary_file.fileno(), 0)
+
+        with open(self.index_file_path, "r+b") as index_file:
+            self.__index_map = mmap.mmap(index_file.fileno(), 0)
+
+        # Lookups jump around the files, reading ahead only costs memory
+        if hasattr(mmap, "MADV_RANDOM"):
+            self.__binary_map.madvise(mmap.MADV_RANDOM)
+            self.__index_map.madvise(mmap.MADV_RANDOM)
+
+        magic = struct.unpack_from(HEADER_FORMAT, self.__binary_map, 0)[0]
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"{self.binary_file_path} is not an inventory "
+                             f"binary file.")
+
+        index_magic, self.__slot_count = struct.unpack_from(
+            INDEX_HEADER_FORMAT, self.__index_map, 0)
+        if index_magic != INDEX_MAGIC:
+            raise ValueError(f"{self.index_file_path} is not an inventory "
+                             f"index file.")
+
+        self.__deleted_count = None
+
+    def __remap_if_grown(self):
+        """Maps the files again if another process appended records or
+        rebuilt the index since they were mapped."""
+
+        if (len(self.__binary_map) != os.path.getsize(self.binary_file_path)
+                or os.stat(self.index_file_path).st_size
+                != len(self.__index_map)):
+            self.__open_maps()
+            return
+
+        # Index rebuilt at the same size, its slot count no longer matches
+        if (struct.unpack_from(INDEX_HEADER_FORMAT, self.__index_map, 0)[1]
+                != self.__slot_count):
+            self.__open_maps()
+
+    def __record_count(self):
+        """Reads the record count, deleted records included.
+
+        Return:
+            record_count (int): Amount of records in use.
+        """
+
+        return struct.unpack_from(HEADER_FORMAT, self.__binary_map, 0)[1]
+
+    @staticmethod
+    def __record_offset(record_number):
+        """Finds where a record starts in the record file.
+
+        Args:
+            record_number (int): Position of the record.
+
+        Return:
+            offset (int): Byte offset of the record.
+        """
+
+        return HEADER_SIZE + record_number * RECORD_SIZE
+
+    def __unpack_record(self, record_number):
+        """Reads a record.
+
+        Args:
+            record_number (int): Position of the record.
+
+        Return:
+            record (tuple): (name, price, quantity), None if deleted.
+        """
+
+        encoded_name, price_cents, quantity = struct.unpack_from(
+            RECORD_FORMAT, self.__binary_map,
+            self.__record_offset(record_number))
+
+        encoded_name = encoded_name.rstrip(b"\x00")
+        if len(encoded_name) == 0:
+            return None
+
+        return encoded_name.decode(), price_cents / 100, quantity
+
+    def __find(self, encoded_name):
+        """Probes the index for an item name.
+
+        Args:
+            encoded_name (bytes): Encoded item name.
+
+        Return:
+            slot (int): Index slot of the item, or of the first free slot.
+
+            record_number (int): Position of the record, None if not found.
+        """
+
+        mask = self.__slot_count - 1
+        slot = name_slot(encoded_name, self.__slot_count)
+
+        while True:
+            value = struct.unpack_from(SLOT_FORMAT, self.__index_map,
+                                       INDEX_HEADER_SIZE + slot * SLOT_SIZE)[0]
+
+            if value == EMPTY_SLOT:
+                return slot, None
+
+            if value != DELETED_SLOT:
+                offset = self.__record_offset(value - 1)
+                stored_name = self.__binary_map[offset:offset + NAME_SIZE]
+                if stored_name.rstrip(b"\x00") == encoded_name:
+                    return slot, value - 1
+
+            slot = (slot + 1) & mask
+
+    def __append_record(self, encoded_name):
+        """Adds an empty record for a new item, growing the record file and
+        rebuilding the index when needed. Must be called under the lock.
+
+        Args:
+            encoded_name (bytes): Encoded item name.
+
+        Return:
+            record_number (int): Position of the new record.
+        """
+
+        magic, record_count, capacity, version = struct.unpack_from(
+            HEADER_FORMAT, self.__binary_map, 0)
+
+        # Double the capacity so appends stay cheap
+        if record_count == capacity:
+            capacity = max(16, capacity * 2)
+            with open(self.binary_file_path, "r+b") as binary_file:
+                binary_file.truncate(HEADER_SIZE + capacity * RECORD_SIZE)
+            self.__open_maps()
+
+        record_number = record_count
+        struct.pack_into(RECORD_FORMAT, self.__binary_map,
+                         self.__record_offset(record_number), encoded_name,
+                         0, 0)
+        struct.pack_into(HEADER_FORMAT, self.__binary_map, 0, magic,
+                         record_count + 1, capacity, version)
+
+        if (record_count + 1) > self.__slot_count * MAX_LOAD_FACTOR:
+            names = list()
+            for number in range(record_count + 1):
+                record = self.__unpack_record(number)
+                names.append(None if record is None else record[0].encode())
+
+            self.__binary_map.flush()
+            write_index(self.index_file_path, names)
+            self.__open_maps()
+        else:
+            slot = self.__find(encoded_name)[0]
+            struct.pack_into(SLOT_FORMAT, self.__index_map,
+                             INDEX_HEADER_SIZE + slot * SLOT_SIZE,
+                             record_number + 1)
+            self.__index_map.flush()
+
+        return record_number
+
+    def __bump_version(self):
+        """Increments the version in the header.
+
+        Return:
+            version (int): New inventory version.
+        """
+
+        magic, record_count, capacity, version = struct.unpack_from(
+            HEADER_FORMAT, self.__binary_map, 0)
+        struct.pack_into(HEADER_FORMAT, self.__binary_map, 0, magic,
+                         record_count, capacity, version + 1)
+
+        return version + 1
+
+    def __apply(self, cart, check_stock):
+        """Writes new quantities for every item of an order. The new values
+        go to a redo file first, so an interrupted checkout is completed
+        the next time the files are opened.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            check_stock (bool): Determines if the order is refused when an
+                                item does not have enough stock.
+
+        Return:
+            version (int): Inventory version created by this change.
+        """
+
+        with self.__lock():
+            self.__remap_if_grown()
+
+            # Another process may have crashed part way through a change,
+            # finish it before reading quantities or writing a new redo file
+            self.__replay_redo()
+
+            updates = list()
+            shortages = dict()
+
+            for name_and_price in cart:
+                record_number = self.__find(name_and_price[0].encode())[1]
+                record = None
+                if record_number is not None:
+                    record = self.__unpack_record(record_number)
+
+                if record is None or record[1] != name_and_price[1]:
+                    if check_stock:
+                        shortages[name_and_price] = 0
+                        continue
+                    raise KeyError(name_and_price)
+
+                quantity = record[2] - cart[name_and_price]
+                if check_stock and quantity < 0:
+                    shortages[name_and_price] = record[2]
+                    continue
+
+                updates.append((self.__record_offset(record_number)
+                                + QUANTITY_OFFSET, quantity))
+
+            if len(shortages) > 0:
+                raise inventory_manager.InsufficientStockError(shortages)
+
+            magic, record_count, capacity, version = struct.unpack_from(
+                HEADER_FORMAT, self.__binary_map, 0)
+            updates.append((0, None))
+
+            self.__write_redo(updates, version + 1)
+            self.__apply_updates(updates, version + 1)
+            self.__binary_map.flush()
+            os.remove(self.binary_file_path + REDO_FILE_SUFFIX)
+
+        return version + 1
+
+    def __apply_updates(self, updates, version):
+        """Writes quantities in place and sets the version.
+
+        Args:
+            updates (list): (file offset, quantity) pairs, an offset of 0
+                            stands for the version.
+
+            version (int): Version after the change.
+        """
+
+        for offset, quantity in updates:
+            if offset == 0:
+                magic, record_count, capacity, old_version = (
+                    struct.unpack_from(HEADER_FORMAT, self.__binary_map, 0))
+                struct.pack_into(HEADER_FORMAT, self.__binary_map, 0, magic,
+                                 record_count, capacity, version)
+            else:
+                struct.pack_into("<q", self.__binary_map, offset, quantity)
+
+    def __write_redo(self, updates, version):
+        """Durably records the new values of a change before making it.
+
+        Args:
+            updates (list): (file offset, quantity) pairs.
+
+            version (int): Version after the change.
+        """
+
+        body = struct.pack("<qq", version, len(updates))
+        for offset, quantity in updates:
+            body += struct.pack("<qq", offset, quantity or 0)
+
+        redo_file_path = self.binary_file_path + REDO_FILE_SUFFIX
+        with open(redo_file_path, "wb") as redo_file:
+            redo_file.write(body + struct.pack("<I", zlib.crc32(body)))
+            redo_file.flush()
+            os.fsync(redo_file.fileno())
+
+    def __replay_redo(self):
+        """Completes a checkout interrupted after its redo file was written.
+        A damaged redo file means the crash happened before the checkout
+        touched anything, so it is discarded."""
+
+        redo_file_path = self.binary_file_path + REDO_FILE_SUFFIX
+
+        if not os.path.exists(redo_file_path):
+            return
+
+        with open(redo_file_path, "rb") as redo_file:
+            data = redo_file.read()
+
+        body = data[:-4]
+        if len(data) >= 20 and struct.unpack("<I", data[-4:])[0] == \
+                zlib.crc32(body):
+            version, update_count = struct.unpack_from("<qq", body, 0)
+            updates = [struct.unpack_from("<qq", body, 16 + index * 16)
+                       for index in range(update_count)]
+            self.__apply_updates(updates, version)
+            self.__binary_map.flush()
+
+        os.remove(redo_file_path)
+
+
+if __name__ == '__main__':
+    # Convert between inventory.txt and inventory.bin
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python mmap_backend.py import|export inventory.txt")
+        sys.exit(1)
+
+    if sys.argv[1] == "import":
+        convert_report = dict()
+        converted = convert_text_to_binary(sys.argv[2], report=convert_report)
+        print(f"Converted {converted} items into {BINARY_FILE_NAME}")
+        for malformed_row in convert_report["malformed"]:
+            print(f"Skipped line {malformed_row['line']}: "
+                  f"{malformed_row['error']}")
+    else:
+        converted = convert_binary_to_text(sys.argv[2])
+        print(f"Exported {converted} items to {sys.argv[2]}")
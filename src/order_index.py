@@ -0,0 +1,1324 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the OrderIndex class that
+                     answers which orders a customer placed, where an order
+                     file lives and how much of an item sold, without opening
+                     order files. Orders are appended to a small log as they
+                     are written, and the log is moved into sorted binary run
+                     files that are searched with binary search. The index
+                     is built once from existing order files, in parallel.
+
+Usage: python order_index.py rebuild|compact|order|customer|item [...]
+       python order_index.py test
+"""
+
+import argparse
+import array
+import concurrent.futures
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import file_lock
+import inventory_journal
+import metrics
+import order_log
+import order_paths
+
+INDEX_DIR_NAME = ".index"
+MANIFEST_FILE_NAME = "manifest"
+LOG_FILE_NAME = "orders.log"
+LOCK_FILE_NAME = "index.lock"
+RUN_FILE_SUFFIX = ".oix"
+
+# Sections of the index: order id -> file location, customer name ->
+# order id, item name -> order id and quantity sold
+ORDERS_SECTION = 0
+CUSTOMERS_SECTION = 1
+ITEMS_SECTION = 2
+SECTION_COUNT = 3
+
+# Run header: magic, then entry count and offset table location per section
+RUN_MAGIC = b"FIMSOIX1"
+RUN_HEADER = struct.Struct("<8s6q")
+
+# Entry: key length, value length, quantity, order time in nanoseconds,
+# followed by the key and value bytes
+ENTRY_HEADER = struct.Struct("<HHqq")
+OFFSET_FORMAT = "<Q"
+OFFSET_SIZE = 8
+
+# Log frame: payload length and checksum, the payload holds a section
+# number before each entry
+FRAME_HEADER = struct.Struct("<II")
+SECTION_FORMAT = "<B"
+
+# Orders kept in the log before it is moved into a run file
+LOG_FLUSH_ORDERS = 1024
+
+# Newest two runs are merged while the older one is at most this many
+# times larger, so there are about log2(orders) runs
+MERGE_RATIO = 2
+
+# Order files parsed by each rebuild worker task
+REBUILD_CHUNK_SIZE = 5000
+
+# Bytes of entries gathered before each write of a run file
+WRITE_BUFFER_SIZE = 1 << 16
+
+# Earliest and latest order times
+MIN_TIME_NS = -2 ** 63
+MAX_TIME_NS = 2 ** 63 - 1
+
+# Open index of each orders folder, shared by the order writing code
+index_cache = dict()
+
+
+def encode_entry(key, time_ns, value, quantity):
+    """Packs an entry into bytes.
+
+    Args:
+        key (bytes): Order id, customer name or item name.
+
+        time_ns (int): Order time in nanoseconds.
+
+        value (bytes): File location or order id.
+
+        quantity (int): Items in the order, or quantity of the item sold.
+
+    Return:
+        entry_bytes (bytes): Packed entry.
+    """
+
+    return (ENTRY_HEADER.pack(len(key), len(value), quantity, time_ns)
+            + key + value)
+
+
+def decode_entry(data, position):
+    """Unpacks an entry.
+
+    Args:
+        data (buffer): Bytes holding the entry.
+
+        position (int): Offset of the entry in data.
+
+    Return:
+        entry (tuple): Key, order time, value and quantity.
+
+        end_position (int): Offset after the entry.
+    """
+
+    key_length, value_length, quantity, time_ns = ENTRY_HEADER.unpack_from(
+        data, position)
+
+    key_start = position + ENTRY_HEADER.size
+    value_start = key_start + key_length
+    end_position = value_start + value_length
+
+    entry = (bytes(data[key_start:value_start]), time_ns,
+             bytes(data[value_start:end_position]), quantity)
+
+    return entry, end_position
+
+
+def order_entries(order_id, customer_name, items, location, time_ns):
+    """Builds the index entries of one order.
+
+    Args:
+        order_id (string): Order id, Ex: John_Doe_12.
+
+        customer_name (string): Customer first and last name.
+
+        items (list): Item name and quantity of each line of the order.
+
+        location (string): Order file location within the orders folder.
+
+        time_ns (int): Order time in nanoseconds.
+
+    Return:
+        entries (list): Section number and entry of each index entry.
+    """
+
+    order_key = order_id.encode()
+
+    # Same item ordered at two prices is counted once per order
+    item_quantities = dict()
+    for item_name, item_quantity in items:
+        item_quantities[item_name] = (item_quantities.get(item_name, 0)
+                                      + item_quantity)
+
+    total_quantity = sum(item_quantities.values())
+
+    entries = [(ORDERS_SECTION,
+                (order_key, time_ns, location.encode(), total_quantity)),
+               (CUSTOMERS_SECTION,
+                (customer_name.strip().lower().encode(), time_ns, order_key,
+                 total_quantity))]
+
+    for item_name, item_quantity in item_quantities.items():
+        entries.append((ITEMS_SECTION, (item_name.encode(), time_ns,
+                                        order_key, item_quantity)))
+
+    return entries
+
+
+def parse_order_file(file_path):
+    """Reads the customer name and item rows back out of an order file.
+
+    Args:
+        file_path (string): Location of the order file.
+
+    Return:
+        customer_name (string): Customer first and last name, None if the
+                                file is not an order file.
+
+        rows (list): Item name, line total in dollars and quantity of each
+                     item row.
+    """
+
+    try:
+        with open(file_path) as order_file:
+            lines = order_file.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return None, list()
+
+    customer_name = None
+    rows = list()
+    in_items = False
+
+    for line in lines:
+        if line.startswith("Customer Name: "):
+            customer_name = line[len("Customer Name: "):]
+        elif line.strip().startswith("---------"):
+            in_items = True
+        elif in_items:
+            # Rows are "name  total price  quantity", a blank line ends them
+            fields = line.rsplit(None, 2)
+            if len(fields) != 3 or not fields[2].isdigit():
+                break
+            try:
+                line_total = float(fields[1])
+            except ValueError:
+                break
+            rows.append((fields[0].strip(), line_total, int(fields[2])))
+
+    return customer_name, rows
+
+
+def read_order_file(file_path, orders_path):
+    """Reads the index entries back out of an order file.
+
+    Args:
+        file_path (string): Location of the order file.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        entries (list): Section number and entry of each index entry, empty
+                        if the file is not an order file.
+    """
+
+    customer_name, rows = parse_order_file(file_path)
+
+    try:
+        time_ns = os.stat(file_path).st_mtime_ns
+    except OSError:
+        return list()
+
+    if customer_name is None:
+        return list()
+
+    order_id = os.path.basename(file_path)[:-len(".txt")]
+    location = os.path.relpath(file_path, orders_path)
+    items = [(item_name, item_quantity)
+             for item_name, line_total, item_quantity in rows]
+
+    return order_entries(order_id, customer_name, items, location, time_ns)
+
+
+def read_segment(segment_path, orders_path):
+    """Reads the index entries of every order record in a segment.
+
+    Args:
+        segment_path (string): Location of the segment.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        entries (list): Section number and entry of each index entry.
+    """
+
+    entries = list()
+
+    for record in order_log.read_segment_records(segment_path):
+        location = os.path.relpath(
+            order_paths.order_location(record["order_id"], orders_path),
+            orders_path)
+        customer_name = f"{record['first_name']} {record['last_name']}"
+        items = [(item_name, item_quantity)
+                 for item_name, item_price, item_quantity in record["items"]]
+
+        entries += order_entries(record["order_id"], customer_name, items,
+                                 location, record["time_ns"])
+
+    return entries
+
+
+def list_order_files(orders_path):
+    """Finds every order file in a flat or sharded orders folder.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        file_paths (list): Location of each order file.
+    """
+
+    file_paths = list()
+
+    for dir_path, dir_names, file_names in os.walk(orders_path):
+        # Skip hidden folders such as the spool and the index itself
+        dir_names[:] = [name for name in dir_names
+                        if not name.startswith(".")]
+
+        for file_name in file_names:
+            if not file_name.startswith(".") and file_name.endswith(".txt"):
+                file_paths.append(os.path.join(dir_path, file_name))
+
+    return file_paths
+
+
+def write_run(run_file_path, sections):
+    """Writes a run file from sorted entries. Each section is followed by a
+    table of entry offsets, so an entry can be found by binary search.
+
+    Args:
+        run_file_path (string): Location of the run file.
+
+        sections (list): Sorted iterable of entries for each section, exact
+                         duplicates are written once.
+
+    Return:
+        entry_count (int): Amount of entries written.
+    """
+
+    header_fields = [RUN_MAGIC]
+    offset_tables = list()
+
+    with open(run_file_path, "wb") as run_file:
+        run_file.write(bytes(RUN_HEADER.size))
+        position = RUN_HEADER.size
+
+        for entries in sections:
+            offsets = array.array("Q")
+            chunk = list()
+            chunk_size = 0
+            previous_entry = None
+
+            for entry in entries:
+                if entry == previous_entry:
+                    continue
+                previous_entry = entry
+
+                entry_bytes = encode_entry(*entry)
+                offsets.append(position)
+                position += len(entry_bytes)
+
+                chunk.append(entry_bytes)
+                chunk_size += len(entry_bytes)
+                if chunk_size >= WRITE_BUFFER_SIZE:
+                    run_file.write(b"".join(chunk))
+                    chunk = list()
+                    chunk_size = 0
+
+            run_file.write(b"".join(chunk))
+            offset_tables.append(offsets)
+
+        for offsets in offset_tables:
+            header_fields += [len(offsets), position]
+
+            if sys.byteorder == "big":
+                offsets.byteswap()
+            run_file.write(offsets.tobytes())
+            position += len(offsets) * OFFSET_SIZE
+
+        run_file.seek(0)
+        run_file.write(RUN_HEADER.pack(*header_fields))
+        run_file.flush()
+        os.fsync(run_file.fileno())
+
+    return sum(len(offsets) for offsets in offset_tables)
+
+
+def index_order_files(file_paths, orders_path, run_file_path):
+    """Parses order files into a run file, run by each rebuild worker.
+
+    Args:
+        file_paths (list): Locations of the order files or segments.
+
+        orders_path (string): Location of the orders folder.
+
+        run_file_path (string): Location of the run file written.
+
+    Return:
+        entry_count (int): Amount of entries written.
+    """
+
+    sections = [list() for section in range(SECTION_COUNT)]
+
+    for file_path in file_paths:
+        if file_path.endswith(order_log.SEGMENT_SUFFIX):
+            file_entries = read_segment(file_path, orders_path)
+        else:
+            file_entries = read_order_file(file_path, orders_path)
+
+        for section, entry in file_entries:
+            sections[section].append(entry)
+
+    for entries in sections:
+        entries.sort()
+
+    return write_run(run_file_path, sections)
+
+
+class IndexRun:
+    """Read-only sorted run file, mapped into memory.
+
+    Attributes:
+        file_name (string): Name of the run file.
+
+        entry_count (int): Amount of entries in every section.
+
+    Methods:
+        __init__(run_file_path): Maps a run file.
+
+        lookup(section, key, start_ns, end_ns): Iterates the entries of a
+                                                key in a time range.
+
+        iter_section(section): Iterates every entry of a section in order.
+
+        close(): Unmaps the run file.
+    """
+
+    def __init__(self, run_file_path):
+        """Maps a run file and reads its header.
+
+        Args:
+            run_file_path (string): Location of the run file.
+        """
+
+        self.file_name = os.path.basename(run_file_path)
+
+        with open(run_file_path, "rb") as run_file:
+            self.__map = mmap.mmap(run_file.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+
+        header_fields = RUN_HEADER.unpack_from(self.__map, 0)
+        if header_fields[0] != RUN_MAGIC:
+            self.__map.close()
+            raise ValueError(f"{run_file_path} is not an order index run")
+
+        self.__counts = header_fields[1::2]
+        self.__tables = header_fields[2::2]
+        self.entry_count = sum(self.__counts)
+
+    def __entry(self, section, entry_index):
+        """Reads the entry at a position of a section."""
+
+        offset = struct.unpack_from(
+            OFFSET_FORMAT, self.__map,
+            self.__tables[section] + entry_index * OFFSET_SIZE)[0]
+
+        return decode_entry(self.__map, offset)[0]
+
+    def lookup(self, section, key, start_ns=MIN_TIME_NS, end_ns=MAX_TIME_NS):
+        """Iterates the entries of a key in a time range. Entries are sorted
+        by key then time, so the first is found by binary search.
+
+        Args:
+            section (int): Section searched.
+
+            key (bytes): Key looked up.
+
+            start_ns (int): Earliest order time included.
+
+            end_ns (int): Latest order time included.
+
+        Return:
+            entry (tuple): Key, order time, value and quantity.
+        """
+
+        low = 0
+        high = self.__counts[section]
+
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.__entry(section, middle)
+            if (entry[0], entry[1]) < (key, start_ns):
+                low = middle + 1
+            else:
+                high = middle
+
+        for entry_index in range(low, self.__counts[section]):
+            entry = self.__entry(section, entry_index)
+            if entry[0] != key or entry[1] > end_ns:
+                break
+            yield entry
+
+    def iter_section(self, section):
+        """Iterates every entry of a section in sorted order.
+
+        Args:
+            section (int): Section read.
+
+        Return:
+            entry (tuple): Key, order time, value and quantity.
+        """
+
+        for entry_index in range(self.__counts[section]):
+            yield self.__entry(section, entry_index)
+
+    def close(self):
+        """Unmaps the run file."""
+
+        self.__map.close()
+
+
+class OrderIndex:
+    """Index of every order in an orders folder. New orders go to an append
+    only log, which is moved into a sorted run file once it holds
+    LOG_FLUSH_ORDERS orders. Runs of similar size are merged, so a lookup
+    does a binary search in each of about log2(orders) runs.
+
+    Attributes:
+        orders_path (string): Location of the orders folder.
+
+        index_path (string): Location of the index folder.
+
+        flush_orders (int): Orders kept in the log before it is moved into
+                            a run file.
+
+    Methods:
+        __init__(orders_path, flush_orders): Initializes the index of an
+                                             orders folder.
+
+        is_built(): Checks if the index has been built.
+
+        ensure_built(workers): Builds the index if it does not exist.
+
+        rebuild(workers): Builds the index from every order file.
+
+        record_orders(orders): Adds orders whose files were just written.
+
+        compact(): Merges the log and every run into one run.
+
+        order_location(order_id): Returns the file location of an order.
+
+        customer_orders(customer_name): Returns the orders of a customer.
+
+        item_sales(item_name, since, until): Returns the orders of an item.
+
+        item_quantity(item_name, since, until): Returns the quantity sold.
+
+        close(): Unmaps every run file.
+    """
+
+    def __init__(self, orders_path=None, flush_orders=LOG_FLUSH_ORDERS):
+        """Initializes the index of an orders folder. Nothing is read or
+        created until the index is used.
+
+        Args:
+            orders_path (string): Location of the orders folder.
+
+            flush_orders (int): Orders kept in the log before it is moved
+                                into a run file.
+        """
+
+        if orders_path is None:
+            orders_path = order_paths.default_orders_path()
+
+        self.orders_path = orders_path
+        self.index_path = os.path.join(orders_path, INDEX_DIR_NAME)
+        self.flush_orders = flush_orders
+
+        self.__manifest_path = os.path.join(self.index_path,
+                                            MANIFEST_FILE_NAME)
+        self.__log_path = os.path.join(self.index_path, LOG_FILE_NAME)
+        self.__file_lock = file_lock.FileLock(
+            os.path.join(self.index_path, LOCK_FILE_NAME))
+
+        # Threads of one process share the index, FileLock is per process
+        self.__thread_lock = threading.RLock()
+
+        # Runs listed in the manifest, newest last
+        self.__runs = list()
+        self.__manifest_stamp = None
+
+        # Entries of the log read so far, by section and key
+        self.__log_entries = [dict() for section in range(SECTION_COUNT)]
+        self.__log_order_count = 0
+        self.__log_offset = 0
+        self.__log_inode = None
+
+    def is_built(self):
+        """Checks if the index has been built.
+
+        Return:
+            built (bool): True once rebuild() has written a manifest.
+        """
+
+        return os.path.exists(self.__manifest_path)
+
+    def ensure_built(self, workers=None):
+        """Builds the index from existing order files on first use.
+
+        Args:
+            workers (int): Processes parsing order files, one per CPU if
+                           None.
+
+        Return:
+            order_count (int): Orders indexed, None if already built.
+        """
+
+        if self.is_built():
+            return None
+
+        with self.__thread_lock:
+            os.makedirs(self.index_path, exist_ok=True)
+            with self.__file_lock:
+                # Another terminal may have built it while we waited
+                if self.is_built():
+                    return None
+                return self.__rebuild(workers)
+
+    def rebuild(self, workers=None):
+        """Builds the index from every order file, replacing the old index.
+
+        Args:
+            workers (int): Processes parsing order files, one per CPU if
+                           None.
+
+        Return:
+            order_count (int): Orders indexed.
+        """
+
+        with self.__thread_lock:
+            os.makedirs(self.index_path, exist_ok=True)
+            with self.__file_lock:
+                return self.__rebuild(workers)
+
+    def __rebuild(self, workers):
+        """Builds the index from every order file, lock held.
+
+        Args:
+            workers (int): Processes parsing order files.
+
+        Return:
+            order_count (int): Orders indexed.
+        """
+
+        file_paths = list_order_files(self.orders_path)
+        chunks = [file_paths[first_index:first_index + REBUILD_CHUNK_SIZE]
+                  for first_index in range(0, len(file_paths),
+                                           REBUILD_CHUNK_SIZE)]
+
+        # Each segment of a segmented folder is a task of its own
+        segments = order_log.list_segments(self.orders_path)
+        chunks += [[segment_path] for segment_number, segment_path in segments]
+        chunk_paths = [self.__new_run_path() for chunk in chunks]
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(chunks)))
+
+        # Each worker parses its order files into its own sorted run
+        with metrics.timer("order_index_rebuild"):
+            try:
+                if workers == 1:
+                    for chunk, chunk_path in zip(chunks, chunk_paths):
+                        index_order_files(chunk, self.orders_path, chunk_path)
+                else:
+                    with concurrent.futures.ProcessPoolExecutor(
+                            workers) as executor:
+                        list(executor.map(index_order_files, chunks,
+                                          [self.orders_path] * len(chunks),
+                                          chunk_paths))
+
+                chunk_runs = [IndexRun(chunk_path)
+                              for chunk_path in chunk_paths]
+                run_path = self.__new_run_path()
+                entry_count = write_run(run_path, self.__merge(chunk_runs))
+
+                for run in chunk_runs:
+                    run.close()
+            finally:
+                for chunk_path in chunk_paths:
+                    if os.path.exists(chunk_path):
+                        os.remove(chunk_path)
+
+            old_names = self.__read_manifest()
+            self.__write_manifest([(os.path.basename(run_path),
+                                    entry_count)])
+            self.__reset_log()
+            self.__remove_runs(name for name, count in old_names)
+
+        if len(segments) > 0:
+            return (len(file_paths)
+                    + order_log.OrderLog(self.orders_path).order_count())
+
+        return len(file_paths)
+
+    def record_orders(self, orders):
+        """Adds orders whose files were just written. Does nothing before
+        the index is built, the build reads their files instead. Orders
+        already in the index, such as orders written again by a spool
+        replay, are skipped so they are never counted twice.
+
+        Args:
+            orders (list): CustomerOrder objects written to order files.
+
+        Return:
+            recorded (bool): True if the orders were added.
+        """
+
+        if len(orders) == 0 or not self.is_built():
+            return False
+
+        order_payloads = list()
+
+        for order in orders:
+            file_path = order_paths.order_location(order.order_id,
+                                                   self.orders_path)
+            try:
+                time_ns = os.stat(file_path).st_mtime_ns
+            except OSError:
+                time_ns = time.time_ns()
+
+            items = [(name_and_price[0], order.items_ordered[name_and_price])
+                     for name_and_price in order.items_ordered]
+            customer_name = (f"{order.customer_first_name} "
+                             f"{order.customer_last_name}")
+            location = os.path.relpath(file_path, self.orders_path)
+
+            order_payload = list()
+            for section, entry in order_entries(order.order_id, customer_name,
+                                                items, location, time_ns):
+                order_payload.append(struct.pack(SECTION_FORMAT, section))
+                order_payload.append(encode_entry(*entry))
+
+            order_payloads.append((order.order_id.encode(),
+                                   b"".join(order_payload)))
+
+        with metrics.timer("order_index_append"):
+            with self.__thread_lock, self.__file_lock:
+                # Cuts off a frame left half written by a crash
+                self.__refresh()
+
+                payload = list()
+                order_keys = set()
+                for order_key, order_payload in order_payloads:
+                    if (order_key not in order_keys
+                            and not self.__is_indexed(order_key)):
+                        order_keys.add(order_key)
+                        payload.append(order_payload)
+
+                if len(payload) == 0:
+                    return True
+
+                payload = b"".join(payload)
+                frame = (FRAME_HEADER.pack(len(payload), zlib.crc32(payload))
+                         + payload)
+
+                with open(self.__log_path, "ab") as log_file:
+                    if log_file.tell() != self.__log_offset:
+                        log_file.truncate(self.__log_offset)
+                    log_file.write(frame)
+                    log_file.flush()
+                    os.fsync(log_file.fileno())
+
+                self.__read_log()
+
+                if self.__log_order_count >= self.flush_orders:
+                    self.__flush_log()
+
+        return True
+
+    def compact(self):
+        """Merges the log and every run into a single run."""
+
+        with self.__thread_lock, self.__file_lock:
+            self.__refresh()
+            self.__flush_log(merge_all=True)
+
+    def order_location(self, order_id):
+        """Returns the file location of an order.
+
+        Args:
+            order_id (string): Order id, Ex: John_Doe_12.
+
+        Return:
+            file_path (string): Location of the order file, None if unknown.
+        """
+
+        entries = self.__lookup(ORDERS_SECTION, order_id)
+
+        if len(entries) == 0:
+            return None
+
+        return os.path.join(self.orders_path, entries[0][2].decode())
+
+    def customer_orders(self, customer_name):
+        """Returns the orders of a customer, oldest first.
+
+        Args:
+            customer_name (string): First and last name, any case.
+
+        Return:
+            order_ids (list): Order ids of the customer.
+        """
+
+        entries = self.__lookup(CUSTOMERS_SECTION,
+                                customer_name.strip().lower())
+
+        return [entry[2].decode() for entry in entries]
+
+    def item_sales(self, item_name, since=None, until=None):
+        """Returns every order of an item in a time range, oldest first.
+
+        Args:
+            item_name (string): Item name, any case.
+
+            since (float): Earliest order time in seconds since the epoch,
+                           no limit if None.
+
+            until (float): Latest order time in seconds since the epoch, no
+                           limit if None.
+
+        Return:
+            sales (list): Order id, quantity and order time of each order.
+        """
+
+        start_ns = MIN_TIME_NS if since is None else int(since * 1e9)
+        end_ns = MAX_TIME_NS if until is None else int(until * 1e9)
+
+        entries = self.__lookup(ITEMS_SECTION, item_name.strip().lower(),
+                                start_ns, end_ns)
+
+        return [(entry[2].decode(), entry[3], entry[1] / 1e9)
+                for entry in entries]
+
+    def item_quantity(self, item_name, since=None, until=None):
+        """Returns the quantity of an item sold in a time range.
+
+        Args:
+            item_name (string): Item name, any case.
+
+            since (float): Earliest order time in seconds since the epoch.
+
+            until (float): Latest order time in seconds since the epoch.
+
+        Return:
+            quantity (int): Total quantity sold.
+        """
+
+        return sum(sale[1] for sale in self.item_sales(item_name, since,
+                                                       until))
+
+    def close(self):
+        """Unmaps every run file."""
+
+        with self.__thread_lock:
+            for run in self.__runs:
+                run.close()
+            self.__runs = list()
+            self.__manifest_stamp = None
+
+    def __lookup(self, section, key, start_ns=MIN_TIME_NS,
+                 end_ns=MAX_TIME_NS):
+        """Finds the entries of a key in every run and in the log. An order
+        indexed twice, by a rebuild racing a new order, is returned once.
+
+        Args:
+            section (int): Section searched.
+
+            key (string): Key looked up.
+
+            start_ns (int): Earliest order time included.
+
+            end_ns (int): Latest order time included.
+
+        Return:
+            entries (list): Matching entries sorted by order time.
+        """
+
+        key = key.encode()
+
+        with metrics.timer("order_index_lookup"), self.__thread_lock:
+            if not self.is_built():
+                return list()
+
+            self.__refresh()
+
+            entries = list()
+            for run in self.__runs:
+                entries.extend(run.lookup(section, key, start_ns, end_ns))
+
+            for entry in self.__log_entries[section].get(key, ()):
+                if start_ns <= entry[1] <= end_ns:
+                    entries.append(entry)
+
+        entries.sort()
+
+        if section == ORDERS_SECTION:
+            return entries[:1]
+
+        unique_entries = list()
+        seen_order_ids = set()
+        for entry in entries:
+            if entry[2] not in seen_order_ids:
+                seen_order_ids.add(entry[2])
+                unique_entries.append(entry)
+
+        return unique_entries
+
+    def __is_indexed(self, order_key):
+        """Checks if an order is in the log or a run, lock held.
+
+        Args:
+            order_key (bytes): Order id.
+
+        Return:
+            indexed (bool): True if the order was recorded before.
+        """
+
+        if order_key in self.__log_entries[ORDERS_SECTION]:
+            return True
+
+        for run in self.__runs:
+            for entry in run.lookup(ORDERS_SECTION, order_key):
+                return True
+
+        return False
+
+    def __refresh(self):
+        """Reopens the runs when another process changed the manifest, then
+        reads anything appended to the log."""
+
+        while True:
+            try:
+                manifest_stat = os.stat(self.__manifest_path)
+            except FileNotFoundError:
+                return
+
+            manifest_stamp = (manifest_stat.st_ino, manifest_stat.st_mtime_ns)
+            if manifest_stamp == self.__manifest_stamp:
+                break
+
+            try:
+                runs = [IndexRun(os.path.join(self.index_path, name))
+                        for name, count in self.__read_manifest()]
+            except FileNotFoundError:
+                # A merge removed a run after the manifest was read
+                continue
+
+            for run in self.__runs:
+                run.close()
+            self.__runs = runs
+            self.__manifest_stamp = manifest_stamp
+
+        self.__read_log()
+
+    def __read_log(self):
+        """Reads the log frames appended since the last read. A new log
+        file, made when the log is flushed, is read from its start."""
+
+        try:
+            log_stat = os.stat(self.__log_path)
+        except FileNotFoundError:
+            return
+
+        if log_stat.st_ino != self.__log_inode:
+            self.__log_entries = [dict() for section in range(SECTION_COUNT)]
+            self.__log_order_count = 0
+            self.__log_offset = 0
+            self.__log_inode = log_stat.st_ino
+
+        if log_stat.st_size <= self.__log_offset:
+            return
+
+        with open(self.__log_path, "rb") as log_file:
+            log_file.seek(self.__log_offset)
+            data = log_file.read()
+
+        position = 0
+
+        while position + FRAME_HEADER.size <= len(data):
+            payload_length, checksum = FRAME_HEADER.unpack_from(data,
+                                                                position)
+            payload_start = position + FRAME_HEADER.size
+            payload = data[payload_start:payload_start + payload_length]
+
+            # Frame cut short by a crash, or still being written
+            if (len(payload) < payload_length
+                    or zlib.crc32(payload) != checksum):
+                break
+
+            entry_position = 0
+            while entry_position < len(payload):
+                section = payload[entry_position]
+                entry, entry_position = decode_entry(payload,
+                                                     entry_position + 1)
+                self.__log_entries[section].setdefault(
+                    entry[0], list()).append(entry)
+
+                if section == ORDERS_SECTION:
+                    self.__log_order_count += 1
+
+            position = payload_start + payload_length
+
+        self.__log_offset += position
+
+    def __flush_log(self, merge_all=False):
+        """Moves the log into a new run, then merges runs of similar size,
+        lock held.
+
+        Args:
+            merge_all (bool): Determines if every run is merged into one.
+        """
+
+        with metrics.timer("order_index_flush"):
+            runs = list(self.__runs)
+            manifest = [(run.file_name, run.entry_count) for run in runs]
+
+            if self.__log_order_count > 0:
+                sections = list()
+                for section_entries in self.__log_entries:
+                    sections.append(sorted(
+                        entry for entries in section_entries.values()
+                        for entry in entries))
+
+                run_path = self.__new_run_path()
+                entry_count = write_run(run_path, sections)
+                runs.append(IndexRun(run_path))
+                manifest.append((os.path.basename(run_path), entry_count))
+
+            merged_names = list()
+
+            while len(runs) >= 2 and (merge_all or manifest[-2][1]
+                                      <= MERGE_RATIO * manifest[-1][1]):
+                run_path = self.__new_run_path()
+                entry_count = write_run(run_path, self.__merge(runs[-2:]))
+
+                for run in runs[-2:]:
+                    run.close()
+                    merged_names.append(run.file_name)
+
+                runs[-2:] = [IndexRun(run_path)]
+                manifest[-2:] = [(os.path.basename(run_path), entry_count)]
+
+            self.__write_manifest(manifest)
+            self.__reset_log()
+
+            # Runs made and merged away within this flush are removed too
+            self.__remove_runs(merged_names)
+
+            manifest_stat = os.stat(self.__manifest_path)
+            self.__runs = runs
+            self.__manifest_stamp = (manifest_stat.st_ino,
+                                     manifest_stat.st_mtime_ns)
+
+    @staticmethod
+    def __merge(runs):
+        """Merges the sections of sorted runs.
+
+        Args:
+            runs (list): IndexRun objects merged.
+
+        Return:
+            sections (list): Sorted iterator of entries for each section.
+        """
+
+        return [heapq.merge(*(run.iter_section(section) for run in runs))
+                for section in range(SECTION_COUNT)]
+
+    def __new_run_path(self):
+        """Returns the location of a new, uniquely named run file."""
+
+        run_fd, run_path = tempfile.mkstemp(prefix="run_",
+                                            suffix=RUN_FILE_SUFFIX,
+                                            dir=self.index_path)
+        os.close(run_fd)
+
+        return run_path
+
+    def __read_manifest(self):
+        """Reads the run file names and entry counts from the manifest.
+
+        Return:
+            manifest (list): Name and entry count of each run, oldest first.
+        """
+
+        manifest = list()
+
+        try:
+            with open(self.__manifest_path) as manifest_file:
+                for line in manifest_file:
+                    if line.startswith("#") or not line.strip():
+                        continue
+                    name, count = line.split()
+                    manifest.append((name, int(count)))
+        except FileNotFoundError:
+            pass
+
+        return manifest
+
+    def __write_manifest(self, manifest):
+        """Replaces the manifest with a new list of runs.
+
+        Args:
+            manifest (list): Name and entry count of each run, oldest first.
+        """
+
+        temp_fd, temp_file_path = tempfile.mkstemp(
+            prefix=MANIFEST_FILE_NAME + ".", dir=self.index_path)
+
+        with os.fdopen(temp_fd, "w") as manifest_file:
+            manifest_file.write("# order index runs, oldest first\n")
+            for name, count in manifest:
+                manifest_file.write(f"{name} {count}\n")
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+        os.replace(temp_file_path, self.__manifest_path)
+        inventory_journal.fsync_directory(self.index_path)
+
+    def __reset_log(self):
+        """Replaces the log with an empty file. Readers notice the new file
+        and drop the entries they read from the old one."""
+
+        temp_fd, temp_file_path = tempfile.mkstemp(
+            prefix=LOG_FILE_NAME + ".", dir=self.index_path)
+        os.close(temp_fd)
+        os.replace(temp_file_path, self.__log_path)
+
+        self.__log_entries = [dict() for section in range(SECTION_COUNT)]
+        self.__log_order_count = 0
+        self.__log_offset = 0
+        self.__log_inode = os.stat(self.__log_path).st_ino
+
+    def __remove_runs(self, names):
+        """Deletes run files no longer in the manifest.
+
+        Args:
+            names (iterable): Names of the run files.
+        """
+
+        for name in names:
+            try:
+                os.remove(os.path.join(self.index_path, name))
+            except FileNotFoundError:
+                pass
+
+
+def open_index(orders_path=None):
+    """Returns the shared index of an orders folder.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        index (OrderIndex): Index of the folder.
+    """
+
+    if orders_path is None:
+        orders_path = order_paths.default_orders_path()
+
+    if orders_path not in index_cache:
+        index_cache[orders_path] = OrderIndex(orders_path)
+
+    return index_cache[orders_path]
+
+
+def record_orders(orders, orders_path=None):
+    """Adds orders whose files were just written to the shared index.
+
+    Args:
+        orders (list): CustomerOrder objects written to order files.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        recorded (bool): True if the orders were added.
+    """
+
+    return open_index(orders_path).record_orders(orders)
+
+
+def main():
+    """Runs an index command given on the command line."""
+
+    parser = argparse.ArgumentParser(description="Query the order index.")
+    parser.add_argument("--orders", metavar="FOLDER",
+                        help="orders folder, ./orders by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = commands.add_parser(
+        "rebuild", help="index every order file again")
+    rebuild_parser.add_argument("--workers", type=int)
+    commands.add_parser("compact", help="merge the index into one run")
+
+    order_parser = commands.add_parser("order",
+                                       help="show where an order file is")
+    order_parser.add_argument("order_id")
+
+    customer_parser = commands.add_parser("customer",
+                                          help="list orders of a customer")
+    customer_parser.add_argument("name", nargs="+")
+
+    item_parser = commands.add_parser("item", help="show sales of an item")
+    item_parser.add_argument("name", nargs="+")
+    item_parser.add_argument("--days", type=float,
+                             help="only count the last DAYS days")
+
+    args = parser.parse_args()
+
+    orders_path = None
+    if args.orders:
+        orders_path = os.path.abspath(args.orders)
+    index = OrderIndex(orders_path)
+
+    if args.command == "rebuild":
+        start_time = time.perf_counter()
+        order_count = index.rebuild(args.workers)
+        print(f"Indexed {order_count} orders in "
+              f"{time.perf_counter() - start_time:.2f}s")
+        return
+
+    built_count = index.ensure_built()
+    if built_count is not None:
+        print(f"Indexed {built_count} existing orders")
+
+    if args.command == "compact":
+        index.compact()
+        print("Order index compacted")
+    elif args.command == "order":
+        file_path = index.order_location(args.order_id)
+        print(file_path if file_path else f"Order {args.order_id} not found")
+    elif args.command == "customer":
+        customer_name = " ".join(args.name)
+        order_ids = index.customer_orders(customer_name)
+        print(f"{len(order_ids)} orders for {customer_name}")
+        for order_id in order_ids:
+            print(order_id)
+    else:
+        item_name = " ".join(args.name)
+        since = None
+        if args.days is not None:
+            since = time.time() - args.days * 86400
+        sales = index.item_sales(item_name, since)
+        print(f"{sum(sale[1] for sale in sales)} {item_name} sold in "
+              f"{len(sales)} orders")
+
+    index.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != "test":
+        main()
+        sys.exit()
+
+    # Unit Test Framework for OrderIndex, run in a scratch folder
+    import shutil
+
+    import customer_order
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        orders_path_test = order_paths.default_orders_path()
+        for first_name, last_name, order_number, items_test in (
+                ("John", "Doe", 1, {("potato", 1.5): 3, ("corn", 0.25): 2}),
+                ("Jane", "Roe", 2, {("potato", 1.5): 4}),
+                ("John", "Doe", 3, {("corn", 0.25): 1})):
+            customer_order.CustomerOrder(items_test, first_name, last_name,
+                                         confirm=False,
+                                         order_number=order_number)
+
+        # Test case: The index is built from the existing order files.
+        index_test = OrderIndex(orders_path_test)
+        assert index_test.ensure_built(workers=1) == 3
+        assert index_test.ensure_built(workers=1) is None
+        assert index_test.customer_orders("john doe") == ["John_Doe_1",
+                                                          "John_Doe_3"]
+        assert index_test.item_quantity("potato") == 7
+        assert index_test.item_quantity("corn") == 3
+        assert (index_test.order_location("Jane_Roe_2")
+                == order_paths.order_location("Jane_Roe_2",
+                                              orders_path_test))
+        assert index_test.order_location("Jane_Roe_9") is None
+
+        # Test case: Recording more orders than the log keeps moves it into
+        # a run, which is merged with the built one.
+        bulk_orders_test = [
+            customer_order.CustomerOrder({("potato", 1.5): 1}, "Bulk",
+                                         "Buyer", confirm=False,
+                                         order_number=order_number,
+                                         write_file=False)
+            for order_number in range(100, 110 + LOG_FLUSH_ORDERS)]
+        for first_index in range(0, len(bulk_orders_test), 100):
+            assert index_test.record_orders(
+                bulk_orders_test[first_index:first_index + 100])
+
+        with open(os.path.join(orders_path_test, INDEX_DIR_NAME,
+                               MANIFEST_FILE_NAME)) as manifest_test:
+            run_lines_test = [line for line in manifest_test
+                              if not line.startswith("#")]
+        assert len(run_lines_test) == 1
+
+        bulk_count_test = len(bulk_orders_test)
+        assert index_test.item_quantity("potato") == 7 + bulk_count_test
+        assert len(index_test.customer_orders("Bulk Buyer")) == (
+            bulk_count_test)
+
+        # Test case: Recording the same orders again counts nothing twice,
+        # whether they are in the log or in a run.
+        extra_order_test = customer_order.CustomerOrder(
+            {("corn", 0.25): 5}, "Jane", "Roe", confirm=False,
+            order_number=5000, write_file=False)
+        assert index_test.record_orders([extra_order_test])
+        assert index_test.record_orders(bulk_orders_test[:100]
+                                        + [extra_order_test,
+                                           extra_order_test])
+        assert index_test.item_quantity("potato") == 7 + bulk_count_test
+        assert index_test.item_quantity("corn") == 8
+
+        # Test case: Another reader finds the log and the runs on disk.
+        other_index_test = OrderIndex(orders_path_test)
+        assert other_index_test.item_quantity("corn") == 8
+        assert other_index_test.customer_orders("jane roe") == [
+            "Jane_Roe_2", "Jane_Roe_5000"]
+        other_index_test.close()
+
+        # Test case: Compacting keeps every entry.
+        index_test.compact()
+        assert index_test.item_quantity("potato") == 7 + bulk_count_test
+        assert index_test.item_quantity("corn") == 8
+        index_test.close()
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
@@ -0,0 +1,915 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the OrderLog class that keeps
+                     the orders of a segmented orders folder as records
+                     appended to a few large segment files, instead of one
+                     small file per order. A full segment is sealed with an
+                     index of its order numbers and offsets, so an order is
+                     found with a binary search, and receipts are rendered
+                     from the record when asked for. Order files of a flat or
+                     sharded folder are moved into segments with export.
+
+Usage: python order_log.py export|show|stats [...]
+       python order_log.py test
+"""
+
+import argparse
+import array
+import bisect
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import customer_order
+import file_lock
+import inventory_journal
+import metrics
+import order_index
+import order_paths
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+SEGMENT_INDEX_SUFFIX = ".idx"
+LOCK_FILE_NAME = "segments.lock"
+
+# Bytes a segment grows to before the next record starts a new segment
+SEGMENT_SIZE = 32 * 1024 * 1024
+
+# Frame: payload length, checksum and order number, followed by the order
+# record as JSON
+FRAME_HEADER = struct.Struct("<IIq")
+
+# Segment index: magic, order count, lowest and highest order number, then
+# the sorted order numbers followed by the offset of each
+SEGMENT_INDEX_MAGIC = b"FIMSSIX1"
+SEGMENT_INDEX_HEADER = struct.Struct("<8sqqq")
+
+# Bytes read at once by a lookup, most records fit in one read
+READ_SIZE = 4096
+
+# Order files moved into segments by each append of export_order_files()
+EXPORT_BATCH_SIZE = 1000
+
+# Open log of each orders folder, shared by the order writing code
+log_cache = dict()
+
+
+def segment_file_name(segment_number):
+    """Builds the file name of a segment.
+
+    Args:
+        segment_number (int): Number of the segment, counted from 1.
+
+    Return:
+        file_name (string): Ex: segment-00000001.log.
+    """
+
+    return f"{SEGMENT_PREFIX}{segment_number:08d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(orders_path):
+    """Finds the segment files of an orders folder.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        segments (list): Number and location of each segment, oldest first.
+    """
+
+    segments_path = os.path.join(orders_path, order_paths.SEGMENTS_DIR_NAME)
+    segments = list()
+
+    try:
+        with os.scandir(segments_path) as entries:
+            for entry in entries:
+                if (not entry.name.startswith(SEGMENT_PREFIX)
+                        or not entry.name.endswith(SEGMENT_SUFFIX)):
+                    continue
+
+                segment_number = entry.name[len(SEGMENT_PREFIX):
+                                            -len(SEGMENT_SUFFIX)]
+                if segment_number.isdigit():
+                    segments.append((int(segment_number), entry.path))
+    except FileNotFoundError:
+        pass
+
+    segments.sort()
+
+    return segments
+
+
+def order_record(order, time_ns):
+    """Builds the record of an order kept in a segment.
+
+    Args:
+        order (CustomerOrder): Order with its order id assigned.
+
+        time_ns (int): Order time in nanoseconds.
+
+    Return:
+        record (dictionary): Customer name, order id and number, order time,
+                             items and total.
+    """
+
+    record = order.to_record()
+    record["order_id"] = order.order_id
+    record["time_ns"] = time_ns
+    record["total"] = round(sum(name_and_price[1]
+                                * order.items_ordered[name_and_price]
+                                for name_and_price in order.items_ordered), 2)
+
+    return record
+
+
+def encode_frame(record):
+    """Frames an order record for a segment.
+
+    Args:
+        record (dictionary): Order record from order_record().
+
+    Return:
+        frame (bytes): Frame header followed by the record.
+    """
+
+    payload = json.dumps(record, separators=(",", ":")).encode()
+
+    return (FRAME_HEADER.pack(len(payload), zlib.crc32(payload),
+                              record["order_number"]) + payload)
+
+
+def scan_frames(data, start=0):
+    """Walks the complete frames of segment data. Stops at the first frame
+    that is cut off or damaged, such as one being written right now.
+
+    Args:
+        data (bytes): Segment data.
+
+        start (int): Offset of the first frame.
+
+    Return:
+        frame (tuple): Offset, order number and payload of each frame.
+    """
+
+    position = start
+
+    while position + FRAME_HEADER.size <= len(data):
+        length, checksum, order_number = FRAME_HEADER.unpack_from(data,
+                                                                  position)
+        payload_start = position + FRAME_HEADER.size
+        payload = data[payload_start:payload_start + length]
+
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            break
+
+        yield position, order_number, payload
+        position = payload_start + length
+
+
+def read_segment_records(segment_path):
+    """Reads every order record of a segment, run by rebuild workers.
+
+    Args:
+        segment_path (string): Location of the segment.
+
+    Return:
+        records (list): Order record of each complete frame.
+    """
+
+    with open(segment_path, "rb") as segment_file:
+        data = segment_file.read()
+
+    return [json.loads(payload)
+            for offset, order_number, payload in scan_frames(data)]
+
+
+def render_receipt(record):
+    """Renders the text an order file would have held.
+
+    Args:
+        record (dictionary): Order record.
+
+    Return:
+        receipt (string): Customer info followed by items ordered.
+    """
+
+    return customer_order.CustomerOrder.from_record(record).render_order_file()
+
+
+class OrderLog:
+    """Order records of a segmented orders folder. Records are appended to
+    the newest segment under a file lock, a batch of orders sharing one
+    write and one sync. Once a segment reaches segment_size it is sealed by
+    writing its index file and the next order starts a new segment.
+    Lookups do not take the lock, the newest segment is only read from
+    where the last lookup stopped.
+
+    Attributes:
+        orders_path (string): Location of the orders folder.
+
+        segments_path (string): Location of the segments folder.
+
+        segment_size (int): Bytes a segment grows to before it is sealed.
+
+    Methods:
+        __init__(orders_path, segment_size): Initializes the log of an
+                                             orders folder.
+
+        append(records): Appends order records in one write and sync.
+
+        read_order(order_id): Returns the record of an order.
+
+        render_order(order_id): Returns the receipt of an order.
+
+        order_count(): Returns the amount of orders in every segment.
+
+        close(): Closes the segments kept open for lookups.
+    """
+
+    def __init__(self, orders_path=None, segment_size=SEGMENT_SIZE):
+        """Initializes the log of an orders folder. Nothing is read or
+        created until the log is used.
+
+        Args:
+            orders_path (string): Location of the orders folder.
+
+            segment_size (int): Bytes a segment grows to before it is
+                                sealed.
+        """
+
+        if orders_path is None:
+            orders_path = order_paths.default_orders_path()
+
+        self.orders_path = orders_path
+        self.segments_path = os.path.join(orders_path,
+                                          order_paths.SEGMENTS_DIR_NAME)
+        self.segment_size = segment_size
+
+        self.__file_lock = file_lock.FileLock(
+            os.path.join(self.segments_path, LOCK_FILE_NAME))
+
+        # Threads of one process share the log, FileLock is per process
+        self.__thread_lock = threading.RLock()
+
+        # Location of every segment seen, by segment number
+        self.__segment_paths = dict()
+
+        # Sealed segments, index arrays loaded on first lookup
+        self.__sealed = dict()
+
+        # Segments without an index: offset scanned up to and offset of
+        # each order number found
+        self.__unsealed = dict()
+
+        # Segments kept open for lookups, by segment number
+        self.__read_fds = dict()
+
+    def append(self, records):
+        """Appends order records to the newest segment, syncing them once.
+
+        Args:
+            records (list): Order records from order_record().
+        """
+
+        if len(records) == 0:
+            return
+
+        frames = [encode_frame(record) for record in records]
+
+        with self.__thread_lock:
+            if len(self.__segment_paths) == 0:
+                os.makedirs(self.segments_path, exist_ok=True)
+
+            with metrics.timer("order_log_append"), self.__file_lock:
+                self.__refresh()
+                segment_number = self.__active_segment()
+                segment_path = self.__segment_paths[segment_number]
+                scanned = self.__unsealed[segment_number]
+
+                new_segment = (scanned[0] == 0
+                               and not os.path.exists(segment_path))
+
+                with open(segment_path, "ab") as segment_file:
+                    # Cuts off a frame left half written by a crash
+                    if segment_file.tell() != scanned[0]:
+                        segment_file.truncate(scanned[0])
+
+                    segment_file.write(b"".join(frames))
+                    segment_file.flush()
+                    with metrics.timer("order_log_fsync"):
+                        os.fsync(segment_file.fileno())
+
+                if new_segment:
+                    inventory_journal.fsync_directory(self.segments_path)
+
+                for record, frame in zip(records, frames):
+                    scanned[1][record["order_number"]] = scanned[0]
+                    scanned[0] += len(frame)
+
+        metrics.increment("order_log_records_total", len(records))
+
+    def read_order(self, order_id):
+        """Finds the record of an order.
+
+        Args:
+            order_id (string): Order id, Ex: John_Doe_12.
+
+        Return:
+            record (dictionary): Order record, None if the order is not in
+                                 any segment.
+        """
+
+        order_number = order_id.rpartition("_")[2]
+        if not order_number.isdigit():
+            return None
+
+        with self.__thread_lock:
+            location = self.__find(int(order_number))
+
+            # Written by another terminal since the last lookup
+            if location is None:
+                self.__refresh()
+                location = self.__find(int(order_number))
+
+            if location is None:
+                return None
+
+            record = self.__read_record(*location)
+
+        if record is None or record["order_id"] != order_id:
+            return None
+
+        return record
+
+    def render_order(self, order_id):
+        """Renders the receipt of an order from its record.
+
+        Args:
+            order_id (string): Order id, Ex: John_Doe_12.
+
+        Return:
+            receipt (string): Text the order file would have held, None if
+                              the order is not in any segment.
+        """
+
+        record = self.read_order(order_id)
+
+        if record is None:
+            return None
+
+        return render_receipt(record)
+
+    def order_count(self):
+        """Counts the orders in every segment.
+
+        Return:
+            order_count (int): Amount of order records.
+        """
+
+        with self.__thread_lock:
+            self.__refresh()
+
+            order_count = 0
+            for segment_number in self.__sealed:
+                order_count += len(self.__load_sealed(segment_number)[2])
+            for scanned in self.__unsealed.values():
+                order_count += len(scanned[1])
+
+        return order_count
+
+    def close(self):
+        """Closes the segments kept open for lookups."""
+
+        with self.__thread_lock:
+            for read_fd in self.__read_fds.values():
+                os.close(read_fd)
+            self.__read_fds = dict()
+
+    def __refresh(self):
+        """Picks up segments created and records appended by any terminal
+        since the last refresh."""
+
+        newest_number = max(self.__segment_paths, default=0)
+
+        # Segments are created one after another, so the folder is only
+        # listed again once the segment after the newest one exists
+        if newest_number == 0 or os.path.exists(os.path.join(
+                self.segments_path, segment_file_name(newest_number + 1))):
+            for segment_number, segment_path in list_segments(
+                    self.orders_path):
+                if segment_number in self.__segment_paths:
+                    continue
+
+                self.__segment_paths[segment_number] = segment_path
+                if os.path.exists(segment_path[:-len(SEGMENT_SUFFIX)]
+                                  + SEGMENT_INDEX_SUFFIX):
+                    self.__sealed[segment_number] = None
+                else:
+                    self.__unsealed[segment_number] = [0, dict()]
+
+            newest_number = max(self.__segment_paths, default=0)
+
+        for segment_number in list(self.__unsealed):
+            segment_path = self.__segment_paths[segment_number]
+            scanned = self.__unsealed[segment_number]
+
+            # Sealed by another terminal, its index replaces the scan
+            if (segment_number < newest_number
+                    and os.path.exists(segment_path[:-len(SEGMENT_SUFFIX)]
+                                       + SEGMENT_INDEX_SUFFIX)):
+                del self.__unsealed[segment_number]
+                self.__sealed[segment_number] = None
+                continue
+
+            try:
+                if os.stat(segment_path).st_size == scanned[0]:
+                    continue
+
+                with open(segment_path, "rb") as segment_file:
+                    segment_file.seek(scanned[0])
+                    data = segment_file.read()
+            except FileNotFoundError:
+                continue
+
+            # A frame still being written is read on a later refresh
+            frames_end = 0
+            for offset, order_number, payload in scan_frames(data):
+                scanned[1][order_number] = scanned[0] + offset
+                frames_end = offset + FRAME_HEADER.size + len(payload)
+
+            scanned[0] += frames_end
+
+    def __active_segment(self):
+        """Picks the segment the next records are appended to, sealing the
+        newest segment once it is full. Lock held.
+
+        Return:
+            segment_number (int): Number of the segment.
+        """
+
+        segment_number = 1
+        if len(self.__segment_paths) > 0:
+            segment_number = max(self.__segment_paths)
+
+            if segment_number in self.__sealed:
+                segment_number += 1
+            elif self.__unsealed[segment_number][0] >= self.segment_size:
+                self.__seal(segment_number)
+                segment_number += 1
+
+        if segment_number not in self.__segment_paths:
+            self.__segment_paths[segment_number] = os.path.join(
+                self.segments_path, segment_file_name(segment_number))
+            self.__unsealed[segment_number] = [0, dict()]
+
+        return segment_number
+
+    def __seal(self, segment_number):
+        """Writes the index of a full segment. Lock held.
+
+        Args:
+            segment_number (int): Number of the segment.
+        """
+
+        offsets_by_number = self.__unsealed[segment_number][1]
+        order_numbers = array.array("q", sorted(offsets_by_number))
+        offsets = array.array("q", (offsets_by_number[order_number]
+                                    for order_number in order_numbers))
+
+        lowest = 0
+        highest = 0
+        if len(order_numbers) > 0:
+            lowest = order_numbers[0]
+            highest = order_numbers[-1]
+
+        header = SEGMENT_INDEX_HEADER.pack(SEGMENT_INDEX_MAGIC,
+                                           len(order_numbers), lowest,
+                                           highest)
+
+        index_numbers = order_numbers
+        index_offsets = offsets
+        if sys.byteorder == "big":
+            index_numbers = array.array("q", order_numbers)
+            index_offsets = array.array("q", offsets)
+            index_numbers.byteswap()
+            index_offsets.byteswap()
+
+        segment_path = self.__segment_paths[segment_number]
+        index_path = segment_path[:-len(SEGMENT_SUFFIX)] + SEGMENT_INDEX_SUFFIX
+        temp_file_path = index_path + ".tmp"
+
+        with open(temp_file_path, "wb") as index_file:
+            index_file.write(header)
+            index_file.write(index_numbers.tobytes())
+            index_file.write(index_offsets.tobytes())
+            index_file.flush()
+            os.fsync(index_file.fileno())
+
+        os.replace(temp_file_path, index_path)
+        inventory_journal.fsync_directory(self.segments_path)
+
+        del self.__unsealed[segment_number]
+        self.__sealed[segment_number] = (lowest, highest, order_numbers,
+                                         offsets)
+
+    def __load_sealed(self, segment_number):
+        """Loads the index of a sealed segment on first use.
+
+        Args:
+            segment_number (int): Number of the segment.
+
+        Return:
+            index (tuple): Lowest and highest order number, sorted order
+                           numbers and the offset of each.
+        """
+
+        if self.__sealed[segment_number] is not None:
+            return self.__sealed[segment_number]
+
+        segment_path = self.__segment_paths[segment_number]
+        index_path = segment_path[:-len(SEGMENT_SUFFIX)] + SEGMENT_INDEX_SUFFIX
+
+        with open(index_path, "rb") as index_file:
+            data = index_file.read()
+
+        magic, order_count, lowest, highest = (
+            SEGMENT_INDEX_HEADER.unpack_from(data))
+
+        order_numbers = array.array("q")
+        offsets = array.array("q")
+        numbers_end = SEGMENT_INDEX_HEADER.size + order_count * 8
+
+        if (magic != SEGMENT_INDEX_MAGIC
+                or len(data) != numbers_end + order_count * 8):
+            raise ValueError(f"Damaged segment index: {index_path}")
+
+        order_numbers.frombytes(data[SEGMENT_INDEX_HEADER.size:numbers_end])
+        offsets.frombytes(data[numbers_end:])
+        if sys.byteorder == "big":
+            order_numbers.byteswap()
+            offsets.byteswap()
+
+        self.__sealed[segment_number] = (lowest, highest, order_numbers,
+                                         offsets)
+
+        return self.__sealed[segment_number]
+
+    def __find(self, order_number):
+        """Finds the segment and offset of an order record.
+
+        Args:
+            order_number (int): Number of the order.
+
+        Return:
+            location (tuple): Segment number and offset, None if not found.
+        """
+
+        for segment_number, scanned in self.__unsealed.items():
+            if order_number in scanned[1]:
+                return segment_number, scanned[1][order_number]
+
+        # Newer segments hold newer order numbers, search them first
+        for segment_number in sorted(self.__sealed, reverse=True):
+            lowest, highest, order_numbers, offsets = self.__load_sealed(
+                segment_number)
+
+            if not lowest <= order_number <= highest:
+                continue
+
+            position = bisect.bisect_left(order_numbers, order_number)
+            if (position < len(order_numbers)
+                    and order_numbers[position] == order_number):
+                return segment_number, offsets[position]
+
+        return None
+
+    def __read_record(self, segment_number, offset):
+        """Reads one order record.
+
+        Args:
+            segment_number (int): Number of the segment.
+
+            offset (int): Offset of the record frame.
+
+        Return:
+            record (dictionary): Order record, None if the frame is damaged.
+        """
+
+        read_fd = self.__read_fds.get(segment_number)
+        if read_fd is None:
+            read_fd = os.open(self.__segment_paths[segment_number],
+                              os.O_RDONLY)
+            self.__read_fds[segment_number] = read_fd
+
+        data = os.pread(read_fd, READ_SIZE, offset)
+        if len(data) < FRAME_HEADER.size:
+            return None
+
+        length, checksum, order_number = FRAME_HEADER.unpack_from(data)
+        if len(data) < FRAME_HEADER.size + length:
+            data = os.pread(read_fd, FRAME_HEADER.size + length, offset)
+
+        payload = data[FRAME_HEADER.size:FRAME_HEADER.size + length]
+        if len(payload) != length or zlib.crc32(payload) != checksum:
+            return None
+
+        return json.loads(payload)
+
+
+def open_log(orders_path=None):
+    """Returns the shared log of an orders folder.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        log (OrderLog): Log of the folder.
+    """
+
+    if orders_path is None:
+        orders_path = order_paths.default_orders_path()
+
+    if orders_path not in log_cache:
+        log_cache[orders_path] = OrderLog(orders_path)
+
+    return log_cache[orders_path]
+
+
+def append_orders(orders, orders_path=None):
+    """Appends the records of orders to the shared log.
+
+    Args:
+        orders (list): CustomerOrder objects with their order ids assigned.
+
+        orders_path (string): Location of the orders folder.
+    """
+
+    time_ns = time.time_ns()
+    open_log(orders_path).append([order_record(order, time_ns)
+                                  for order in orders])
+
+
+def split_customer_name(customer_name, name_part):
+    """Splits a customer name back into first and last name, using the
+    First_Last part of the order id to find the split.
+
+    Args:
+        customer_name (string): Customer first and last name.
+
+        name_part (string): Order id without its order number.
+
+    Return:
+        first_name (string): First name of customer.
+
+        last_name (string): Last name of customer.
+    """
+
+    for position, character in enumerate(customer_name):
+        if (character == " "
+                and (f"{customer_name[:position]}_"
+                     f"{customer_name[position + 1:]}") == name_part):
+            return customer_name[:position], customer_name[position + 1:]
+
+    first_name, separator, last_name = customer_name.partition(" ")
+
+    return first_name, last_name
+
+
+def read_order_file_record(file_path):
+    """Builds the record of an order from its order file.
+
+    Args:
+        file_path (string): Location of the order file.
+
+    Return:
+        record (dictionary): Order record, None if the file is not an order
+                             file.
+    """
+
+    customer_name, rows = order_index.parse_order_file(file_path)
+    if customer_name is None:
+        return None
+
+    order_id = os.path.basename(file_path)[:-len(".txt")]
+    name_part, separator, order_number = order_id.rpartition("_")
+    if not order_number.isdigit():
+        return None
+
+    try:
+        time_ns = os.stat(file_path).st_mtime_ns
+    except OSError:
+        return None
+
+    first_name, last_name = split_customer_name(customer_name, name_part)
+
+    # Order files only keep line totals, the price is worked back out
+    items = list()
+    for item_name, line_total, item_quantity in rows:
+        item_price = 0.0
+        if item_quantity > 0:
+            item_price = round(line_total / item_quantity, 2)
+        items.append([item_name, item_price, item_quantity])
+
+    return {"first_name": first_name,
+            "last_name": last_name,
+            "order_number": int(order_number),
+            "items": items,
+            "order_id": order_id,
+            "time_ns": time_ns,
+            "total": round(sum(row[1] for row in rows), 2)}
+
+
+def export_order_files(orders_path=None, batch_size=EXPORT_BATCH_SIZE):
+    """Moves every order file of a flat or sharded orders folder into
+    segments. The layout is switched to segmented first, so new orders go
+    straight to segments. Files are only removed once their records are
+    synced, and running it again after an interruption skips orders already
+    in a segment.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+        batch_size (int): Order files moved by each append.
+
+    Return:
+        exported_count (int): Amount of order files moved.
+    """
+
+    if orders_path is None:
+        orders_path = order_paths.default_orders_path()
+
+    file_paths = order_index.list_order_files(orders_path)
+    order_paths.write_layout(orders_path, order_paths.SEGMENTED_LAYOUT)
+
+    log = open_log(orders_path)
+    exported_count = 0
+    order_dirs = set()
+
+    for first_index in range(0, len(file_paths), batch_size):
+        records = list()
+        moved_paths = list()
+
+        for file_path in file_paths[first_index:first_index + batch_size]:
+            record = read_order_file_record(file_path)
+            if record is None:
+                continue
+
+            if log.read_order(record["order_id"]) is None:
+                records.append(record)
+            moved_paths.append(file_path)
+
+        log.append(records)
+
+        for file_path in moved_paths:
+            os.remove(file_path)
+            order_dirs.add(os.path.dirname(file_path))
+
+        exported_count += len(records)
+
+    # Emptied subfolders of a sharded folder go too, deepest first
+    for dir_path in sorted(order_dirs, reverse=True):
+        if dir_path == orders_path:
+            continue
+        try:
+            os.rmdir(dir_path)
+            os.rmdir(os.path.dirname(dir_path))
+        except OSError:
+            pass
+    inventory_journal.fsync_directory(orders_path)
+
+    # Index entries still point at the removed order files
+    index = order_index.open_index(orders_path)
+    if index.is_built():
+        index.rebuild()
+
+    return exported_count
+
+
+def main():
+    """Runs an order log command given on the command line."""
+
+    parser = argparse.ArgumentParser(
+        description="Keep orders in segment files.")
+    parser.add_argument("--orders", metavar="FOLDER",
+                        help="orders folder, ./orders by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser(
+        "export", help="move order files into segments and keep new orders "
+                       "in segments")
+    export_parser.add_argument("--batch-size", type=int,
+                               default=EXPORT_BATCH_SIZE)
+
+    show_parser = commands.add_parser("show",
+                                      help="print the receipt of an order")
+    show_parser.add_argument("order_id")
+
+    commands.add_parser("stats", help="show the segments and order count")
+
+    args = parser.parse_args()
+
+    orders_path = order_paths.default_orders_path()
+    if args.orders:
+        orders_path = os.path.abspath(args.orders)
+
+    if args.command == "export":
+        start_time = time.perf_counter()
+        exported_count = export_order_files(orders_path, args.batch_size)
+        print(f"Exported {exported_count} order files into segments of "
+              f"{orders_path} in {time.perf_counter() - start_time:.2f}s")
+        return
+
+    log = OrderLog(orders_path)
+
+    if args.command == "show":
+        receipt = log.render_order(args.order_id)
+        print(receipt if receipt else f"Order {args.order_id} not found")
+    else:
+        segments = list_segments(orders_path)
+        segment_bytes = sum(os.path.getsize(segment_path)
+                            for segment_number, segment_path in segments)
+        print(f"{log.order_count()} orders in {len(segments)} segments, "
+              f"{segment_bytes / (1024 * 1024):.1f} MiB")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != "test":
+        main()
+        sys.exit()
+
+    # Unit Test Framework for OrderLog, run in a scratch folder
+    import shutil
+    import tempfile
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        orders_path_test = order_paths.default_orders_path()
+        orders_test = [customer_order.CustomerOrder(
+            {("potato", 1.5): order_number, ("corn", 0.25): 2}, "John", "Doe",
+            confirm=False, order_number=order_number, write_file=False)
+            for order_number in range(1, 6)]
+        records_test = [order_record(order, 1000 + order.order_number)
+                        for order in orders_test]
+
+        # Segments this small are full after a single append
+        log_test = OrderLog(orders_path_test, segment_size=300)
+
+        # Test case: Records appended together are read back by order id.
+        log_test.append(records_test[:3])
+        assert log_test.read_order("John_Doe_2")["items"] == (
+            records_test[1]["items"])
+        assert log_test.read_order("John_Doe_2")["time_ns"] == 1002
+        assert log_test.read_order("Jane_Roe_2") is None
+        assert log_test.read_order("John_Doe_9") is None
+
+        # Test case: The next append seals the full segment with its index
+        # and starts a new one, records of both are found.
+        log_test.append(records_test[3:4])
+        segments_test = list_segments(orders_path_test)
+        assert [number for number, path in segments_test] == [1, 2]
+        assert os.path.exists(segments_test[0][1][:-len(SEGMENT_SUFFIX)]
+                              + SEGMENT_INDEX_SUFFIX)
+        assert log_test.read_order("John_Doe_1")["order_number"] == 1
+        assert log_test.read_order("John_Doe_4")["order_number"] == 4
+
+        # Test case: Another reader finds every record, and renders the
+        # receipt the order file would have held.
+        other_test = OrderLog(orders_path_test, segment_size=300)
+        assert other_test.order_count() == 4
+        assert (other_test.render_order("John_Doe_3")
+                == orders_test[2].render_order_file())
+        other_test.close()
+
+        # Test case: A frame torn by a crash is skipped by readers, and the
+        # next append writes over it.
+        torn_frame_test = encode_frame(records_test[4])
+        with open(segments_test[1][1], "ab") as segment_file:
+            segment_file.write(torn_frame_test[:-5])
+
+        torn_reader_test = OrderLog(orders_path_test, segment_size=300)
+        assert torn_reader_test.order_count() == 4
+        assert torn_reader_test.read_order("John_Doe_5") is None
+
+        log_test.append(records_test[4:])
+        assert torn_reader_test.read_order("John_Doe_5")["order_number"] == 5
+        assert torn_reader_test.order_count() == 5
+        assert log_test.read_order("John_Doe_4")["order_number"] == 4
+        torn_reader_test.close()
+        log_test.close()
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
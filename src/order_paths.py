@@ -0,0 +1,293 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file works out where an order file lives in
+                     the orders folder. New folders spread order files over
+                     nested subfolders picked from a hash of the order id, so
+                     no single folder grows too large and an order file is
+                     found without listing any folder. Segmented folders keep
+                     no order files, orders are records in the segment files
+                     of order_log.py.
+
+Usage: python order_paths.py migrate [orders folder]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+import inventory_journal
+
+LAYOUT_FILE_NAME = ".layout"
+FLAT_LAYOUT = "flat"
+SHARDED_LAYOUT = "sharded"
+SEGMENTED_LAYOUT = "segmented"
+LAYOUTS = (FLAT_LAYOUT, SHARDED_LAYOUT, SEGMENTED_LAYOUT)
+
+# Folder of the segment files of a segmented orders folder, hidden so it is
+# not walked for order files
+SEGMENTS_DIR_NAME = ".segments"
+
+# Layout of each orders folder with the inode and modification time of the
+# layout file it was read from, read again once another process replaces it
+layout_cache = dict()
+
+
+def default_orders_path():
+    """Returns the orders folder in the current working directory.
+
+    Return:
+        orders_path (string): Location of the orders folder.
+    """
+
+    return os.path.join(os.getcwd(), "orders")
+
+
+def shard_dirs(order_id):
+    """Picks the two nested subfolders an order file belongs in.
+
+    Args:
+        order_id (string): Order id, Ex: John_Doe_12.
+
+    Return:
+        shard_dirs (tuple): Two folder names of two hex digits each.
+    """
+
+    digest = hashlib.blake2b(order_id.encode(), digest_size=2).hexdigest()
+
+    return digest[:2], digest[2:]
+
+
+def layout_file_key(layout_file_path):
+    """Builds a key that changes whenever the layout file is replaced.
+
+    Args:
+        layout_file_path (string): Location of the layout file.
+
+    Return:
+        file_key (tuple): Inode and modification time, None if the file does
+                          not exist.
+    """
+
+    try:
+        file_stat = os.stat(layout_file_path)
+    except FileNotFoundError:
+        return None
+
+    return file_stat.st_ino, file_stat.st_mtime_ns
+
+
+def read_layout(orders_path=None):
+    """Finds the layout of an orders folder. A folder without a layout file
+    that already holds order files is an old flat folder, any other folder
+    is set up sharded. The layout file is checked on every call, so a
+    terminal follows a migration made by another process.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        layout (string): FLAT_LAYOUT, SHARDED_LAYOUT or SEGMENTED_LAYOUT.
+    """
+
+    if orders_path is None:
+        orders_path = default_orders_path()
+
+    layout_file_path = os.path.join(orders_path, LAYOUT_FILE_NAME)
+
+    # One stat instead of reading the file each time
+    file_key = layout_file_key(layout_file_path)
+    cached = layout_cache.get(orders_path)
+    if file_key is not None and cached is not None and cached[0] == file_key:
+        return cached[1]
+
+    try:
+        with open(layout_file_path) as layout_file:
+            layout = layout_file.read().strip()
+    except FileNotFoundError:
+        layout = None
+
+    if layout not in LAYOUTS:
+        layout = SHARDED_LAYOUT
+
+        # Only done once per folder, stops at the first order file
+        if os.path.isdir(orders_path):
+            with os.scandir(orders_path) as entries:
+                for entry in entries:
+                    if (entry.name.endswith(".txt")
+                            and not entry.name.startswith(".")):
+                        layout = FLAT_LAYOUT
+                        break
+
+        write_layout(orders_path, layout)
+        return layout
+
+    layout_cache[orders_path] = (file_key, layout)
+
+    return layout
+
+
+def write_layout(orders_path, layout):
+    """Records the layout of an orders folder in its layout file.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+        layout (string): FLAT_LAYOUT, SHARDED_LAYOUT or SEGMENTED_LAYOUT.
+    """
+
+    os.makedirs(orders_path, exist_ok=True)
+
+    layout_file_path = os.path.join(orders_path, LAYOUT_FILE_NAME)
+
+    # Several terminals may set up the same folder at once
+    temp_fd, temp_file_path = tempfile.mkstemp(prefix=LAYOUT_FILE_NAME + ".",
+                                               dir=orders_path)
+
+    with os.fdopen(temp_fd, "w") as layout_file:
+        layout_file.write(layout + "\n")
+        layout_file.flush()
+        os.fsync(layout_file.fileno())
+
+    os.replace(temp_file_path, layout_file_path)
+    layout_cache[orders_path] = (layout_file_key(layout_file_path), layout)
+
+
+def order_file_path(order_id, orders_path=None, create_dirs=False):
+    """Works out where the file of an order is written.
+
+    Args:
+        order_id (string): Order id, Ex: John_Doe_12.
+
+        orders_path (string): Location of the orders folder.
+
+        create_dirs (bool): Determines if missing subfolders are created.
+
+    Return:
+        file_path (string): Location of the order file.
+    """
+
+    if orders_path is None:
+        orders_path = default_orders_path()
+
+    if read_layout(orders_path) == FLAT_LAYOUT:
+        dir_path = orders_path
+    else:
+        dir_path = os.path.join(orders_path, *shard_dirs(order_id))
+
+    if create_dirs:
+        os.makedirs(dir_path, exist_ok=True)
+
+    return os.path.join(dir_path, order_id + ".txt")
+
+
+def order_location(order_id, orders_path=None):
+    """Describes where an order is stored, its file path in a flat or sharded
+    folder and the segments folder followed by the order id in a segmented
+    one.
+
+    Args:
+        order_id (string): Order id, Ex: John_Doe_12.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        location (string): Location of the order.
+    """
+
+    if orders_path is None:
+        orders_path = default_orders_path()
+
+    if read_layout(orders_path) == SEGMENTED_LAYOUT:
+        return f"{os.path.join(orders_path, SEGMENTS_DIR_NAME)}#{order_id}"
+
+    return order_file_path(order_id, orders_path)
+
+
+def locate_order_file(order_id, orders_path=None):
+    """Finds an existing order file. Besides its own location, the other
+    layout is tried too, so files are found while a migration runs.
+
+    Args:
+        order_id (string): Order id, Ex: John_Doe_12.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        file_path (string): Location of the order file, None if missing.
+    """
+
+    if orders_path is None:
+        orders_path = default_orders_path()
+
+    file_path = order_file_path(order_id, orders_path)
+
+    if os.path.exists(file_path):
+        return file_path
+
+    for other_path in (os.path.join(orders_path, order_id + ".txt"),
+                       os.path.join(orders_path, *shard_dirs(order_id),
+                                    order_id + ".txt")):
+        if os.path.exists(other_path):
+            return other_path
+
+    return None
+
+
+def migrate_flat_orders(orders_path=None):
+    """Moves every order file of a flat orders folder into its subfolder.
+    The layout is switched to sharded first, so new orders go straight to
+    subfolders and locate_order_file() finds both moved and unmoved files.
+    Running it again after an interruption finishes the move.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        moved_count (int): Amount of order files moved.
+    """
+
+    if orders_path is None:
+        orders_path = default_orders_path()
+
+    write_layout(orders_path, SHARDED_LAYOUT)
+
+    moved_count = 0
+    created_dirs = set()
+
+    with os.scandir(orders_path) as entries:
+        for entry in entries:
+            if (not entry.is_file() or entry.name.startswith(".")
+                    or not entry.name.endswith(".txt")):
+                continue
+
+            order_id = entry.name[:-len(".txt")]
+            new_path = order_file_path(order_id, orders_path,
+                                       create_dirs=True)
+            created_dirs.add(os.path.dirname(new_path))
+
+            os.rename(entry.path, new_path)
+            moved_count += 1
+
+    # Make the renames durable before reporting the migration done
+    for dir_path in created_dirs:
+        inventory_journal.fsync_directory(dir_path)
+    inventory_journal.fsync_directory(orders_path)
+
+    return moved_count
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "migrate":
+        print("Usage: python order_paths.py migrate [orders folder]")
+        sys.exit(1)
+
+    target_path = default_orders_path()
+    if len(sys.argv) == 3:
+        target_path = os.path.abspath(sys.argv[2])
+
+    moved = migrate_flat_orders(target_path)
+    print(f"Moved {moved} order files into subfolders of {target_path}")
@@ -0,0 +1,174 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines an OrderSequence class which hands
+                     out order numbers from a small persistent counter file
+                     instead of scanning every existing order file.
+"""
+
+import os
+
+import file_lock
+import inventory_journal
+import metrics
+
+SEQUENCE_FILE_NAME = ".order_sequence"
+
+
+class OrderSequence:
+    """Allocates order numbers from a counter file kept in the orders folder.
+    Every allocation happens under a file lock, so several terminals sharing
+    the same orders folder never receive the same number.
+
+    Attributes:
+        orders_path (string): Location of the orders folder.
+
+        sequence_file_path (string): Location of the counter file.
+
+    Methods:
+        __init__(orders_path): Initializes allocator for an orders folder.
+
+        allocate(count): Reserves count consecutive order numbers.
+
+        release(first_number, count): Gives back the newest unused numbers.
+
+        peek(): Returns the last order number handed out.
+    """
+
+    def __init__(self, orders_path=None):
+        """Initializes allocator, defaulting to the orders folder in the
+        current working directory.
+
+        Args:
+            orders_path (string): Location of the orders folder.
+        """
+
+        if orders_path is None:
+            orders_path = os.path.join(os.getcwd(), "orders")
+
+        self.orders_path = orders_path
+        self.sequence_file_path = os.path.join(orders_path, SEQUENCE_FILE_NAME)
+
+    @metrics.timed("order_number_allocate")
+    def allocate(self, count=1):
+        """Atomically reserves count consecutive order numbers.
+
+        Args:
+            count (int): Amount of order numbers to reserve.
+
+        Return:
+            first_number (int): First of the reserved order numbers.
+        """
+
+        os.makedirs(self.orders_path, exist_ok=True)
+
+        with file_lock.FileLock(self.sequence_file_path + ".lock"):
+            last_number = self.__read_counter()
+
+            # First use of the counter, continue from existing order files
+            if last_number is None:
+                last_number = self.__scan_order_numbers()
+
+            self.__write_counter(last_number + count)
+
+        return last_number + 1
+
+    def release(self, first_number, count):
+        """Gives back reserved numbers that were never used, only if no
+        number was allocated after them, so they leave no gap.
+
+        Args:
+            first_number (int): First of the unused order numbers.
+
+            count (int): Amount of unused order numbers, the last ones
+                         reserved.
+
+        Return:
+            released (bool): True if the numbers will be handed out again.
+        """
+
+        with file_lock.FileLock(self.sequence_file_path + ".lock"):
+            if self.__read_counter() != first_number + count - 1:
+                return False
+
+            self.__write_counter(first_number - 1)
+
+        return True
+
+    def peek(self):
+        """Returns the last order number handed out without reserving one.
+
+        Return:
+            last_number (int): Last allocated order number, 0 if none.
+        """
+
+        last_number = self.__read_counter()
+
+        if last_number is None:
+            return 0
+
+        return last_number
+
+    def __read_counter(self):
+        """Reads the counter file.
+
+        Return:
+            last_number (int): Last allocated order number, None if the
+                               counter file does not exist yet.
+        """
+
+        try:
+            with open(self.sequence_file_path) as sequence_file:
+                return int(sequence_file.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def __write_counter(self, last_number):
+        """Durably replaces the counter file contents.
+
+        Args:
+            last_number (int): Last allocated order number.
+        """
+
+        temp_file_path = self.sequence_file_path + ".tmp"
+
+        with open(temp_file_path, "w") as sequence_file:
+            sequence_file.write(str(last_number) + "\n")
+            sequence_file.flush()
+            os.fsync(sequence_file.fileno())
+
+        os.replace(temp_file_path, self.sequence_file_path)
+
+        # Otherwise a crash can bring back the old counter, and its numbers
+        # would be handed out again
+        inventory_journal.fsync_directory(self.orders_path)
+
+    @metrics.timed("orders_scan")
+    def __scan_order_numbers(self):
+        """Finds the highest order number among existing order files. Only
+        run once, when the counter file is first created.
+
+        Return:
+            highest_number (int): Highest order number found, 0 if none.
+        """
+
+        highest_number = 0
+
+        for dir_path, dir_names, file_names in os.walk(self.orders_path):
+            # Skip hidden folders
+            dir_names[:] = [name for name in dir_names
+                            if not name.startswith(".")]
+
+            for file_name in file_names:
+                if file_name.startswith(".") or not file_name.endswith(".txt"):
+                    continue
+
+                # Order number is the last part of First_Last_Number.txt
+                order_num = file_name[:-len(".txt")].rsplit("_", 1)[-1]
+
+                if order_num.isdigit():
+                    highest_number = max(highest_number, int(order_num))
+
+        return highest_number
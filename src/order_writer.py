@@ -0,0 +1,255 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the OrderWriter class that
+                     renders and writes order files on background threads, so
+                     a terminal can go back to the menu as soon as an order
+                     is placed. Queued orders are kept in a spool file until
+                     written, and spools left behind by a terminal that
+                     stopped early are written on the next start.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+import customer_order
+import file_lock
+import metrics
+import order_paths
+
+SPOOL_DIR_NAME = ".spool"
+
+
+def spool_dir_path(orders_path=None):
+    """Returns the folder holding the spool file of every running writer.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        spool_dir (string): Location of the spool folder.
+    """
+
+    if orders_path is None:
+        orders_path = order_paths.default_orders_path()
+
+    return os.path.join(orders_path, SPOOL_DIR_NAME)
+
+
+def read_spool(spool_file_path):
+    """Reads the orders saved in a spool file. A line cut short by a crash
+    is skipped, its order never reached the queue.
+
+    Args:
+        spool_file_path (string): Location of the spool file.
+
+    Return:
+        orders (list): CustomerOrder objects rebuilt from the spool.
+    """
+
+    orders = list()
+
+    with open(spool_file_path) as spool_file:
+        for line in spool_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            orders.append(customer_order.CustomerOrder.from_record(record))
+
+    return orders
+
+
+def replay_spools(orders_path=None):
+    """Writes the order files of spools whose writer is no longer running.
+    A running writer holds a lock on its spool, so those are left alone.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        replayed_count (int): Amount of order files written.
+    """
+
+    spool_dir = spool_dir_path(orders_path)
+
+    if not os.path.isdir(spool_dir):
+        return 0
+
+    replayed_count = 0
+
+    for file_name in sorted(os.listdir(spool_dir)):
+        if not file_name.endswith(".jsonl"):
+            continue
+
+        spool_file_path = os.path.join(spool_dir, file_name)
+        spool_lock = file_lock.FileLock(spool_file_path)
+
+        if not spool_lock.acquire(blocking=False):
+            continue
+
+        try:
+            # Orders written before the crash are simply written again
+            orders = read_spool(spool_file_path)
+            customer_order.write_order_files(orders)
+            os.remove(spool_file_path)
+            replayed_count += len(orders)
+        finally:
+            spool_lock.release()
+
+    return replayed_count
+
+
+class OrderWriter:
+    """Bounded queue of orders drained by a pool of writer threads. Each
+    worker takes every order waiting in the queue, up to max_batch_size,
+    and writes them together with write_order_files(). A full queue makes
+    submit() wait, so a slow disk holds back new orders instead of using up
+    memory.
+
+    Attributes:
+        worker_count (int): Writer threads.
+
+        max_batch_size (int): Most orders a worker writes together.
+
+        spool_file_path (string): Spool holding every submitted order until
+                                  the writer is closed.
+
+        replayed_count (int): Orders from earlier spools written on start.
+
+        written_count (int): Order files written by the workers.
+
+        failed_orders (list): Orders a worker could not write, written again
+                              from the spool on the next start.
+
+        errors (list): Exceptions raised while writing failed_orders.
+
+    Methods:
+        __init__(worker_count, max_queue_size, max_batch_size,
+                 orders_path): Replays old spools and starts the workers.
+
+        submit(order): Saves an order to the spool and queues it.
+
+        close(): Waits for every queued order to be written.
+    """
+
+    def __init__(self, worker_count=2, max_queue_size=256, max_batch_size=64,
+                 orders_path=None):
+        """Writes orders left in earlier spools, then opens a new spool and
+        starts the writer threads.
+
+        Args:
+            worker_count (int): Writer threads.
+
+            max_queue_size (int): Orders waiting before submit() blocks.
+
+            max_batch_size (int): Most orders a worker writes together.
+
+            orders_path (string): Location of the orders folder.
+        """
+
+        self.worker_count = max(1, worker_count)
+        self.max_batch_size = max(1, max_batch_size)
+        self.replayed_count = replay_spools(orders_path)
+        self.written_count = 0
+        self.failed_orders = list()
+        self.errors = list()
+
+        spool_dir = spool_dir_path(orders_path)
+        os.makedirs(spool_dir, exist_ok=True)
+
+        # Held until close(), tells replay_spools() this spool is in use
+        self.spool_file_path = os.path.join(
+            spool_dir, f"{os.getpid()}_{time.time_ns()}.jsonl")
+        self.__spool_lock = file_lock.FileLock(self.spool_file_path)
+        self.__spool_lock.acquire()
+        self.__spool_fd = os.open(self.spool_file_path,
+                                  os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                                  0o644)
+
+        self.__queue = queue.Queue(max_queue_size)
+        self.__count_lock = threading.Lock()
+        self.__workers = list()
+
+        for _ in range(self.worker_count):
+            worker = threading.Thread(target=self.__work, daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def submit(self, order):
+        """Saves an order to the spool and hands it to the workers. Blocks
+        while the queue is full. The order is durable once this returns.
+
+        Args:
+            order (CustomerOrder): Order created with write_file=False.
+        """
+
+        # Stock of the order is already taken out of inventory, the spool
+        # line must survive a power loss until the order file does
+        spool_line = json.dumps(order.to_record()) + "\n"
+        os.write(self.__spool_fd, spool_line.encode())
+        with metrics.timer("order_spool_fsync"):
+            os.fsync(self.__spool_fd)
+
+        self.__queue.put(order)
+
+    def __work(self):
+        """Writes queued orders until close() asks the worker to stop."""
+
+        while True:
+            order = self.__queue.get()
+            if order is None:
+                return
+
+            # Orders queued meanwhile share the fsync of the folder
+            batch = [order]
+            stop_after_batch = False
+            while len(batch) < self.max_batch_size:
+                try:
+                    next_order = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_order is None:
+                    stop_after_batch = True
+                    break
+                batch.append(next_order)
+
+            # Any error is kept with the orders instead of ending the
+            # worker, the spool still holds them for the next start
+            try:
+                customer_order.write_order_files(batch)
+            except Exception as error:
+                with self.__count_lock:
+                    self.failed_orders += batch
+                    self.errors.append(error)
+            else:
+                with self.__count_lock:
+                    self.written_count += len(batch)
+
+            if stop_after_batch:
+                return
+
+    def close(self):
+        """Waits for the workers to write every queued order, then removes
+        the spool. The spool is kept if any order failed, so the next start
+        writes it again.
+        """
+
+        for _ in self.__workers:
+            self.__queue.put(None)
+
+        for worker in self.__workers:
+            worker.join()
+
+        os.close(self.__spool_fd)
+
+        try:
+            if len(self.failed_orders) == 0:
+                os.remove(self.spool_file_path)
+        finally:
+            self.__spool_lock.release()
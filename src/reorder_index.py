@@ -0,0 +1,436 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the ReorderIndex class that
+                     keeps the items at or below their reorder point sorted
+                     by how short they are. Only items whose quantity changed
+                     are looked at, and an alert record is written whenever
+                     an order takes an item down to its reorder point or a
+                     restock brings it back above. Reorder points are kept
+                     in reorder_points.txt next to inventory.txt.
+
+Usage: python reorder_index.py set <item> <reorder point> | low [limit]
+       python reorder_index.py test
+"""
+
+import bisect
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+REORDER_POINTS_FILE_NAME = "reorder_points.txt"
+ALERTS_FILE_NAME = "reorder_alerts.jsonl"
+
+LOW_STOCK_EVENT = "low_stock"
+RESTOCKED_EVENT = "restocked"
+
+# Alerts kept in memory until taken, older ones are only in the alerts file
+MAX_KEPT_ALERTS = 1000
+
+
+def read_reorder_points(reorder_points_file_path):
+    """Reads reorder points written as "name, reorder point" lines.
+
+    Args:
+        reorder_points_file_path (string): Location of reorder_points.txt.
+
+    Return:
+        reorder_points (dictionary): Reorder point of each item name.
+    """
+
+    reorder_points = dict()
+
+    try:
+        with open(reorder_points_file_path) as reorder_points_file:
+            for line in reorder_points_file:
+                entries = line.strip().split(", ")
+
+                # Skip lines formatted incorrectly, same as inventory.txt
+                if len(entries) != 2 or not entries[1].isnumeric():
+                    continue
+                reorder_points[entries[0].lower()] = int(entries[1])
+    except FileNotFoundError:
+        pass
+
+    return reorder_points
+
+
+def write_reorder_points(reorder_points_file_path, reorder_points):
+    """Replaces reorder_points.txt with new reorder points.
+
+    Args:
+        reorder_points_file_path (string): Location of reorder_points.txt.
+
+        reorder_points (dictionary): Reorder point of each item name.
+    """
+
+    dir_path = os.path.dirname(os.path.abspath(reorder_points_file_path))
+    temp_fd, temp_file_path = tempfile.mkstemp(
+        prefix=REORDER_POINTS_FILE_NAME + ".", dir=dir_path)
+
+    with os.fdopen(temp_fd, "w") as reorder_points_file:
+        for item_name in sorted(reorder_points):
+            reorder_points_file.write(
+                f"{item_name}, {reorder_points[item_name]}\n")
+        reorder_points_file.flush()
+        os.fsync(reorder_points_file.fileno())
+
+    os.replace(temp_file_path, reorder_points_file_path)
+
+
+class ReorderIndex:
+    """Items at or below their reorder point, kept sorted by how far below
+    they are. It follows an ItemStore as a listener, so only items whose
+    quantity changed are checked again.
+
+    Attributes:
+        reorder_points (dictionary): Reorder point of each item name.
+
+        default_reorder_point (int): Reorder point of items without their
+                                     own, None to only watch listed items.
+
+        alerts (list): Newest MAX_KEPT_ALERTS alert records not yet taken
+                       with take_alerts().
+
+    Methods:
+        __init__(reorder_points, default_reorder_point,
+                 alerts_file_path): Initializes an empty index.
+
+        update(name, quantity): Checks one item again.
+
+        low_states(names): Returns which of some items are low.
+
+        emit_alerts(low_states, quantities, order_id): Records alerts for
+                                                       items that crossed
+                                                       their reorder point.
+
+        low_stock_items(limit): Returns the items at or below their reorder
+                                point, shortest first.
+
+        set_reorder_point(name, reorder_point, quantity): Changes the reorder
+                                                          point of an item.
+
+        take_alerts(): Returns and forgets the alerts not yet taken.
+
+        item_added(name, slot): Does nothing, called by ItemStore.
+
+        item_removed(name, slot): Forgets an item, called by ItemStore.
+
+        items_cleared(): Forgets every item, called by ItemStore.
+
+        items_updated(added_names, removed_names): Forgets removed items,
+                                                   called by ItemStore.
+
+        quantity_changed(name, slot, quantity): Checks one item again,
+                                                called by ItemStore.
+    """
+
+    def __init__(self, reorder_points=None, default_reorder_point=None,
+                 alerts_file_path=None):
+        """Initializes an empty index, update() adds the quantity of each
+        watched item.
+
+        Args:
+            reorder_points (dictionary): Reorder point of each item name.
+
+            default_reorder_point (int): Reorder point of items without their
+                                         own, None to only watch listed
+                                         items.
+
+            alerts_file_path (string): Where alert records are appended,
+                                       alerts are only kept in memory if
+                                       None.
+        """
+
+        if reorder_points is None:
+            reorder_points = dict()
+
+        self.reorder_points = reorder_points
+        self.default_reorder_point = default_reorder_point
+        self.alerts = list()
+
+        self.__alerts_file_path = alerts_file_path
+
+        # Sorted (quantity - reorder point, name) of every low item
+        self.__low_keys = list()
+        self.__low_items = dict()
+
+    def __reorder_point(self, name):
+        """Returns the reorder point of an item, None if not watched."""
+
+        return self.reorder_points.get(name, self.default_reorder_point)
+
+    def update(self, name, quantity):
+        """Checks one item against its reorder point again.
+
+        Args:
+            name (string): Item name.
+
+            quantity (int): Quantity in stock, None if the item is gone.
+        """
+
+        reorder_point = self.__reorder_point(name)
+
+        new_key = None
+        if (reorder_point is not None and quantity is not None
+                and quantity <= reorder_point):
+            new_key = (quantity - reorder_point, name)
+
+        old_key = self.__low_items.get(name)
+        if new_key == old_key:
+            return
+
+        if old_key is not None:
+            key_index = bisect.bisect_left(self.__low_keys, old_key)
+            del self.__low_keys[key_index]
+            del self.__low_items[name]
+
+        if new_key is not None:
+            bisect.insort(self.__low_keys, new_key)
+            self.__low_items[name] = new_key
+
+    def low_states(self, names):
+        """Returns which of some items are at or below their reorder point,
+        taken before an order changes them.
+
+        Args:
+            names (iterable): Item names.
+
+        Return:
+            low_states (dictionary): True for each low item name.
+        """
+
+        return {name: name in self.__low_items for name in names}
+
+    def emit_alerts(self, low_states, quantities, order_id=None):
+        """Records an alert for each item whose low state changed since
+        low_states() was called.
+
+        Args:
+            low_states (dictionary): Result of low_states().
+
+            quantities (dictionary): Quantity of each item after the change.
+
+            order_id (string): Order that changed the items.
+
+        Return:
+            alerts (list): Alert records emitted.
+        """
+
+        alerts = list()
+
+        for name, was_low in low_states.items():
+            is_low = name in self.__low_items
+            if is_low == was_low:
+                continue
+
+            alerts.append({"time": datetime.datetime.now().isoformat(
+                               timespec="seconds"),
+                           "event": LOW_STOCK_EVENT if is_low
+                           else RESTOCKED_EVENT,
+                           "item": name,
+                           "quantity": quantities.get(name),
+                           "reorder_point": self.__reorder_point(name),
+                           "order_id": order_id})
+
+        if len(alerts) == 0:
+            return alerts
+
+        # Programs that never take alerts only need the alerts file
+        self.alerts.extend(alerts)
+        del self.alerts[:-MAX_KEPT_ALERTS]
+
+        if self.__alerts_file_path is not None:
+            with open(self.__alerts_file_path, "a") as alerts_file:
+                alerts_file.write("".join(json.dumps(alert) + "\n"
+                                          for alert in alerts))
+
+        return alerts
+
+    def low_stock_items(self, limit=None):
+        """Returns the items at or below their reorder point.
+
+        Args:
+            limit (int): Most items returned, every low item if None.
+
+        Return:
+            low_items (list): Name, quantity and reorder point of each item,
+                              furthest below its reorder point first.
+        """
+
+        low_items = list()
+
+        for shortfall, name in self.__low_keys[:limit]:
+            reorder_point = self.__reorder_point(name)
+            low_items.append((name, shortfall + reorder_point, reorder_point))
+
+        return low_items
+
+    def set_reorder_point(self, name, reorder_point, quantity):
+        """Changes the reorder point of an item.
+
+        Args:
+            name (string): Item name.
+
+            reorder_point (int): New reorder point, None to use the default.
+
+            quantity (int): Quantity in stock, None if the item is unknown.
+        """
+
+        if reorder_point is None:
+            self.reorder_points.pop(name, None)
+        else:
+            self.reorder_points[name] = reorder_point
+
+        self.update(name, quantity)
+
+    def take_alerts(self):
+        """Returns the alerts not yet taken and forgets them.
+
+        Return:
+            alerts (list): Alert records, oldest first.
+        """
+
+        alerts = self.alerts
+        self.alerts = list()
+
+        return alerts
+
+    def item_added(self, name, slot):
+        """Does nothing, quantity_changed() follows with the quantity."""
+
+    def item_removed(self, name, slot):
+        """Forgets an item removed from the store.
+
+        Args:
+            name (string): Item name.
+
+            slot (int): Slot of the item in its ItemStore, not used.
+        """
+
+        self.update(name, None)
+
+    def items_cleared(self):
+        """Forgets every item, the store is reloaded after."""
+
+        self.__low_keys = list()
+        self.__low_items = dict()
+
+    def items_updated(self, added_names, removed_names):
+        """Forgets the items removed by a bulk update of the store.
+
+        Args:
+            added_names (list): Item names added, quantity_changed() follows
+                                with their quantity.
+
+            removed_names (list): Item names removed.
+        """
+
+        for name in removed_names:
+            self.update(name, None)
+
+    def quantity_changed(self, name, slot, quantity):
+        """Checks an item whose quantity changed in the store.
+
+        Args:
+            name (string): Item name.
+
+            slot (int): Slot of the item in its ItemStore, not used.
+
+            quantity (int): New quantity.
+        """
+
+        self.update(name, quantity)
+
+
+def format_alert(alert):
+    """Builds the message shown for an alert record.
+
+    Args:
+        alert (dictionary): Alert record from emit_alerts().
+
+    Return:
+        message (string): Message for the terminal.
+    """
+
+    if alert["event"] == LOW_STOCK_EVENT:
+        return (f"Reorder alert: {alert['item']} is down to "
+                f"{alert['quantity']} (reorder point "
+                f"{alert['reorder_point']})")
+
+    return (f"Restocked: {alert['item']} is back to {alert['quantity']} "
+            f"(reorder point {alert['reorder_point']})")
+
+
+if __name__ == '__main__':
+    import storage_backends
+
+    points_file_path = os.path.join(os.getcwd(), REORDER_POINTS_FILE_NAME)
+
+    if len(sys.argv) == 4 and sys.argv[1] == "set":
+        if not sys.argv[3].isnumeric():
+            print("Reorder point must be a whole number.")
+            sys.exit(1)
+
+        points = read_reorder_points(points_file_path)
+        points[sys.argv[2].lower()] = int(sys.argv[3])
+        write_reorder_points(points_file_path, points)
+        print(f"Reorder point of {sys.argv[2].lower()} set to {sys.argv[3]}")
+    elif len(sys.argv) in (2, 3) and sys.argv[1] == "low":
+        low_limit = None
+        if len(sys.argv) == 3:
+            low_limit = int(sys.argv[2])
+
+        # Opened like the app opens it, so journaled checkouts count
+        stock = storage_backends.open_inventory("text")
+        for low_name, low_quantity, low_point in (
+                stock.reorder_index().low_stock_items(low_limit)):
+            print(f"{low_name: ^15} {low_quantity: ^10} {low_point: ^10}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "test":
+
+        # Unit Test Framework for ReorderIndex, run in a scratch folder
+        import shutil
+
+        test_dir = tempfile.mkdtemp()
+        start_dir = os.getcwd()
+        os.chdir(test_dir)
+
+        try:
+            print("Running unit tests.")
+
+            with open("inventory.txt", "w") as inventory_file:
+                inventory_file.write("potato, 1.5, 30\ncorn, 0.25, 10\n")
+            write_reorder_points(REORDER_POINTS_FILE_NAME, {"potato": 20})
+
+            # Test case: A journaled checkout below the reorder point shows
+            # up in a store opened afterwards, as the low command opens it.
+            stock_test = storage_backends.open_inventory("text")
+            stock_test.checkout({("potato", 1.5): 15}, "John_Doe_1")
+
+            low_test = storage_backends.open_inventory("text")
+            assert low_test.reorder_index().low_stock_items() == [
+                ("potato", 15, 20)]
+
+            # Test case: The checkout crossing the reorder point was alerted.
+            with open(ALERTS_FILE_NAME) as alerts_file:
+                alert_test = json.loads(alerts_file.readline())
+            assert alert_test["event"] == LOW_STOCK_EVENT
+            assert alert_test["item"] == "potato"
+
+            # Test case: A restock above the reorder point leaves the index.
+            stock_test.modify_inventory({("potato", 1.5): -10}, "Restock_1")
+            low_test.refresh_inventory()
+            assert low_test.reorder_index().low_stock_items() == []
+        finally:
+            os.chdir(start_dir)
+            shutil.rmtree(test_dir)
+
+        print("Unit tests all passed successfully.")
+    else:
+        print("Usage: python reorder_index.py set <item> <reorder point> "
+              "| low [limit] | test")
+        sys.exit(1)
@@ -0,0 +1,535 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines a ReservationLedger class which
+                     records the items held by carts that are still being
+                     filled. Holds are appended to a ledger file shared by
+                     every terminal and expire on their own after a time to
+                     live, so stock available to sell is the stock on hand
+                     minus the holds of other carts.
+"""
+
+import heapq
+import os
+import time
+import uuid
+import zlib
+
+import inventory_journal
+import metrics
+
+LEDGER_FILE_NAME = "reservations.log"
+
+# First line of a compacted ledger. A new file may reuse the inode of the one
+# it replaced, so readers tell them apart by this id.
+GENERATION_HEADER = "# generation: "
+
+# Seconds a cart keeps its items without being changed
+DEFAULT_HOLD_TTL = 900.0
+
+
+def new_hold_id():
+    """Creates an id for the holds of a new cart.
+
+    Return:
+        hold_id (string): Id unique across terminals.
+    """
+
+    return uuid.uuid4().hex
+
+
+class ReservationLedger:
+    """Appends and replays the hold records of carts.
+
+    A hold record sets the expiry of a cart and adds quantity changes to the
+    items it holds, a release record drops the cart. Records are only
+    appended while holding the inventory lock, so a hold is checked against
+    the same stock as checkouts, but they are replayed without it. Expired
+    holds are found through a heap of expiry times instead of scanning every
+    cart. Items are held by name, so a price change does not let other carts
+    sell them.
+
+    Attributes:
+        ledger_file_path (string): Location of the ledger file.
+
+        hold_ttl (float): Seconds a hold lasts after its cart last changed.
+
+        compact_threshold (int): Records allowed before the ledger is
+                                 rewritten with only the active holds.
+
+        holds (dictionary): Cart of item quantities and expiry time of each
+                            active hold id.
+
+        held (dictionary): Total quantity held of each item name.
+
+        record_count (int): Records in the ledger file.
+
+        offset (int): Byte offset up to which the ledger has been replayed.
+
+        inode (int): Inode of the ledger file the offset belongs to.
+
+        generation (string): Id in the header of the ledger file the offset
+                             belongs to, None if it has no header.
+
+    Methods:
+        __init__(ledger_file_path, hold_ttl, compact_threshold): Initializes
+            ledger at the given path.
+
+        refresh(now): Applies new records and drops expired holds.
+
+        held_quantity(item_name, hold_id): Returns the quantity held by
+                                           other carts.
+
+        held_items(hold_id): Returns the items held by a cart.
+
+        hold(hold_id, changes, now): Appends a hold record for a cart.
+
+        release(hold_id): Appends a release record for a cart.
+
+        compact_if_needed(): Rewrites the ledger once it holds
+                             compact_threshold records.
+    """
+
+    def __init__(self, ledger_file_path=None, hold_ttl=DEFAULT_HOLD_TTL,
+                 compact_threshold=1000):
+        """Initializes a ledger, defaulting to reservations.log in the current
+        working directory.
+
+        Args:
+            ledger_file_path (string): Location of the ledger file.
+
+            hold_ttl (float): Seconds a hold lasts after its cart last
+                              changed.
+
+            compact_threshold (int): Records allowed before compacting.
+        """
+
+        if ledger_file_path is None:
+            ledger_file_path = os.path.join(os.getcwd(), LEDGER_FILE_NAME)
+
+        self.ledger_file_path = ledger_file_path
+        self.hold_ttl = hold_ttl
+        self.compact_threshold = compact_threshold
+        self.holds = dict()
+        self.held = dict()
+        self.record_count = 0
+        self.offset = 0
+        self.inode = None
+        self.generation = None
+        self.__expiry_heap = list()
+
+    def refresh(self, now=None):
+        """Applies every complete record appended since the last refresh and
+        drops holds that have expired.
+
+        Args:
+            now (float): Current time, time.time() if None.
+        """
+
+        if now is None:
+            now = time.time()
+
+        try:
+            with open(self.ledger_file_path, "rb") as ledger_file:
+                first_line = ledger_file.readline().decode(errors="replace")
+                generation = None
+                if first_line.startswith(GENERATION_HEADER):
+                    generation = first_line[len(GENERATION_HEADER):].strip()
+
+                # Ledger was compacted, it holds every active hold again
+                ledger_stat = os.fstat(ledger_file.fileno())
+                if (ledger_stat.st_ino != self.inode
+                        or generation != self.generation
+                        or ledger_stat.st_size < self.offset):
+                    self.inode = ledger_stat.st_ino
+                    self.generation = generation
+                    self.offset = 0
+                    self.record_count = 0
+                    self.holds = dict()
+                    self.held = dict()
+                    self.__expiry_heap = list()
+
+                ledger_file.seek(self.offset)
+                data = ledger_file.read()
+        except FileNotFoundError:
+            data = b""
+
+        # Anything after the last newline is a torn append, leave it
+        end = data.rfind(b"\n") + 1
+
+        for raw_line in data[:end].splitlines():
+            record = self.__parse_record(raw_line.decode(errors="replace"))
+
+            if record is None:
+                continue
+
+            self.record_count += 1
+            self.__apply(*record)
+
+        self.offset += end
+
+        self.__expire(now)
+
+    def held_quantity(self, item_name, hold_id=None):
+        """Finds how much of an item is held by carts other than hold_id.
+
+        Args:
+            item_name (string): Lowercase name of the item.
+
+            hold_id (string): Cart whose own hold is not counted, None to
+                              count every hold.
+
+        Return:
+            quantity (int): Quantity held.
+        """
+
+        quantity = self.held.get(item_name, 0)
+
+        if hold_id is not None and hold_id in self.holds:
+            quantity -= self.holds[hold_id]["cart"].get(item_name, 0)
+
+        return quantity
+
+    def held_items(self, hold_id):
+        """Finds the items still held by a cart.
+
+        Args:
+            hold_id (string): Cart holding the items.
+
+        Return:
+            cart (dictionary): Quantity held of each item name, empty when
+                               the hold expired or was released.
+        """
+
+        if hold_id not in self.holds:
+            return dict()
+
+        return self.holds[hold_id]["cart"]
+
+    def hold(self, hold_id, changes, now=None):
+        """Appends a hold record that renews a cart and changes what it
+        holds. Must be called while holding the inventory lock, after
+        checking the stock.
+
+        Args:
+            hold_id (string): Cart holding the items.
+
+            changes (dictionary): Quantity change of each item name.
+
+            now (float): Current time, time.time() if None.
+
+        Return:
+            expires_at (float): Time the hold expires unless renewed.
+        """
+
+        if now is None:
+            now = time.time()
+
+        expires_at = now + self.hold_ttl
+
+        fields = ["hold", hold_id, repr(expires_at)]
+        for item_name in changes:
+            fields.append(str(item_name))
+            fields.append(str(changes[item_name]))
+
+        self.__append(fields)
+        self.__apply(hold_id, expires_at, changes)
+        metrics.increment("reservation_holds_total")
+
+        return expires_at
+
+    def release(self, hold_id):
+        """Appends a release record that drops every item of a cart. Must be
+        called while holding the inventory lock.
+
+        Args:
+            hold_id (string): Cart holding the items.
+        """
+
+        if hold_id not in self.holds:
+            return
+
+        self.__append(["release", hold_id])
+        self.__apply(hold_id, None, None)
+
+    def compact_if_needed(self):
+        """Rewrites the ledger with one record per active hold once it holds
+        compact_threshold records. Must be called while holding the
+        inventory lock, right after a refresh."""
+
+        if self.record_count < self.compact_threshold:
+            return
+
+        generation = uuid.uuid4().hex
+        lines = [f"{GENERATION_HEADER}{generation}\n"]
+        for hold_id in self.holds:
+            fields = ["hold", hold_id, repr(self.holds[hold_id]["expires_at"])]
+            cart = self.holds[hold_id]["cart"]
+            for item_name in cart:
+                fields.append(str(item_name))
+                fields.append(str(cart[item_name]))
+            lines.append(self.__format_record(fields))
+
+        temp_file_path = self.ledger_file_path + ".tmp"
+
+        with open(temp_file_path, "w") as temp_file:
+            temp_file.writelines(lines)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.chmod(temp_file_path, 0o644)
+        os.replace(temp_file_path, self.ledger_file_path)
+        inventory_journal.fsync_directory(
+            os.path.dirname(self.ledger_file_path))
+
+        self.offset = sum(len(line.encode()) for line in lines)
+        self.record_count = len(self.holds)
+        self.inode = os.stat(self.ledger_file_path).st_ino
+        self.generation = generation
+
+    def __apply(self, hold_id, expires_at, changes):
+        """Applies one record to the active holds.
+
+        Args:
+            hold_id (string): Cart the record belongs to.
+
+            expires_at (float): New expiry of the cart, None to release it.
+
+            changes (dictionary): Quantity change of each item name.
+        """
+
+        # Release record
+        if expires_at is None:
+            hold = self.holds.pop(hold_id, None)
+            if hold is not None:
+                self.__remove_from_held(hold["cart"])
+            return
+
+        hold = self.holds.get(hold_id)
+        if hold is None:
+            hold = {"cart": dict(), "expires_at": expires_at}
+            self.holds[hold_id] = hold
+
+        cart = hold["cart"]
+        for item_name in changes:
+            quantity = cart.get(item_name, 0) + changes[item_name]
+            if quantity > 0:
+                cart[item_name] = quantity
+            else:
+                cart.pop(item_name, None)
+
+            self.held[item_name] = (self.held.get(item_name, 0)
+                                    + changes[item_name])
+            if self.held[item_name] <= 0:
+                del self.held[item_name]
+
+        # Older heap entries of the cart are skipped when they come up
+        hold["expires_at"] = expires_at
+        heapq.heappush(self.__expiry_heap, (expires_at, hold_id))
+
+    def __expire(self, now):
+        """Drops holds whose expiry time has passed.
+
+        Args:
+            now (float): Current time.
+        """
+
+        while (len(self.__expiry_heap) > 0
+               and self.__expiry_heap[0][0] <= now):
+            expires_at, hold_id = heapq.heappop(self.__expiry_heap)
+
+            hold = self.holds.get(hold_id)
+            if hold is None or hold["expires_at"] != expires_at:
+                continue
+
+            del self.holds[hold_id]
+            self.__remove_from_held(hold["cart"])
+            metrics.increment("reservation_expired_total")
+
+    def __remove_from_held(self, cart):
+        """Takes the items of a dropped cart out of the held totals.
+
+        Args:
+            cart (dictionary): Quantity held of each item name.
+        """
+
+        for item_name in cart:
+            quantity = self.held.get(item_name, 0) - cart[item_name]
+            if quantity > 0:
+                self.held[item_name] = quantity
+            else:
+                self.held.pop(item_name, None)
+
+    def __append(self, fields):
+        """Appends a single record to the ledger file.
+
+        Args:
+            fields (list): Fields of the record.
+        """
+
+        line = self.__format_record(fields)
+
+        # O_APPEND keeps each record in one contiguous write
+        ledger_fd = os.open(self.ledger_file_path,
+                            os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Start a fresh line if a previous append was torn by a crash
+            ledger_size = os.fstat(ledger_fd).st_size
+            if (ledger_size > 0
+                    and os.pread(ledger_fd, 1, ledger_size - 1) != b"\n"):
+                line = "\n" + line
+
+            os.write(ledger_fd, line.encode())
+            ledger_stat = os.fstat(ledger_fd)
+        finally:
+            os.close(ledger_fd)
+
+        # Ledger was replayed under the same lock, so the own record is the
+        # only one not applied yet. Holds only last minutes, so they are not
+        # synced to disk like the journal.
+        self.inode = ledger_stat.st_ino
+        self.offset = ledger_stat.st_size
+        self.record_count += 1
+
+    @staticmethod
+    def __format_record(fields):
+        """Joins the fields of a record into a line with a checksum.
+
+        Args:
+            fields (list): Fields of the record.
+
+        Return:
+            line (string): Record line.
+        """
+
+        body = ", ".join(fields)
+        checksum = zlib.crc32(body.encode())
+
+        return f"{body}, {checksum}\n"
+
+    @staticmethod
+    def __parse_record(line):
+        """Splits a ledger line back into its hold id, expiry and changes.
+
+        Args:
+            line (string): A single ledger line.
+
+        Return:
+            record (tuple): Hold id, expiry time (None for a release) and
+                            changes dictionary, or None if the line is
+                            damaged.
+        """
+
+        body, separator, checksum = line.rstrip("\n").rpartition(", ")
+
+        if not separator:
+            return None
+
+        try:
+            if zlib.crc32(body.encode()) != int(checksum):
+                return None
+        except ValueError:
+            return None
+
+        fields = body.split(", ")
+
+        if fields[0] == "release" and len(fields) == 2:
+            return fields[1], None, None
+
+        if fields[0] != "hold" or len(fields) < 3 or (len(fields) - 3) % 2:
+            return None
+
+        changes = dict()
+
+        try:
+            expires_at = float(fields[2])
+
+            for index in range(3, len(fields), 2):
+                changes[fields[index]] = (changes.get(fields[index], 0)
+                                          + int(fields[index + 1]))
+        except ValueError:
+            return None
+
+        return fields[1], expires_at, changes
+
+
+if __name__ == '__main__':
+
+    # Unit Test Framework for ReservationLedger, run in a scratch folder
+    import shutil
+    import tempfile
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        ledger_test = ReservationLedger(hold_ttl=60.0, compact_threshold=4)
+        other_test = ReservationLedger(hold_ttl=60.0, compact_threshold=4)
+        ledger_test.refresh(now=1000.0)
+
+        # Test case: A cart's own hold is not counted against it, holds of
+        # other carts are.
+        ledger_test.hold("cart_a", {"potato": 3, "corn": 1}, now=1000.0)
+        ledger_test.hold("cart_b", {"potato": 2}, now=1010.0)
+        assert ledger_test.held_quantity("potato") == 5
+        assert ledger_test.held_quantity("potato", "cart_a") == 2
+        assert ledger_test.held_quantity("potato", "cart_b") == 3
+        assert ledger_test.held_items("cart_a") == {"potato": 3, "corn": 1}
+
+        # Test case: Another ledger replays the same holds.
+        other_test.refresh(now=1020.0)
+        assert other_test.held == {"potato": 5, "corn": 1}
+
+        # Test case: Changing a hold only adds the difference, and a
+        # release drops the whole cart.
+        ledger_test.hold("cart_a", {"potato": -1, "corn": -1}, now=1030.0)
+        assert ledger_test.held_items("cart_a") == {"potato": 2}
+        ledger_test.release("cart_b")
+        other_test.refresh(now=1030.0)
+        assert other_test.held == {"potato": 2}
+
+        # Test case: A hold expires hold_ttl after its cart last changed.
+        other_test.refresh(now=1089.0)
+        assert other_test.held_quantity("potato") == 2
+        other_test.refresh(now=1090.0)
+        assert other_test.held_quantity("potato") == 0
+        assert other_test.held_items("cart_a") == dict()
+
+        # Test case: Compacting keeps only active holds, and another ledger
+        # notices the new file through its generation header.
+        ledger_test.hold("cart_c", {"corn": 4}, now=1100.0)
+        ledger_test.refresh(now=1100.0)
+        assert ledger_test.record_count >= ledger_test.compact_threshold
+        ledger_test.compact_if_needed()
+        assert ledger_test.record_count == 1
+        with open(LEDGER_FILE_NAME) as ledger_file:
+            assert ledger_file.readline().startswith(GENERATION_HEADER)
+
+        other_test.refresh(now=1100.0)
+        assert other_test.generation == ledger_test.generation
+        assert other_test.held == {"corn": 4}
+
+        new_test = ReservationLedger(hold_ttl=60.0)
+        new_test.refresh(now=1100.0)
+        assert new_test.held == {"corn": 4}
+
+        # Test case: A torn last line is ignored until it is complete, and
+        # the next hold starts on a fresh line.
+        with open(LEDGER_FILE_NAME, "a") as ledger_file:
+            ledger_file.write("hold, cart_d, 1200.0, potato, 9")
+        other_test.refresh(now=1100.0)
+        assert other_test.held == {"corn": 4}
+
+        ledger_test.hold("cart_e", {"potato": 1}, now=1100.0)
+        other_test.refresh(now=1100.0)
+        assert other_test.held == {"corn": 4, "potato": 1}
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
@@ -0,0 +1,947 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the SalesAnalytics class that
+                     reports top sellers, revenue per item, basket sizes and
+                     sales velocity. Every order line is kept once in a
+                     fixed-width file and loaded into array columns, which
+                     NumPy aggregates without Python loops when installed.
+                     Existing order files are parsed by a process pool the
+                     first time, and new orders are appended as they are
+                     written. Reports are cached until a new order arrives.
+
+Usage: python sales_analytics.py report|rebuild [...]
+       python sales_analytics.py test
+"""
+
+import argparse
+import array
+import concurrent.futures
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+import file_lock
+import order_index
+import order_log
+import order_paths
+
+# NumPy is optional, reports fall back to Python loops without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ANALYTICS_DIR_NAME = ".analytics"
+LINES_FILE_NAME = "lines.bin"
+ITEMS_FILE_NAME = "items.txt"
+LOCK_FILE_NAME = "analytics.lock"
+
+# Order line: order number, order time in nanoseconds, item code, quantity
+# and line total in cents, all 64-bit so the file loads as one array
+LINE_FORMAT = "<qqqqq"
+LINE_SIZE = struct.calcsize(LINE_FORMAT)
+LINE_FIELDS = 5
+
+# Order files parsed by each rebuild worker task
+REBUILD_CHUNK_SIZE = 5000
+
+# Open analytics of each orders folder, shared by the order writing code
+analytics_cache = dict()
+
+
+def parse_order_lines(file_paths):
+    """Parses order files into order lines, run by each rebuild worker.
+
+    Args:
+        file_paths (list): Locations of the order files or segments.
+
+    Return:
+        lines (list): Order number, order time, item name, quantity and
+                      line total in cents of each order line.
+    """
+
+    lines = list()
+
+    for file_path in file_paths:
+        if file_path.endswith(order_log.SEGMENT_SUFFIX):
+            for record in order_log.read_segment_records(file_path):
+                for item_name, item_price, item_quantity in record["items"]:
+                    lines.append((record["order_number"], record["time_ns"],
+                                  item_name, item_quantity,
+                                  int(round(item_price * item_quantity
+                                            * 100))))
+            continue
+
+        customer_name, rows = order_index.parse_order_file(file_path)
+        if customer_name is None:
+            continue
+
+        # Order number is the last part of First_Last_Number.txt
+        order_number = os.path.basename(file_path)[:-len(".txt")]
+        order_number = order_number.rsplit("_", 1)[-1]
+        if not order_number.isdigit():
+            continue
+
+        try:
+            time_ns = os.stat(file_path).st_mtime_ns
+        except OSError:
+            continue
+
+        for item_name, line_total, item_quantity in rows:
+            lines.append((int(order_number), time_ns, item_name,
+                          item_quantity, int(round(line_total * 100))))
+
+    return lines
+
+
+class SalesAnalytics:
+    """Sales reports over every order line of an orders folder.
+
+    Attributes:
+        orders_path (string): Location of the orders folder.
+
+        analytics_path (string): Location of the analytics folder.
+
+        item_names (list): Item name of each item code.
+
+        order_numbers (array): Order number of each line.
+
+        order_times (array): Order time in nanoseconds of each line.
+
+        item_codes (array): Item code of each line.
+
+        quantities (array): Quantity of each line.
+
+        revenues (array): Line total in cents of each line.
+
+        version (int): Changes whenever new lines are loaded.
+
+    Methods:
+        __init__(orders_path): Initializes the analytics of an orders folder.
+
+        is_built(): Checks if order lines have been collected.
+
+        ensure_built(workers): Collects order lines on first use.
+
+        rebuild(workers): Collects the lines of every order file again.
+
+        record_orders(orders): Adds the lines of orders just written.
+
+        refresh(): Loads lines added since the last refresh.
+
+        top_sellers(limit, since, until): Returns the items sold most.
+
+        revenue_per_item(since, until): Returns the revenue of each item.
+
+        basket_sizes(since, until): Returns how many orders had each size.
+
+        sales_velocity(days, limit, now): Returns units sold per day.
+
+        report(limit, days): Returns every report at once.
+    """
+
+    def __init__(self, orders_path=None):
+        """Initializes the analytics of an orders folder. Nothing is read
+        or created until it is used.
+
+        Args:
+            orders_path (string): Location of the orders folder.
+        """
+
+        if orders_path is None:
+            orders_path = order_paths.default_orders_path()
+
+        self.orders_path = orders_path
+        self.analytics_path = os.path.join(orders_path, ANALYTICS_DIR_NAME)
+
+        self.__lines_path = os.path.join(self.analytics_path,
+                                         LINES_FILE_NAME)
+        self.__items_path = os.path.join(self.analytics_path,
+                                         ITEMS_FILE_NAME)
+        self.__file_lock = file_lock.FileLock(
+            os.path.join(self.analytics_path, LOCK_FILE_NAME))
+        self.__thread_lock = threading.RLock()
+
+        self.__reset_item_names()
+        self.__reset_columns()
+        self.version = 0
+        self.__report_cache = dict()
+
+        # Bit per order number already in the lines file, read by
+        # record_orders() apart from the loaded columns
+        self.__recorded_orders = bytearray()
+        self.__recorded_offset = 0
+        self.__recorded_inode = None
+
+    def __reset_item_names(self):
+        """Forgets the item names read so far."""
+
+        self.item_names = list()
+        self.__item_codes = dict()
+        self.__items_offset = 0
+        self.__items_inode = None
+
+    def __reset_columns(self):
+        """Empties the loaded order line columns."""
+
+        self.order_numbers = array.array("q")
+        self.order_times = array.array("q")
+        self.item_codes = array.array("q")
+        self.quantities = array.array("q")
+        self.revenues = array.array("q")
+        self.__lines_offset = 0
+        self.__lines_inode = None
+
+    def is_built(self):
+        """Checks if order lines have been collected.
+
+        Return:
+            built (bool): True once rebuild() has written the lines file.
+        """
+
+        return os.path.exists(self.__lines_path)
+
+    def ensure_built(self, workers=None):
+        """Collects the lines of existing order files on first use.
+
+        Args:
+            workers (int): Processes parsing order files, one per CPU if
+                           None.
+
+        Return:
+            order_count (int): Order files and segment records read, None if
+                               already built.
+        """
+
+        if self.is_built():
+            return None
+
+        with self.__thread_lock:
+            os.makedirs(self.analytics_path, exist_ok=True)
+            with self.__file_lock:
+                if self.is_built():
+                    return None
+                return self.__rebuild(workers)
+
+    def rebuild(self, workers=None):
+        """Collects the lines of every order file again.
+
+        Args:
+            workers (int): Processes parsing order files, one per CPU if
+                           None.
+
+        Return:
+            order_count (int): Order files and segment records read.
+        """
+
+        with self.__thread_lock:
+            os.makedirs(self.analytics_path, exist_ok=True)
+            with self.__file_lock:
+                return self.__rebuild(workers)
+
+    def __rebuild(self, workers):
+        """Collects the lines of every order file, lock held.
+
+        Args:
+            workers (int): Processes parsing order files.
+
+        Return:
+            order_count (int): Order files and segment records read.
+        """
+
+        file_paths = order_index.list_order_files(self.orders_path)
+        chunks = [file_paths[first_index:first_index + REBUILD_CHUNK_SIZE]
+                  for first_index in range(0, len(file_paths),
+                                           REBUILD_CHUNK_SIZE)]
+
+        # Each segment of a segmented folder is a task of its own
+        segments = order_log.list_segments(self.orders_path)
+        chunks += [[segment_path] for segment_number, segment_path in segments]
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        workers = max(1, min(workers, len(chunks)))
+
+        if workers == 1:
+            chunk_lines = map(parse_order_lines, chunks)
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(workers)
+            chunk_lines = executor.map(parse_order_lines, chunks)
+
+        item_names = list()
+        item_codes = dict()
+        packed_lines = array.array("q")
+
+        try:
+            for lines in chunk_lines:
+                for order_number, time_ns, item_name, quantity, cents in lines:
+                    item_code = item_codes.get(item_name)
+                    if item_code is None:
+                        item_code = len(item_names)
+                        item_codes[item_name] = item_code
+                        item_names.append(item_name)
+
+                    packed_lines.extend((order_number, time_ns, item_code,
+                                         quantity, cents))
+        finally:
+            if workers > 1:
+                executor.shutdown()
+
+        if sys.byteorder == "big":
+            packed_lines.byteswap()
+
+        # Item names first, so a line never refers to an unknown code
+        self.__replace_file(self.__items_path,
+                            "".join(name + "\n"
+                                    for name in item_names).encode())
+        self.__replace_file(self.__lines_path, packed_lines.tobytes())
+
+        self.__reset_item_names()
+        self.__reset_columns()
+
+        if len(segments) > 0:
+            return (len(file_paths)
+                    + order_log.OrderLog(self.orders_path).order_count())
+
+        return len(file_paths)
+
+    def __replace_file(self, file_path, data):
+        """Swaps in new file contents atomically.
+
+        Args:
+            file_path (string): Location of the file.
+
+            data (bytes): New contents.
+        """
+
+        temp_file_path = file_path + ".tmp"
+
+        with open(temp_file_path, "wb") as temp_file:
+            temp_file.write(data)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+
+        os.replace(temp_file_path, file_path)
+
+    def record_orders(self, orders):
+        """Adds the lines of orders just written. Does nothing before the
+        lines are first collected, the rebuild reads their files instead.
+        Lines are not synced, a lost line comes back with rebuild(). Orders
+        whose lines are already in the file, such as orders written again by
+        a spool replay, are skipped so they are never counted twice.
+
+        Args:
+            orders (list): CustomerOrder objects written to order files.
+
+        Return:
+            recorded (bool): True if the lines were added.
+        """
+
+        if len(orders) == 0 or not self.is_built():
+            return False
+
+        time_ns = time.time_ns()
+
+        with self.__thread_lock, self.__file_lock:
+            self.__read_item_names()
+            self.__read_recorded_orders()
+
+            new_names = list()
+            packed_lines = list()
+
+            for order in orders:
+                if self.__is_recorded(order.order_number):
+                    continue
+                self.__mark_recorded(order.order_number)
+
+                for name_and_price in order.items_ordered:
+                    item_name = name_and_price[0]
+                    quantity = order.items_ordered[name_and_price]
+
+                    item_code = self.__item_codes.get(item_name)
+                    if item_code is None:
+                        item_code = len(self.item_names)
+                        self.__item_codes[item_name] = item_code
+                        self.item_names.append(item_name)
+                        new_names.append(item_name)
+
+                    cents = int(round(name_and_price[1] * quantity * 100))
+                    packed_lines.append(struct.pack(
+                        LINE_FORMAT, order.order_number, time_ns, item_code,
+                        quantity, cents))
+
+            if len(new_names) > 0:
+                with open(self.__items_path, "ab") as items_file:
+                    items_file.write("".join(name + "\n"
+                                             for name in new_names).encode())
+                self.__items_offset = os.path.getsize(self.__items_path)
+
+            with open(self.__lines_path, "ab") as lines_file:
+                # Cuts off a line left half written by a crash
+                size = lines_file.tell()
+                if size % LINE_SIZE != 0:
+                    lines_file.truncate(size - size % LINE_SIZE)
+                lines_file.write(b"".join(packed_lines))
+                self.__recorded_offset = lines_file.tell()
+
+        return True
+
+    def __read_recorded_orders(self):
+        """Marks the order numbers of lines written since the last read,
+        lock held."""
+
+        try:
+            lines_stat = os.stat(self.__lines_path)
+        except FileNotFoundError:
+            return
+
+        # Rebuilt by another process, read every line again
+        if lines_stat.st_ino != self.__recorded_inode:
+            self.__recorded_orders = bytearray()
+            self.__recorded_offset = 0
+            self.__recorded_inode = lines_stat.st_ino
+
+        end_offset = lines_stat.st_size - lines_stat.st_size % LINE_SIZE
+        if end_offset <= self.__recorded_offset:
+            return
+
+        with open(self.__lines_path, "rb") as lines_file:
+            lines_file.seek(self.__recorded_offset)
+            packed_lines = array.array("q", lines_file.read(
+                end_offset - self.__recorded_offset))
+
+        if sys.byteorder == "big":
+            packed_lines.byteswap()
+
+        for order_number in set(packed_lines[0::LINE_FIELDS]):
+            self.__mark_recorded(order_number)
+
+        self.__recorded_offset = end_offset
+
+    def __is_recorded(self, order_number):
+        """Checks if the lines of an order are in the lines file.
+
+        Args:
+            order_number (int): Order number.
+
+        Return:
+            recorded (bool): True if the order was recorded before.
+        """
+
+        byte_index = order_number >> 3
+
+        return (0 <= byte_index < len(self.__recorded_orders)
+                and self.__recorded_orders[byte_index] >> (order_number & 7)
+                & 1 == 1)
+
+    def __mark_recorded(self, order_number):
+        """Marks an order as recorded.
+
+        Args:
+            order_number (int): Order number.
+        """
+
+        byte_index = order_number >> 3
+
+        if byte_index < 0:
+            return
+
+        # Grown at least twofold, numbers mostly arrive in order
+        if byte_index >= len(self.__recorded_orders):
+            self.__recorded_orders.extend(bytes(max(
+                byte_index + 1 - len(self.__recorded_orders),
+                len(self.__recorded_orders))))
+
+        self.__recorded_orders[byte_index] |= 1 << (order_number & 7)
+
+    def refresh(self):
+        """Loads the lines added since the last refresh, collecting them
+        from order files on first use. The cached reports are dropped when
+        any line is new.
+
+        Return:
+            new_line_count (int): Amount of lines loaded.
+        """
+
+        self.ensure_built()
+
+        with self.__thread_lock:
+            try:
+                lines_stat = os.stat(self.__lines_path)
+            except FileNotFoundError:
+                return 0
+
+            # Rebuilt by another process, load everything again
+            if lines_stat.st_ino != self.__lines_inode:
+                self.__reset_columns()
+                self.__lines_inode = lines_stat.st_ino
+                self.version += 1
+                self.__report_cache = dict()
+
+            end_offset = lines_stat.st_size - lines_stat.st_size % LINE_SIZE
+            if end_offset <= self.__lines_offset:
+                return 0
+
+            with open(self.__lines_path, "rb") as lines_file:
+                lines_file.seek(self.__lines_offset)
+                packed_lines = array.array("q", lines_file.read(
+                    end_offset - self.__lines_offset))
+
+            if sys.byteorder == "big":
+                packed_lines.byteswap()
+
+            # Strided slices split the lines into columns in C
+            self.order_numbers.extend(packed_lines[0::LINE_FIELDS])
+            self.order_times.extend(packed_lines[1::LINE_FIELDS])
+            self.item_codes.extend(packed_lines[2::LINE_FIELDS])
+            self.quantities.extend(packed_lines[3::LINE_FIELDS])
+            self.revenues.extend(packed_lines[4::LINE_FIELDS])
+
+            self.__lines_offset = end_offset
+            self.__read_item_names()
+
+            self.version += 1
+            self.__report_cache = dict()
+
+            return len(packed_lines) // LINE_FIELDS
+
+    def __read_item_names(self):
+        """Reads item names added since the last read."""
+
+        try:
+            with open(self.__items_path, "rb") as items_file:
+                # Replaced by a rebuild, item codes start over
+                items_inode = os.fstat(items_file.fileno()).st_ino
+                if items_inode != self.__items_inode:
+                    self.__reset_item_names()
+                    self.__items_inode = items_inode
+
+                items_file.seek(self.__items_offset)
+                data = items_file.read()
+        except FileNotFoundError:
+            return
+
+        # A name still being written has no newline yet
+        data = data[:data.rfind(b"\n") + 1]
+
+        for item_name in data.decode().splitlines():
+            self.__item_codes[item_name] = len(self.item_names)
+            self.item_names.append(item_name)
+
+        self.__items_offset += len(data)
+
+    def __cached(self, key, compute):
+        """Returns a cached report, computing it if the lines changed.
+
+        Args:
+            key (tuple): Report name and arguments.
+
+            compute (function): Builds the report.
+
+        Return:
+            result (object): Report.
+        """
+
+        self.refresh()
+
+        with self.__thread_lock:
+            if key not in self.__report_cache:
+                self.__report_cache[key] = compute()
+
+            return self.__report_cache[key]
+
+    def __columns(self, since, until, *names):
+        """Returns columns limited to lines in a time range, as NumPy arrays
+        when NumPy is installed.
+
+        Args:
+            since (float): Earliest order time in seconds, None for no limit.
+
+            until (float): Latest order time in seconds, None for no limit.
+
+            *names (string): Column attribute names.
+
+        Return:
+            columns (list): Requested columns.
+        """
+
+        columns = [getattr(self, name) for name in names]
+
+        if numpy is not None:
+            columns = [numpy.frombuffer(column, dtype=numpy.int64)
+                       if len(column) > 0 else numpy.zeros(0, numpy.int64)
+                       for column in columns]
+
+        if since is None and until is None:
+            return columns
+
+        start_ns = -2 ** 63 if since is None else int(since * 1e9)
+        end_ns = 2 ** 63 - 1 if until is None else int(until * 1e9)
+
+        if numpy is not None:
+            times = numpy.frombuffer(self.order_times, dtype=numpy.int64)
+            mask = (times >= start_ns) & (times <= end_ns)
+            return [column[mask] for column in columns]
+
+        kept = [index for index, time_ns in enumerate(self.order_times)
+                if start_ns <= time_ns <= end_ns]
+        return [[column[index] for index in kept] for column in columns]
+
+    def __item_totals(self, value_column, since, until):
+        """Adds up a column per item.
+
+        Args:
+            value_column (string): "quantities" or "revenues".
+
+            since (float): Earliest order time in seconds.
+
+            until (float): Latest order time in seconds.
+
+        Return:
+            totals (list): Total of each item code.
+        """
+
+        item_codes, values = self.__columns(since, until, "item_codes",
+                                            value_column)
+
+        if numpy is not None:
+            return numpy.bincount(item_codes, weights=values,
+                                  minlength=len(self.item_names)).tolist()
+
+        totals = [0] * len(self.item_names)
+        for item_code, value in zip(item_codes, values):
+            totals[item_code] += value
+
+        return totals
+
+    def top_sellers(self, limit=10, since=None, until=None):
+        """Returns the items with the most units sold.
+
+        Args:
+            limit (int): Most items returned.
+
+            since (float): Earliest order time in seconds, None for no limit.
+
+            until (float): Latest order time in seconds, None for no limit.
+
+        Return:
+            top_sellers (list): Item name and units sold, most sold first.
+        """
+
+        def compute():
+            totals = self.__item_totals("quantities", since, until)
+            top_codes = sorted((code for code in range(len(totals))
+                                if totals[code] > 0),
+                               key=lambda code: (-totals[code],
+                                                 self.item_names[code]))
+
+            return [(self.item_names[code], int(totals[code]))
+                    for code in top_codes[:limit]]
+
+        return self.__cached(("top_sellers", limit, since, until), compute)
+
+    def revenue_per_item(self, since=None, until=None):
+        """Returns the revenue of every item sold, highest first.
+
+        Args:
+            since (float): Earliest order time in seconds, None for no limit.
+
+            until (float): Latest order time in seconds, None for no limit.
+
+        Return:
+            revenues (dictionary): Revenue in dollars of each item name.
+        """
+
+        def compute():
+            totals = self.__item_totals("revenues", since, until)
+            codes = sorted((code for code in range(len(totals))
+                            if totals[code] > 0),
+                           key=lambda code: -totals[code])
+
+            return {self.item_names[code]: round(totals[code] / 100, 2)
+                    for code in codes}
+
+        return self.__cached(("revenue_per_item", since, until), compute)
+
+    def basket_sizes(self, since=None, until=None):
+        """Returns how many orders had each amount of units.
+
+        Args:
+            since (float): Earliest order time in seconds, None for no limit.
+
+            until (float): Latest order time in seconds, None for no limit.
+
+        Return:
+            distribution (dictionary): Amount of orders per basket size,
+                                       smallest size first.
+        """
+
+        def compute():
+            order_numbers, quantities = self.__columns(
+                since, until, "order_numbers", "quantities")
+
+            if numpy is not None:
+                if len(order_numbers) == 0:
+                    return dict()
+                order_codes = numpy.unique(order_numbers,
+                                           return_inverse=True)[1]
+                sizes = numpy.bincount(order_codes, weights=quantities)
+                size_values, size_counts = numpy.unique(
+                    sizes.astype(numpy.int64), return_counts=True)
+                return dict(zip(size_values.tolist(), size_counts.tolist()))
+
+            order_sizes = dict()
+            for order_number, quantity in zip(order_numbers, quantities):
+                order_sizes[order_number] = (order_sizes.get(order_number, 0)
+                                             + quantity)
+
+            distribution = dict()
+            for size in order_sizes.values():
+                distribution[size] = distribution.get(size, 0) + 1
+
+            return dict(sorted(distribution.items()))
+
+        return self.__cached(("basket_sizes", since, until), compute)
+
+    def sales_velocity(self, days=7, limit=10, now=None):
+        """Returns the average units sold per day over recent days.
+
+        Args:
+            days (float): Days looked back.
+
+            limit (int): Most items returned.
+
+            now (float): End of the period in seconds, the current time if
+                         None.
+
+        Return:
+            velocities (list): Item name and units per day, fastest first.
+        """
+
+        if now is None:
+            # Rounded so reports within a minute share the cache
+            now = (time.time() // 60 + 1) * 60
+
+        def compute():
+            top_sellers = self.top_sellers(limit, now - days * 86400, now)
+            return [(item_name, round(units / days, 2))
+                    for item_name, units in top_sellers]
+
+        return self.__cached(("sales_velocity", days, limit, now), compute)
+
+    def report(self, limit=10, days=7):
+        """Returns every report at once.
+
+        Args:
+            limit (int): Most items in each ranking.
+
+            days (float): Days looked back for sales velocity.
+
+        Return:
+            report (dictionary): Order and line counts, top sellers, revenue,
+                                 basket sizes and sales velocity.
+        """
+
+        self.refresh()
+
+        revenues = self.revenue_per_item()
+
+        order_count = self.__cached(("orders",),
+                                    lambda: len(set(self.order_numbers)))
+
+        return {"orders": order_count,
+                "lines": len(self.order_numbers),
+                "revenue": round(sum(revenues.values()), 2),
+                "top_sellers": self.top_sellers(limit),
+                "top_revenue": list(revenues.items())[:limit],
+                "basket_sizes": self.basket_sizes(),
+                "sales_velocity": self.sales_velocity(days, limit)}
+
+
+def open_analytics(orders_path=None):
+    """Returns the shared analytics of an orders folder.
+
+    Args:
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        analytics (SalesAnalytics): Analytics of the folder.
+    """
+
+    if orders_path is None:
+        orders_path = order_paths.default_orders_path()
+
+    if orders_path not in analytics_cache:
+        analytics_cache[orders_path] = SalesAnalytics(orders_path)
+
+    return analytics_cache[orders_path]
+
+
+def record_orders(orders, orders_path=None):
+    """Adds the lines of orders just written to the shared analytics.
+
+    Args:
+        orders (list): CustomerOrder objects written to order files.
+
+        orders_path (string): Location of the orders folder.
+
+    Return:
+        recorded (bool): True if the lines were added.
+    """
+
+    return open_analytics(orders_path).record_orders(orders)
+
+
+def print_report(report, days):
+    """Prints a report in the table layout of the inventory.
+
+    Args:
+        report (dictionary): Report from SalesAnalytics.report().
+
+        days (float): Days looked back for sales velocity.
+    """
+
+    print("")
+    print("********************************************")
+    print("                Sales Report                ")
+    print("********************************************")
+    print("")
+    print(f"Orders: {report['orders']}  Lines: {report['lines']}  "
+          f"Revenue ($): {report['revenue']:.2f}")
+
+    sections = (("Top Sellers", "Units", report["top_sellers"]),
+                ("Top Revenue", "Revenue ($)", report["top_revenue"]),
+                (f"Velocity ({days:g} days)", "Units/Day",
+                 report["sales_velocity"]))
+
+    for title, value_name, rows in sections:
+        print("")
+        print(f"{title: ^15} {value_name: ^15}")
+        print(f"{'---------': ^15} {'---------': ^15}")
+        for item_name, value in rows:
+            print(f"{item_name: ^15} {value: ^15}")
+
+    print("")
+    print(f"{'Basket Size': ^15} {'Orders': ^15}")
+    print(f"{'---------': ^15} {'---------': ^15}")
+    for size, order_count in report["basket_sizes"].items():
+        print(f"{size: ^15} {order_count: ^15}")
+    print("")
+
+
+def main():
+    """Runs an analytics command given on the command line."""
+
+    parser = argparse.ArgumentParser(description="Report sales.")
+    parser.add_argument("--orders", metavar="FOLDER",
+                        help="orders folder, ./orders by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = commands.add_parser(
+        "rebuild", help="collect the lines of every order file again")
+    rebuild_parser.add_argument("--workers", type=int)
+
+    report_parser = commands.add_parser("report", help="print a report")
+    report_parser.add_argument("--limit", type=int, default=10)
+    report_parser.add_argument("--days", type=float, default=7.0)
+    report_parser.add_argument("--json", action="store_true",
+                               help="print the report as JSON")
+
+    args = parser.parse_args()
+
+    orders_path = None
+    if args.orders:
+        orders_path = os.path.abspath(args.orders)
+    analytics = SalesAnalytics(orders_path)
+
+    start_time = time.perf_counter()
+
+    if args.command == "rebuild":
+        order_count = analytics.rebuild(args.workers)
+        print(f"Read {order_count} order files in "
+              f"{time.perf_counter() - start_time:.2f}s")
+        return
+
+    report = analytics.report(args.limit, args.days)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args.days)
+        print(f"Report took {time.perf_counter() - start_time:.2f}s")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2 or sys.argv[1] != "test":
+        main()
+        sys.exit()
+
+    # Unit Test Framework for SalesAnalytics, run in a scratch folder
+    import shutil
+    import tempfile
+
+    import customer_order
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        for order_number, items_test in (
+                (1, {("potato", 1.5): 3, ("corn", 0.25): 2}),
+                (2, {("potato", 1.5): 4}),
+                (3, {("corn", 0.25): 1, ("apple", 0.4): 5})):
+            customer_order.CustomerOrder(items_test, "John", "Doe",
+                                         confirm=False,
+                                         order_number=order_number)
+
+        # Test case: Reports over the order files match totals worked out
+        # by hand.
+        analytics_test = SalesAnalytics()
+        assert analytics_test.ensure_built(workers=1) == 3
+        assert analytics_test.top_sellers() == [("potato", 7), ("apple", 5),
+                                                ("corn", 3)]
+        assert analytics_test.top_sellers(limit=1) == [("potato", 7)]
+        assert analytics_test.revenue_per_item() == {"potato": 10.5,
+                                                     "apple": 2.0,
+                                                     "corn": 0.75}
+        assert analytics_test.basket_sizes() == {4: 1, 5: 1, 6: 1}
+
+        report_test = analytics_test.report()
+        assert report_test["orders"] == 3
+        assert report_test["lines"] == 5
+        assert report_test["revenue"] == 13.25
+
+        # Test case: Reports are cached while no order arrives.
+        assert analytics_test.top_sellers() is analytics_test.top_sellers()
+
+        # Test case: A new order written by the order code drops the cached
+        # reports.
+        new_order_test = customer_order.CustomerOrder(
+            {("corn", 0.25): 10}, "Jane", "Roe", confirm=False,
+            order_number=4)
+        assert analytics_test.top_sellers() == [("corn", 13), ("potato", 7),
+                                                ("apple", 5)]
+        assert analytics_test.revenue_per_item()["corn"] == 3.25
+        assert analytics_test.basket_sizes() == {4: 1, 5: 1, 6: 1, 10: 1}
+
+        # Test case: Recording an order again counts nothing twice.
+        analytics_test.record_orders([new_order_test])
+        assert analytics_test.top_sellers()[0] == ("corn", 13)
+        assert analytics_test.report()["orders"] == 4
+
+        # Test case: Another reader loads the same lines.
+        assert SalesAnalytics().report()["revenue"] == 15.75
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
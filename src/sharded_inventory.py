@@ -0,0 +1,792 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file splits the inventory across worker
+                     processes so orders can be checked out on several cores.
+                     Items are assigned to a shard by a hash of their name and
+                     each shard owns the stock of its items in its own folder.
+                     Orders touching one shard are checked out right away,
+                     orders touching several are reserved on each shard first
+                     and only committed once every shard accepted them.
+"""
+
+import multiprocessing
+import os
+import shutil
+import zlib
+
+import create_order_interface
+import inventory_journal
+import inventory_manager
+
+SHARDS_DIR_NAME = "shards"
+
+# Written before the stock of the shards is taken out of inventory.txt and
+# kept until the shard folders are gone, shards without it never owned any
+# stock. It holds a state and a journal sequence number.
+HANDED_OUT_FILE_NAME = "handed_out"
+
+# States of the marker: stock may be on its way to the shards after the
+# sequence number, the shards own it, or it may be on its way back after
+# the sequence number
+HANDING_OUT_STATE = "handing_out"
+HANDED_OUT_STATE = "handed_out"
+RETURNING_STATE = "returning"
+
+# Journal record ids of the stock moved to and from the shards
+HAND_OUT_ORDER_ID = "shards_out"
+RETURN_ORDER_ID = "shards_returned"
+
+
+def shard_of(item_name, shard_count):
+    """Returns the shard owning an item. The hash is the same in every
+    process, unlike hash().
+
+    Args:
+        item_name (string): Lowercase item name.
+
+        shard_count (int): Amount of shards.
+
+    Return:
+        shard_index (int): Index of the owning shard.
+    """
+
+    return zlib.crc32(item_name.encode()) % shard_count
+
+
+def request_item_name(item_request):
+    """Returns the item name of an "item quantity" request.
+
+    Args:
+        item_request (string): Item and quantity, Ex: "potato 23".
+
+    Return:
+        item_name (string): Lowercase item name, empty if there is none.
+    """
+
+    words = item_request.split()
+    if len(words) == 0:
+        return ""
+
+    return words[0].lower()
+
+
+def add_quantities(totals, cart, sign=1):
+    """Adds the quantities of a cart to running totals, in place.
+
+    Args:
+        totals (dictionary): Quantity of each (name, price).
+
+        cart (dictionary): Quantity of each (name, price) to add.
+
+        sign (int): 1 to add the cart, -1 to take it back out.
+    """
+
+    for name_and_price in cart:
+        quantity = totals.get(name_and_price, 0) + sign * cart[name_and_price]
+        if quantity == 0:
+            totals.pop(name_and_price, None)
+        else:
+            totals[name_and_price] = quantity
+
+
+class InventoryShard:
+    """Stock of one shard, kept by an Inventory in the shard folder. Runs in
+    its own worker process.
+
+    Attributes:
+        stock (Inventory): Journaled inventory of the shard items.
+
+        reservations (dictionary): Cart held for each order waiting to be
+                                   committed or aborted.
+
+    Methods:
+        __init__(reorder_dir_path): Loads the shard inventory of the current
+                                    folder.
+
+        place(entries, batch_id): Validates and checks out or reserves the
+                                  lines of some orders.
+
+        finish(decisions, batch_id): Commits or aborts reserved orders.
+
+        lookup_item(item_name): Returns the price and stock of an item.
+
+        remaining_items(): Returns the stock left in the shard.
+    """
+
+    def __init__(self, reorder_dir_path=None):
+        """Loads the shard inventory of the current folder.
+
+        Args:
+            reorder_dir_path (string): Folder holding the reorder points and
+                                       alerts of the whole inventory. A
+                                       shard holds all the stock of its
+                                       items, so its sales are checked
+                                       against them.
+        """
+
+        self.stock = inventory_manager.Inventory(journaled=True)
+        self.stock.reorder_index(reorder_dir_path=reorder_dir_path)
+        self.reservations = dict()
+
+        # Quantity of each item claimed by reservations and by the order
+        # being validated
+        self.__claimed = dict()
+
+    def place(self, entries, batch_id):
+        """Validates the lines of some orders like create_order does, in the
+        order given. Orders only on this shard are checked out together at
+        the end, other orders are reserved.
+
+        Args:
+            entries (list): Order id, item requests and whether the order is
+                            only on this shard, for each order.
+
+            batch_id (string): Journal record id of the checkout.
+
+        Return:
+            results (list): Cart and reasons the lines were rejected, for
+                            each order.
+        """
+
+        results = list()
+        checkout_cart = dict()
+
+        for order_key, item_requests, single_shard in entries:
+            cart = dict()
+            reasons = list()
+
+            for item_request in item_requests:
+                lookup_pair, item_quantity, error = (
+                    create_order_interface.validate_item_request(
+                        self.stock, item_request, self.__claimed))
+
+                if error is not None:
+                    reasons.append(f"{item_request}: {error}")
+                    continue
+
+                cart[lookup_pair] = cart.get(lookup_pair, 0) + item_quantity
+                add_quantities(self.__claimed, {lookup_pair: item_quantity})
+
+            if len(reasons) > 0:
+                add_quantities(self.__claimed, cart, -1)
+                cart = dict()
+            elif single_shard:
+                add_quantities(checkout_cart, cart)
+            else:
+                self.reservations[order_key] = cart
+
+            results.append((cart, reasons))
+
+        if len(checkout_cart) > 0:
+            self.stock.checkout(checkout_cart, batch_id)
+            add_quantities(self.__claimed, checkout_cart, -1)
+
+        return results
+
+    def finish(self, decisions, batch_id):
+        """Commits or aborts reserved orders, committed orders are checked
+        out together.
+
+        Args:
+            decisions (list): Order id and whether to commit it, for each
+                              reserved order.
+
+            batch_id (string): Journal record id of the checkout.
+        """
+
+        checkout_cart = dict()
+
+        for order_key, commit in decisions:
+            cart = self.reservations.pop(order_key)
+            if commit:
+                add_quantities(checkout_cart, cart)
+            else:
+                add_quantities(self.__claimed, cart, -1)
+
+        if len(checkout_cart) > 0:
+            self.stock.checkout(checkout_cart, batch_id)
+            add_quantities(self.__claimed, checkout_cart, -1)
+
+    def lookup_item(self, item_name):
+        """Returns the price and stock of an item not claimed yet.
+
+        Args:
+            item_name (string): Lowercase item name.
+
+        Return:
+            item (tuple): Price and quantity, None if the item is unknown.
+        """
+
+        item = self.stock.lookup_item(item_name)
+        if item is None:
+            return None
+
+        return item[0], item[1] - self.__claimed.get((item_name, item[0]), 0)
+
+    def remaining_items(self):
+        """Returns the stock left in the shard.
+
+        Return:
+            remaining (dictionary): Quantity of each (name, price).
+        """
+
+        return {(item[0], item[1]): item[2]
+                for item in self.stock.iter_items()}
+
+
+def run_shard(shard_dir_path, connection, reorder_dir_path=None):
+    """Answers the coordinator until told to stop. Runs in a worker
+    process.
+
+    Args:
+        shard_dir_path (string): Folder holding the shard inventory.txt.
+
+        connection (Connection): Pipe to the coordinator.
+
+        reorder_dir_path (string): Folder holding the reorder points and
+                                   alerts of the whole inventory.
+    """
+
+    os.chdir(shard_dir_path)
+    shard = InventoryShard(reorder_dir_path)
+
+    while True:
+        command, arguments = connection.recv()
+
+        if command == "stop":
+            shard.stock.compact_inventory()
+            connection.send(None)
+            break
+
+        try:
+            if command == "place":
+                reply = shard.place(*arguments)
+            elif command == "finish":
+                reply = shard.finish(*arguments)
+            elif command == "lookup":
+                reply = shard.lookup_item(*arguments)
+            else:
+                reply = shard.remaining_items()
+        except Exception as error:
+            # Exceptions with extra attributes do not survive pickling
+            reply = RuntimeError(f"Shard {shard_dir_path}: {error}")
+
+        connection.send(reply)
+
+
+def write_shard_files(shards_dir_path, items, shard_count):
+    """Writes the inventory.txt of each shard folder.
+
+    Args:
+        shards_dir_path (string): Folder holding one folder per shard.
+
+        items (iterable): Name, price and quantity of each item.
+
+        shard_count (int): Amount of shards.
+    """
+
+    shard_files = list()
+
+    try:
+        for shard_index in range(shard_count):
+            shard_dir_path = os.path.join(shards_dir_path, f"{shard_index:02}")
+            os.makedirs(shard_dir_path)
+            shard_files.append(open(os.path.join(shard_dir_path,
+                                                 "inventory.txt"), "w"))
+
+        for item_name, item_price, item_quantity in items:
+            shard_files[shard_of(item_name, shard_count)].write(
+                f"{item_name}, {item_price}, {item_quantity}\n")
+
+        for shard_file in shard_files:
+            shard_file.flush()
+            os.fsync(shard_file.fileno())
+    finally:
+        for shard_file in shard_files:
+            shard_file.close()
+
+
+class ShardedInventory:
+    """Coordinator of the shard worker processes. While it is open the
+    shards own the stock, it is moved out of the inventory when it opens and
+    moved back when it closes, so other terminals cannot sell it meanwhile.
+
+    Attributes:
+        stock (Inventory): Inventory the stock is moved out of and back into.
+
+        shard_count (int): Amount of shard processes.
+
+        shards_dir_path (string): Folder holding one folder per shard.
+
+    Raises:
+        RuntimeError: Shards left by a crash cannot be settled from the
+                      journal, they are kept for someone to look at.
+
+    Methods:
+        __init__(stock, shard_count, shards_dir_path): Moves the stock into
+                                                       shards and starts
+                                                       their processes.
+
+        place_orders(orders): Checks out each order that every shard
+                              accepts.
+
+        lookup_item(item_name): Returns the price and unclaimed stock of an
+                                item.
+
+        close(): Stops the shards and moves their stock back.
+    """
+
+    def __init__(self, stock, shard_count, shards_dir_path=None):
+        """Moves the stock into shards and starts their processes.
+
+        Args:
+            stock (Inventory): Inventory the stock is taken from.
+
+            shard_count (int): Amount of shard processes.
+
+            shards_dir_path (string): Folder holding one folder per shard,
+                                      shards/ in the current folder if None.
+
+        Raises:
+            ValueError: The inventory is not journaled, crashed shards could
+                        not be settled.
+        """
+
+        # Moves of stock are found again in the journal after a crash
+        if stock.journal is None:
+            raise ValueError("Shards need the journaled text inventory")
+
+        cwd = os.getcwd()
+        if shards_dir_path is None:
+            shards_dir_path = os.path.join(cwd, SHARDS_DIR_NAME)
+
+        self.stock = stock
+        self.shard_count = shard_count
+        self.shards_dir_path = shards_dir_path
+
+        self.__connections = list()
+        self.__processes = list()
+        self.__batch_number = 0
+
+        # Shards alert on the reorder points next to inventory.txt
+        self.__reorder_dir_path = cwd
+
+        # Shards left by a coordinator that did not close still own stock
+        if os.path.isdir(shards_dir_path):
+            self.__return_leftover_shards()
+
+        self.__hand_out_stock()
+        self.__start_shards()
+
+    def __start_shards(self):
+        """Starts one process for each shard folder."""
+
+        for shard_index in range(self.shard_count):
+            shard_dir_path = os.path.join(self.shards_dir_path,
+                                          f"{shard_index:02}")
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_shard,
+                args=(shard_dir_path, worker_connection,
+                      self.__reorder_dir_path),
+                daemon=True)
+            process.start()
+
+            self.__connections.append(connection)
+            self.__processes.append(process)
+
+    def __return_leftover_shards(self):
+        """Settles shards left by an earlier run. The journal tells whether
+        a move of stock that was under way when it stopped took place, so
+        stock is never lost or counted twice.
+
+        Raises:
+            RuntimeError: The journal no longer tells whether the move took
+                          place, the shards are kept.
+        """
+
+        marker = self.__read_marker()
+
+        # Written before any stock moved, these shards never owned any
+        if marker is None:
+            shutil.rmtree(self.shards_dir_path)
+            return
+
+        state, sequence = marker
+        self.stock.refresh_inventory()
+
+        if state == HANDING_OUT_STATE:
+            if not self.__find_move(HAND_OUT_ORDER_ID, sequence):
+                self.__remove_shards()
+                return
+        elif state == RETURNING_STATE:
+            if self.__find_move(RETURN_ORDER_ID, sequence):
+                self.__remove_shards()
+                return
+
+        leftover_count = len([entry for entry
+                              in os.listdir(self.shards_dir_path)
+                              if entry != HANDED_OUT_FILE_NAME])
+        shard_count = self.shard_count
+        self.shard_count = leftover_count
+        self.__start_shards()
+        self.__return_stock()
+        self.shard_count = shard_count
+
+    def __find_move(self, order_id, sequence):
+        """Checks the journal for the record of a move of stock.
+
+        Args:
+            order_id (string): HAND_OUT_ORDER_ID or RETURN_ORDER_ID.
+
+            sequence (int): Inventory version before the move began.
+
+        Return:
+            moved (bool): True if the move took place.
+
+        Raises:
+            RuntimeError: Records after the sequence number were already
+                          folded into inventory.txt, so the move cannot be
+                          found.
+        """
+
+        if self.stock.journal.find_record(order_id, sequence) is not None:
+            return True
+
+        if self.stock.snapshot_version <= sequence:
+            return False
+
+        raise RuntimeError(f"Cannot tell if {order_id} after version "
+                           f"{sequence} was applied, {self.shards_dir_path} "
+                           f"was kept")
+
+    def __read_marker(self):
+        """Reads the state of the shard folders.
+
+        Return:
+            marker (tuple): State and journal sequence number, None if there
+                            is no marker.
+        """
+
+        try:
+            with open(os.path.join(self.shards_dir_path,
+                                   HANDED_OUT_FILE_NAME)) as marker_file:
+                state, sequence = marker_file.read().split()
+        except FileNotFoundError:
+            return None
+
+        return state, int(sequence)
+
+    def __write_marker(self, state, sequence):
+        """Durably replaces the state of the shard folders.
+
+        Args:
+            state (string): One of the marker states.
+
+            sequence (int): Inventory version the state refers to.
+        """
+
+        marker_file_path = os.path.join(self.shards_dir_path,
+                                        HANDED_OUT_FILE_NAME)
+        temp_file_path = marker_file_path + ".tmp"
+
+        with open(temp_file_path, "w") as marker_file:
+            marker_file.write(f"{state} {sequence}\n")
+            marker_file.flush()
+            os.fsync(marker_file.fileno())
+
+        os.replace(temp_file_path, marker_file_path)
+        inventory_journal.fsync_directory(self.shards_dir_path)
+
+    def __remove_shards(self):
+        """Removes the shard folders, the marker last so a crash part way
+        never leaves shard stock without it."""
+
+        for entry in os.listdir(self.shards_dir_path):
+            if entry != HANDED_OUT_FILE_NAME:
+                shutil.rmtree(os.path.join(self.shards_dir_path, entry))
+        inventory_journal.fsync_directory(self.shards_dir_path)
+
+        shutil.rmtree(self.shards_dir_path)
+
+    def __hand_out_stock(self):
+        """Writes the shard folders and takes their stock out of the
+        inventory. The shard files and the marker come first, so after a
+        crash the shards hold whatever the journal took out."""
+
+        self.stock.refresh_inventory()
+
+        write_shard_files(self.shards_dir_path, self.stock.iter_items(),
+                          self.shard_count)
+
+        handed_out = {(item[0], item[1]): item[2]
+                      for item in self.stock.iter_items() if item[2] > 0}
+
+        self.__write_marker(HANDING_OUT_STATE, self.stock.version)
+
+        if len(handed_out) > 0:
+            self.stock.modify_inventory(handed_out, HAND_OUT_ORDER_ID,
+                                        reorder_alerts=False)
+
+        self.__write_marker(HANDED_OUT_STATE, self.stock.version)
+
+    def __call(self, shard_messages):
+        """Sends messages to several shards at once, then waits for every
+        reply so the shards work in parallel.
+
+        Args:
+            shard_messages (dictionary): Command and arguments for each shard
+                                         index.
+
+        Return:
+            replies (dictionary): Reply of each shard index.
+        """
+
+        for shard_index in shard_messages:
+            self.__connections[shard_index].send(shard_messages[shard_index])
+
+        replies = dict()
+        for shard_index in shard_messages:
+            replies[shard_index] = self.__connections[shard_index].recv()
+
+        for reply in replies.values():
+            if isinstance(reply, Exception):
+                raise reply
+
+        return replies
+
+    def lookup_item(self, item_name):
+        """Returns the price and stock of an item not claimed by a reserved
+        order, same as Inventory.lookup_item().
+
+        Args:
+            item_name (string): Lowercase item name.
+
+        Return:
+            item (tuple): Price and quantity, None if the item is unknown.
+        """
+
+        shard_index = shard_of(item_name, self.shard_count)
+
+        return self.__call({shard_index: ("lookup", (item_name,))})[
+            shard_index]
+
+    def place_orders(self, orders):
+        """Checks out each order that every shard accepts. An order is never
+        checked out in part, its lines are reserved on each shard and only
+        committed once all of them were accepted.
+
+        Args:
+            orders (list): Item requests of each order, Ex: ["potato 23"].
+
+        Return:
+            results (list): Cart and reasons rejected of each order, the cart
+                            is empty if rejected.
+        """
+
+        results = [None] * len(orders)
+        rejected, aborted = self.__place_round(range(len(orders)), orders,
+                                               results)
+
+        # Reservations of aborted orders may have turned later orders away,
+        # try those once more on their own
+        if aborted:
+            for order_index in rejected:
+                self.__place_round([order_index], orders, results)
+
+        return results
+
+    def __place_round(self, order_indexes, orders, results):
+        """Places some orders together, in two phases when they touch more
+        than one shard.
+
+        Args:
+            order_indexes (iterable): Index of each order to place.
+
+            orders (list): Item requests of each order.
+
+            results (list): Cart and reasons of each order, filled in.
+
+        Return:
+            rejected (list): Index of each order rejected.
+
+            aborted (bool): Determines if any order was reserved and then
+                            aborted.
+        """
+
+        self.__batch_number += 1
+        batch_id = f"shard_batch_{self.__batch_number}"
+
+        entries = dict()
+        order_shards = dict()
+
+        for order_index in order_indexes:
+            lines_by_shard = dict()
+            for item_request in orders[order_index]:
+                shard_index = shard_of(request_item_name(item_request),
+                                       self.shard_count)
+                lines_by_shard.setdefault(shard_index, list()).append(
+                    item_request)
+
+            if len(lines_by_shard) == 0:
+                results[order_index] = (dict(),
+                                        ["Empty Cart. No order created."])
+                continue
+
+            order_shards[order_index] = list(lines_by_shard)
+            for shard_index in lines_by_shard:
+                entries.setdefault(shard_index, list()).append(
+                    (order_index, lines_by_shard[shard_index],
+                     len(lines_by_shard) == 1))
+
+        # Phase one, every shard validates its lines
+        replies = self.__call({shard_index: ("place", (entries[shard_index],
+                                                       batch_id))
+                               for shard_index in entries})
+
+        shard_results = dict()
+        for shard_index in replies:
+            for entry, result in zip(entries[shard_index],
+                                     replies[shard_index]):
+                shard_results[(entry[0], shard_index)] = result
+
+        rejected = list()
+        decisions = dict()
+
+        for order_index in order_shards:
+            cart = dict()
+            reasons = list()
+            for shard_index in order_shards[order_index]:
+                shard_cart, shard_reasons = shard_results[(order_index,
+                                                           shard_index)]
+                cart.update(shard_cart)
+                reasons += shard_reasons
+
+            if len(reasons) > 0:
+                rejected.append(order_index)
+                cart = dict()
+
+            results[order_index] = (cart, reasons)
+
+            if len(order_shards[order_index]) == 1:
+                continue
+
+            # Shards that reserved the order learn whether to commit it
+            for shard_index in order_shards[order_index]:
+                if len(shard_results[(order_index, shard_index)][1]) == 0:
+                    decisions.setdefault(shard_index, list()).append(
+                        (order_index, len(reasons) == 0))
+
+        # Phase two, reserved orders are committed or aborted
+        if len(decisions) > 0:
+            self.__call({shard_index: ("finish", (decisions[shard_index],
+                                                  batch_id))
+                         for shard_index in decisions})
+
+        aborted = any(not commit for shard_decisions in decisions.values()
+                      for _, commit in shard_decisions)
+
+        return rejected, aborted
+
+    def __return_stock(self):
+        """Stops the shards and moves the stock they have left back into the
+        inventory."""
+
+        replies = self.__call({shard_index: ("items", ())
+                               for shard_index in range(self.shard_count)})
+        self.__call({shard_index: ("stop", ())
+                     for shard_index in range(self.shard_count)})
+
+        for process in self.__processes:
+            process.join()
+        self.__connections = list()
+        self.__processes = list()
+
+        # Items are matched by name, modify_inventory() takes the current
+        # price
+        self.stock.refresh_inventory()
+        returned = dict()
+        for remaining in replies.values():
+            for name_and_price in remaining:
+                if (remaining[name_and_price] > 0 and self.stock.lookup_item(
+                        name_and_price[0]) is not None):
+                    returned[name_and_price] = -remaining[name_and_price]
+
+        # Shards are only removed once the journal holds the returned stock
+        self.__write_marker(RETURNING_STATE, self.stock.version)
+
+        if len(returned) > 0:
+            self.stock.modify_inventory(returned, RETURN_ORDER_ID,
+                                        reorder_alerts=False)
+
+        self.__remove_shards()
+
+    def close(self):
+        """Stops the shards and moves their stock back into the
+        inventory."""
+
+        if len(self.__processes) > 0:
+            self.__return_stock()
+
+
+if __name__ == '__main__':
+    # Unit Test Framework for ShardedInventory, run in a scratch folder
+    import tempfile
+
+    test_dir = tempfile.mkdtemp()
+    start_dir = os.getcwd()
+    os.chdir(test_dir)
+
+    try:
+        print("Running unit tests.")
+
+        with open("inventory.txt", "w") as inventory_file:
+            inventory_file.write("potato, 1.5, 30\napple, 0.4, 10\n")
+
+        # Potato and apple live on different shards
+        assert shard_of("potato", 2) != shard_of("apple", 2)
+
+        stock_test = inventory_manager.Inventory(journaled=True)
+        shards_test = ShardedInventory(stock_test, 2)
+
+        try:
+            # Test case: Stock moved into the shards is gone from the
+            # inventory while they are open.
+            stock_test.refresh_inventory()
+            assert stock_test.lookup_item("potato") == (1.5, 0)
+            assert shards_test.lookup_item("potato") == (1.5, 30)
+
+            # Test case: An order short on one shard is aborted on every
+            # shard, the order turned away by its reservation gets retried.
+            results_test = shards_test.place_orders(
+                [["potato 5", "apple 20"], ["potato 28", "apple 4"]])
+
+            assert results_test[0][0] == dict()
+            assert len(results_test[0][1]) == 1
+            assert results_test[0][1][0].startswith("apple 20")
+            assert results_test[1] == ({("potato", 1.5): 28,
+                                        ("apple", 0.4): 4}, [])
+
+            assert shards_test.lookup_item("potato") == (1.5, 2)
+            assert shards_test.lookup_item("apple") == (0.4, 6)
+            assert shards_test.lookup_item("corn") is None
+        finally:
+            shards_test.close()
+
+        # Test case: Closing returns exactly the stock left in the shards.
+        assert not os.path.isdir(SHARDS_DIR_NAME)
+        stock_test.refresh_inventory()
+        assert stock_test.lookup_item("potato") == (1.5, 2)
+        assert stock_test.lookup_item("apple") == (0.4, 6)
+
+        reopened_test = inventory_manager.Inventory(journaled=True)
+        assert reopened_test.lookup_item("potato") == (1.5, 2)
+        assert reopened_test.lookup_item("apple") == (0.4, 6)
+    finally:
+        os.chdir(start_dir)
+        shutil.rmtree(test_dir)
+
+    print("Unit tests all passed successfully.")
@@ -0,0 +1,585 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file defines the SQLiteBackend class, a storage
+                     backend that keeps the inventory and customer orders in
+                     an SQLite database instead of text files.
+"""
+
+import collections.abc
+import os
+import sqlite3
+import time
+
+import catalog_importer
+import inventory_manager
+
+DATABASE_FILE_NAME = "inventory.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    name TEXT PRIMARY KEY,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_number INTEGER PRIMARY KEY,
+    order_id TEXT NOT NULL,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS order_lines (
+    order_number INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS order_lines_by_order ON order_lines (order_number);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('order_number', 0);
+"""
+
+
+class SQLiteInventoryView(collections.abc.MutableMapping):
+    """Dictionary-like view of the items table keyed by (name, price), so
+    code written for Inventory.inventory works without loading every row.
+
+    Attributes:
+        connection (Connection): Database connection of the backend.
+    """
+
+    def __init__(self, connection):
+        """Initializes view on a database connection.
+
+        Args:
+            connection (Connection): Database connection of the backend.
+        """
+
+        self.connection = connection
+
+    def __getitem__(self, name_and_price):
+        """Looks up the quantity of an item through the name index."""
+
+        row = self.connection.execute(
+            "SELECT price, quantity FROM items WHERE name = ?",
+            (name_and_price[0],)).fetchone()
+
+        if row is None or row[0] != name_and_price[1]:
+            raise KeyError(name_and_price)
+
+        return row[1]
+
+    def __setitem__(self, name_and_price, quantity):
+        """Sets the quantity of an item, adding it if new."""
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO items (name, price, quantity) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET price = excluded.price, "
+                "quantity = excluded.quantity",
+                (name_and_price[0], name_and_price[1], quantity))
+
+    def __delitem__(self, name_and_price):
+        """Removes an item."""
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM items WHERE name = ? AND price = ?",
+                name_and_price)
+
+        if cursor.rowcount == 0:
+            raise KeyError(name_and_price)
+
+    def __iter__(self):
+        """Iterates (name, price) pairs in insertion order."""
+
+        for name, price in self.connection.execute(
+                "SELECT name, price FROM items ORDER BY rowid"):
+            yield name, price
+
+    def __len__(self):
+        """Counts the items."""
+
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def items(self):
+        """Iterates ((name, price), quantity) pairs with a single query."""
+
+        for name, price, quantity in self.connection.execute(
+                "SELECT name, price, quantity FROM items ORDER BY rowid"):
+            yield (name, price), quantity
+
+
+class SQLitePriceView(collections.abc.Mapping):
+    """Dictionary-like view of item prices keyed by name, standing in for
+    Inventory.item_price_lookup.
+
+    Attributes:
+        connection (Connection): Database connection of the backend.
+    """
+
+    def __init__(self, connection):
+        """Initializes view on a database connection.
+
+        Args:
+            connection (Connection): Database connection of the backend.
+        """
+
+        self.connection = connection
+
+    def __getitem__(self, name):
+        """Looks up the price of an item through the name index."""
+
+        row = self.connection.execute(
+            "SELECT price FROM items WHERE name = ?", (name,)).fetchone()
+
+        if row is None:
+            raise KeyError(name)
+
+        return row[0]
+
+    def __iter__(self):
+        """Iterates item names in insertion order."""
+
+        for (name,) in self.connection.execute(
+                "SELECT name FROM items ORDER BY rowid"):
+            yield name
+
+    def __len__(self):
+        """Counts the items."""
+
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM items").fetchone()[0]
+
+
+class SQLiteBackend:
+    """Keeps inventory and orders in an SQLite database. Items are looked up
+    through the primary key index, a checkout is one transaction and WAL mode
+    lets other terminals keep reading while an order is written.
+
+    Attributes:
+        database_path (string): Location of the database file.
+
+        connection (Connection): Database connection.
+
+    Methods:
+        __init__(database_path): Opens or creates the database.
+
+        inventory_view(): Returns a view standing in for Inventory.inventory.
+
+        price_view(): Returns a view standing in for
+                      Inventory.item_price_lookup.
+
+        version(): Returns the number of changes made to inventory.
+
+        checkout(cart, order_id): Removes an order if all of it is in stock.
+
+        modify(cart, order_id): Removes an order without checking stock.
+
+        import_text_inventory(inventory_file_path, report): Loads
+                                                            inventory.txt.
+
+        export_text_inventory(inventory_file_path): Writes inventory.txt.
+
+        allocate_order_numbers(count): Reserves consecutive order numbers.
+
+        release_order_numbers(first_number, count): Gives back unused order
+                                                    numbers.
+
+        save_orders(orders): Stores CustomerOrder objects.
+
+        order_location(order_id): Describes where an order is stored.
+
+        close(): Closes the database connection.
+    """
+
+    def __init__(self, database_path=None):
+        """Opens the database, creating its tables on first use.
+
+        Args:
+            database_path (string): Location of the database file, defaults
+                                    to inventory.db in the current working
+                                    directory.
+        """
+
+        if database_path is None:
+            database_path = os.path.join(os.getcwd(), DATABASE_FILE_NAME)
+
+        self.database_path = database_path
+
+        # Transactions are started explicitly with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(database_path, timeout=30,
+                                          isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL")
+        self.connection.executescript(SCHEMA)
+
+    def inventory_view(self):
+        """Creates a view of the items table keyed by (name, price).
+
+        Return:
+            view (SQLiteInventoryView): Stand in for Inventory.inventory.
+        """
+
+        return SQLiteInventoryView(self.connection)
+
+    def price_view(self):
+        """Creates a view of item prices keyed by name.
+
+        Return:
+            view (SQLitePriceView): Stand in for Inventory.item_price_lookup.
+        """
+
+        return SQLitePriceView(self.connection)
+
+    def version(self):
+        """Reads the inventory version, bumped by every change.
+
+        Return:
+            version (int): Number of changes made to inventory.
+        """
+
+        return self.__read_meta("version")
+
+    def checkout(self, cart, order_id=None):
+        """Removes every item of an order in one transaction, but only if all
+        of them are still in stock.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            order_id (string): Order that the change belongs to.
+
+        Return:
+            version (int): Inventory version created by this checkout.
+
+        Raises:
+            InsufficientStockError: Some items no longer have enough stock,
+                                    nothing was changed.
+        """
+
+        rows = [(cart[name_and_price], name_and_price[0], name_and_price[1],
+                 cart[name_and_price])
+                for name_and_price in cart]
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.connection.executemany(
+                "UPDATE items SET quantity = quantity - ? "
+                "WHERE name = ? AND price = ? AND quantity >= ?", rows)
+
+            # A row without enough stock is skipped by the WHERE clause
+            if cursor.rowcount != len(rows):
+                shortages = self.__find_shortages(cart)
+                self.connection.execute("ROLLBACK")
+                raise inventory_manager.InsufficientStockError(shortages)
+
+            version = self.__bump_version()
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        return version
+
+    def modify(self, cart, order_id=None):
+        """Removes every item of an order in one transaction without checking
+        stock, like Inventory.modify_inventory.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+            order_id (string): Order that the change belongs to.
+
+        Return:
+            version (int): Inventory version created by this change.
+        """
+
+        rows = [(cart[name_and_price], name_and_price[0], name_and_price[1])
+                for name_and_price in cart]
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.executemany(
+                "UPDATE items SET quantity = quantity - ? "
+                "WHERE name = ? AND price = ?", rows)
+            version = self.__bump_version()
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        return version
+
+    def import_text_inventory(self, inventory_file_path, report=None):
+        """Replaces the items table with the contents of an inventory.txt.
+
+        Args:
+            inventory_file_path (string): Location of inventory.txt.
+
+            report (dictionary): Receives the malformed lines skipped, see
+                                 catalog_importer.read_catalog().
+
+        Return:
+            item_count (int): Amount of items imported.
+        """
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute("DELETE FROM items")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO items (name, price, quantity) "
+                "VALUES (?, ?, ?)",
+                catalog_importer.read_catalog(inventory_file_path, "text",
+                                              report=report))
+            self.__bump_version()
+            self.connection.execute("COMMIT")
+        except (sqlite3.Error, OSError):
+            self.connection.execute("ROLLBACK")
+            raise
+
+        return len(self.inventory_view())
+
+    def export_text_inventory(self, inventory_file_path):
+        """Writes the items table in the inventory.txt format.
+
+        Args:
+            inventory_file_path (string): Location to write to.
+        """
+
+        with open(inventory_file_path, "w") as inventory_file:
+            for name_and_price, quantity in self.inventory_view().items():
+                inventory_file.write(f"{name_and_price[0]}, "
+                                     f"{name_and_price[1]}, {quantity}\n")
+
+    def allocate_order_numbers(self, count=1):
+        """Reserves count consecutive order numbers.
+
+        Args:
+            count (int): Amount of order numbers to reserve.
+
+        Return:
+            first_number (int): First of the reserved order numbers.
+        """
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute(
+                "UPDATE meta SET value = value + ? WHERE key = 'order_number'",
+                (count,))
+            last_number = self.__read_meta("order_number")
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        return last_number - count + 1
+
+    def release_order_numbers(self, first_number, count):
+        """Gives back the newest reserved order numbers if they were never
+        used and nothing was allocated after them.
+
+        Args:
+            first_number (int): First of the unused order numbers.
+
+            count (int): Amount of unused order numbers.
+
+        Return:
+            released (bool): True if the numbers will be handed out again.
+        """
+
+        with self.connection:
+            cursor = self.connection.execute(
+                "UPDATE meta SET value = ? WHERE key = 'order_number' "
+                "AND value = ?", (first_number - 1, first_number + count - 1))
+
+        return cursor.rowcount == 1
+
+    def save_orders(self, orders):
+        """Stores orders and their items in one transaction.
+
+        Args:
+            orders (list): CustomerOrder objects, created with a backend.
+        """
+
+        created = time.time()
+        order_rows = list()
+        line_rows = list()
+
+        for order in orders:
+            order_rows.append((order.order_number, order.order_id,
+                               order.customer_first_name,
+                               order.customer_last_name, created))
+
+            for name_and_price in order.items_ordered:
+                line_rows.append((order.order_number, name_and_price[0],
+                                  name_and_price[1],
+                                  order.items_ordered[name_and_price]))
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO orders (order_number, order_id, "
+                "first_name, last_name, created) VALUES (?, ?, ?, ?, ?)",
+                order_rows)
+            self.connection.executemany(
+                "INSERT INTO order_lines (order_number, name, price, quantity) "
+                "VALUES (?, ?, ?, ?)", line_rows)
+            self.connection.execute("COMMIT")
+        except sqlite3.Error:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def order_location(self, order_id):
+        """Describes where an order is stored, in place of a file path.
+
+        Args:
+            order_id (string): Order to locate.
+
+        Return:
+            location (string): Database path followed by the order id.
+        """
+
+        return f"{self.database_path}#{order_id}"
+
+    def close(self):
+        """Closes the database connection."""
+
+        self.connection.close()
+
+    def __read_meta(self, key):
+        """Reads a counter from the meta table.
+
+        Args:
+            key (string): Name of the counter.
+
+        Return:
+            value (int): Value of the counter.
+        """
+
+        return self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def __bump_version(self):
+        """Increments the inventory version inside the open transaction.
+
+        Return:
+            version (int): New inventory version.
+        """
+
+        self.connection.execute(
+            "UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        return self.__read_meta("version")
+
+    def __find_shortages(self, cart):
+        """Finds the items of a cart that do not have enough stock.
+
+        Args:
+            cart (dictionary): Quantity ordered for each (name, price).
+
+        Return:
+            shortages (dictionary): Quantity available for each short item.
+        """
+
+        inventory = self.inventory_view()
+        shortages = dict()
+
+        for name_and_price in cart:
+            try:
+                available = inventory[name_and_price]
+            except KeyError:
+                available = 0
+
+            if cart[name_and_price] > available:
+                shortages[name_and_price] = available
+
+        return shortages
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) == 2 and sys.argv[1] == "test":
+
+        # Unit Test Framework for SQLiteBackend, run in a scratch folder
+        import shutil
+        import tempfile
+
+        test_dir = tempfile.mkdtemp()
+        start_dir = os.getcwd()
+        os.chdir(test_dir)
+
+        try:
+            print("Running unit tests.")
+
+            with open("inventory.txt", "w") as inventory_file:
+                inventory_file.write("potato, 1.5, 10\ncorn, 0.25, 5\n")
+
+            backend_test = SQLiteBackend()
+            assert backend_test.import_text_inventory("inventory.txt") == 2
+
+            # Test case: A checkout in stock removes every item of the order.
+            version_test = backend_test.checkout({("potato", 1.5): 4},
+                                                 "John_Doe_1")
+            assert backend_test.inventory_view()[("potato", 1.5)] == 6
+            assert backend_test.version() == version_test
+
+            # Test case: A checkout that would oversell one item is refused
+            # and changes no item, not even the ones in stock.
+            try:
+                backend_test.checkout({("corn", 0.25): 1,
+                                       ("potato", 1.5): 7}, "John_Doe_2")
+                assert False, "oversold checkout was accepted"
+            except inventory_manager.InsufficientStockError as error:
+                assert error.shortages == {("potato", 1.5): 6}
+            assert backend_test.inventory_view()[("potato", 1.5)] == 6
+            assert backend_test.inventory_view()[("corn", 0.25)] == 5
+            assert backend_test.version() == version_test
+
+            # Test case: An item at another price is not in stock.
+            try:
+                backend_test.checkout({("corn", 0.5): 1}, "John_Doe_3")
+                assert False, "checkout at a wrong price was accepted"
+            except inventory_manager.InsufficientStockError as error:
+                assert error.shortages == {("corn", 0.5): 0}
+
+            # Test case: Another connection sees the same stock.
+            other_test = inventory_manager.Inventory(backend=SQLiteBackend())
+            assert other_test.lookup_item("potato") == (1.5, 6)
+            other_test.backend.close()
+            backend_test.close()
+        finally:
+            os.chdir(start_dir)
+            shutil.rmtree(test_dir)
+
+        print("Unit tests all passed successfully.")
+        sys.exit()
+
+    # Convert between inventory.txt and inventory.db
+    if len(sys.argv) != 3 or sys.argv[1] not in ("import", "export"):
+        print("Usage: python sqlite_backend.py import|export inventory.txt "
+              "| test")
+        sys.exit(1)
+
+    backend = SQLiteBackend()
+
+    if sys.argv[1] == "import":
+        import_report = dict()
+        imported = backend.import_text_inventory(sys.argv[2], import_report)
+        print(f"Imported {imported} items into {backend.database_path}")
+        for malformed_row in import_report["malformed"]:
+            print(f"Skipped line {malformed_row['line']}: "
+                  f"{malformed_row['error']}")
+    else:
+        backend.export_text_inventory(sys.argv[2])
+        print(f"Exported items to {sys.argv[2]}")
+
+    backend.close()
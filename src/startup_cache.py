@@ -0,0 +1,156 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file keeps a binary copy of the parsed
+                     inventory.txt in inventory.cache, so a new terminal can
+                     load the item columns with one read instead of parsing
+                     every line. The cache records the size, modification
+                     time and hash of the inventory.txt it was built from and
+                     is ignored as soon as any of them differ.
+"""
+
+import array
+import hashlib
+import os
+import struct
+import tempfile
+
+import item_store
+
+CACHE_FILE_NAME = "inventory.cache"
+CACHE_MAGIC = b"FIMSCAC2"
+
+# Magic, source size, source mtime, version, item count, names size and
+# source hash
+HEADER_FORMAT = "<8sqqqqq32s"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+
+def read_source(inventory_file_path):
+    """Reads inventory.txt once and builds the key of its cache.
+
+    Args:
+        inventory_file_path (string): Location of inventory.txt.
+
+    Return:
+        content (bytes): Contents of inventory.txt.
+
+        source_key (tuple): Size, modification time and hash of the contents
+                            read.
+    """
+
+    with open(inventory_file_path, "rb") as inventory_file:
+        file_stat = os.fstat(inventory_file.fileno())
+        content = inventory_file.read()
+
+    digest = hashlib.blake2b(content, digest_size=32).digest()
+
+    return content, (len(content), file_stat.st_mtime_ns, digest)
+
+
+def load_cache(cache_file_path, source_key):
+    """Loads the item columns saved for an inventory.txt.
+
+    Args:
+        cache_file_path (string): Location of inventory.cache.
+
+        source_key (tuple): Key from read_source().
+
+    Return:
+        cached (tuple): Version, item names, price column in cents and
+                        quantity column. None if there is no cache or it was
+                        built from a different inventory.txt.
+    """
+
+    try:
+        with open(cache_file_path, "rb") as cache_file:
+            data = cache_file.read()
+    except FileNotFoundError:
+        return None
+
+    if len(data) < HEADER_SIZE:
+        return None
+
+    (magic, source_size, source_mtime_ns, version, item_count, names_size,
+     digest) = struct.unpack_from(HEADER_FORMAT, data)
+
+    if (magic != CACHE_MAGIC
+            or (source_size, source_mtime_ns, digest) != source_key):
+        return None
+
+    prices = array.array(item_store.PRICE_COLUMN_TYPE)
+    quantities = array.array(item_store.QUANTITY_COLUMN_TYPE)
+
+    prices_offset = HEADER_SIZE + names_size
+    quantities_offset = prices_offset + item_count * prices.itemsize
+    if len(data) != quantities_offset + item_count * quantities.itemsize:
+        return None
+
+    view = memoryview(data)
+    prices.frombytes(view[prices_offset:quantities_offset])
+    quantities.frombytes(view[quantities_offset:])
+
+    names = list()
+    if item_count > 0:
+        names = bytes(view[HEADER_SIZE:prices_offset]).decode().split("\n")
+
+    if len(names) != item_count:
+        return None
+
+    return version, names, prices, quantities
+
+
+def write_cache(cache_file_path, source_key, version, store):
+    """Saves the item columns of a store parsed from inventory.txt. A
+    temporary file is renamed over the old cache, so a half written cache is
+    never read.
+
+    Args:
+        cache_file_path (string): Location of inventory.cache.
+
+        source_key (tuple): Key from read_source() of the contents parsed.
+
+        version (int): Version header of the contents parsed.
+
+        store (ItemStore): Items parsed.
+    """
+
+    slots = list(store.slots.values())
+    names = "\n".join(store.slots).encode()
+
+    # A freshly parsed store already has its slots in name order
+    if len(store.prices) == len(slots) and slots == list(range(len(slots))):
+        prices = store.prices
+        quantities = store.quantities
+    else:
+        prices = array.array(item_store.PRICE_COLUMN_TYPE,
+                             map(store.prices.__getitem__, slots))
+        quantities = array.array(item_store.QUANTITY_COLUMN_TYPE,
+                                 map(store.quantities.__getitem__, slots))
+
+    header = struct.pack(HEADER_FORMAT, CACHE_MAGIC, source_key[0],
+                         source_key[1], version, len(slots), len(names),
+                         source_key[2])
+
+    dir_path = os.path.dirname(os.path.abspath(cache_file_path))
+    temp_fd, temp_file_path = tempfile.mkstemp(prefix=CACHE_FILE_NAME + ".",
+                                               dir=dir_path)
+
+    try:
+        with os.fdopen(temp_fd, "wb") as cache_file:
+            cache_file.write(header)
+            cache_file.write(names)
+            cache_file.write(prices.tobytes())
+            cache_file.write(quantities.tobytes())
+
+        # Readable by other users like inventory.txt, not only the owner
+        os.chmod(temp_file_path, 0o644)
+        os.replace(temp_file_path, cache_file_path)
+    except OSError:
+        # Only a cache, the next start parses inventory.txt again
+        try:
+            os.remove(temp_file_path)
+        except OSError:
+            pass
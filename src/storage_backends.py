@@ -0,0 +1,50 @@
+"""
+Ricky Zheng
+Class: CS 521 - Spring 1
+Date: 2/21/2024
+Final Project
+Description of File: This Python file chooses the storage used for inventory
+                     and orders, so the interfaces can open any of them by
+                     name.
+"""
+
+import inventory_manager
+import reservation_ledger
+
+# Storage names accepted by open_inventory()
+STORAGE_TYPES = ("text", "sqlite", "mmap")
+
+
+def open_inventory(storage="text",
+                   hold_ttl=reservation_ledger.DEFAULT_HOLD_TTL):
+    """Opens the inventory on the chosen storage.
+
+    Args:
+        storage (string): "text" for inventory.txt with its journal,
+                          "sqlite" for inventory.db, or "mmap" for
+                          inventory.bin.
+
+        hold_ttl (float): Seconds the items of a cart stay held, only used
+                          by "text".
+
+    Return:
+        stock (Inventory): Inventory on the chosen storage.
+    """
+
+    if storage == "sqlite":
+        # Only needed when the SQLite storage is chosen
+        import sqlite_backend
+
+        return inventory_manager.Inventory(
+            backend=sqlite_backend.SQLiteBackend())
+
+    if storage == "mmap":
+        import mmap_backend
+
+        return inventory_manager.Inventory(
+            backend=mmap_backend.MmapBackend())
+
+    if storage == "text":
+        return inventory_manager.Inventory(journaled=True, hold_ttl=hold_ttl)
+
+    raise ValueError(f"Unknown storage: {storage}")